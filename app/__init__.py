@@ -1,4 +1,5 @@
 import os
+import click
 from flask import Flask, url_for, render_template
 from config import config_by_name
 from extensions import db, migrate, login_manager, csrf
@@ -42,29 +43,10 @@ def create_app(config_name=None):
                 'current_year': datetime.now().year,
             }
             
-            # Variables nécessitant un context d'application
-            with app.app_context():
-                from models import Product
-                
-                # Statistiques pour dashboard (avec gestion d'erreur)
-                try:
-                    total_products = Product.query.count()
-                    low_stock = Product.query.filter(Product.quantity_in_stock <= 5).count()
-                    out_of_stock = Product.query.filter(Product.quantity_in_stock <= 0).count()
-                    
-                    base_vars.update({
-                        'total_products_count': total_products,
-                        'low_stock_products': low_stock,
-                        'out_of_stock_products': out_of_stock,
-                    })
-                except Exception as e:
-                    # En cas d'erreur DB, fournir des valeurs par défaut
-                    app.logger.warning(f"Erreur context processor statistiques: {e}")
-                    base_vars.update({
-                        'total_products_count': 0,
-                        'low_stock_products': 0,
-                        'out_of_stock_products': 0,
-                    })
+            # Statistiques produits : calculées seulement si le template les lit,
+            # puis gardées en cache (app/stock/stats.py)
+            from app.stock.stats import StockStatsCache
+            base_vars.update(StockStatsCache.template_variables(app.logger))
             
             return base_vars
             
@@ -150,10 +132,16 @@ def create_app(config_name=None):
 
     from app.recipes.routes import recipes as recipes_blueprint
     app.register_blueprint(recipes_blueprint, url_prefix='/admin/recipes')
+    from app.recipes.bom import register_bom_cache_hooks
+    register_bom_cache_hooks()
     
     # ✅ CORRECTION : Import correct du blueprint stock
     from app.stock import bp as stock_blueprint
     app.register_blueprint(stock_blueprint, url_prefix='/admin/stock')
+    from app.stock.stats import register_stock_stats_hooks
+    register_stock_stats_hooks()
+    from app.stock.ledger import register_stock_ledger_hooks
+    register_stock_ledger_hooks()
 
     from app.admin.routes import admin as admin_blueprint
     app.register_blueprint(admin_blueprint, url_prefix='/admin')
@@ -186,6 +174,8 @@ def create_app(config_name=None):
 
     from app.employees.routes import employees_bp
     app.register_blueprint(employees_bp, url_prefix='/employees')
+    from app.employees.attendance_summary import register_attendance_summary_hooks
+    register_attendance_summary_hooks()
 
     # ✅ AJOUT : Blueprint deliverymen pour la gestion des livreurs
     from app.deliverymen.routes import deliverymen_bp
@@ -194,6 +184,8 @@ def create_app(config_name=None):
     # ✅ AJOUT : Blueprint sales pour le module de vente
     from app.sales.routes import sales as sales_blueprint
     app.register_blueprint(sales_blueprint, url_prefix='/sales')
+    from app.sales.catalog import register_pos_catalog_hooks
+    register_pos_catalog_hooks()
     
     # ✅ AJOUT : Import des modèles sales pour Flask-Migrate
     from app.sales import models as sales_models
@@ -213,6 +205,8 @@ def create_app(config_name=None):
     
     # ✅ AJOUT : Import des modèles accounting pour Flask-Migrate
     from app.accounting import models as accounting_models
+    from app.accounting.ledger import register_ledger_hooks
+    register_ledger_hooks()
 
     # ✅ AJOUT : Blueprint ZKTeco pour la pointeuse
     from app.zkteco import zkteco as zkteco_blueprint
@@ -275,6 +269,158 @@ def create_app(config_name=None):
         print(f"Produits - Finis: {finished}")
         print(f"Produits - Stock bas: {low_stock}")
 
+    # Commande CLI pour reconstruire la table de faits des ventes
+    @app.cli.command("rebuild-sales-facts")
+    @click.option('--start', 'start', default=None, help="Date de début (YYYY-MM-DD), défaut: première commande")
+    @click.option('--end', 'end', default=None, help="Date de fin (YYYY-MM-DD), défaut: aujourd'hui")
+    def rebuild_sales_facts(start, end):
+        """Reconstruit daily_sales_facts à partir des commandes"""
+        from models import Order
+        from app.reports.sales_facts import SalesFactService
+        
+        if start:
+            start_date = datetime.strptime(start, '%Y-%m-%d').date()
+        else:
+            first_order = db.session.query(db.func.min(Order.created_at)).scalar()
+            start_date = first_order.date() if first_order else datetime.now().date()
+        end_date = datetime.strptime(end, '%Y-%m-%d').date() if end else datetime.now().date()
+        
+        print(f"Reconstruction des faits de ventes du {start_date} au {end_date}...")
+        written = SalesFactService.rebuild(start_date, end_date)
+        db.session.commit()
+        print(f"✅ {written} lignes de faits écrites.")
+
+    # Commande CLI pour vérifier / reconstruire les soldes comptables par période
+    @app.cli.command("rebuild-account-balances")
+    @click.option('--verify-only', is_flag=True, default=False, help="Signaler les écarts sans reconstruire")
+    def rebuild_account_balances(verify_only):
+        """Vérifie puis reconstruit accounting_account_period_balances"""
+        from app.accounting.ledger import AccountBalanceService
+        
+        mismatches = AccountBalanceService.verify()
+        for account_id, year, month, expected, stored in mismatches:
+            print(f"⚠️ Compte {account_id} {year}-{month:02d} : attendu D={expected[0]} C={expected[1]}, stocké D={stored[0]} C={stored[1]}")
+        print(f"{len(mismatches)} écart(s) détecté(s).")
+        
+        if verify_only:
+            return
+        written = AccountBalanceService.rebuild()
+        db.session.commit()
+        print(f"✅ {written} lignes de soldes écrites.")
+
+    # Commande CLI pour photographier le stock (tâche planifiée quotidienne)
+    @app.cli.command("stock-snapshot")
+    @click.option('--date', 'snapshot_date', default=None, help="Jour photographié (YYYY-MM-DD), défaut: hier")
+    def stock_snapshot(snapshot_date):
+        """Enregistre le stock de fin de journée dans stock_snapshots"""
+        from app.stock.valuation import StockValuationService
+        
+        snapshot_date = datetime.strptime(snapshot_date, '%Y-%m-%d').date() if snapshot_date else None
+        written = StockValuationService.take_snapshot(snapshot_date)
+        db.session.commit()
+        print(f"✅ {written} lignes de stock photographiées.")
+
+    # Commande CLI pour reconstruire les résumés de présence quotidiens
+    @app.cli.command("rebuild-attendance-summaries")
+    @click.option('--start', 'start', default=None, help="Date de début (YYYY-MM-DD), défaut: premier pointage")
+    @click.option('--end', 'end', default=None, help="Date de fin (YYYY-MM-DD), défaut: aujourd'hui")
+    def rebuild_attendance_summaries(start, end):
+        """Reconstruit attendance_summaries à partir des pointages"""
+        from app.employees.models import AttendanceRecord
+        from app.employees.attendance_summary import AttendanceSummaryService
+        
+        if start:
+            start_date = datetime.strptime(start, '%Y-%m-%d').date()
+        else:
+            first_punch = db.session.query(db.func.min(AttendanceRecord.timestamp)).scalar()
+            start_date = first_punch.date() if first_punch else datetime.now().date()
+        end_date = datetime.strptime(end, '%Y-%m-%d').date() if end else datetime.now().date()
+        
+        print(f"Reconstruction des résumés de présence du {start_date} au {end_date}...")
+        written = AttendanceSummaryService.rebuild(start_date, end_date)
+        db.session.commit()
+        print(f"✅ {written} résumés écrits.")
+
+    # Commandes CLI de paie
+    @app.cli.group("payroll")
+    def payroll_cli():
+        """Paie : consolidation des heures depuis les pointages"""
+
+    @payroll_cli.command("consolidate")
+    @click.option('--month', 'month', required=True, help="Mois à consolider (YYYY-MM)")
+    @click.option('--employee', 'employee_ids', multiple=True, type=int, help="Employé(s) à consolider (défaut: tous les actifs)")
+    @click.option('--dry-run', is_flag=True, default=False, help="Afficher sans enregistrer")
+    def payroll_consolidate(month, employee_ids, dry_run):
+        """Consolide les heures du mois dans WorkHours / AttendanceSummary"""
+        from app.employees.consolidation import PayrollConsolidationService
+        
+        try:
+            period = datetime.strptime(month, '%Y-%m')
+        except ValueError:
+            raise click.BadParameter("Format attendu: YYYY-MM", param_hint='--month')
+        employee_ids = list(employee_ids) or None
+        
+        if dry_run:
+            results = list(PayrollConsolidationService.consolidate(period.year, period.month, employee_ids)[0].values())
+        else:
+            results = PayrollConsolidationService.run(period.year, period.month, employee_ids)
+        for result in results:
+            print(f"{result['employee']}: {result['days_worked']} j travaillés, {result['paid_days']} j payés, "
+                  f"{result['regular_hours']}h + {result['overtime_hours']}h sup, {result['other_absences']} absence(s)"
+                  f"{'' if dry_run else ' (' + result['action'] + ')'}")
+        print(f"✅ {len(results)} employé(s) consolidé(s) pour {month}{' (simulation)' if dry_run else ''}.")
+
+    # Commande CLI pour la file de relais des pointages vers le VPS
+    @app.cli.command("zkteco-relay")
+    @click.option('--drain', 'drain', is_flag=True, default=False, help="Relayer maintenant les pointages échus")
+    @click.option('--requeue-dead', 'requeue_dead', is_flag=True, default=False, help="Remettre les lettres mortes en file")
+    @click.option('--loop', 'loop', is_flag=True, default=False, help="Relayer en continu (processus dédié, à côté de gunicorn)")
+    def zkteco_relay(drain, requeue_dead, loop):
+        """Affiche l'état de la file de relais des pointages (et la vide si demandé)"""
+        from app.zkteco.relay import AttendanceRelayService, start_relay_worker
+        
+        if loop:
+            print(f"🔄 Relais des pointages vers {app.config.get('ZKTECO_VPS_URL')} (Ctrl+C pour arrêter)")
+            worker = start_relay_worker(app)
+            try:
+                worker.join()
+            except KeyboardInterrupt:
+                worker.stop()
+            return
+        if requeue_dead:
+            print(f"🔁 {AttendanceRelayService.requeue_dead()} lettre(s) morte(s) remise(s) en file.")
+        if drain:
+            counts = AttendanceRelayService.drain()
+            print(f"📤 Relayés: {counts['sent']}, en échec: {counts['failed']}, lettres mortes: {counts['dead']}")
+        status = AttendanceRelayService.status()
+        print(f"En attente: {status['pending']} (depuis {status['oldest_pending_at'] or '-'}), "
+              f"relayés: {status['sent']}, lettres mortes: {status['dead']}")
+        for message in status['recent_dead']:
+            print(f"⚠️ #{message['id']} ({message['attempts']} essais) : {message['last_error']}")
+
+    # Commande CLI pour l'entraînement (nocturne) des modèles Prophet
+    @app.cli.command("ai-train")
+    @click.option('--days', 'days', default=90, type=int, help="Jours d'historique (défaut: 90)")
+    @click.option('--workers', 'workers', default=None, type=int, help="Processus en parallèle (défaut: CPU - 1)")
+    @click.option('--report', 'reports', multiple=True, help="Rapport à entraîner (répétable, défaut: tous)")
+    def ai_train(days, workers, reports):
+        """Entraîne les modèles Prophet et précalcule leurs prévisions"""
+        from app.ai.model_trainer import train_all_reports
+        
+        try:
+            results = train_all_reports(days, workers=workers, report_names=list(reports) or None)
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+        for result in results:
+            if result['success']:
+                timings = result.get('timings', {})
+                state = 'ré-entraîné' if result.get('refitted') else 'inchangé'
+                print(f"✅ {result['report_name']}: {state} en {timings.get('total', 0):.1f}s, "
+                      f"MAPE {result['metrics'].get('mape', 'N/A')}%")
+            else:
+                print(f"❌ {result['report_name']}: {result.get('error')}")
+        print(f"{sum(1 for r in results if r['success'])}/{len(results)} modèle(s) entraîné(s).")
+
     # Initialiser le service d'impression
     try:
         from app.services.printer_service import get_printer_service
@@ -304,11 +450,18 @@ def create_app(config_name=None):
     
     # ✅ AJOUT : Import des modèles consumables pour Flask-Migrate
     from app.consumables import models as consumables_models
+    from app.consumables.packing import register_packing_cache_hooks
+    register_packing_cache_hooks()
     print("📦 Module Consommables enregistré")
     
     # ✅ AJOUT : Blueprint reports pour la génération de rapports
     from app.reports import reports
     app.register_blueprint(reports, url_prefix='/admin/reports')
+    
+    # ✅ AJOUT : Table de faits des ventes (modèle + maintenance incrémentale)
+    from app.reports import models as reports_models
+    from app.reports.sales_facts import register_sales_facts_hooks
+    register_sales_facts_hooks()
     print("📊 Module Rapports enregistré")
     
     # ✅ MODULE AI RÉACTIVÉ
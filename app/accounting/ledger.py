@@ -0,0 +1,288 @@
+"""
+Grand livre agrégé : soldes par compte et par mois
+
+La balance générale et les soldes banque/caisse lisent
+accounting_account_period_balances (quelques lignes par compte) au lieu de
+parcourir toutes les lignes d'écriture de l'historique.
+
+Maintenance transactionnelle : chaque flush qui ajoute, modifie ou supprime
+une écriture ou une ligne d'écriture (y compris les suppressions en masse
+`JournalEntryLine.query.filter_by(...).delete()`) marque les couples
+(compte, mois) concernés, recalculés juste avant le commit ; si ce calcul
+échoue, le commit échoue avec lui.
+
+Comme l'ancien Account.balance, toutes les écritures sont prises en compte,
+validées ou non.
+"""
+
+from datetime import date, datetime
+from decimal import Decimal
+from itertools import chain
+
+from sqlalchemy import delete, extract, func, insert, select
+from sqlalchemy.orm import attributes
+
+from extensions import db
+from app.accounting.models import (
+    AccountNature, AccountPeriodBalance, JournalEntry, JournalEntryLine
+)
+from app.utils.session_hooks import DeferredRefreshHooks
+from app.utils.upsert import insert_missing, upsert
+
+
+# Contrainte uq_account_period_balance
+_BALANCE_KEY = ('account_id', 'period_year', 'period_month')
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return None
+
+
+def _signed(account, debit, credit):
+    """Solde selon la nature du compte (débit - crédit ou l'inverse)."""
+    if account.account_nature == AccountNature.DEBIT:
+        return debit - credit
+    return credit - debit
+
+
+class AccountBalanceService:
+    """Lecture et maintenance des soldes par période"""
+
+    @staticmethod
+    def totals(account_ids=None):
+        """
+        Totaux débit/crédit cumulés par compte.
+
+        Returns:
+            dict: {account_id: (Decimal débit, Decimal crédit)}
+        """
+        query = db.session.query(
+            AccountPeriodBalance.account_id,
+            func.sum(AccountPeriodBalance.debit_total),
+            func.sum(AccountPeriodBalance.credit_total)
+        )
+        if account_ids is not None:
+            query = query.filter(AccountPeriodBalance.account_id.in_(list(account_ids)))
+        return {
+            account_id: (Decimal(str(debit or 0)), Decimal(str(credit or 0)))
+            for account_id, debit, credit in query.group_by(AccountPeriodBalance.account_id)
+        }
+
+    @staticmethod
+    def balances(accounts):
+        """Soldes signés d'une liste de comptes en une requête : {account_id: Decimal}."""
+        totals = AccountBalanceService.totals([a.id for a in accounts])
+        return {
+            account.id: _signed(account, *totals.get(account.id, (Decimal('0'), Decimal('0'))))
+            for account in accounts
+        }
+
+    @staticmethod
+    def balance_of(account):
+        """Solde signé d'un compte."""
+        return AccountBalanceService.balances([account])[account.id]
+
+    @staticmethod
+    def _aggregate_query():
+        year = extract('year', JournalEntry.entry_date)
+        month = extract('month', JournalEntry.entry_date)
+        return db.session.query(
+            JournalEntryLine.account_id,
+            year.label('period_year'),
+            month.label('period_month'),
+            func.sum(func.coalesce(JournalEntryLine.debit_amount, 0)).label('debit_total'),
+            func.sum(func.coalesce(JournalEntryLine.credit_amount, 0)).label('credit_total'),
+            func.count(JournalEntryLine.id).label('lines_count')
+        ).select_from(JournalEntryLine).join(
+            JournalEntry, JournalEntry.id == JournalEntryLine.entry_id
+        ).group_by(JournalEntryLine.account_id, year, month)
+
+    @staticmethod
+    def _payload(rows):
+        now = datetime.utcnow()
+        return [{
+            'account_id': row.account_id,
+            'period_year': int(row.period_year),
+            'period_month': int(row.period_month),
+            'debit_total': Decimal(str(row.debit_total or 0)),
+            'credit_total': Decimal(str(row.credit_total or 0)),
+            'lines_count': int(row.lines_count or 0),
+            'updated_at': now,
+        } for row in rows]
+
+    @staticmethod
+    def refresh(keys):
+        """
+        Recalcule les soldes de couples (account_id, année, mois).
+
+        Les lignes de soldes sont créées si besoin puis verrouillées
+        (SELECT ... FOR UPDATE) avant de relire les écritures : deux commits
+        du même mois sur un même compte (ventes PDV → caisse 530) se
+        sérialisent ici, et le second relit les lignes du premier.
+
+        Returns:
+            int: Nombre de lignes de soldes écrites
+        """
+        by_period = {}
+        for account_id, year, month in keys:
+            by_period.setdefault((year, month), set()).add(account_id)
+
+        written = 0
+        for (year, month), account_ids in sorted(by_period.items()):
+            start = date(year, month, 1)
+            end = date(year + month // 12, month % 12 + 1, 1)
+            now = datetime.utcnow()
+            insert_missing(db.session, AccountPeriodBalance, [{
+                'account_id': account_id, 'period_year': year, 'period_month': month,
+                'debit_total': Decimal('0'), 'credit_total': Decimal('0'), 'lines_count': 0,
+                'updated_at': now,
+            } for account_id in sorted(account_ids)], _BALANCE_KEY)
+            db.session.execute(
+                select(AccountPeriodBalance.id).where(
+                    AccountPeriodBalance.account_id.in_(account_ids),
+                    AccountPeriodBalance.period_year == year,
+                    AccountPeriodBalance.period_month == month
+                ).order_by(AccountPeriodBalance.account_id).with_for_update()
+            ).all()
+
+            rows = AccountBalanceService._aggregate_query().filter(
+                JournalEntryLine.account_id.in_(account_ids),
+                JournalEntry.entry_date >= start,
+                JournalEntry.entry_date < end
+            ).all()
+            payload = AccountBalanceService._payload(rows)
+            upsert(db.session, AccountPeriodBalance, payload, _BALANCE_KEY,
+                   ('debit_total', 'credit_total', 'lines_count', 'updated_at'))
+
+            # Plus aucune ligne d'écriture sur la période : même état qu'après rebuild()
+            emptied = account_ids - {row['account_id'] for row in payload}
+            if emptied:
+                db.session.execute(delete(AccountPeriodBalance).where(
+                    AccountPeriodBalance.account_id.in_(emptied),
+                    AccountPeriodBalance.period_year == year,
+                    AccountPeriodBalance.period_month == month
+                ))
+            written += len(payload)
+        return written
+
+    @staticmethod
+    def rebuild():
+        """Reconstruit intégralement la table des soldes depuis les écritures."""
+        db.session.execute(delete(AccountPeriodBalance))
+        payload = AccountBalanceService._payload(AccountBalanceService._aggregate_query().all())
+        if payload:
+            db.session.execute(insert(AccountPeriodBalance), payload)
+        return len(payload)
+
+    @staticmethod
+    def verify():
+        """
+        Compare les soldes stockés aux écritures.
+
+        Returns:
+            list: [(account_id, année, mois, attendu (débit, crédit), stocké (débit, crédit))]
+        """
+        expected = {
+            (row['account_id'], row['period_year'], row['period_month']): (row['debit_total'], row['credit_total'])
+            for row in AccountBalanceService._payload(AccountBalanceService._aggregate_query().all())
+        }
+        stored = {
+            (row.account_id, row.period_year, row.period_month): (
+                Decimal(str(row.debit_total or 0)), Decimal(str(row.credit_total or 0))
+            )
+            for row in AccountPeriodBalance.query.all()
+        }
+        zero = (Decimal('0'), Decimal('0'))
+        mismatches = []
+        for key in sorted(set(expected) | set(stored)):
+            if expected.get(key, zero) != stored.get(key, zero):
+                mismatches.append((*key, expected.get(key, zero), stored.get(key, zero)))
+        return mismatches
+
+
+# ============================================================================
+# MAINTENANCE INCRÉMENTALE (événements de session)
+# ============================================================================
+
+def _history_values(obj, attr, include_current):
+    """Anciennes valeurs d'un attribut (et valeurs courantes si include_current)."""
+    history = attributes.get_history(obj, attr)
+    values = list(history.deleted or ())
+    if include_current:
+        values += list(history.added or ()) + list(history.unchanged or ())
+    return [v for v in values if v is not None]
+
+
+def _collect_dirty_entries(session, pending):
+    """after_flush : mémorise les écritures touchées et leurs anciens comptes/dates."""
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, JournalEntryLine):
+            for entry_id in _history_values(obj, 'entry_id', True):
+                accounts = pending['accounts'].setdefault(entry_id, set())
+                accounts.update(_history_values(obj, 'account_id', True))
+        elif isinstance(obj, JournalEntry) and obj.id:
+            dates = pending['dates'].setdefault(obj.id, set())
+            # Dates courantes relues avant le commit ; on garde ici les anciennes
+            # (changement de date) et celle d'une écriture supprimée
+            dates.update(_history_values(obj, 'entry_date', obj in session.deleted))
+
+
+def _collect_bulk_line_changes(orm_execute_state, pending):
+    """do_orm_execute : capture les lignes visées par un DELETE/UPDATE en masse."""
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ is not JournalEntryLine:
+        return
+
+    whereclause = orm_execute_state.statement.whereclause
+    query = select(JournalEntryLine.entry_id, JournalEntryLine.account_id)
+    if whereclause is not None:
+        query = query.where(whereclause)
+    for entry_id, account_id in orm_execute_state.session.execute(query):
+        pending['accounts'].setdefault(entry_id, set()).add(account_id)
+
+
+def _refresh_balances(session, pending):
+    """before_commit : recalcule les (compte, mois) touchés, dans la même transaction."""
+    entry_ids = set(pending['accounts']) | set(pending['dates'])
+    accounts = {entry_id: set(ids) for entry_id, ids in pending['accounts'].items()}
+    dates = {entry_id: {_as_date(d) for d in values} for entry_id, values in pending['dates'].items()}
+
+    # État courant : comptes des lignes restantes et date de l'écriture
+    current = session.query(JournalEntry.id, JournalEntry.entry_date, JournalEntryLine.account_id).outerjoin(
+        JournalEntryLine, JournalEntryLine.entry_id == JournalEntry.id
+    ).filter(JournalEntry.id.in_(entry_ids))
+    for entry_id, entry_date, account_id in current:
+        dates.setdefault(entry_id, set()).add(_as_date(entry_date))
+        if account_id:
+            accounts.setdefault(entry_id, set()).add(account_id)
+
+    keys = {
+        (account_id, day.year, day.month)
+        for entry_id in entry_ids
+        for account_id in accounts.get(entry_id, ())
+        for day in dates.get(entry_id, ())
+        if day
+    }
+    AccountBalanceService.refresh(keys)
+
+
+# Pas de SAVEPOINT ni de failure_message : un solde non mis à jour fait échouer
+# le commit de l'écriture plutôt que de laisser la balance diverger silencieusement.
+# Anciennes valeurs nécessaires pour décrémenter le bon (compte, mois).
+_hooks = DeferredRefreshHooks(
+    'account_ledger',
+    new_pending=lambda: {'accounts': {}, 'dates': {}},
+    collect=_collect_dirty_entries,
+    refresh=_refresh_balances,
+    collect_bulk=_collect_bulk_line_changes,
+    history_attributes=(JournalEntry.entry_date, JournalEntryLine.entry_id, JournalEntryLine.account_id),
+)
+
+
+def register_ledger_hooks():
+    """Branche la maintenance des soldes sur la classe de session Flask-SQLAlchemy."""
+    _hooks.register()
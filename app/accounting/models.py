@@ -66,14 +66,9 @@ class Account(db.Model):
     
     @property
     def balance(self):
-        """Calcul du solde du compte"""
-        total_debit = sum(line.debit_amount for line in self.journal_entries if line.debit_amount)
-        total_credit = sum(line.credit_amount for line in self.journal_entries if line.credit_amount)
-        
-        if self.account_nature == AccountNature.DEBIT:
-            return total_debit - total_credit
-        else:
-            return total_credit - total_debit
+        """Solde du compte (lu depuis les soldes par période)"""
+        from app.accounting.ledger import AccountBalanceService
+        return AccountBalanceService.balance_of(self)
 
 
 class Journal(db.Model):
@@ -244,6 +239,34 @@ class JournalEntryLine(db.Model):
         return f'<JournalEntryLine {self.id} - {self.debit_amount or 0} / {self.credit_amount or 0}>'
 
 
+class AccountPeriodBalance(db.Model):
+    """
+    Soldes cumulés par compte et par période (mois)
+    Maintenu à chaque commit touchant des écritures (voir app/accounting/ledger.py)
+    """
+    __tablename__ = 'accounting_account_period_balances'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('accounting_accounts.id'), nullable=False)
+    period_year = db.Column(db.Integer, nullable=False)
+    period_month = db.Column(db.Integer, nullable=False)
+    
+    # Totaux de la période
+    debit_total = db.Column(db.Numeric(14, 2), default=0.0, nullable=False)
+    credit_total = db.Column(db.Numeric(14, 2), default=0.0, nullable=False)
+    lines_count = db.Column(db.Integer, default=0, nullable=False)
+    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('account_id', 'period_year', 'period_month', name='uq_account_period_balance'),
+        db.Index('idx_account_period_balance_period', 'period_year', 'period_month'),
+    )
+    
+    def __repr__(self):
+        return f'<AccountPeriodBalance {self.account_id} {self.period_year}-{self.period_month:02d}>'
+
+
 class HistoricalAccountingData(db.Model):
     """
     Données historiques de comptabilité extraites des fichiers Excel
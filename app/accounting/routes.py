@@ -14,6 +14,7 @@ from .models import (Account, Journal, JournalEntry, JournalEntryLine,
                      FiscalYear, AccountType, AccountNature, JournalType)
 from .forms import (AccountForm, JournalForm, JournalEntryForm, FiscalYearForm,
                     AccountSearchForm, JournalEntrySearchForm, ExpenseForm)
+from .ledger import AccountBalanceService
 
 
 @bp.route('/')
@@ -1378,6 +1379,7 @@ def trial_balance():
     
     # Récupérer tous les comptes de détail avec leurs soldes
     accounts = Account.query.filter_by(is_detail=True, is_active=True).order_by(Account.code).all()
+    balances = AccountBalanceService.balances(accounts)
     
     balance_data = []
     total_debit = 0
@@ -1388,7 +1390,7 @@ def trial_balance():
     total_charges = 0   # Classe 6
     
     for account in accounts:
-        balance = account.balance
+        balance = balances[account.id]
         if balance is not None and balance != 0:
             if balance > 0:
                 debit_balance = balance
@@ -1559,7 +1561,8 @@ def distribute_profit():
 @admin_required
 def closing_wizard():
     """Assistant de clôture mensuelle"""
-    from .services import AccountingIntegrationService, DashboardService
+    from .services import AccountingIntegrationService
+    from app.stock.valuation import StockValuationService
     
     # Par défaut : Mois précédent (car on clôture le mois fini)
     today = date.today()
@@ -1571,11 +1574,9 @@ def closing_wizard():
     year = int(request.args.get('year', target_date.year))
     month = int(request.args.get('month', target_date.month))
     
-    # 1. Récupérer la valeur du stock actuel (Estimation)
-    # Pour l'instant on prend la valeur actuelle, idéalement il faudrait l'historique mais c'est complexe
-    # On suppose que la clôture se fait "maintenant"
-    current_stock_stats = DashboardService.get_stock_value()
-    current_stock_value = current_stock_stats.get('total_value', 0)
+    # 1. Valeur du stock à la fin du mois clôturé (photos + mouvements de stock)
+    month_end = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    current_stock_value = StockValuationService.value_at(min(month_end, today), location='all')
     
     # 2. Calculer les stats
     stats = AccountingIntegrationService.calculate_closing_stats(year, month, current_stock_value)
@@ -957,17 +957,9 @@ class DashboardService:
         if not bank_account:
             return 0
         
-        # Calculer le solde depuis les écritures comptables
-        # Débits (augmentations) - Crédits (diminutions)
-        total_debits = db.session.query(func.sum(JournalEntryLine.debit_amount))\
-            .join(JournalEntry)\
-            .filter(JournalEntryLine.account_id == bank_account.id)\
-            .scalar() or 0
-        
-        total_credits = db.session.query(func.sum(JournalEntryLine.credit_amount))\
-            .join(JournalEntry)\
-            .filter(JournalEntryLine.account_id == bank_account.id)\
-            .scalar() or 0
+        # Solde depuis les totaux par période (débits = augmentations, crédits = diminutions)
+        from app.accounting.ledger import AccountBalanceService
+        total_debits, total_credits = AccountBalanceService.totals([bank_account.id]).get(bank_account.id, (0, 0))
         
         solde_banque = float(total_debits) - float(total_credits)
         return solde_banque
@@ -981,23 +973,23 @@ class DashboardService:
         if not sales_account:
             return []
         
-        trend_data = []
-        today = date.today()
+        from app.reports.trends import TimeSeriesService
         
-        for i in range(days):
-            target_date = today - timedelta(days=i)
-            daily_sales = db.session.query(func.sum(JournalEntryLine.credit_amount))\
-                .join(JournalEntry)\
-                .filter(JournalEntryLine.account_id == sales_account.id)\
-                .filter(JournalEntry.entry_date == target_date)\
-                .scalar() or 0
-            
-            trend_data.append({
-                'date': target_date.strftime('%Y-%m-%d'),
-                'revenue': float(daily_sales)
-            })
+        today = date.today()
+        series = TimeSeriesService.aggregate(
+            JournalEntry.entry_date,
+            {'revenue': func.sum(JournalEntryLine.credit_amount)},
+            today - timedelta(days=days - 1), today,
+            filters=[JournalEntryLine.account_id == sales_account.id],
+            select_from=JournalEntryLine,
+            joins=[(JournalEntry, JournalEntry.id == JournalEntryLine.entry_id)]
+        )
         
-        return list(reversed(trend_data))  # Plus ancien au plus récent
+        # Plus ancien au plus récent
+        return [
+            {'date': point['bucket'].strftime('%Y-%m-%d'), 'revenue': point['revenue']}
+            for point in series
+        ]
     
     @staticmethod
     def get_expense_breakdown(year=None, month=None):
@@ -18,6 +18,7 @@ Usage :
     summary = ai.get_ai_summary()
 """
 
+import calendar
 import logging
 from typing import Dict, List, Optional
 from datetime import date, datetime, timedelta
@@ -27,6 +28,7 @@ import pandas as pd
 from app.ai.services.prophet_predictor import ProphetPredictor
 from app.ai.services.llm_analyzer import LLMAnalyzer
 from app.ai.context_builder import ContextBuilder
+from app.ai.model_trainer import fetch_training_series, get_training_progress, training_end_date
 
 # Configuration du logger
 logger = logging.getLogger(__name__)
@@ -154,7 +156,8 @@ class AIManager:
             analysis = self.llm.analyze_report(
                 context=context,
                 prompt_type=prompt_type,
-                temperature=0.3
+                temperature=0.3,
+                period_end=self._period_end(report_name, report_date)
             )
             
             # Enrichir avec les métadonnées
@@ -210,7 +213,8 @@ class AIManager:
                 analysis = self.llm.analyze_report(
                     context=context,
                     prompt_type=prompt_type,
-                    temperature=0.3
+                    temperature=0.3,
+                    period_end=self._period_end('monthly_summary', reference_date)
                 )
                 
                 # Formater la réponse pour le dashboard mensuel
@@ -285,7 +289,8 @@ class AIManager:
             analysis = self.llm.analyze_report(
                 context=context,
                 prompt_type=prompt_type,
-                temperature=0.3
+                temperature=0.3,
+                period_end=self._period_end(f'{summary_type}_summary', reference_date)
             )
             
             analysis['summary_type'] = summary_type
@@ -361,7 +366,8 @@ class AIManager:
             analysis = self.llm.analyze_report(
                 context=context,
                 prompt_type='anomaly_detection',
-                temperature=0.2  # Plus déterministe pour détection
+                temperature=0.2,  # Plus déterministe pour détection
+                period_end=self._period_end(report_name, report_date)
             )
             
             analysis['report_name'] = report_name
@@ -388,38 +394,24 @@ class AIManager:
         end_date: date,
         history_days: int = 1825  # 5 ans par défaut (au lieu de 30 jours)
     ) -> Optional[pd.DataFrame]:
-        """Construit un DataFrame Prophet depuis l'historique des rapports"""
+        """Construit un DataFrame Prophet depuis l'historique des rapports (jours précédant end_date)"""
         try:
-            # Récupérer l'historique
-            historical_data = self.context_builder._fetch_historical_data(
-                self.context_builder.REPORT_SERVICES[report_name],
-                report_name,
-                end_date,
-                history_days
-            )
-            
-            if not historical_data:
-                return None
-            
-            # Construire le DataFrame Prophet (colonnes 'ds' et 'y')
-            rows = []
-            for record in historical_data:
-                # Extraire le KPI principal (revenue par défaut)
-                kpis = record.get('kpis', {})
-                value = kpis.get('total_revenue') or kpis.get('revenue') or kpis.get('total_units') or 0
-                
-                rows.append({
-                    'ds': pd.to_datetime(record['date']),
-                    'y': float(value)
-                })
-            
-            df = pd.DataFrame(rows)
-            return df
+            # Même extraction que l'entraînement planifié
+            return fetch_training_series([report_name], history_days, training_end_date(end_date))[report_name]
         
         except Exception as e:
             logger.error(f"Erreur lors de la construction du DataFrame Prophet: {e}")
             return None
     
+    @staticmethod
+    def _period_end(report_name: str, report_date: date) -> date:
+        """Dernier jour de la période couverte (semaine ISO, mois ou jour)"""
+        if report_name.startswith('weekly_'):
+            return report_date + timedelta(days=6 - report_date.weekday())
+        if report_name.startswith('monthly_'):
+            return report_date.replace(day=calendar.monthrange(report_date.year, report_date.month)[1])
+        return report_date
+    
     def _build_daily_context(self, reference_date: date) -> Dict:
         """Construit le contexte quotidien global"""
         daily_reports = [
@@ -469,9 +461,12 @@ class AIManager:
         return {
             'prophet': {
                 'available': self.prophet.prophet_available,
-                'models_count': len(self.prophet.get_available_models())
+                'models_count': len(self.prophet.get_available_models()),
+                'registry': self.prophet.registry.stats(),
+                'training': get_training_progress()
             },
             'llm': self.llm.get_provider_info(),
+            'llm_cache': self.llm.cache.get_stats(),
             'context_builder': {
                 'reports_available': len(self.context_builder.get_available_reports())
             }
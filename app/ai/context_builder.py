@@ -21,6 +21,7 @@ from typing import Dict, List, Optional
 from datetime import date, datetime, timedelta
 from decimal import Decimal
 
+from app.ai.jobs import run_concurrently
 from app.reports.services import (
     DailySalesReportService,
     PrimeCostReportService,
@@ -243,17 +244,24 @@ class ContextBuilder:
         if report_date is None:
             report_date = date.today()
         
-        contexts = {}
+        # Contextes construits en parallèle (requêtes indépendantes)
+        results = run_concurrently(
+            {
+                report_name: (lambda report_name=report_name: self.build_context(
+                    report_name,
+                    report_date,
+                    include_history=False
+                ))
+                for report_name in report_names
+            },
+            on_error=lambda report_name, message: {'error': message}
+        )
         
-        for report_name in report_names:
-            context = self.build_context(
-                report_name,
-                report_date,
-                include_history=False
-            )
-            
-            if 'error' not in context:
-                contexts[report_name] = context
+        contexts = {
+            report_name: context
+            for report_name, context in results.items()
+            if 'error' not in context
+        }
         
         return {
             'date': report_date.isoformat(),
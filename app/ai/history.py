@@ -0,0 +1,246 @@
+"""
+KpiHistory - Historique quotidien des KPI pour l'entraînement AI
+================================================================
+
+Les séries d'entraînement Prophet étaient construites en appelant le
+generate() complet d'un rapport pour chaque jour d'historique (dizaines de
+requêtes, plus la comparaison avec la veille) : 5 ans d'historique
+représentaient ~10 000 générations de rapports.
+
+Ce module extrait directement les séries quotidiennes sur une plage de dates
+arbitraire, en cinq requêtes GROUP BY :
+- ventes : CA (Order.total_amount, règle de _compute_revenue_real) et transactions
+- table de faits : unités vendues et coût des ventes (COGS)
+- production : unités produites (ordres de production)
+- invendus : valeur perdue (quantité × PMP)
+- présence : coût de main d'œuvre (AttendanceSummary × taux horaire)
+
+Usage:
+    from app.ai.history import KpiHistory
+
+    df = KpiHistory.daily_frame(start_date, end_date)
+    series = KpiHistory.prophet_series('daily_sales', end_date, days=1825)
+    all_series = KpiHistory.prophet_frames(REPORT_SERIES, end_date, days=1825)
+"""
+
+import logging
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+import pandas as pd
+from sqlalchemy import and_, case, func, or_
+
+from extensions import db
+from models import Order, OrderItem, Product
+from app.employees.models import AttendanceSummary, Employee
+from app.inventory.models import DailyWaste
+from app.reports.models import DailySalesFact
+from app.utils.date_ranges import in_period
+
+# Configuration du logger
+logger = logging.getLogger(__name__)
+
+
+DELIVERED_STATUSES = ['delivered', 'completed', 'delivered_unpaid']
+
+# Colonnes de l'historique quotidien
+KPI_COLUMNS = [
+    'revenue', 'transactions', 'average_basket', 'units_sold', 'cogs',
+    'units_produced', 'waste_value', 'labor_cost', 'prime_cost',
+]
+
+# Série Prophet de chaque rapport quotidien (mêmes KPI que _extract_main_value)
+REPORT_SERIES = {
+    'daily_sales': 'revenue',
+    'daily_prime_cost': 'prime_cost',
+    'daily_production': 'units_produced',
+    'daily_waste_loss': 'waste_value',
+}
+
+
+def _as_date(value):
+    """Normalise une valeur renvoyée par func.date() (str sous SQLite) en date."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+def _series(rows) -> dict:
+    """{date: valeur} depuis des lignes (jour, valeur)."""
+    return {_as_date(day): float(value or 0) for day, value in rows if day is not None}
+
+
+class KpiHistory:
+    """Extraction en lot des KPI quotidiens"""
+
+    @staticmethod
+    def _sales(start_date: date, end_date: date):
+        """CA et transactions par jour (POS au jour de création, Shop au jour de livraison)."""
+        is_pos = Order.order_type == 'in_store'
+        sale_day = func.date(case((is_pos, Order.created_at), else_=Order.due_date))
+        # Shop : le CA n'est compté que si la commande est créée et livrée le même jour
+        counted_revenue = case(
+            (or_(is_pos, func.date(Order.created_at) == func.date(Order.due_date)), Order.total_amount),
+            else_=0
+        )
+        rows = db.session.query(
+            sale_day, func.count(Order.id), func.sum(counted_revenue)
+        ).filter(
+            or_(
+                and_(is_pos, in_period(Order.created_at, start_date, end_date)),
+                and_(
+                    Order.order_type != 'in_store',
+                    Order.order_type != 'counter_production_request',  # Exclure les ordres de production
+                    Order.status.in_(DELIVERED_STATUSES),
+                    in_period(Order.due_date, start_date, end_date)
+                )
+            )
+        ).group_by(sale_day).all()
+        transactions = _series((day, count) for day, count, _ in rows)
+        revenue = _series((day, amount) for day, _, amount in rows)
+        return revenue, transactions
+
+    @staticmethod
+    def _facts(start_date: date, end_date: date):
+        """Unités vendues et COGS par jour (table de faits)."""
+        rows = db.session.query(
+            DailySalesFact.fact_date, func.sum(DailySalesFact.quantity), func.sum(DailySalesFact.cogs)
+        ).filter(
+            DailySalesFact.fact_date >= start_date,
+            DailySalesFact.fact_date <= end_date
+        ).group_by(DailySalesFact.fact_date).all()
+        units = _series((day, quantity) for day, quantity, _ in rows)
+        cogs = _series((day, value) for day, _, value in rows)
+        return units, cogs
+
+    @staticmethod
+    def _production(start_date: date, end_date: date) -> dict:
+        """Unités produites par jour (ordres de production)."""
+        production_day = func.date(Order.created_at)
+        return _series(
+            db.session.query(production_day, func.sum(OrderItem.quantity))
+            .select_from(OrderItem).join(Order, Order.id == OrderItem.order_id)
+            .filter(
+                Order.order_type == 'counter_production_request',
+                in_period(Order.created_at, start_date, end_date)
+            ).group_by(production_day).all()
+        )
+
+    @staticmethod
+    def _waste(start_date: date, end_date: date) -> dict:
+        """Valeur des invendus par jour (quantité × PMP, comme DailyWaste.value_lost)."""
+        return _series(
+            db.session.query(
+                DailyWaste.waste_date,
+                func.sum(DailyWaste.quantity * func.coalesce(Product.cost_price, 0))
+            ).join(Product, Product.id == DailyWaste.product_id)
+            .filter(DailyWaste.waste_date >= start_date, DailyWaste.waste_date <= end_date)
+            .group_by(DailyWaste.waste_date).all()
+        )
+
+    @staticmethod
+    def _labor(start_date: date, end_date: date) -> dict:
+        """Coût de main d'œuvre par jour (résumés de présence)."""
+        return _series(
+            db.session.query(
+                AttendanceSummary.work_date,
+                func.sum(
+                    (func.coalesce(AttendanceSummary.worked_hours, 0) + func.coalesce(AttendanceSummary.overtime_hours, 0))
+                    * func.coalesce(Employee.hourly_rate, 0)
+                )
+            ).join(Employee, Employee.id == AttendanceSummary.employee_id)
+            .filter(AttendanceSummary.work_date >= start_date, AttendanceSummary.work_date <= end_date)
+            .group_by(AttendanceSummary.work_date).all()
+        )
+
+    @staticmethod
+    def daily_frame(start_date: date, end_date: date) -> pd.DataFrame:
+        """
+        KPI quotidiens sur [start_date, end_date]
+
+        Args:
+            start_date: Premier jour (inclus)
+            end_date: Dernier jour (inclus)
+
+        Returns:
+            DataFrame indexé par jour (un jour par ligne, 0 sans activité),
+            colonnes KPI_COLUMNS
+        """
+        revenue, transactions = KpiHistory._sales(start_date, end_date)
+        units_sold, cogs = KpiHistory._facts(start_date, end_date)
+
+        index = pd.date_range(start_date, end_date, freq='D', name='date')
+        df = pd.DataFrame({
+            'revenue': pd.Series(revenue, dtype=float),
+            'transactions': pd.Series(transactions, dtype=float),
+            'units_sold': pd.Series(units_sold, dtype=float),
+            'cogs': pd.Series(cogs, dtype=float),
+            'units_produced': pd.Series(KpiHistory._production(start_date, end_date), dtype=float),
+            'waste_value': pd.Series(KpiHistory._waste(start_date, end_date), dtype=float),
+            'labor_cost': pd.Series(KpiHistory._labor(start_date, end_date), dtype=float),
+        })
+        df.index = pd.to_datetime(df.index)
+        df = df.reindex(index, fill_value=0.0).fillna(0.0)
+
+        df['average_basket'] = (df['revenue'] / df['transactions'].where(df['transactions'] > 0)).fillna(0.0)
+        df['prime_cost'] = df['cogs'] + df['labor_cost']
+        return df[KPI_COLUMNS]
+
+    @staticmethod
+    def prophet_series(
+        report_name: str,
+        end_date: date,
+        days: int,
+        drop_empty_days: bool = False
+    ) -> Optional[pd.DataFrame]:
+        """
+        Série Prophet (colonnes 'ds' et 'y') d'un rapport quotidien
+
+        Args:
+            report_name: Nom du rapport (voir REPORT_SERIES)
+            end_date: Dernier jour de l'historique (inclus)
+            days: Nombre de jours d'historique
+            drop_empty_days: Exclure les jours à 0 (jours fermés)
+
+        Returns:
+            DataFrame trié par date, ou None si le rapport n'a pas de série quotidienne
+        """
+        if report_name not in REPORT_SERIES:
+            return None
+        return KpiHistory.prophet_frames([report_name], end_date, days, drop_empty_days)[report_name]
+
+    @staticmethod
+    def prophet_frames(
+        report_names,
+        end_date: date,
+        days: int,
+        drop_empty_days: bool = False
+    ) -> dict:
+        """
+        Séries Prophet de plusieurs rapports quotidiens, extraites ensemble
+
+        Les rapports de REPORT_SERIES partagent les mêmes requêtes : une
+        seule extraction sert toutes les séries demandées.
+
+        Returns:
+            {rapport: DataFrame 'ds'/'y'} pour les rapports de REPORT_SERIES
+        """
+        names = [name for name in report_names if name in REPORT_SERIES]
+        if not names:
+            return {}
+
+        start_date = end_date - timedelta(days=days - 1)
+        frame = KpiHistory.daily_frame(start_date, end_date)
+        series = {}
+        for name in names:
+            df = pd.DataFrame({'ds': frame.index, 'y': frame[REPORT_SERIES[name]].to_numpy()})
+            if drop_empty_days:
+                df = df[df['y'] > 0]
+            series[name] = df.reset_index(drop=True)
+            logger.info(f"Historique {name} : {len(df)} jours ({start_date} → {end_date})")
+        return series
+
+# Export
+__all__ = ['KpiHistory', 'KPI_COLUMNS', 'REPORT_SERIES']
@@ -0,0 +1,232 @@
+"""
+AIJobs - Exécution concurrente et tâches de fond du module AI
+==============================================================
+
+Les insights IA du dashboard enchaînaient la construction des contextes
+(requêtes de rapports) puis les appels LLM, un rapport après l'autre, dans
+la requête HTTP : plusieurs dizaines de secondes d'attente.
+
+Ce module fournit :
+- run_concurrently() : exécute des tâches nommées dans un pool de threads
+  borné (AI_MAX_CONCURRENCY), chacune dans son propre contexte
+  d'application, avec un délai maximal (AI_CALL_TIMEOUT). Les tâches en
+  erreur ou hors délai sont remplacées par un résultat d'échec : les
+  résultats partiels restent exploitables.
+- AIJobs.submit() / AIJobs.get() : exécute une fonction en tâche de fond et
+  expose son état (pending → running → done/error) sous un identifiant que
+  le client interroge. L'état est écrit dans app/ai/cache/jobs/ pour être
+  lisible par tous les workers.
+
+Usage:
+    results = run_concurrently({'sales': lambda: ..., 'stock': lambda: ...})
+
+    job_id = AIJobs.submit('daily_insights', build_insights)
+    job = AIJobs.get(job_id)
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from flask import current_app, has_app_context
+
+# Configuration du logger
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_CALL_TIMEOUT = 45
+
+# Durée de conservation de l'état d'une tâche terminée
+JOB_RETENTION_SECONDS = 3600
+
+JOBS_DIR = os.path.join(os.path.dirname(__file__), 'cache', 'jobs')
+
+_lock = threading.Lock()
+_executor = None
+
+
+def _config(name: str, default):
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+
+def max_workers() -> int:
+    """Nombre maximal d'appels simultanés (config AI_MAX_CONCURRENCY)"""
+    return max(1, int(_config('AI_MAX_CONCURRENCY', DEFAULT_MAX_WORKERS)))
+
+
+def call_timeout() -> float:
+    """Délai maximal d'un appel, en secondes (config AI_CALL_TIMEOUT)"""
+    return float(_config('AI_CALL_TIMEOUT', DEFAULT_CALL_TIMEOUT))
+
+
+def _in_app_context(func: Callable, *args, **kwargs) -> Callable[[], Any]:
+    """Enveloppe func pour qu'il s'exécute dans un contexte d'application (session DB propre au thread)"""
+    app = current_app._get_current_object() if has_app_context() else None
+
+    def run():
+        if app is None:
+            return func(*args, **kwargs)
+        with app.app_context():
+            return func(*args, **kwargs)
+    return run
+
+
+def run_concurrently(
+    tasks: Dict[Any, Callable[[], Any]],
+    workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    on_error: Optional[Callable[[Any, str], Any]] = None
+) -> Dict[Any, Any]:
+    """
+    Exécute des tâches nommées en parallèle
+
+    Args:
+        tasks: {nom: fonction sans argument}
+        workers: Threads simultanés (None = AI_MAX_CONCURRENCY)
+        timeout: Délai par tâche en secondes (None = AI_CALL_TIMEOUT)
+        on_error: Construit le résultat d'une tâche échouée à partir de
+            (nom, message) ; par défaut {'success': False, 'error': message}
+
+    Returns:
+        {nom: résultat}, dans l'ordre des tâches
+    """
+    if not tasks:
+        return {}
+
+    workers = min(workers or max_workers(), len(tasks))
+    timeout = timeout if timeout is not None else call_timeout()
+    on_error = on_error or (lambda name, message: {'success': False, 'error': message})
+
+    # Les tâches au-delà du pool attendent leur tour : le délai global en tient compte
+    deadline = timeout * math.ceil(len(tasks) / workers)
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ai-task')
+    try:
+        futures = {name: executor.submit(_in_app_context(task)) for name, task in tasks.items()}
+        wait(futures.values(), timeout=deadline)
+
+        results = {}
+        for name, future in futures.items():
+            if not future.done():
+                future.cancel()
+                logger.warning(f"Tâche AI {name} hors délai ({timeout:.0f}s)")
+                results[name] = on_error(name, f"Délai dépassé ({timeout:.0f}s)")
+            elif future.exception() is not None:
+                logger.error(f"Tâche AI {name} en erreur: {future.exception()}")
+                results[name] = on_error(name, str(future.exception()))
+            else:
+                results[name] = future.result()
+        return results
+    finally:
+        # Ne pas attendre les appels hors délai : leur résultat est abandonné
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# ============================================================================
+# TÂCHES DE FOND
+# ============================================================================
+
+def _job_path(job_id: str) -> str:
+    return os.path.join(JOBS_DIR, f"{job_id}.json")
+
+
+def _write_job(job: Dict):
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    tmp_path = f"{_job_path(job['id'])}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(job, f, ensure_ascii=False, default=str)
+    os.replace(tmp_path, _job_path(job['id']))
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='ai-job')
+        return _executor
+
+
+class AIJobs:
+    """Tâches AI exécutées en arrière-plan, interrogées par identifiant"""
+
+    @staticmethod
+    def submit(name: str, func: Callable, *args, **kwargs) -> str:
+        """
+        Lance func(*args, **kwargs) en arrière-plan
+
+        Args:
+            name: Nom de la tâche (affichage et logs)
+            func: Fonction dont le résultat doit être sérialisable en JSON
+
+        Returns:
+            Identifiant de la tâche
+        """
+        AIJobs.purge()
+        job = {
+            'id': uuid.uuid4().hex,
+            'name': name,
+            'status': 'pending',
+            'result': None,
+            'error': None,
+            'created_at': datetime.utcnow().isoformat(),
+            'finished_at': None,
+        }
+        _write_job(job)
+        task = _in_app_context(func, *args, **kwargs)
+
+        def run():
+            _write_job({**job, 'status': 'running'})
+            try:
+                result = task()
+                _write_job({**job, 'status': 'done', 'result': result,
+                            'finished_at': datetime.utcnow().isoformat()})
+            except Exception as e:
+                logger.error(f"Tâche de fond AI {name} en erreur: {e}")
+                _write_job({**job, 'status': 'error', 'error': str(e),
+                            'finished_at': datetime.utcnow().isoformat()})
+
+        _get_executor().submit(run)
+        logger.info(f"Tâche de fond AI {name} lancée ({job['id']})")
+        return job['id']
+
+    @staticmethod
+    def get(job_id: str) -> Optional[Dict]:
+        """État de la tâche (status, result, error), ou None si inconnue"""
+        # L'identifiant vient de l'URL : refuser tout ce qui n'est pas un uuid hex
+        if not job_id or len(job_id) != 32 or any(c not in '0123456789abcdef' for c in job_id):
+            return None
+        try:
+            with open(_job_path(job_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def purge(max_age: int = JOB_RETENTION_SECONDS) -> int:
+        """Supprime les états de tâches plus anciens que max_age secondes"""
+        removed = 0
+        if not os.path.isdir(JOBS_DIR):
+            return removed
+        limit = time.time() - max_age
+        for entry in os.scandir(JOBS_DIR):
+            try:
+                if entry.name.endswith('.json') and entry.stat().st_mtime < limit:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+
+# Export
+__all__ = ['AIJobs', 'run_concurrently', 'max_workers', 'call_timeout']
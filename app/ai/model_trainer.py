@@ -8,7 +8,8 @@ pour chaque rapport de l'ERP.
 Fonctionnalités :
 - Entraînement individuel par rapport
 - Entraînement batch (tous les rapports)
-- Sauvegarde des modèles dans app/ai/models/
+- Sauvegarde des modèles dans app/ai/models/ (registre : métadonnées,
+  ré-entraînement à chaud si de nouvelles données, prévisions précalculées)
 - Validation et métriques de qualité
 
 Usage:
@@ -24,8 +25,11 @@ Usage:
 
 import os
 import sys
+import json
+import time
 import logging
-import pickle
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import date, datetime, timedelta
 from typing import Dict, Optional, List
 
@@ -35,6 +39,7 @@ import pandas as pd
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
 from app.ai.context_builder import ContextBuilder
+from app.ai.history import KpiHistory, REPORT_SERIES
 from app.ai.services.prophet_predictor import ProphetPredictor
 
 # Configuration du logger
@@ -45,6 +50,11 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def training_end_date(reference: Optional[date] = None) -> date:
+    """Dernier jour complet de l'historique : la veille de reference (défaut aujourd'hui)"""
+    return (reference or date.today()) - timedelta(days=1)
+
+
 def build_training_dataframe(
     report_name: str,
     days_history: int = 90,
@@ -56,13 +66,13 @@ def build_training_dataframe(
     Args:
         report_name: Nom du rapport (ex: 'daily_sales')
         days_history: Nombre de jours d'historique à récupérer
-        end_date: Date de fin (None = aujourd'hui)
+        end_date: Date de fin incluse (None = hier, voir training_end_date)
     
     Returns:
         DataFrame avec colonnes 'ds' (date) et 'y' (valeur)
     """
     if end_date is None:
-        end_date = date.today()
+        end_date = training_end_date()
     
     logger.info(f"Construction DataFrame pour {report_name} ({days_history} jours)")
     
@@ -74,9 +84,18 @@ def build_training_dataframe(
             logger.error(f"Rapport inconnu: {report_name}")
             return None
         
+        # Rapports quotidiens : séries extraites en lot (quelques GROUP BY pour toute la période)
+        if report_name in REPORT_SERIES:
+            df = KpiHistory.prophet_series(report_name, end_date, days_history, drop_empty_days=True)
+            if df.empty:
+                logger.error(f"Aucune donnée récupérée pour {report_name}")
+                return None
+            logger.info(f"DataFrame créé: {len(df)} lignes de {df['ds'].min()} à {df['ds'].max()}")
+            return df
+        
         service_class = context_builder.REPORT_SERVICES[report_name]
         
-        # Récupérer les données historiques
+        # Autres rapports : récupérer les données historiques rapport par rapport
         rows = []
         
         for i in range(days_history):
@@ -162,30 +181,24 @@ def _extract_main_value(report_name: str, data: Dict) -> Optional[float]:
     return None
 
 
-def train_model(
-    report_name: str,
-    days_history: int = 90,
-    save_model: bool = True
-) -> Dict:
+def fit_report(report_name: str, df: Optional[pd.DataFrame], save_model: bool = True) -> Dict:
     """
-    Entraîne un modèle Prophet pour un rapport spécifique
+    Entraîne (ou conserve) le modèle d'un rapport à partir de sa série
+    
+    Fonction autonome (ni base de données ni contexte Flask) : elle s'exécute
+    telle quelle dans un processus du pool d'entraînement.
     
     Args:
         report_name: Nom du rapport
-        days_history: Nombre de jours d'historique à utiliser
-        save_model: Si True, sauvegarde le modèle entraîné
+        df: Série d'entraînement ('ds', 'y')
+        save_model: Si True, sauvegarde le modèle et précalcule les prévisions
     
     Returns:
-        Dict avec résultats de l'entraînement
+        Dict avec résultats de l'entraînement (dont 'timings' en secondes)
     """
-    logger.info(f"═══════════════════════════════════════")
-    logger.info(f"Entraînement du modèle : {report_name}")
-    logger.info(f"═══════════════════════════════════════")
+    started = time.perf_counter()
     
     try:
-        # Construire le DataFrame d'entraînement
-        df = build_training_dataframe(report_name, days_history)
-        
         if df is None or len(df) < 10:
             error_msg = f"Données insuffisantes pour {report_name} ({len(df) if df is not None else 0} lignes)"
             logger.error(error_msg)
@@ -207,33 +220,39 @@ def train_model(
                 'error': error_msg
             }
         
-        # Créer et entraîner le modèle
-        model = predictor.Prophet(
-            daily_seasonality=True,
-            weekly_seasonality=True,
-            yearly_seasonality=len(df) >= 365,  # Seulement si + d'un an de données
-            interval_width=0.95
-        )
-        
-        logger.info(f"Entraînement du modèle Prophet sur {len(df)} lignes...")
-        model.fit(df)
-        logger.info("✅ Entraînement terminé")
+        registry = predictor.registry
+        previous = registry.get(report_name)
+        model_path = registry.model_path(report_name)
+        fit_seconds = 0.0
         
-        # Sauvegarder le modèle
-        if save_model:
-            model_path = os.path.join(predictor.models_dir, f"{report_name}.pkl")
-            with open(model_path, 'wb') as f:
-                pickle.dump(model, f)
-            logger.info(f"✅ Modèle sauvegardé : {model_path}")
+        if previous is not None and registry.is_current(report_name, df):
+            # Aucune nouvelle donnée : le modèle enregistré est conservé
+            logger.info(f"✅ {report_name} : données inchangées depuis le dernier entraînement, modèle conservé")
+            entry, refitted, warm = previous, False, previous.metadata.get('warm_start', False)
+            metrics = previous.metadata.get('metrics', {})
+            if save_model and registry.get_forecast(report_name, entry.metadata['data_hash'], 7) is None:
+                predictor.precompute_forecasts(report_name, entry, df)
         
-        # Générer une prédiction de test
-        future = model.make_future_dataframe(periods=7)
-        forecast = model.predict(future)
-        
-        # Calculer les métriques
-        metrics = predictor._calculate_metrics(df, forecast)
+        else:
+            # Entraîner (à chaud depuis le modèle précédent s'il existe)
+            logger.info(f"Entraînement du modèle Prophet {report_name} sur {len(df)} lignes...")
+            fit_started = time.perf_counter()
+            model, warm = predictor.fit_model(df, previous=previous.model if previous is not None else None)
+            fit_seconds = time.perf_counter() - fit_started
+            refitted = True
+            logger.info(f"✅ {report_name} entraîné en {fit_seconds:.1f}s (démarrage à chaud: {warm})")
+            
+            # Calculer les métriques sur l'historique
+            forecast = model.predict(model.make_future_dataframe(periods=0))
+            metrics = predictor._calculate_metrics(df, forecast)
+            
+            # Sauvegarder le modèle (écriture atomique) et précalculer les prévisions servies aux dashboards
+            if save_model:
+                entry = registry.save(report_name, model, df, metrics, warm_start=warm)
+                predictor.precompute_forecasts(report_name, entry, df)
+                logger.info(f"✅ Modèle sauvegardé : {model_path}")
         
-        logger.info(f"📊 Métriques : MAE={metrics.get('mae', 'N/A')}, MAPE={metrics.get('mape', 'N/A')}%")
+        logger.info(f"📊 {report_name} : MAE={metrics.get('mae', 'N/A')}, MAPE={metrics.get('mape', 'N/A')}%")
         
         return {
             'success': True,
@@ -241,7 +260,13 @@ def train_model(
             'training_size': len(df),
             'date_range': f"{df['ds'].min()} à {df['ds'].max()}",
             'metrics': metrics,
+            'refitted': refitted,
+            'warm_start': warm,
             'model_path': model_path if save_model else None,
+            'timings': {
+                'fit': round(fit_seconds, 3),
+                'total': round(time.perf_counter() - started, 3)
+            },
             'trained_at': datetime.now().isoformat()
         }
     
@@ -254,55 +279,302 @@ def train_model(
         }
 
 
-def train_all_reports(days_history: int = 90) -> List[Dict]:
+def train_model(
+    report_name: str,
+    days_history: int = 90,
+    save_model: bool = True
+) -> Dict:
+    """
+    Entraîne un modèle Prophet pour un rapport spécifique
+    
+    Args:
+        report_name: Nom du rapport
+        days_history: Nombre de jours d'historique à utiliser
+        save_model: Si True, sauvegarde le modèle entraîné
+    
+    Returns:
+        Dict avec résultats de l'entraînement
+    """
+    logger.info(f"═══════════════════════════════════════")
+    logger.info(f"Entraînement du modèle : {report_name}")
+    logger.info(f"═══════════════════════════════════════")
+    
+    # Construire le DataFrame d'entraînement
+    df = build_training_dataframe(report_name, days_history)
+    return fit_report(report_name, df, save_model)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# PIPELINE - Entraînement de tous les rapports
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Avancement du dernier entraînement (lu par /ai/status)
+TRAINING_PROGRESS_PATH = os.path.join(os.path.dirname(__file__), 'cache', 'training_progress.json')
+
+# Sans nouvelle progression depuis ce délai, un entraînement 'running' est
+# considéré comme interrompu (processus tué, redémarrage du serveur...)
+TRAINING_STALE_SECONDS = 2 * 60 * 60
+
+
+def _lock_path() -> str:
+    return f"{TRAINING_PROGRESS_PATH}.lock"
+
+
+def _write_progress(progress: Dict):
+    os.makedirs(os.path.dirname(TRAINING_PROGRESS_PATH), exist_ok=True)
+    tmp_path = f"{TRAINING_PROGRESS_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({**progress, 'updated_at': datetime.now().isoformat()}, f, ensure_ascii=False, default=str)
+    os.replace(tmp_path, TRAINING_PROGRESS_PATH)
+    # Chaque progression rafraîchit le verrou : seul un entraînement muet devient périmé
+    try:
+        os.utime(_lock_path())
+    except OSError:
+        pass
+
+
+def get_training_progress() -> Dict:
+    """Avancement du dernier entraînement ({'status': 'idle'} si aucun)"""
+    try:
+        with open(TRAINING_PROGRESS_PATH, 'r', encoding='utf-8') as f:
+            progress = json.load(f)
+    except (OSError, ValueError):
+        return {'status': 'idle'}
+    
+    if progress.get('status') == 'running':
+        updated_at = progress.get('updated_at') or progress.get('started_at')
+        try:
+            age = (datetime.now() - datetime.fromisoformat(updated_at)).total_seconds()
+        except (TypeError, ValueError):
+            age = TRAINING_STALE_SECONDS
+        if age >= TRAINING_STALE_SECONDS:
+            progress.update(status='error', error='Entraînement interrompu (aucune progression)')
+    return progress
+
+
+def acquire_training_lock() -> bool:
+    """
+    Réserve l'entraînement complet (création exclusive d'un fichier verrou,
+    atomique entre threads et workers)
+    
+    Un verrou plus ancien que TRAINING_STALE_SECONDS est celui d'un
+    entraînement interrompu : il est repris.
+    
+    Returns:
+        False si un entraînement est déjà en cours
+    """
+    os.makedirs(os.path.dirname(TRAINING_PROGRESS_PATH), exist_ok=True)
+    for _ in range(2):
+        try:
+            fd = os.open(_lock_path(), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                stale = time.time() - os.stat(_lock_path()).st_mtime >= TRAINING_STALE_SECONDS
+            except FileNotFoundError:
+                continue
+            if not stale:
+                return False
+            logger.warning("Verrou d'entraînement périmé repris")
+            try:
+                os.remove(_lock_path())
+            except FileNotFoundError:
+                pass
+            continue
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(f"{os.getpid()} {datetime.now().isoformat()}")
+        return True
+    return False
+
+
+def release_training_lock():
+    """Libère le verrou pris par acquire_training_lock"""
+    try:
+        os.remove(_lock_path())
+    except FileNotFoundError:
+        pass
+
+
+def fetch_training_series(
+    report_names: List[str],
+    days_history: int = 90,
+    end_date: Optional[date] = None
+) -> Dict[str, Optional[pd.DataFrame]]:
+    """
+    Séries d'entraînement de plusieurs rapports
+    
+    Les rapports quotidiens partagent une seule extraction en lot
+    (KpiHistory) ; les autres sont construits rapport par rapport.
+    Les prévisions (AIManager) lisent leurs séries ici aussi : mêmes jours,
+    mêmes jours fermés exclus que l'entraînement.
+    
+    Returns:
+        {rapport: DataFrame 'ds'/'y' ou None}
+    """
+    if end_date is None:
+        end_date = training_end_date()
+    
+    series = KpiHistory.prophet_frames(report_names, end_date, days_history, drop_empty_days=True)
+    for report_name in report_names:
+        if report_name in series:
+            if series[report_name].empty:
+                series[report_name] = None
+        else:
+            series[report_name] = build_training_dataframe(report_name, days_history, end_date)
+    return series
+
+
+def _default_workers(report_count: int) -> int:
+    """Processus d'entraînement : AI_TRAINING_WORKERS, sinon CPU - 1"""
+    try:
+        from flask import current_app
+        configured = current_app.config.get('AI_TRAINING_WORKERS')
+    except RuntimeError:
+        configured = None
+    workers = configured or max(1, (os.cpu_count() or 2) - 1)
+    return max(1, min(int(workers), report_count))
+
+
+def train_all_reports(
+    days_history: int = 90,
+    workers: Optional[int] = None,
+    report_names: Optional[List[str]] = None,
+    lock_acquired: bool = False
+) -> List[Dict]:
     """
     Entraîne tous les modèles Prophet disponibles
     
+    Les séries sont extraites dans le processus courant (requêtes en lot),
+    puis les modèles sont ajustés dans un pool de processus (Prophet/Stan
+    est limité par le CPU). L'avancement est publié dans
+    TRAINING_PROGRESS_PATH ; si l'entraînement échoue, il y passe en 'error'.
+    
     Args:
         days_history: Nombre de jours d'historique à utiliser
+        workers: Processus d'entraînement (None = AI_TRAINING_WORKERS ou CPU - 1)
+        report_names: Rapports à entraîner (None = tous)
+        lock_acquired: L'appelant a déjà pris le verrou (acquire_training_lock) ;
+            il est libéré à la fin dans tous les cas
     
     Returns:
-        Liste des résultats d'entraînement
+        Liste des résultats d'entraînement, dans l'ordre des rapports
+    
+    Raises:
+        RuntimeError: Un entraînement est déjà en cours
     """
+    if not lock_acquired and not acquire_training_lock():
+        raise RuntimeError("Un entraînement est déjà en cours")
+    
+    try:
+        return _train_all_reports(days_history, workers, report_names)
+    except BaseException as e:
+        logger.error(f"❌ Entraînement interrompu: {e}")
+        progress = get_training_progress()
+        if progress.get('status') in ('running', 'idle'):
+            _write_progress({**progress, 'status': 'error', 'error': str(e) or type(e).__name__,
+                             'finished_at': datetime.now().isoformat()})
+        raise
+    finally:
+        release_training_lock()
+
+
+def _train_all_reports(
+    days_history: int,
+    workers: Optional[int],
+    report_names: Optional[List[str]]
+) -> List[Dict]:
     logger.info("═══════════════════════════════════════════════════════")
     logger.info("ENTRAÎNEMENT DE TOUS LES MODÈLES PROPHET")
     logger.info("═══════════════════════════════════════════════════════")
     
-    context_builder = ContextBuilder()
-    available_reports = context_builder.get_available_reports()
+    if report_names is None:
+        report_names = ContextBuilder().get_available_reports()
     
-    logger.info(f"Rapports disponibles : {len(available_reports)}")
+    logger.info(f"Rapports à entraîner : {len(report_names)}")
     
-    results = []
+    progress = {
+        'status': 'running',
+        'started_at': datetime.now().isoformat(),
+        'finished_at': None,
+        'total': len(report_names),
+        'completed': 0,
+        'reports': {name: {'status': 'pending'} for name in report_names}
+    }
+    _write_progress(progress)
+    
+    # 1. Séries d'entraînement (requêtes partagées)
+    fetch_started = time.perf_counter()
+    series = fetch_training_series(report_names, days_history)
+    fetch_seconds = time.perf_counter() - fetch_started
+    logger.info(f"Séries extraites en {fetch_seconds:.1f}s")
+    progress['fetch_seconds'] = round(fetch_seconds, 3)
+    
+    # 2. Ajustement des modèles (pool de processus si Prophet est disponible)
+    results = {}
+    
+    def record(result: Dict):
+        results[result['report_name']] = result
+        progress['completed'] += 1
+        progress['reports'][result['report_name']] = {
+            'status': 'done' if result['success'] else 'error',
+            'seconds': result.get('timings', {}).get('total'),
+            'error': result.get('error')
+        }
+        _write_progress(progress)
     
-    for report_name in available_reports:
-        result = train_model(report_name, days_history)
-        results.append(result)
+    trainable = [name for name in report_names if series[name] is not None and len(series[name]) >= 10]
+    workers = workers or _default_workers(len(trainable) or 1)
+    
+    if not ProphetPredictor().prophet_available or workers == 1 or len(trainable) <= 1:
+        for report_name in report_names:
+            progress['reports'][report_name] = {'status': 'running'}
+            _write_progress(progress)
+            record(fit_report(report_name, series[report_name]))
+    else:
+        for report_name in report_names:
+            if report_name not in trainable:
+                record(fit_report(report_name, series[report_name]))
         
-        # Pause entre les entraînements pour éviter la surcharge
-        import time
-        time.sleep(1)
+        # 'spawn' : pas de fork d'un processus web multi-thread (verrous, connexions DB)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = {pool.submit(fit_report, name, series[name]): name for name in trainable}
+            for name in trainable:
+                progress['reports'][name] = {'status': 'running'}
+            _write_progress(progress)
+            
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    record(future.result())
+                except Exception as e:
+                    logger.error(f"❌ Processus d'entraînement de {name} interrompu: {e}")
+                    record({'success': False, 'report_name': name, 'error': str(e)})
+    
+    ordered = [results[name] for name in report_names]
+    
+    progress['status'] = 'done'
+    progress['finished_at'] = datetime.now().isoformat()
+    _write_progress(progress)
     
     # Résumé
     logger.info("\n═══════════════════════════════════════════════════════")
     logger.info("RÉSUMÉ DE L'ENTRAÎNEMENT")
     logger.info("═══════════════════════════════════════════════════════")
     
-    success_count = sum(1 for r in results if r['success'])
-    fail_count = len(results) - success_count
+    success_count = sum(1 for r in ordered if r['success'])
+    fail_count = len(ordered) - success_count
     
-    logger.info(f"✅ Succès : {success_count}/{len(results)}")
-    logger.info(f"❌ Échecs : {fail_count}/{len(results)}")
+    logger.info(f"✅ Succès : {success_count}/{len(ordered)}")
+    logger.info(f"❌ Échecs : {fail_count}/{len(ordered)}")
     
     if fail_count > 0:
         logger.info("\nRapports en échec :")
-        for r in results:
+        for r in ordered:
             if not r['success']:
                 logger.info(f"  - {r['report_name']}: {r.get('error', 'Erreur inconnue')}")
     
     logger.info("═══════════════════════════════════════════════════════")
     
-    return results
+    return ordered
 
 
 def predict_future(report_name: str, days_ahead: int = 7) -> Dict:
@@ -321,11 +593,11 @@ def predict_future(report_name: str, days_ahead: int = 7) -> Dict:
     try:
         predictor = ProphetPredictor()
         
-        # Charger le modèle
-        model_path = os.path.join(predictor.models_dir, f"{report_name}.pkl")
+        # Charger le modèle (registre en mémoire)
+        entry = predictor.registry.get(report_name)
         
-        if not os.path.exists(model_path):
-            error_msg = f"Modèle non trouvé : {model_path}. Entraîner d'abord le modèle."
+        if entry is None:
+            error_msg = f"Modèle non trouvé : {predictor.registry.model_path(report_name)}. Entraîner d'abord le modèle."
             logger.error(error_msg)
             return {
                 'success': False,
@@ -333,10 +605,8 @@ def predict_future(report_name: str, days_ahead: int = 7) -> Dict:
                 'error': error_msg
             }
         
-        with open(model_path, 'rb') as f:
-            model = pickle.load(f)
-        
-        logger.info(f"✅ Modèle chargé : {model_path}")
+        model = entry.model
+        logger.info(f"✅ Modèle chargé : {report_name}")
         
         # Générer la prédiction
         future = model.make_future_dataframe(periods=days_ahead)
@@ -382,6 +652,12 @@ if __name__ == "__main__":
         default=90,
         help='Nombre de jours d\'historique à utiliser (défaut: 90)'
     )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='Processus d\'entraînement en parallèle (défaut: CPU - 1)'
+    )
     parser.add_argument(
         '--predict',
         action='store_true',
@@ -427,7 +703,7 @@ if __name__ == "__main__":
                 sys.exit(1)
         else:
             # Entraîner tous les rapports
-            results = train_all_reports(args.days)
+            results = train_all_reports(args.days, workers=args.workers)
             
             success_count = sum(1 for r in results if r['success'])
             
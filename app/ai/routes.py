@@ -5,7 +5,7 @@ Routes Flask pour le module AI
 Ce module expose les endpoints Flask pour l'analyse AI.
 
 Endpoints :
-- POST /ai/train : Entraîne les modèles Prophet
+- POST /ai/train : Entraîne les modèles Prophet (tous : en tâche de fond)
 - GET /ai/predict : Génère des prédictions
 - GET /ai/analyze : Analyse un rapport via LLM
 - GET /ai/status : Statut du module AI
@@ -21,7 +21,10 @@ from flask import jsonify, request
 
 from app.ai import ai
 from app.ai.ai_manager import AIManager
-from app.ai.model_trainer import train_model, train_all_reports
+from app.ai.jobs import AIJobs
+from app.ai.model_trainer import (
+    acquire_training_lock, get_training_progress, release_training_lock, train_model, train_all_reports
+)
 
 # Configuration du logger
 logger = logging.getLogger(__name__)
@@ -72,10 +75,17 @@ def train():
         "days_history": 90              # optionnel, défaut 90
     }
     
-    Réponse :
+    Réponse (un rapport) :
+    {
+        "success": true,
+        "result": {...}
+    }
+    
+    Réponse (tous les rapports, 202) : entraînement lancé en tâche de fond,
+    avancement dans GET /ai/status (prophet.training)
     {
         "success": true,
-        "results": [...]
+        "job_id": "..."
     }
     """
     try:
@@ -95,18 +105,28 @@ def train():
             }), 200 if result['success'] else 400
         
         else:
-            # Entraîner tous les rapports
-            logger.info("Entraînement de tous les rapports")
-            results = train_all_reports(days_history)
+            # Entraîner tous les rapports hors de la requête (pool de processus).
+            # Verrou pris ici (création exclusive) : deux POST simultanés ne
+            # lancent pas deux entraînements ; la tâche le libère en fin de course
+            if not acquire_training_lock():
+                return jsonify({
+                    'success': False,
+                    'error': 'Un entraînement est déjà en cours',
+                    'progress': get_training_progress()
+                }), 409
             
-            success_count = sum(1 for r in results if r['success'])
+            logger.info("Entraînement de tous les rapports (tâche de fond)")
+            try:
+                job_id = AIJobs.submit('train_all_reports', train_all_reports, days_history, lock_acquired=True)
+            except Exception:
+                release_training_lock()
+                raise
             
             return jsonify({
-                'success': success_count > 0,
-                'total': len(results),
-                'success_count': success_count,
-                'results': results
-            }), 200
+                'success': True,
+                'job_id': job_id,
+                'status_url': '/ai/status'
+            }), 202
     
     except Exception as e:
         logger.error(f"Erreur lors de l'entraînement: {e}")
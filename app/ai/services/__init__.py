@@ -4,11 +4,13 @@ Services AI - Modules d'analyse et prédiction
 
 Services disponibles :
 - llm_analyzer : Analyse via LLM (Groq/GPT-4o mini)
+- llm_cache : Cache persistant des réponses LLM
 - prophet_predictor : Prédictions temporelles via Prophet
 """
 
 from app.ai.services.llm_analyzer import LLMAnalyzer
+from app.ai.services.llm_cache import LLMCache
 from app.ai.services.prophet_predictor import ProphetPredictor
 
-__all__ = ['LLMAnalyzer', 'ProphetPredictor']
+__all__ = ['LLMAnalyzer', 'LLMCache', 'ProphetPredictor']
 
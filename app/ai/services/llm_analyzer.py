@@ -14,6 +14,7 @@ Fonctionnalités :
 - Détection d'anomalies
 - Génération de recommandations
 - Fallback local si aucune API disponible
+- Cache persistant des réponses (voir llm_cache)
 
 Usage:
     analyzer = LLMAnalyzer(provider='groq')
@@ -24,9 +25,12 @@ import os
 import logging
 import yaml
 from typing import Dict, Optional, List
-from datetime import datetime
+from datetime import date, datetime
 from jinja2 import Template
 
+from app.ai.jobs import call_timeout, run_concurrently
+from app.ai.services.llm_cache import LLMCache
+
 # Configuration du logger
 logger = logging.getLogger(__name__)
 
@@ -46,17 +50,24 @@ class LLMAnalyzer:
         }
     }
     
-    def __init__(self, provider: str = 'auto', model: Optional[str] = None):
+    def __init__(
+        self,
+        provider: str = 'auto',
+        model: Optional[str] = None,
+        cache: Optional[LLMCache] = None
+    ):
         """
         Initialise l'analyseur LLM
         
         Args:
             provider: 'groq', 'openai', ou 'auto' (détection automatique)
             model: Nom du modèle spécifique (optionnel)
+            cache: Cache des réponses (défaut: app/ai/cache/llm)
         """
         self.provider = provider
         self.model = model
         self.client = None
+        self.cache = cache or LLMCache()
         self.prompts = self._load_prompts()
         
         # Configuration automatique du provider
@@ -139,7 +150,8 @@ class LLMAnalyzer:
         self,
         context: Dict,
         prompt_type: str = 'daily_analysis',
-        temperature: float = 0.3
+        temperature: float = 0.3,
+        period_end: Optional[date] = None
     ) -> Dict:
         """
         Analyse un rapport via LLM
@@ -148,6 +160,8 @@ class LLMAnalyzer:
             context: Dictionnaire avec les données du rapport
             prompt_type: Type de prompt à utiliser (daily_analysis, weekly_summary, etc.)
             temperature: Créativité du modèle (0-2, recommandé: 0.3)
+            period_end: Dernier jour de la période analysée ; une période
+                clôturée est mise en cache sans expiration (None = en cours)
         
         Returns:
             Dict avec l'analyse structurée
@@ -163,11 +177,20 @@ class LLMAnalyzer:
             system_message = prompt_template['system']
             user_message = self._render_prompt(prompt_template['user'], context)
             
+            # Réponse déjà obtenue pour exactement le même prompt
+            cache_key = LLMCache.make_key(
+                self.provider, self.model, prompt_type, system_message, user_message, temperature
+            )
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                cached['cached'] = True
+                return cached
+            
             # Appeler l'API
             response = self._call_llm(system_message, user_message, temperature)
             
             # Formater la réponse
-            return {
+            analysis = {
                 'success': True,
                 'analysis': response,
                 'provider': self.provider,
@@ -175,6 +198,9 @@ class LLMAnalyzer:
                 'prompt_type': prompt_type,
                 'generated_at': datetime.now().isoformat()
             }
+            self.cache.set(cache_key, analysis, period_end)
+            analysis['cached'] = False
+            return analysis
         
         except Exception as e:
             logger.error(f"Erreur lors de l'analyse LLM: {e}")
@@ -210,7 +236,8 @@ class LLMAnalyzer:
                 model=self.model,
                 messages=messages,
                 temperature=temperature,
-                max_tokens=2000
+                max_tokens=2000,
+                timeout=call_timeout()
             )
             return response.choices[0].message.content
         
@@ -219,7 +246,8 @@ class LLMAnalyzer:
                 model=self.model,
                 messages=messages,
                 temperature=temperature,
-                max_tokens=2000
+                max_tokens=2000,
+                timeout=call_timeout()
             )
             return response.choices[0].message.content
         
@@ -277,24 +305,38 @@ Date : {context.get('date', datetime.now().strftime('%Y-%m-%d'))}
     def batch_analyze(
         self,
         reports_contexts: List[Dict],
-        prompt_type: str = 'daily_analysis'
+        prompt_type: str = 'daily_analysis',
+        max_workers: Optional[int] = None,
+        timeout: Optional[float] = None
     ) -> List[Dict]:
         """
-        Analyse plusieurs rapports en batch
+        Analyse plusieurs rapports en parallèle
         
         Args:
             reports_contexts: Liste de contextes de rapports
             prompt_type: Type de prompt à utiliser
+            max_workers: Appels LLM simultanés (None = AI_MAX_CONCURRENCY)
+            timeout: Délai par appel en secondes (None = AI_CALL_TIMEOUT)
         
         Returns:
-            Liste d'analyses
+            Liste d'analyses, dans l'ordre des contextes (un appel en erreur
+            ou hors délai donne success=False et une analyse locale)
         """
-        results = []
-        for context in reports_contexts:
-            result = self.analyze_report(context, prompt_type)
-            results.append(result)
-        
-        return results
+        tasks = {
+            index: (lambda context=context: self.analyze_report(context, prompt_type))
+            for index, context in enumerate(reports_contexts)
+        }
+        results = run_concurrently(
+            tasks,
+            workers=max_workers,
+            timeout=timeout,
+            on_error=lambda index, message: {
+                'success': False,
+                'error': message,
+                'fallback': self._fallback_analysis(reports_contexts[index])
+            }
+        )
+        return [results[index] for index in range(len(reports_contexts))]
     
     def get_provider_info(self) -> Dict:
         """Retourne les informations sur le provider actif"""
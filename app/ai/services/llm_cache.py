@@ -0,0 +1,181 @@
+"""
+LLMCache - Cache persistant des analyses LLM
+=============================================
+
+Les insights du dashboard quotidien, le résumé mensuel et la page AI des
+rapports appelaient le LLM (Groq/OpenAI) à chaque chargement, alors que le
+prompt d'une période clôturée ne change plus.
+
+Les réponses sont stockées dans app/ai/cache/llm/, un fichier JSON par
+entrée, adressé par le hash SHA-256 de ce qui est réellement envoyé :
+provider, modèle, température, type de prompt et messages rendus. Un
+contexte modifié (nouvelle vente, prévision différente...) produit donc une
+autre clé, sans invalidation explicite.
+
+- période clôturée (fin < aujourd'hui) : entrée permanente
+- période en cours : entrée valable TODAY_TTL_SECONDS
+
+Usage:
+    cache = LLMCache()
+    key = LLMCache.make_key(provider, model, prompt_type, system, user, temperature)
+    analysis = cache.get(key)
+    if analysis is None:
+        cache.set(key, analysis, period_end)
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date
+from typing import Dict, Optional
+
+# Configuration du logger
+logger = logging.getLogger(__name__)
+
+
+# Durée de vie des analyses d'une période non clôturée (les données évoluent)
+TODAY_TTL_SECONDS = 15 * 60
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)),
+    'cache',
+    'llm'
+)
+
+# Compteurs du processus (AIManager est instancié à chaque requête)
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'stores': 0, 'expired': 0}
+
+
+class LLMCache:
+    """Cache fichier des réponses LLM, adressé par contenu"""
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        """
+        Initialise le cache
+
+        Args:
+            cache_dir: Répertoire des entrées (défaut: app/ai/cache/llm)
+        """
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+
+    @staticmethod
+    def make_key(
+        provider: str,
+        model: Optional[str],
+        prompt_type: str,
+        system_message: str,
+        user_message: str,
+        temperature: float
+    ) -> str:
+        """Clé SHA-256 des paramètres de l'appel LLM"""
+        payload = json.dumps({
+            'provider': provider,
+            'model': model,
+            'prompt_type': prompt_type,
+            'temperature': temperature,
+            'system': system_message,
+            'user': user_message,
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Analyse en cache, ou None (absente, expirée ou illisible)"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            _count('misses')
+            return None
+        except Exception as e:
+            logger.warning(f"Entrée de cache LLM illisible {key}: {e}")
+            _count('misses')
+            return None
+
+        expires_at = entry.get('expires_at')
+        if expires_at is not None and time.time() >= expires_at:
+            _count('expired')
+            _count('misses')
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+        _count('hits')
+        return entry.get('analysis')
+
+    def set(self, key: str, analysis: Dict, period_end: Optional[date] = None):
+        """
+        Enregistre une analyse
+
+        Args:
+            key: Clé (voir make_key)
+            analysis: Réponse à mettre en cache
+            period_end: Dernier jour de la période analysée (None = en cours)
+        """
+        closed = period_end is not None and period_end < date.today()
+        entry = {
+            'analysis': analysis,
+            'period_end': period_end.isoformat() if period_end else None,
+            'expires_at': None if closed else time.time() + TODAY_TTL_SECONDS,
+        }
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Écriture atomique : un lecteur concurrent ne voit jamais un fichier partiel
+            tmp_path = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(key))
+            _count('stores')
+        except Exception as e:
+            logger.warning(f"Impossible d'écrire le cache LLM {key}: {e}")
+
+    def clear(self) -> int:
+        """Supprime toutes les entrées, retourne leur nombre"""
+        removed = 0
+        if not os.path.isdir(self.cache_dir):
+            return removed
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.json'):
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
+
+    def get_stats(self) -> Dict:
+        """Compteurs hit/miss du processus et nombre d'entrées stockées"""
+        with _lock:
+            stats = dict(_stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups * 100, 1) if lookups else 0.0
+        try:
+            stats['entries'] = sum(1 for name in os.listdir(self.cache_dir) if name.endswith('.json'))
+        except OSError:
+            stats['entries'] = 0
+        return stats
+
+    @staticmethod
+    def reset_stats():
+        """Remet les compteurs à zéro"""
+        with _lock:
+            for name in _stats:
+                _stats[name] = 0
+
+
+def _count(name: str):
+    with _lock:
+        _stats[name] += 1
+
+
+# Export
+__all__ = ['LLMCache', 'TODAY_TTL_SECONDS']
@@ -0,0 +1,229 @@
+"""
+ModelRegistry - Registre des modèles Prophet entraînés
+======================================================
+
+ProphetPredictor désérialisait le pickle du modèle à chaque prévision, ou
+ré-entraînait un modèle complet dans la requête s'il n'en trouvait pas :
+/dashboards/api/daily/sales-forecast payait ce coût à chaque appel.
+
+Le registre conserve, par rapport :
+- le modèle ajusté en mémoire (LRU borné à MAX_MODELS_IN_MEMORY), rechargé
+  seulement si le pickle a été réécrit (autre worker, entraînement nocturne)
+- des métadonnées à côté du pickle ({rapport}.meta.json) : fenêtre
+  d'entraînement, hash des données, métriques (MAPE...)
+- les prévisions précalculées ({rapport}.forecast.json), valides tant que
+  les données d'entraînement n'ont pas changé
+
+Le hash des données permet de ne ré-entraîner que si de nouvelles données
+sont arrivées ; l'ajustement lui-même (démarrage à chaud) reste dans
+ProphetPredictor.
+
+Usage:
+    registry = ModelRegistry(models_dir)
+    entry = registry.get('daily_sales')
+    if entry is None or not registry.is_current('daily_sales', df):
+        registry.save('daily_sales', model, df, metrics)
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional
+
+import pandas as pd
+
+# Configuration du logger
+logger = logging.getLogger(__name__)
+
+
+MAX_MODELS_IN_MEMORY = 8
+
+# Horizons précalculés après chaque entraînement
+FORECAST_HORIZONS = (7, 30)
+
+# Modèles en mémoire : (models_dir, rapport) -> RegisteredModel
+_lock = threading.Lock()
+_models = OrderedDict()
+
+
+class RegisteredModel(NamedTuple):
+    """Modèle ajusté et ses métadonnées"""
+    model: object
+    metadata: Dict
+    mtime_ns: int
+
+
+def _atomic_write(path: str, write, mode: str = 'w'):
+    """Écrit via un fichier temporaire puis os.replace : jamais de fichier partiel"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    kwargs = {'encoding': 'utf-8'} if 'b' not in mode else {}
+    with open(tmp_path, mode, **kwargs) as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+class ModelRegistry:
+    """Modèles Prophet par rapport : mémoire (LRU) + disque (pickle, métadonnées, prévisions)"""
+
+    def __init__(self, models_dir: str):
+        """
+        Args:
+            models_dir: Répertoire des modèles (app/ai/models)
+        """
+        self.models_dir = models_dir
+
+    # ------------------------------------------------------------------
+    # Chemins et hash
+    # ------------------------------------------------------------------
+
+    def model_path(self, report_name: str) -> str:
+        return os.path.join(self.models_dir, f"{report_name}.pkl")
+
+    def _metadata_path(self, report_name: str) -> str:
+        return os.path.join(self.models_dir, f"{report_name}.meta.json")
+
+    def _forecast_path(self, report_name: str) -> str:
+        return os.path.join(self.models_dir, f"{report_name}.forecast.json")
+
+    @staticmethod
+    def data_hash(df: pd.DataFrame) -> str:
+        """Empreinte de la série d'entraînement (colonnes 'ds' et 'y')"""
+        values = pd.util.hash_pandas_object(df[['ds', 'y']], index=False).values
+        return hashlib.sha256(values.tobytes()).hexdigest()
+
+    # ------------------------------------------------------------------
+    # Modèles
+    # ------------------------------------------------------------------
+
+    def get(self, report_name: str) -> Optional[RegisteredModel]:
+        """Modèle du rapport (mémoire, ou disque si absent ou réécrit), None s'il n'existe pas"""
+        key = (self.models_dir, report_name)
+        try:
+            mtime_ns = os.stat(self.model_path(report_name)).st_mtime_ns
+        except OSError:
+            with _lock:
+                _models.pop(key, None)
+            return None
+
+        with _lock:
+            entry = _models.get(key)
+            if entry is not None and entry.mtime_ns == mtime_ns:
+                _models.move_to_end(key)
+                return entry
+
+        try:
+            with open(self.model_path(report_name), 'rb') as f:
+                model = pickle.load(f)
+        except Exception as e:
+            logger.warning(f"Impossible de charger le modèle {report_name}: {e}")
+            return None
+
+        entry = RegisteredModel(model, self.get_metadata(report_name), mtime_ns)
+        self._remember(key, entry)
+        logger.info(f"Modèle {report_name} chargé en mémoire")
+        return entry
+
+    def get_metadata(self, report_name: str) -> Dict:
+        """Métadonnées du modèle ({} si absentes)"""
+        try:
+            with open(self._metadata_path(report_name), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def is_current(self, report_name: str, df: pd.DataFrame) -> bool:
+        """Vrai si le modèle enregistré a été entraîné sur exactement ces données"""
+        metadata = self.get_metadata(report_name)
+        return bool(metadata) and metadata.get('data_hash') == self.data_hash(df)
+
+    def save(self, report_name: str, model, df: pd.DataFrame, metrics: Optional[Dict] = None,
+             warm_start: bool = False) -> RegisteredModel:
+        """
+        Enregistre un modèle ajusté (pickle + métadonnées) et le garde en mémoire
+
+        Les prévisions précalculées de l'ancien modèle sont supprimées.
+        """
+        os.makedirs(self.models_dir, exist_ok=True)
+        metadata = {
+            'report_name': report_name,
+            'trained_at': datetime.now().isoformat(),
+            'training_start': pd.to_datetime(df['ds'].min()).date().isoformat(),
+            'training_end': pd.to_datetime(df['ds'].max()).date().isoformat(),
+            'training_size': len(df),
+            'data_hash': self.data_hash(df),
+            'warm_start': warm_start,
+            'metrics': metrics or {},
+        }
+        _atomic_write(self.model_path(report_name), lambda f: pickle.dump(model, f), 'wb')
+        _atomic_write(self._metadata_path(report_name), lambda f: json.dump(metadata, f, ensure_ascii=False))
+        try:
+            os.remove(self._forecast_path(report_name))
+        except OSError:
+            pass
+
+        entry = RegisteredModel(model, metadata, os.stat(self.model_path(report_name)).st_mtime_ns)
+        self._remember((self.models_dir, report_name), entry)
+        logger.info(f"Modèle sauvegardé: {self.model_path(report_name)}")
+        return entry
+
+    def _remember(self, key, entry: RegisteredModel):
+        with _lock:
+            _models[key] = entry
+            _models.move_to_end(key)
+            while len(_models) > MAX_MODELS_IN_MEMORY:
+                _models.popitem(last=False)
+
+    # ------------------------------------------------------------------
+    # Prévisions précalculées
+    # ------------------------------------------------------------------
+
+    def get_forecast(self, report_name: str, data_hash: str, days: int) -> Optional[Dict]:
+        """Prévision à `days` jours précalculée pour ces données, ou None"""
+        try:
+            with open(self._forecast_path(report_name), 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if stored.get('data_hash') != data_hash:
+            return None
+        return stored.get('forecasts', {}).get(str(days))
+
+    def save_forecast(self, report_name: str, data_hash: str, days: int, forecast: Dict):
+        """Ajoute une prévision à `days` jours aux prévisions précalculées"""
+        try:
+            with open(self._forecast_path(report_name), 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            stored = {}
+        if stored.get('data_hash') != data_hash:
+            stored = {'data_hash': data_hash, 'forecasts': {}}
+        stored['forecasts'][str(days)] = forecast
+        try:
+            _atomic_write(self._forecast_path(report_name),
+                          lambda f: json.dump(stored, f, ensure_ascii=False, default=str))
+        except Exception as e:
+            logger.warning(f"Impossible d'enregistrer la prévision {report_name}: {e}")
+
+    @staticmethod
+    def stats() -> Dict:
+        """Modèles actuellement en mémoire"""
+        with _lock:
+            return {
+                'in_memory': [report_name for _, report_name in _models],
+                'max_in_memory': MAX_MODELS_IN_MEMORY,
+            }
+
+    @staticmethod
+    def clear_memory():
+        """Vide le cache mémoire (les fichiers sont conservés)"""
+        with _lock:
+            _models.clear()
+
+
+# Export
+__all__ = ['ModelRegistry', 'RegisteredModel', 'FORECAST_HORIZONS', 'MAX_MODELS_IN_MEMORY']
@@ -7,8 +7,9 @@ des rapports de l'ERP.
 
 Fonctionnalités :
 - Génération de prédictions à N jours
-- Chargement de modèles pré-entraînés
-- Mise en cache des prédictions
+- Modèles gardés en mémoire (voir model_registry), entraînés par la tâche
+  planifiée (model_trainer) : aucun ajustement Stan dans une requête
+- Prévisions précalculées servies depuis le registre
 - Extraction des composantes (tendance, saisonnalité)
 
 Usage :
@@ -17,13 +18,15 @@ Usage :
 """
 
 import os
-import pickle
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
+from app.ai.services.model_registry import FORECAST_HORIZONS, ModelRegistry, RegisteredModel
+
 # Configuration du logger
 logger = logging.getLogger(__name__)
 
@@ -43,6 +46,7 @@ class ProphetPredictor:
         )
         os.makedirs(self.models_dir, exist_ok=True)
         os.makedirs(self.cache_dir, exist_ok=True)
+        self.registry = ModelRegistry(self.models_dir)
         
         # Import conditionnel de Prophet
         try:
@@ -67,7 +71,8 @@ class ProphetPredictor:
             df: DataFrame avec colonnes 'ds' (date) et 'y' (valeur)
             report_name: Nom du rapport (pour cache du modèle)
             days: Nombre de jours à prédire
-            use_cached_model: Si True, charge le modèle depuis cache
+            use_cached_model: Si True, sert le modèle du registre (sinon ajuste
+                un modèle sur df, sans l'enregistrer)
         
         Returns:
             Dict avec clés:
@@ -83,29 +88,28 @@ class ProphetPredictor:
             if not self._validate_dataframe(df):
                 raise ValueError("DataFrame invalide (colonnes 'ds' et 'y' requises)")
             
-            # Charger ou créer le modèle
-            model = self._load_or_create_model(report_name, df, use_cached_model)
+            if not use_cached_model:
+                model, _ = self.fit_model(df)
+                logger.info(f"Nouveau modèle entraîné pour {report_name}")
+                return self.build_forecast(model, df, report_name, days)
             
-            # Générer les prédictions
-            future = model.make_future_dataframe(periods=days)
-            forecast = model.predict(future)
+            # Modèle de l'entraînement planifié (flask ai-train), jamais ré-ajusté ici
+            entry = self.registry.get(report_name)
+            if entry is None:
+                logger.warning(f"Aucun modèle entraîné pour {report_name}, moyenne mobile en attendant")
+                return self._fallback_forecast(df, days)
             
-            # Extraire les composantes
-            components = self._extract_components(forecast, days)
+            model_hash = entry.metadata.get('data_hash')
+            if model_hash:
+                cached = self.registry.get_forecast(report_name, model_hash, days)
+                if cached is not None:
+                    return cached
             
-            # Calculer les métriques
-            metrics = self._calculate_metrics(df, forecast)
-            
-            # Formater la réponse
-            return {
-                'success': True,
-                'report_name': report_name,
-                'forecast_days': days,
-                'forecast': forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].tail(days).to_dict('records'),
-                'components': components,
-                'metrics': metrics,
-                'generated_at': datetime.now().isoformat()
-            }
+            # Horizon non précalculé : prédiction seule (pas d'ajustement)
+            result = self.build_forecast(entry.model, df, report_name, days)
+            if model_hash:
+                self.registry.save_forecast(report_name, model_hash, days, result)
+            return result
             
         except Exception as e:
             logger.error(f"Erreur lors de la prédiction Prophet pour {report_name}: {e}")
@@ -125,35 +129,73 @@ class ProphetPredictor:
             return False
         return True
     
-    def _load_or_create_model(
-        self,
-        report_name: str,
-        df: pd.DataFrame,
-        use_cached: bool
-    ):
-        """Charge un modèle depuis le cache ou en crée un nouveau"""
-        model_path = os.path.join(self.models_dir, f"{report_name}.pkl")
+    def build_forecast(self, model, df: pd.DataFrame, report_name: str, days: int) -> Dict:
+        """Prévision à `days` jours d'un modèle ajusté (réponse de generate_forecast)"""
+        future = model.make_future_dataframe(periods=days)
+        forecast = model.predict(future)
         
-        if use_cached and os.path.exists(model_path):
+        # Extraire les composantes
+        components = self._extract_components(forecast, days)
+        
+        # Calculer les métriques
+        metrics = self._calculate_metrics(df, forecast)
+        
+        records = forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].tail(days)
+        records = records.assign(ds=records['ds'].dt.strftime('%Y-%m-%dT%H:%M:%S'))
+        
+        # Formater la réponse
+        return {
+            'success': True,
+            'report_name': report_name,
+            'forecast_days': days,
+            'forecast': records.to_dict('records'),
+            'components': components,
+            'metrics': metrics,
+            'generated_at': datetime.now().isoformat()
+        }
+    
+    def precompute_forecasts(self, report_name: str, entry: RegisteredModel, df: pd.DataFrame):
+        """Calcule et enregistre les prévisions FORECAST_HORIZONS d'un modèle fraîchement entraîné"""
+        for days in FORECAST_HORIZONS:
             try:
-                with open(model_path, 'rb') as f:
-                    model = pickle.load(f)
-                logger.info(f"Modèle chargé depuis {model_path}")
-                return model
+                forecast = self.build_forecast(entry.model, df, report_name, days)
+                self.registry.save_forecast(report_name, entry.metadata['data_hash'], days, forecast)
             except Exception as e:
-                logger.warning(f"Impossible de charger le modèle: {e}. Création d'un nouveau modèle.")
-        
-        # Créer et entraîner un nouveau modèle
-        model = self.Prophet(
+                logger.warning(f"Prévision {days}j non précalculée pour {report_name}: {e}")
+    
+    def new_model(self, df: pd.DataFrame):
+        """Modèle Prophet non ajusté (même configuration pour tous les rapports)"""
+        return self.Prophet(
             daily_seasonality=True,
             weekly_seasonality=True,
             yearly_seasonality=False,  # Pas assez de données généralement
             interval_width=0.95
         )
-        model.fit(df)
-        logger.info(f"Nouveau modèle entraîné pour {report_name}")
+    
+    def fit_model(self, df: pd.DataFrame, previous=None):
+        """
+        Ajuste un nouveau modèle sur df
         
-        return model
+        Args:
+            df: Série d'entraînement ('ds', 'y')
+            previous: Modèle précédent ; ses paramètres servent de point de
+                départ à l'optimisation (démarrage à chaud)
+        
+        Returns:
+            (modèle ajusté, True si le démarrage à chaud a été utilisé)
+        """
+        if previous is not None:
+            try:
+                model = self.new_model(df)
+                model.fit(df, init=_warm_start_params(previous))
+                return model, True
+            except Exception as e:
+                # Paramètres incompatibles (saisonnalités ou points de rupture différents)
+                logger.warning(f"Démarrage à chaud impossible ({e}), entraînement complet")
+        
+        model = self.new_model(df)
+        model.fit(df)
+        return model, False
     
     def _extract_components(self, forecast: pd.DataFrame, days: int) -> Dict:
         """Extrait les composantes tendance/saisonnalité"""
@@ -225,25 +267,25 @@ class ProphetPredictor:
             return 'faible'
     
     def _fallback_forecast(self, df: pd.DataFrame, days: int) -> Dict:
-        """Prévision simple (moyenne mobile) si Prophet indisponible"""
+        """Prévision simple (moyenne mobile) si Prophet indisponible, calculée en NumPy"""
         if df is None or df.empty:
             return {'success': False, 'error': 'Données insuffisantes'}
         
         # Moyenne des 7 derniers jours
-        recent_avg = df['y'].tail(7).mean()
+        recent_avg = float(np.asarray(df['y'].to_numpy()[-7:], dtype=float).mean())
         
         # Générer des dates futures
-        last_date = pd.to_datetime(df['ds'].max())
-        future_dates = [last_date + timedelta(days=i+1) for i in range(days)]
+        last_date = np.asarray(df['ds'].to_numpy(), dtype='datetime64[D]').max()
+        future_dates = np.datetime_as_string(
+            (last_date + np.arange(1, days + 1)).astype('datetime64[s]')
+        ).tolist()
         
+        yhat = np.full(days, recent_avg)
         forecast = [
-            {
-                'ds': d.isoformat(),
-                'yhat': float(recent_avg),
-                'yhat_lower': float(recent_avg * 0.9),
-                'yhat_upper': float(recent_avg * 1.1)
-            }
-            for d in future_dates
+            {'ds': ds, 'yhat': value, 'yhat_lower': lower, 'yhat_upper': upper}
+            for ds, value, lower, upper in zip(
+                future_dates, yhat.tolist(), (yhat * 0.9).tolist(), (yhat * 1.1).tolist()
+            )
         ]
         
         return {
@@ -254,13 +296,12 @@ class ProphetPredictor:
             'generated_at': datetime.now().isoformat()
         }
     
-    def save_model(self, model, report_name: str) -> bool:
-        """Sauvegarde un modèle Prophet entraîné"""
+    def save_model(self, model, report_name: str, df: Optional[pd.DataFrame] = None) -> bool:
+        """Sauvegarde un modèle Prophet entraîné (avec ses métadonnées si df est fourni)"""
         try:
-            model_path = os.path.join(self.models_dir, f"{report_name}.pkl")
-            with open(model_path, 'wb') as f:
-                pickle.dump(model, f)
-            logger.info(f"Modèle sauvegardé: {model_path}")
+            if df is None:
+                df = model.history[['ds', 'y']]
+            self.registry.save(report_name, model, df)
             return True
         except Exception as e:
             logger.error(f"Erreur lors de la sauvegarde du modèle: {e}")
@@ -279,6 +320,22 @@ class ProphetPredictor:
         return models
 
 
+def _warm_start_params(model) -> Dict:
+    """Paramètres ajustés d'un modèle Prophet, au format init de Stan"""
+    params = {}
+    for name in ('k', 'm', 'sigma_obs'):
+        if model.mcmc_samples == 0:
+            params[name] = model.params[name][0][0]
+        else:
+            params[name] = np.mean(model.params[name])
+    for name in ('delta', 'beta'):
+        if model.mcmc_samples == 0:
+            params[name] = model.params[name][0]
+        else:
+            params[name] = np.mean(model.params[name], axis=0)
+    return params
+
+
 # Export
 __all__ = ['ProphetPredictor']
 
@@ -106,25 +106,21 @@ class ConsumableCategory(db.Model):
         Retourne le consommable approprié pour une quantité donnée
         Retourne : (ConsumableRange, nombre_de_boites)
         """
-        # Trouver la plage qui correspond
-        range_obj = ConsumableRange.query.filter(
-            ConsumableRange.category_id == self.id,
-            ConsumableRange.min_quantity <= quantity,
-            ConsumableRange.max_quantity >= quantity
-        ).first()
+        from app.consumables.packing import ConsumablePackingCache
+        plan = ConsumablePackingCache.for_category(self.id)
+        ranges = plan.ranges if plan else ()
         
-        if range_obj:
-            return range_obj, 1
+        # Trouver la plage qui correspond
+        range_spec = next((r for r in ranges if r.min_quantity <= quantity <= r.max_quantity), None)
+        if range_spec:
+            return db.session.get(ConsumableRange, range_spec.id), 1
         
         # Si pas de plage exacte, utiliser la plus grande plage disponible
-        largest_range = ConsumableRange.query.filter(
-            ConsumableRange.category_id == self.id
-        ).order_by(ConsumableRange.max_quantity.desc()).first()
-        
-        if largest_range:
+        if ranges:
+            largest_range = max(ranges, key=lambda r: r.max_quantity)
             # Calculer le nombre de boîtes nécessaires
             boxes_needed = (quantity + largest_range.max_quantity - 1) // largest_range.max_quantity
-            return largest_range, boxes_needed
+            return db.session.get(ConsumableRange, largest_range.id), boxes_needed
         
         return None, 0
     
@@ -134,36 +130,31 @@ class ConsumableCategory(db.Model):
         Retourne une liste de tuples (consommable, quantité)
         Gère les multiples boîtes intelligemment
         """
-        result = []
-        remaining = quantity
-        
-        # Trier les plages par capacité décroissante
-        ranges = ConsumableRange.query.filter(
-            ConsumableRange.category_id == self.id
-        ).order_by(ConsumableRange.max_quantity.desc()).all()
-        
-        for range_obj in ranges:
-            if remaining <= 0:
-                break
-            
-            # Trouver la meilleure combinaison
-            if remaining >= range_obj.min_quantity:
-                boxes_needed = remaining // range_obj.max_quantity
-                if boxes_needed > 0:
-                    result.append((range_obj.consumable_product, boxes_needed))
-                    remaining -= boxes_needed * range_obj.max_quantity
-        
-        # Si il reste des pièces, utiliser la plus petite boîte disponible
-        if remaining > 0:
-            smallest_range = ConsumableRange.query.filter(
-                ConsumableRange.category_id == self.id,
-                ConsumableRange.max_quantity >= remaining
-            ).order_by(ConsumableRange.max_quantity.asc()).first()
-            
-            if smallest_range:
-                result.append((smallest_range.consumable_product, 1))
-        
-        return result
+        from app.consumables.packing import ConsumablePackingCache
+        plan = ConsumablePackingCache.for_category(self.id)
+        return ConsumableCategory._with_products(plan, quantity)
+    
+    @staticmethod
+    def consumables_for_product_category(product_category_id, quantity):
+        """
+        Consommables à sortir pour une quantité d'une catégorie de produits
+        (catégorie de consommables active, lue depuis le cache).
+        Retourne une liste de tuples (consommable, quantité)
+        """
+        from app.consumables.packing import ConsumablePackingCache
+        plan = ConsumablePackingCache.for_product_category(product_category_id)
+        return ConsumableCategory._with_products(plan, quantity)
+    
+    @staticmethod
+    def _with_products(plan, quantity):
+        from app.consumables.packing import pack
+        from models import Product
+        if plan is None:
+            return []
+        return [
+            (db.session.get(Product, range_spec.consumable_product_id), boxes)
+            for range_spec, boxes in pack(plan.ranges, quantity)
+        ]
 
 class ConsumableRange(db.Model):
     """Plages de quantités pour les catégories de consommables"""
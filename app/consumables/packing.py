@@ -0,0 +1,200 @@
+"""
+Cache des plans de conditionnement (catégories de consommables)
+Module: app/consumables/packing.py
+
+Les plages de quantités changent rarement (écrans d'administration) alors
+qu'elles sont lues à chaque vente PDV et à chaque production. On garde donc
+en mémoire un instantané immuable et versionné de toutes les catégories et
+de leurs plages triées ; toute écriture sur ConsumableCategory/ConsumableRange
+l'invalide (événements SQLAlchemy), et une durée de vie courte borne le
+décalage entre workers.
+
+Le calcul des boîtes est un solveur mémoïsé : pour des plages et une
+quantité données, il retourne la combinaison qui utilise le moins de boîtes,
+en privilégiant les boîtes utilisées dans leur plage puis la plus petite
+capacité totale.
+"""
+
+import threading
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+from sqlalchemy import select
+
+from extensions import db
+from app.consumables.models import ConsumableCategory, ConsumableRange
+from app.utils.session_hooks import CacheInvalidationHooks
+
+
+# Durée de vie d'un instantané : les écritures d'un autre worker ne sont pas vues avant
+CACHE_TTL_SECONDS = 300
+
+# Au-delà, les boîtes pleines de plus grande capacité sont posées d'office
+# et seul le reste passe dans le solveur
+_SOLVER_WINDOW_BOXES = 4
+
+RangeSpec = namedtuple('RangeSpec', ['id', 'min_quantity', 'max_quantity', 'consumable_product_id'])
+CategoryPlan = namedtuple('CategoryPlan', ['id', 'name', 'product_category_id', 'is_active', 'ranges'])
+PackingSnapshot = namedtuple('PackingSnapshot', ['version', 'loaded_at', 'categories', 'by_product_category'])
+
+_lock = threading.Lock()
+_snapshot = None
+_version = 0
+
+
+class ConsumablePackingCache:
+    """Instantané en mémoire des catégories de consommables et de leurs plages"""
+
+    @staticmethod
+    def snapshot():
+        """Instantané courant, rechargé (2 requêtes) s'il est invalidé ou expiré."""
+        current = _snapshot
+        if current is not None and time.monotonic() - current.loaded_at < CACHE_TTL_SECONDS:
+            return current
+        with _lock:
+            if _snapshot is current:
+                ConsumablePackingCache._load(current.version if current else _version)
+            return _snapshot
+
+    @staticmethod
+    def _load(version):
+        global _snapshot
+
+        ranges_by_category = {}
+        rows = db.session.execute(
+            select(ConsumableRange.id, ConsumableRange.category_id, ConsumableRange.min_quantity,
+                   ConsumableRange.max_quantity, ConsumableRange.consumable_product_id)
+            .order_by(ConsumableRange.min_quantity, ConsumableRange.id)
+        )
+        for range_id, category_id, min_quantity, max_quantity, product_id in rows:
+            ranges_by_category.setdefault(category_id, []).append(
+                RangeSpec(range_id, min_quantity, max_quantity, product_id)
+            )
+
+        categories = {}
+        by_product_category = {}
+        rows = db.session.execute(
+            select(ConsumableCategory.id, ConsumableCategory.name, ConsumableCategory.product_category_id,
+                   ConsumableCategory.is_active)
+            .order_by(ConsumableCategory.id)
+        )
+        for category_id, name, product_category_id, is_active in rows:
+            plan = CategoryPlan(category_id, name, product_category_id, bool(is_active),
+                                tuple(ranges_by_category.get(category_id, ())))
+            categories[category_id] = plan
+            # Même règle que la requête .first() historique : la plus ancienne catégorie active
+            if plan.is_active:
+                by_product_category.setdefault(product_category_id, plan)
+
+        _snapshot = PackingSnapshot(version, time.monotonic(), categories, by_product_category)
+
+    @staticmethod
+    def invalidate():
+        """Force le rechargement au prochain accès."""
+        global _snapshot, _version
+        with _lock:
+            _version += 1
+            _snapshot = None
+
+    @staticmethod
+    def version():
+        return _snapshot.version if _snapshot is not None else _version
+
+    @staticmethod
+    def for_category(category_id):
+        """CategoryPlan d'une catégorie de consommables (ou None)."""
+        return ConsumablePackingCache.snapshot().categories.get(category_id)
+
+    @staticmethod
+    def for_product_category(product_category_id):
+        """CategoryPlan actif rattaché à une catégorie de produits (ou None)."""
+        if not product_category_id:
+            return None
+        return ConsumablePackingCache.snapshot().by_product_category.get(product_category_id)
+
+
+def pack(ranges, quantity):
+    """
+    Boîtes nécessaires pour une quantité.
+
+    Args:
+        ranges: plages (RangeSpec ou ConsumableRange)
+        quantity: nombre de pièces
+
+    Returns:
+        list: [(plage, nombre_de_boites)] par capacité décroissante
+    """
+    quantity = int(quantity or 0)
+    if quantity <= 0 or not ranges:
+        return []
+    by_id = {r.id: r for r in ranges}
+    key = tuple(sorted((r.id, r.min_quantity, r.max_quantity) for r in ranges))
+    return [(by_id[range_id], boxes) for range_id, boxes in _solve(key, quantity)]
+
+
+@lru_cache(maxsize=4096)
+def _solve(ranges_key, quantity):
+    """
+    Programmation dynamique sur le nombre de pièces.
+
+    Une boîte peut contenir de 1 à max_quantity pièces ; le coût d'une
+    combinaison est (nombre de boîtes, boîtes hors de leur plage, capacité
+    totale), comparé dans cet ordre.
+    """
+    ranges = [r for r in ranges_key if r[2] and r[2] > 0]
+    if not ranges:
+        return ()
+
+    largest = max(ranges, key=lambda r: (r[2], -r[0]))
+    full_boxes = 0
+    window = _SOLVER_WINDOW_BOXES * largest[2]
+    if quantity > window:
+        full_boxes = (quantity - window) // largest[2]
+        quantity -= full_boxes * largest[2]
+
+    # best[q] = (coût, plage utilisée, pièces mises dans cette boîte)
+    best = [((0, 0, 0), None, 0)] + [None] * quantity
+    for q in range(1, quantity + 1):
+        for range_id, min_quantity, max_quantity in ranges:
+            for pieces in range(1, min(max_quantity, q) + 1):
+                previous = best[q - pieces]
+                if previous is None:
+                    continue
+                boxes, outside, capacity = previous[0]
+                cost = (boxes + 1, outside + (pieces < (min_quantity or 0)), capacity + max_quantity)
+                if best[q] is None or cost < best[q][0]:
+                    best[q] = (cost, range_id, pieces)
+
+    counts = {}
+    if full_boxes:
+        counts[largest[0]] = full_boxes
+    q = quantity
+    while q > 0:
+        _, range_id, pieces = best[q]
+        counts[range_id] = counts.get(range_id, 0) + 1
+        q -= pieces
+
+    capacity = {r[0]: r[2] for r in ranges}
+    return tuple(sorted(counts.items(), key=lambda item: (-capacity[item[0]], item[0])))
+
+
+# --- Invalidation -----------------------------------------------------------
+
+def _touches_packing(session):
+    return any(isinstance(obj, (ConsumableCategory, ConsumableRange))
+               for obj in (*session.new, *session.dirty, *session.deleted))
+
+
+_hooks = CacheInvalidationHooks(
+    'consumable_packing',
+    invalidate=ConsumablePackingCache.invalidate,
+    changed=_touches_packing,
+    bulk_models=(ConsumableCategory, ConsumableRange),
+    tables=(ConsumableCategory.__table__, ConsumableRange.__table__),
+)
+
+
+def register_packing_cache_hooks():
+    """Branche l'invalidation du cache sur la classe de session Flask-SQLAlchemy."""
+    _hooks.register()
@@ -125,9 +125,14 @@ def create_usage():
         
         db.session.add(usage)
         
-        # Ajuster le stock
-        product.stock_consommables = max(0, product.stock_consommables - form.actual_quantity_used.data)
-        db.session.add(product)
+        # Ajuster le stock (sans descendre sous zéro)
+        current_stock = float(product.stock_consommables or 0.0)
+        product.update_stock_by_location(
+            'stock_consommables',
+            max(0.0, current_stock - form.actual_quantity_used.data) - current_stock,
+            movement_type='sortie',
+            reason=f"Utilisation du {form.usage_date.data.strftime('%d/%m/%Y')}"
+        )
         
         db.session.commit()
         
@@ -177,14 +182,21 @@ def create_adjustment():
         db.session.add(adjustment)
         
         # Ajuster le stock selon le type
+        current_stock = float(product.stock_consommables or 0.0)
         if form.adjustment_type.data == 'inventory':
             # Ajustement d'inventaire : remplacer le stock
-            product.stock_consommables = form.quantity_adjusted.data
+            new_stock = form.quantity_adjusted.data
+            movement_type = 'inventaire'
         else:
             # Autres ajustements : ajouter/soustraire
-            product.stock_consommables = max(0, product.stock_consommables + form.quantity_adjusted.data)
+            new_stock = max(0.0, current_stock + form.quantity_adjusted.data)
+            movement_type = 'ajustement_positif' if new_stock >= current_stock else 'ajustement_negatif'
+        product.update_stock_by_location(
+            'stock_consommables', new_stock - current_stock,
+            movement_type=movement_type,
+            reason=form.reason.data
+        )
         
-        db.session.add(product)
         db.session.commit()
         
         flash(f'Ajustement enregistré : {product.name} - {form.quantity_adjusted.data} {product.unit}', 'success')
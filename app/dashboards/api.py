@@ -3,12 +3,13 @@ API Dashboard pour ERP Fée Maison
 Endpoints pour dashboards journalier et mensuel
 """
 
-from flask import Blueprint, jsonify, request, send_file
+from flask import Blueprint, jsonify, request, send_file, url_for
 from flask_login import login_required
 from decorators import admin_required
 from extensions import db
+from app.utils.date_ranges import on_day
 from datetime import datetime, date, timedelta
-from sqlalchemy import func, and_, or_, desc, asc
+from sqlalchemy import func, and_, or_, desc, asc, case
 from decimal import Decimal
 import json
 import logging
@@ -24,11 +25,14 @@ from app.reports.services import (
     DailySalesReportService,
     StockAlertReportService,
     MonthlyProfitLossService,
-    WeeklyProductPerformanceService
+    WeeklyProductPerformanceService,
+    EmployeePerformanceService
 )
+from app.reports.trends import TimeSeriesService
 
 # Import AI Manager (Phase 1 - Intégration IA)
 from app.ai import AIManager
+from app.ai.jobs import AIJobs, run_concurrently
 
 # Logger
 logger = logging.getLogger(__name__)
@@ -152,7 +156,7 @@ def daily_stock():
         
         # Mouvements aujourd'hui (basé sur les commandes)
         today_movements = Order.query.filter(
-            func.date(Order.created_at) == today
+            on_day(Order.created_at, today)
         ).count()
         
         # Métadonnées IA disponibles
@@ -196,7 +200,7 @@ def daily_stock():
         # Utiliser la fonction utilitaire partagée pour garantir la cohérence avec stock overview
         from app.stock.utils import calculate_total_stock_value
         total_stock_value = calculate_total_stock_value()
-        today_movements = Order.query.filter(func.date(Order.created_at) == today).count()
+        today_movements = Order.query.filter(on_day(Order.created_at, today)).count()
         
         def format_product(product):
             return {
@@ -254,17 +258,17 @@ def daily_sales():
         # Fallback sur calcul direct si erreur
         daily_revenue = db.session.query(func.sum(Order.total_amount)).filter(
             and_(
-                func.date(Order.created_at) == today,
+                on_day(Order.created_at, today),
                 Order.status.in_(['delivered', 'completed'])
             )
         ).scalar() or 0
-        total_orders = Order.query.filter(func.date(Order.created_at) == today).count()
+        total_orders = Order.query.filter(on_day(Order.created_at, today)).count()
         growth_rate = 0
         trend_direction = 'stable'
     
     # Commandes du jour (pour répartition par statut)
     daily_orders = Order.query.filter(
-        func.date(Order.created_at) == today
+        on_day(Order.created_at, today)
     ).all()
     
     # Commandes par statut
@@ -281,7 +285,7 @@ def daily_sales():
     
     # Mouvements de caisse aujourd'hui
     today_movements = CashMovement.query.filter(
-        func.date(CashMovement.created_at) == today
+        on_day(CashMovement.created_at, today)
     ).all()
     
     # CashMovement n'a pas d'attribut movement_type, le champ est `type`
@@ -325,7 +329,7 @@ def daily_employees():
     
     # Pointages aujourd'hui
     today_attendance = AttendanceRecord.query.filter(
-        func.date(AttendanceRecord.timestamp) == today
+        on_day(AttendanceRecord.timestamp, today)
     ).all()
     
     # Grouper par employé
@@ -512,56 +516,36 @@ def monthly_revenue_trend():
     # Paramètres
     months = request.args.get('months', type=int, default=12)
     
-    trend_data = []
-    current_date = datetime.now()
+    today = date.today()
+    first_month = today.month - (months - 1)
+    start_date = date(today.year + (first_month - 1) // 12, (first_month - 1) % 12 + 1, 1)
     
-    for i in range(months):
-        # Calculer la date
-        if current_date.month - i <= 0:
-            year = current_date.year - 1
-            month = 12 + (current_date.month - i)
-        else:
-            year = current_date.year
-            month = current_date.month - i
-        
-        start_date = date(year, month, 1)
-        if month == 12:
-            end_date = date(year + 1, 1, 1) - timedelta(days=1)
-        else:
-            end_date = date(year, month + 1, 1) - timedelta(days=1)
-        
-        start_datetime = datetime.combine(start_date, datetime.min.time())
-        end_datetime = datetime.combine(end_date, datetime.max.time())
-        
-        # CA du mois
-        monthly_revenue = db.session.query(func.sum(Order.total_amount)).filter(
-            and_(
-                Order.created_at >= start_datetime,
-                Order.created_at <= end_datetime,
-                Order.status.in_(['delivered', 'completed'])
-            )
-        ).scalar() or 0
-        
-        # Nombre de commandes
-        monthly_orders = Order.query.filter(
-            and_(
-                Order.created_at >= start_datetime,
-                Order.created_at <= end_datetime
-            )
-        ).count()
-        
+    # Une seule requête groupée par mois (CA des commandes livrées + nombre de commandes)
+    series = TimeSeriesService.aggregate(
+        Order.created_at,
+        {
+            'revenue': func.sum(case((Order.status.in_(['delivered', 'completed']), Order.total_amount), else_=0)),
+            'orders': func.count(Order.id)
+        },
+        start_date, today, granularity='month'
+    )
+    
+    trend_data = []
+    for point in series:
+        monthly_revenue = point['revenue']
+        monthly_orders = int(point['orders'])
         trend_data.append({
-            'period': f"{year}-{month:02d}",
-            'year': year,
-            'month': month,
-            'revenue': float(monthly_revenue),
+            'period': point['bucket'].strftime('%Y-%m'),
+            'year': point['bucket'].year,
+            'month': point['bucket'].month,
+            'revenue': monthly_revenue,
             'orders': monthly_orders,
-            'avg_order_value': float(monthly_revenue) / monthly_orders if monthly_orders > 0 else 0
+            'avg_order_value': monthly_revenue / monthly_orders if monthly_orders > 0 else 0
         })
     
     return jsonify({
         'success': True,
-        'data': list(reversed(trend_data))  # Plus ancien au plus récent
+        'data': trend_data  # Plus ancien au plus récent
     })
 
 @dashboard_api.route('/monthly/product-performance', methods=['GET'])
@@ -685,88 +669,9 @@ def monthly_employee_performance():
     year = request.args.get('year', type=int, default=datetime.now().year)
     month = request.args.get('month', type=int, default=datetime.now().month)
     
-    start_date = date(year, month, 1)
-    if month == 12:
-        end_date = date(year + 1, 1, 1) - timedelta(days=1)
-    else:
-        end_date = date(year, month + 1, 1) - timedelta(days=1)
-    
-    start_datetime = datetime.combine(start_date, datetime.min.time())
-    end_datetime = datetime.combine(end_date, datetime.max.time())
-    
-    # Employés actifs
-    active_employees = Employee.query.filter_by(is_active=True).all()
-    
-    employee_performance = []
-    
-    for emp in active_employees:
-        # CA généré par l'employé
-        employee_revenue = db.session.query(func.sum(Order.total_amount))\
-            .join(Order.produced_by)\
-            .filter(
-                and_(
-                    Employee.id == emp.id,
-                    Order.created_at >= start_datetime,
-                    Order.created_at <= end_datetime,
-                    Order.status.in_(['completed', 'delivered'])
-                )
-            ).scalar() or 0
-        
-        # Nombre de commandes produites
-        employee_orders = Order.query.join(Order.produced_by).filter(
-            and_(
-                Employee.id == emp.id,
-                Order.created_at >= start_datetime,
-                Order.created_at <= end_datetime
-            )
-        ).count()
-        
-        # Problèmes de qualité
-        quality_issues = OrderIssue.query.filter(
-            and_(
-                OrderIssue.employee_id == emp.id,
-                OrderIssue.detected_at >= start_datetime,
-                OrderIssue.detected_at <= end_datetime
-            )
-        ).count()
-        
-        # Coût employé
-        employee_cost = emp.get_monthly_salary_cost(year, month)
-        
-        # ROI employé
-        roi = (float(employee_revenue) / employee_cost * 100) if employee_cost > 0 else 0
-        
-        # Taux d'erreur
-        error_rate = (quality_issues / employee_orders * 100) if employee_orders > 0 else 0
-        
-        employee_performance.append({
-            'id': emp.id,
-            'name': emp.name,
-            'role': emp.get_role_display(),
-            'revenue_generated': float(employee_revenue),
-            'orders_produced': employee_orders,
-            'quality_issues': quality_issues,
-            'error_rate': error_rate,
-            'monthly_cost': employee_cost,
-            'roi': roi,
-            'avg_order_value': float(employee_revenue) / employee_orders if employee_orders > 0 else 0
-        })
-    
-    # Trier par ROI
-    employee_performance.sort(key=lambda x: x['roi'], reverse=True)
-    
     return jsonify({
         'success': True,
-        'data': {
-            'employees': employee_performance,
-            'summary': {
-                'total_employees': len(active_employees),
-                'total_revenue': sum(e['revenue_generated'] for e in employee_performance),
-                'total_cost': sum(e['monthly_cost'] for e in employee_performance),
-                'avg_roi': sum(e['roi'] for e in employee_performance) / len(employee_performance) if employee_performance else 0,
-                'avg_error_rate': sum(e['error_rate'] for e in employee_performance) / len(employee_performance) if employee_performance else 0
-            }
-        }
+        'data': EmployeePerformanceService.monthly(year, month)
     })
 
 # ==========================================
@@ -789,6 +694,45 @@ def refresh_dashboard():
 # ENDPOINTS IA (PHASE 1)
 # ==========================================
 
+# Analyses des insights quotidiens : (rapport, prompt, message hors ligne)
+DAILY_INSIGHTS = {
+    'sales': ('daily_sales', 'daily_analysis',
+              'Analyse IA indisponible pour les ventes (mode hors ligne)',
+              'Consultez les rapports standards pour plus de détails.'),
+    'stock': ('daily_stock_alerts', 'anomaly_detection',
+              'Analyse IA indisponible pour le stock (mode hors ligne)',
+              'Consultez les alertes stock standards.'),
+    'production': ('daily_production', 'daily_analysis',
+                   'Analyse IA indisponible pour la production (mode hors ligne)',
+                   'Consultez les rapports de production standards.'),
+}
+
+
+def _build_daily_insights():
+    """Insights IA quotidiens : les trois analyses tournent en parallèle, une analyse
+    en échec ou hors délai est remplacée par un message de repli."""
+    ai_manager = AIManager()
+
+    def fallback(key, error):
+        logger.warning(f"[AI] {key} analysis failed: {error}")
+        return {
+            'status': 'fallback',
+            'message': DAILY_INSIGHTS[key][2],
+            'analysis': DAILY_INSIGHTS[key][3]
+        }
+
+    insights = run_concurrently(
+        {
+            key: (lambda report_name=report_name, prompt_type=prompt_type:
+                  ai_manager.analyze_reports(report_name, prompt_type=prompt_type))
+            for key, (report_name, prompt_type, _, _) in DAILY_INSIGHTS.items()
+        },
+        on_error=fallback
+    )
+    insights['timestamp'] = datetime.utcnow().isoformat()
+    return insights
+
+
 @dashboard_api.route('/daily/ai-insights', methods=['GET'])
 @login_required
 @admin_required
@@ -796,61 +740,25 @@ def daily_ai_insights():
     """Analyses IA pour le dashboard journalier (multi-rapports)
     
     PHASE 1 - Intégration app/ai : Analyse LLM des rapports quotidiens
+    
+    ?mode=async : lance l'analyse en tâche de fond et répond 202 avec
+    l'identifiant à interroger sur /dashboards/api/ai/jobs/<job_id>
     """
     try:
-        ai_manager = AIManager()
         logger.info("[AI] Requesting daily AI insights")
         
-        # Analyse multi-rapports (ventes, stock, production)
-        insights = {
-            'sales': None,
-            'stock': None,
-            'production': None,
-            'timestamp': datetime.utcnow().isoformat()
-        }
-        
-        # Analyse ventes
-        try:
-            sales_analysis = ai_manager.analyze_reports('daily_sales', prompt_type='daily_analysis')
-            insights['sales'] = sales_analysis
-            logger.info("[AI] Sales analysis completed")
-        except Exception as e:
-            logger.warning(f"[AI] Sales analysis failed: {e}")
-            insights['sales'] = {
-                'status': 'fallback',
-                'message': 'Analyse IA indisponible pour les ventes (mode hors ligne)',
-                'analysis': 'Consultez les rapports standards pour plus de détails.'
-            }
-        
-        # Analyse stock (détection anomalies)
-        try:
-            stock_analysis = ai_manager.analyze_reports('daily_stock_alerts', prompt_type='anomaly_detection')
-            insights['stock'] = stock_analysis
-            logger.info("[AI] Stock analysis completed")
-        except Exception as e:
-            logger.warning(f"[AI] Stock analysis failed: {e}")
-            insights['stock'] = {
-                'status': 'fallback',
-                'message': 'Analyse IA indisponible pour le stock (mode hors ligne)',
-                'analysis': 'Consultez les alertes stock standards.'
-            }
-        
-        # Analyse production
-        try:
-            production_analysis = ai_manager.analyze_reports('daily_production', prompt_type='daily_analysis')
-            insights['production'] = production_analysis
-            logger.info("[AI] Production analysis completed")
-        except Exception as e:
-            logger.warning(f"[AI] Production analysis failed: {e}")
-            insights['production'] = {
-                'status': 'fallback',
-                'message': 'Analyse IA indisponible pour la production (mode hors ligne)',
-                'analysis': 'Consultez les rapports de production standards.'
-            }
+        if request.args.get('mode') == 'async':
+            job_id = AIJobs.submit('daily_ai_insights', _build_daily_insights)
+            return jsonify({
+                'success': True,
+                'job_id': job_id,
+                'status_url': url_for('dashboards.dashboard_api.ai_job_status', job_id=job_id),
+                'timestamp': datetime.utcnow().isoformat()
+            }), 202
         
         return jsonify({
             'success': True,
-            'data': insights,
+            'data': _build_daily_insights(),
             'source': 'ai_manager',
             'timestamp': datetime.utcnow().isoformat()
         })
@@ -864,6 +772,23 @@ def daily_ai_insights():
             'timestamp': datetime.utcnow().isoformat()
         }), 500
 
+@dashboard_api.route('/ai/jobs/<job_id>', methods=['GET'])
+@login_required
+@admin_required
+def ai_job_status(job_id):
+    """État d'une tâche IA de fond (pending, running, done, error) et son résultat"""
+    job = AIJobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Tâche inconnue ou expirée'}), 404
+    
+    return jsonify({
+        'success': job['status'] != 'error',
+        'status': job['status'],
+        'data': job['result'],
+        'error': job['error'],
+        'timestamp': datetime.utcnow().isoformat()
+    })
+
 @dashboard_api.route('/daily/sales-forecast', methods=['GET'])
 @login_required
 @admin_required
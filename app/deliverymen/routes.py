@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required
 from app.deliverymen.models import Deliveryman
 from extensions import db
+from app.utils.date_ranges import in_period
 from models import Order
 from datetime import datetime, date, timedelta
 from sqlalchemy import func
@@ -119,8 +120,7 @@ def deliverymen_dashboard():
     
     # Filtrer par période (sur due_date qui est la date de livraison)
     query = query.filter(
-        func.date(Order.due_date) >= start_date,
-        func.date(Order.due_date) <= end_date
+        in_period(Order.due_date, start_date, end_date)
     )
     
     # Filtrer par livreur si spécifié
@@ -0,0 +1,215 @@
+"""
+Résumés de présence quotidiens (attendance_summaries)
+Module: app/employees/attendance_summary.py
+
+Le coût de main d'œuvre du jour, le bloc présence du tableau de bord et le
+dashboard des pointages rechargeaient tous les pointages du jour puis
+l'employé de chaque pointage (AttendanceRecord.get_daily_summary). Un
+résumé par employé et par jour est désormais maintenu à chaque pointage :
+
+- arrivée (premier IN), départ (dernier OUT), nombre de pointages,
+- heures = dernier OUT - premier IN (0 si incomplet), réparties en
+  worked_hours (8 h maximum) et overtime_hours : leur somme est la durée de
+  présence, comme dans get_daily_summary,
+- status : 'present' si le dernier pointage est une entrée, sinon 'absent'
+  (is_present / is_absent en sont dérivés).
+
+Chaque flush qui ajoute, modifie ou supprime un pointage marque les
+(employé, jour) concernés, recalculés juste avant le commit ; l'import en
+lot (INSERT sans ORM) les marque lui-même via mark_days().
+"""
+
+from datetime import date, datetime, timedelta
+from itertools import chain
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import attributes
+
+from extensions import db
+from app.employees.models import AttendanceRecord, AttendanceSummary
+from app.utils.session_hooks import DeferredRefreshHooks
+
+
+# Au-delà, les heures du jour sont des heures supplémentaires
+DAILY_REGULAR_HOURS = 8
+
+_PUNCH_TYPES = {'in': 'in', 0: 'in', '0': 'in', 'out': 'out', 1: 'out', '1': 'out'}
+
+
+def _day_values(punches):
+    """Champs du résumé d'une journée à partir de ses pointages triés."""
+    in_times = [timestamp for timestamp, punch_type in punches if _PUNCH_TYPES.get(punch_type) == 'in']
+    out_times = [timestamp for timestamp, punch_type in punches if _PUNCH_TYPES.get(punch_type) == 'out']
+    first_in = min(in_times) if in_times else None
+    last_out = max(out_times) if out_times else None
+
+    total_hours = 0.0
+    if first_in and last_out and last_out > first_in:
+        total_hours = round((last_out - first_in).total_seconds() / 3600, 2)
+    worked_hours = min(total_hours, DAILY_REGULAR_HOURS)
+    status = 'present' if _PUNCH_TYPES.get(punches[-1][1]) == 'in' else 'absent'
+
+    return {
+        'worked_hours': worked_hours,
+        'overtime_hours': round(total_hours - worked_hours, 2),
+        'arrived_at': first_in.time() if first_in else None,
+        'left_at': last_out.time() if last_out else None,
+        'status': status,
+        'punch_count': len(punches),
+        'is_present': status == 'present',
+        'is_absent': status == 'absent',
+    }
+
+
+class AttendanceSummaryService:
+    """Maintenance et lecture des résumés de présence"""
+
+    @staticmethod
+    def refresh(keys):
+        """
+        Recalcule les résumés de plusieurs (employee_id, jour) en deux lectures.
+        Un jour sans pointage perd son résumé.
+
+        Returns:
+            int: nombre de résumés écrits ou supprimés
+        """
+        keys = {(employee_id, day) for employee_id, day in keys if employee_id and day}
+        if not keys:
+            return 0
+        employee_ids = {employee_id for employee_id, _ in keys}
+        first_day = min(day for _, day in keys)
+        last_day = max(day for _, day in keys)
+
+        punches = {}
+        rows = db.session.execute(
+            select(AttendanceRecord.employee_id, AttendanceRecord.timestamp, AttendanceRecord.punch_type)
+            .where(AttendanceRecord.employee_id.in_(employee_ids),
+                   AttendanceRecord.timestamp >= datetime.combine(first_day, datetime.min.time()),
+                   AttendanceRecord.timestamp < datetime.combine(last_day + timedelta(days=1), datetime.min.time()))
+            .order_by(AttendanceRecord.timestamp, AttendanceRecord.id)
+        )
+        for employee_id, timestamp, punch_type in rows:
+            key = (employee_id, timestamp.date())
+            if key in keys:
+                punches.setdefault(key, []).append((timestamp, punch_type))
+
+        existing = dict(
+            ((employee_id, work_date), summary_id)
+            for summary_id, employee_id, work_date in db.session.execute(
+                select(AttendanceSummary.id, AttendanceSummary.employee_id, AttendanceSummary.work_date)
+                .where(AttendanceSummary.employee_id.in_(employee_ids),
+                       AttendanceSummary.work_date >= first_day,
+                       AttendanceSummary.work_date <= last_day)
+            )
+        )
+
+        # Écritures en lot : un INSERT, un UPDATE et un DELETE au plus
+        inserts, updates, deleted_ids = [], [], []
+        for key in keys:
+            summary_id = existing.get(key)
+            day_punches = punches.get(key)
+            if not day_punches:
+                if summary_id is not None:
+                    deleted_ids.append(summary_id)
+                continue
+            values = _day_values(day_punches)
+            if summary_id is None:
+                inserts.append({'employee_id': key[0], 'work_date': key[1], **values})
+            else:
+                updates.append({'id': summary_id, **values})
+
+        if inserts:
+            db.session.execute(insert(AttendanceSummary), inserts)
+        if updates:
+            db.session.execute(update(AttendanceSummary), updates)
+        if deleted_ids:
+            db.session.execute(
+                delete(AttendanceSummary).where(AttendanceSummary.id.in_(deleted_ids)),
+                execution_options={'synchronize_session': False}
+            )
+        return len(inserts) + len(updates) + len(deleted_ids)
+
+    @staticmethod
+    def rebuild(start_date, end_date):
+        """Recalcule tous les résumés d'une période (reprise de l'historique)."""
+        keys = {
+            (employee_id, timestamp.date())
+            for employee_id, timestamp in db.session.execute(
+                select(AttendanceRecord.employee_id, AttendanceRecord.timestamp).where(
+                    AttendanceRecord.timestamp >= datetime.combine(start_date, datetime.min.time()),
+                    AttendanceRecord.timestamp < datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+                )
+            )
+        }
+        # Résumés orphelins (pointages supprimés hors ORM)
+        keys.update(db.session.execute(
+            select(AttendanceSummary.employee_id, AttendanceSummary.work_date).where(
+                AttendanceSummary.work_date >= start_date, AttendanceSummary.work_date <= end_date
+            )
+        ).all())
+        return AttendanceSummaryService.refresh(keys)
+
+    @staticmethod
+    def for_day(target_date):
+        """
+        Résumés d'un jour avec leur employé, en une requête.
+
+        Returns:
+            dict: {employee_id: {'employee', 'summary', 'first_in', 'last_out', 'total_hours', 'status'}}
+        """
+        summaries = AttendanceSummary.query.options(db.joinedload(AttendanceSummary.employee)).filter(
+            AttendanceSummary.work_date == target_date
+        ).order_by(AttendanceSummary.arrived_at, AttendanceSummary.employee_id).all()
+        return {
+            summary.employee_id: {
+                'employee': summary.employee,
+                'summary': summary,
+                'first_in': summary.arrived_at,
+                'last_out': summary.left_at,
+                'total_hours': summary.total_hours,
+                'status': summary.status,
+            }
+            for summary in summaries
+        }
+
+
+def mark_days(keys, session=None):
+    """Marque des (employee_id, jour) à recalculer au prochain commit (INSERT hors ORM)."""
+    _hooks.pending(session or db.session).update(
+        (employee_id, day.date() if isinstance(day, datetime) else day) for employee_id, day in keys
+    )
+
+
+# ============================================================================
+# MAINTENANCE INCRÉMENTALE (événements de session)
+# ============================================================================
+
+def _collect_dirty_days(session, pending):
+    """after_flush : repère les (employé, jour) dont le résumé doit être recalculé."""
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if not isinstance(obj, AttendanceRecord):
+            continue
+        # Valeurs actuelles et anciennes (pointage déplacé ou réattribué)
+        employee_ids = attributes.get_history(obj, 'employee_id').sum() or [obj.employee_id]
+        timestamps = attributes.get_history(obj, 'timestamp').sum() or [obj.timestamp]
+        for employee_id in employee_ids:
+            for timestamp in timestamps:
+                if employee_id and isinstance(timestamp, (date, datetime)):
+                    pending.add((employee_id, timestamp.date() if isinstance(timestamp, datetime) else timestamp))
+
+
+# SAVEPOINT : un échec du recalcul ne doit jamais bloquer un pointage.
+# Ancien jour / ancien employé nécessaires pour recalculer le résumé quitté.
+_hooks = DeferredRefreshHooks(
+    'attendance_summary',
+    new_pending=set,
+    collect=_collect_dirty_days,
+    refresh=lambda session, keys: AttendanceSummaryService.refresh(keys),
+    history_attributes=(AttendanceRecord.employee_id, AttendanceRecord.timestamp),
+    failure_message="attendance_summaries non mis à jour ({error}) - lancer `flask rebuild-attendance-summaries`",
+)
+
+
+def register_attendance_summary_hooks():
+    """Branche la maintenance incrémentale sur la classe de session Flask-SQLAlchemy."""
+    _hooks.register()
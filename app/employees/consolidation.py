@@ -0,0 +1,252 @@
+"""
+Consolidation mensuelle des heures de tous les employés
+Module: app/employees/consolidation.py
+
+api_consolidate_hours et la page de consolidation traitaient un employé à
+la fois (une requête par employé, boucles Python par pointage). Ici le mois
+entier est chargé en une requête pour tous les employés et les règles de
+paie sont appliquées par regroupement pandas :
+
+- heures du jour = dernière sortie - première entrée (si sortie > entrée),
+- vendredi : heures doublées, plafond normal de 16 h au lieu de 8 h,
+- jours payés : 1 par jour travaillé, 2 le vendredi (sauf jour off),
+  + 1 jour off payé par semaine ISO d'au moins 6 jours travaillés,
+- absences : jours attendus par semaine (6 avec jour off, sinon 7) moins
+  jours travaillés, sur chaque semaine ISO touchant le mois.
+
+Les résultats sont identiques à ceux de api_consolidate_hours ; ils sont
+écrits en lot dans WorkHours (mois) ; les AttendanceSummary des jours
+pointés sont recalculés au passage.
+"""
+
+from calendar import monthrange
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+
+from extensions import db
+from app.utils.date_ranges import in_period
+from app.employees.attendance_summary import AttendanceSummaryService
+from app.employees.models import AttendanceRecord, Employee, SalaryAdvance, WorkHours
+
+
+DAY_NAMES = ['lundi', 'mardi', 'mercredi', 'jeudi', 'vendredi', 'samedi', 'dimanche']
+FRIDAY = 4
+DAILY_MAX_HOURS = 8
+FRIDAY_MAX_HOURS = 16
+# Jours travaillés dans la semaine donnant droit au jour off payé
+PAID_DAY_OFF_MIN_DAYS = 6
+
+DAILY_COLUMNS = ['employee_id', 'work_date', 'first_in', 'last_out', 'worked', 'hours',
+                 'regular_hours', 'overtime_hours', 'paid_days', 'week']
+
+
+def day_off_from_schedule(schedule):
+    """Jour off (0=lundi ... 6=dimanche) : jour inactif des horaires, sinon None."""
+    day_off = None
+    if schedule:
+        for day_name, config in schedule.items():
+            if not config.get('active', True):
+                try:
+                    day_off = DAY_NAMES.index(day_name.lower())
+                except ValueError:
+                    pass
+    return day_off
+
+
+class PayrollConsolidationService:
+    """Consolidation des pointages d'un mois pour tous les employés"""
+
+    @staticmethod
+    def month_bounds(year, month):
+        return date(year, month, 1), date(year, month, monthrange(year, month)[1])
+
+    @staticmethod
+    def load_punches(start_date, end_date, employee_ids=None):
+        """Pointages de la période en une requête (DataFrame employee_id, timestamp, punch_type)."""
+        query = select(AttendanceRecord.employee_id, AttendanceRecord.timestamp, AttendanceRecord.punch_type).where(
+            in_period(AttendanceRecord.timestamp, start_date, end_date)
+        )
+        if employee_ids is not None:
+            query = query.where(AttendanceRecord.employee_id.in_(employee_ids))
+        rows = db.session.execute(query).all()
+        punches = pd.DataFrame(rows, columns=['employee_id', 'timestamp', 'punch_type'])
+        punches['timestamp'] = pd.to_datetime(punches['timestamp'])
+        return punches
+
+    @staticmethod
+    def daily_frame(punches, day_offs):
+        """
+        Une ligne par (employé, jour pointé) avec les heures et jours payés du jour.
+
+        Args:
+            punches: DataFrame de load_punches
+            day_offs: {employee_id: jour off ou None}
+        """
+        if punches.empty:
+            return pd.DataFrame(columns=DAILY_COLUMNS)
+
+        punches = punches.assign(work_date=punches['timestamp'].dt.normalize())
+        keys = ['employee_id', 'work_date']
+        days = punches.groupby(keys).size().rename('records').to_frame()
+        days['first_in'] = punches[punches['punch_type'] == 'in'].groupby(keys)['timestamp'].min()
+        days['last_out'] = punches[punches['punch_type'] == 'out'].groupby(keys)['timestamp'].max()
+        days = days.reset_index()
+
+        days['worked'] = days['first_in'].notna() & days['last_out'].notna() & (days['last_out'] > days['first_in'])
+        hours = ((days['last_out'] - days['first_in']).dt.total_seconds() / 3600).where(days['worked'], 0.0)
+        days['hours'] = hours
+
+        weekday = days['work_date'].dt.weekday
+        day_off = days['employee_id'].map(lambda employee_id: day_offs.get(employee_id))
+        is_friday = (weekday == FRIDAY).to_numpy()
+        is_day_off = (weekday == day_off).to_numpy()
+
+        # Vendredi : heures doublées, plafond normal doublé ; jour off : heures normales
+        paid_hours = np.where(is_friday, hours * 2, hours)
+        daily_max = np.where(is_friday, FRIDAY_MAX_HOURS, DAILY_MAX_HOURS)
+        days['regular_hours'] = np.minimum(paid_hours, daily_max)
+        days['overtime_hours'] = np.maximum(paid_hours - daily_max, 0.0)
+        days['paid_days'] = np.where(days['worked'], np.where(is_friday & ~is_day_off, 2, 1), 0)
+        days['week'] = days['work_date'].dt.isocalendar().week.astype(int)
+        return days[DAILY_COLUMNS]
+
+    @staticmethod
+    def consolidate(year, month, employee_ids=None):
+        """
+        Heures et jours payés du mois.
+
+        Args:
+            employee_ids: employés à consolider (défaut : tous les employés actifs)
+
+        Returns:
+            tuple: ({employee_id: résultat}, DataFrame des jours)
+        """
+        start_date, end_date = PayrollConsolidationService.month_bounds(year, month)
+        employee_query = Employee.query
+        if employee_ids is None:
+            employee_query = employee_query.filter(Employee.is_active == True)
+        else:
+            employee_query = employee_query.filter(Employee.id.in_(employee_ids))
+        employees = employee_query.order_by(Employee.id).all()
+        if not employees:
+            return {}, pd.DataFrame(columns=DAILY_COLUMNS)
+
+        day_offs = {employee.id: day_off_from_schedule(employee.get_work_schedule()) for employee in employees}
+        punches = PayrollConsolidationService.load_punches(start_date, end_date, list(day_offs))
+        daily = PayrollConsolidationService.daily_frame(punches, day_offs)
+        worked = daily[daily['worked'].astype(bool)]
+
+        # Semaines ISO touchant le mois × employés
+        weeks = sorted({(start_date + timedelta(days=i)).isocalendar()[1]
+                        for i in range((end_date - start_date).days + 1)})
+        grid = pd.MultiIndex.from_product([list(day_offs), weeks], names=['employee_id', 'week'])
+        weekly = worked.groupby(['employee_id', 'week']).agg(
+            days=('worked', 'size'), paid=('paid_days', 'sum')
+        ).reindex(grid, fill_value=0).reset_index()
+
+        expected = weekly['employee_id'].map(lambda employee_id: 6 if day_offs[employee_id] is not None else 7)
+        weekly['paid'] += (weekly['days'] >= PAID_DAY_OFF_MIN_DAYS).astype(int)
+        weekly['absences'] = (expected - weekly['days']).clip(lower=0)
+        by_employee = weekly.groupby('employee_id')[['paid', 'absences']].sum()
+
+        totals = worked.groupby('employee_id').agg(
+            regular_hours=('regular_hours', 'sum'), overtime_hours=('overtime_hours', 'sum'),
+            days_worked=('worked', 'size')
+        ).reindex(list(day_offs), fill_value=0)
+
+        results = {}
+        for employee in employees:
+            row = totals.loc[employee.id]
+            results[employee.id] = {
+                'employee_id': employee.id,
+                'employee': employee.name,
+                'regular_hours': round(float(row['regular_hours']), 2),
+                'overtime_hours': round(float(row['overtime_hours']), 2),
+                'days_worked': int(row['days_worked']),
+                'paid_days': int(by_employee.loc[employee.id, 'paid']),
+                'expected_days_per_week': 6 if day_offs[employee.id] is not None else 7,
+                'other_absences': int(by_employee.loc[employee.id, 'absences']),
+            }
+        return results, daily
+
+    @staticmethod
+    def save_work_hours(year, month, results, created_by=None):
+        """
+        Écrit les heures du mois dans WorkHours (mise à jour ou création) avec
+        les avances de la période, en deux requêtes de lecture.
+
+        Returns:
+            dict: {employee_id: 'créé' | 'mis à jour'}
+        """
+        employee_ids = list(results)
+        if not employee_ids:
+            return {}
+        existing = {
+            work_hours.employee_id: work_hours
+            for work_hours in WorkHours.query.filter(
+                WorkHours.employee_id.in_(employee_ids),
+                WorkHours.period_month == month,
+                WorkHours.period_year == year
+            )
+        }
+        advances = dict(db.session.execute(
+            select(SalaryAdvance.employee_id, func.sum(SalaryAdvance.amount))
+            .where(SalaryAdvance.employee_id.in_(employee_ids),
+                   SalaryAdvance.period_month == month,
+                   SalaryAdvance.period_year == year)
+            .group_by(SalaryAdvance.employee_id)
+        ).all())
+
+        actions = {}
+        now = datetime.utcnow()
+        for employee_id, result in results.items():
+            total_advances = float(advances.get(employee_id) or 0)
+            result['advances'] = total_advances
+            work_hours = existing.get(employee_id)
+            if work_hours:
+                work_hours.regular_hours = result['regular_hours']
+                work_hours.overtime_hours = result['overtime_hours']
+                work_hours.other_absences = result['other_absences']
+                work_hours.advance_deduction = total_advances
+                work_hours.updated_at = now
+                actions[employee_id] = "mis à jour"
+            else:
+                db.session.add(WorkHours(
+                    employee_id=employee_id,
+                    period_month=month,
+                    period_year=year,
+                    regular_hours=result['regular_hours'],
+                    overtime_hours=result['overtime_hours'],
+                    other_absences=result['other_absences'],
+                    advance_deduction=total_advances,
+                    created_by=created_by
+                ))
+                actions[employee_id] = "créé"
+        return actions
+
+    @staticmethod
+    def save_attendance_summaries(daily):
+        """
+        Recalcule l'AttendanceSummary de chaque jour pointé (durée de présence
+        brute ; les règles de paie ne s'appliquent qu'à WorkHours).
+
+        Returns:
+            int: nombre de résumés écrits
+        """
+        if daily.empty:
+            return 0
+        keys = zip(daily['employee_id'].astype(int).tolist(), daily['work_date'].dt.date)
+        return AttendanceSummaryService.refresh(keys)
+
+    @staticmethod
+    def run(year, month, employee_ids=None, created_by=None, commit=True):
+        """Consolide et enregistre le mois ; retourne la liste des résultats par employé."""
+        results, daily = PayrollConsolidationService.consolidate(year, month, employee_ids)
+        actions = PayrollConsolidationService.save_work_hours(year, month, results, created_by=created_by)
+        PayrollConsolidationService.save_attendance_summaries(daily)
+        if commit:
+            db.session.commit()
+        return [{**result, 'action': actions[employee_id]} for employee_id, result in results.items()]
@@ -7,6 +7,7 @@ Modèles pour la gestion des employés et RH
 from datetime import datetime, date, time
 from decimal import Decimal
 from extensions import db
+from app.utils.date_ranges import on_day, in_period
 from sqlalchemy import UniqueConstraint, Index
 import json
 
@@ -16,6 +17,41 @@ order_employees = db.Table('order_employees',
     db.Column('employee_id', db.Integer, db.ForeignKey('employees.id'), primary_key=True)
 )
 
+def work_hours_from_records(records):
+    """Heures travaillées d'une journée : premier IN → dernier OUT (0 si incomplet)"""
+    # Mapping pour normaliser les punch_type (ZKTeco envoie parfois 0/1 au lieu de in/out)
+    def normalize_punch_type(pt):
+        if pt in ('in', 0, '0'):
+            return 'in'
+        elif pt in ('out', 1, '1'):
+            return 'out'
+        return pt
+    
+    # Séparer les pointages IN et OUT
+    in_times = []
+    out_times = []
+    
+    for record in records:
+        punch = normalize_punch_type(record.punch_type)
+        if punch == 'in':
+            in_times.append(record.timestamp)
+        elif punch == 'out':
+            out_times.append(record.timestamp)
+    
+    # Méthode robuste: Premier IN + Dernier OUT
+    total_hours = 0
+    if in_times and out_times:
+        first_in = min(in_times)
+        last_out = max(out_times)
+        
+        # S'assurer que la sortie est après l'entrée
+        if last_out > first_in:
+            duration = last_out - first_in
+            total_hours = duration.total_seconds() / 3600
+    
+    return round(total_hours, 2)
+
+
 class Employee(db.Model):
     __tablename__ = 'employees'
     
@@ -192,20 +228,19 @@ class Employee(db.Model):
         from datetime import date
         today = date.today()
         return self.attendance_records.filter(
-            db.func.date(AttendanceRecord.timestamp) == today
+            on_day(AttendanceRecord.timestamp, today)
         ).order_by(AttendanceRecord.timestamp).all()
     
     def get_attendance_for_date(self, target_date):
         """Récupère les pointages pour une date donnée"""
         return self.attendance_records.filter(
-            db.func.date(AttendanceRecord.timestamp) == target_date
+            on_day(AttendanceRecord.timestamp, target_date)
         ).order_by(AttendanceRecord.timestamp).all()
     
     def get_attendance_for_period(self, start_date, end_date):
         """Récupère les pointages pour une période donnée"""
         return self.attendance_records.filter(
-            db.func.date(AttendanceRecord.timestamp) >= start_date,
-            db.func.date(AttendanceRecord.timestamp) <= end_date
+            in_period(AttendanceRecord.timestamp, start_date, end_date)
         ).order_by(AttendanceRecord.timestamp).all()
     
     def get_current_status(self):
@@ -219,56 +254,31 @@ class Employee(db.Model):
     
     def get_work_hours_for_date(self, target_date):
         """Calcule les heures travaillées pour une date donnée"""
-        records = self.get_attendance_for_date(target_date)
-        total_hours = 0
-        
-        # Mapping pour normaliser les punch_type (ZKTeco envoie parfois 0/1 au lieu de in/out)
-        def normalize_punch_type(pt):
-            if pt in ('in', 0, '0'):
-                return 'in'
-            elif pt in ('out', 1, '1'):
-                return 'out'
-            return pt
-        
-        # Séparer les pointages IN et OUT
-        in_times = []
-        out_times = []
-        
-        for record in records:
-            punch = normalize_punch_type(record.punch_type)
-            if punch == 'in':
-                in_times.append(record.timestamp)
-            elif punch == 'out':
-                out_times.append(record.timestamp)
-        
-        # Méthode robuste: Premier IN + Dernier OUT
-        if in_times and out_times:
-            first_in = min(in_times)
-            last_out = max(out_times)
-            
-            # S'assurer que la sortie est après l'entrée
-            if last_out > first_in:
-                duration = last_out - first_in
-                total_hours = duration.total_seconds() / 3600
-        
-        return round(total_hours, 2)
+        return work_hours_from_records(self.get_attendance_for_date(target_date))
+    
+    def _attendance_by_day(self, start_date, end_date):
+        """Pointages de la période groupés par jour (une seule requête)"""
+        by_day = {}
+        for record in self.get_attendance_for_period(start_date, end_date):
+            by_day.setdefault(record.timestamp.date(), []).append(record)
+        return by_day
     
     def get_weekly_attendance_summary(self):
         """Résumé de présence de la semaine"""
         from datetime import date, timedelta
         today = date.today()
         week_start = today - timedelta(days=today.weekday())
+        by_day = self._attendance_by_day(week_start, week_start + timedelta(days=6))
         
         summary = []
         for i in range(7):
             day = week_start + timedelta(days=i)
-            records = self.get_attendance_for_date(day)
-            hours = self.get_work_hours_for_date(day)
+            records = by_day.get(day, [])
             
             summary.append({
                 'date': day,
                 'records_count': len(records),
-                'hours_worked': hours,
+                'hours_worked': work_hours_from_records(records),
                 'status': 'present' if records else 'absent'
             })
         
@@ -276,23 +286,16 @@ class Employee(db.Model):
     
     def get_monthly_attendance_stats(self, year, month):
         """Statistiques de présence pour un mois"""
-        from datetime import date, timedelta
+        from datetime import date
         import calendar
         
         start_date = date(year, month, 1)
         end_date = date(year, month, calendar.monthrange(year, month)[1])
         
         total_days = (end_date - start_date).days + 1
-        present_days = 0
-        total_hours = 0
-        
-        current_date = start_date
-        while current_date <= end_date:
-            records = self.get_attendance_for_date(current_date)
-            if records:
-                present_days += 1
-                total_hours += self.get_work_hours_for_date(current_date)
-            current_date += timedelta(days=1)
+        by_day = self._attendance_by_day(start_date, end_date)
+        present_days = len(by_day)
+        total_hours = sum(work_hours_from_records(records) for records in by_day.values())
         
         return {
             'total_days': total_days,
@@ -325,8 +328,9 @@ class AttendanceRecord(db.Model):
     processed = db.Column(db.Boolean, default=False)
     
     # Index pour optimiser les requêtes
+    # (l'unicité employé + horodatage sert aussi d'index employé/date et rend l'import idempotent)
     __table_args__ = (
-        db.Index('idx_employee_date', 'employee_id', 'timestamp'),
+        db.UniqueConstraint('employee_id', 'timestamp', name='uq_attendance_employee_timestamp'),
         db.Index('idx_date_punch', 'timestamp', 'punch_type'),
     )
     
@@ -367,7 +371,7 @@ class AttendanceRecord(db.Model):
     def get_daily_summary(target_date):
         """Récupère un résumé des pointages pour une date"""
         records = AttendanceRecord.query.filter(
-            db.func.date(AttendanceRecord.timestamp) == target_date
+            on_day(AttendanceRecord.timestamp, target_date)
         ).order_by(AttendanceRecord.timestamp).all()
         
         summary = {}
@@ -468,10 +472,18 @@ class AttendanceSummary(db.Model):
     # Status
     is_present = db.Column(db.Boolean, default=True)
     is_absent = db.Column(db.Boolean, default=False)
+    # 'present' si le dernier pointage du jour est une entrée (en cours), sinon 'absent'
+    status = db.Column(db.String(20), nullable=True)
+    punch_count = db.Column(db.Integer, default=0)
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    @property
+    def total_hours(self):
+        """Heures de présence du jour (premier IN → dernier OUT)"""
+        return round(float(self.worked_hours or 0) + float(self.overtime_hours or 0), 2)
+    
     # Contrainte unique : un seul résumé par employé par jour
     __table_args__ = (
         UniqueConstraint('employee_id', 'work_date', name='uq_attendance_summary_employee_date'),
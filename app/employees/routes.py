@@ -7,7 +7,9 @@ Routes pour la gestion des employés
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from flask_login import login_required, current_user
 from extensions import db
+from app.utils.date_ranges import on_day, in_period
 from app.employees.models import Employee, AttendanceRecord
+from app.employees.attendance_summary import AttendanceSummaryService
 from app.employees.forms import EmployeeForm, EmployeeSearchForm, WorkScheduleForm, AnalyticsPeriodForm, WorkHoursForm, PayrollCalculationForm
 from decorators import admin_required
 from datetime import datetime, timedelta, date
@@ -274,8 +276,8 @@ def attendance_dashboard():
     else:
         selected_date = date.today()
     
-    # Récupérer le résumé des pointages du jour
-    daily_summary = AttendanceRecord.get_daily_summary(selected_date)
+    # Résumés de présence du jour (une ligne par employé, maintenue à chaque pointage)
+    daily_summary = AttendanceSummaryService.for_day(selected_date)
     
     # Statistiques générales
     total_employees = Employee.query.filter(Employee.is_active == True).count()
@@ -319,7 +321,7 @@ def live_attendance():
     # Récupérer les pointages d'aujourd'hui
     today = date.today()
     today_records = AttendanceRecord.query.filter(
-        db.func.date(AttendanceRecord.timestamp) == today
+        on_day(AttendanceRecord.timestamp, today)
     ).order_by(AttendanceRecord.timestamp.desc()).limit(50).all()
     
     # Statut actuel de tous les employés
@@ -408,7 +410,7 @@ def api_attendance_today():
     
     # Récupérer tous les pointages du jour
     records = AttendanceRecord.query.filter(
-        db.func.date(AttendanceRecord.timestamp) == today
+        on_day(AttendanceRecord.timestamp, today)
     ).order_by(AttendanceRecord.timestamp.desc()).all()
     
     result = {
@@ -1177,8 +1179,7 @@ def api_consolidate_hours():
         # Récupérer les pointages pour ce mois
         records = AttendanceRecord.query.filter(
             AttendanceRecord.employee_id == employee_id,
-            db.func.date(AttendanceRecord.timestamp) >= start_date,
-            db.func.date(AttendanceRecord.timestamp) <= end_date
+            in_period(AttendanceRecord.timestamp, start_date, end_date)
         ).order_by(AttendanceRecord.timestamp).all()
         
         # Grouper par jour
@@ -1284,13 +1285,51 @@ def api_consolidate_hours():
         }), 500
 
 
+@employees_bp.route('/api/consolidate-hours/all', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def api_consolidate_hours_all():
+    """API de consolidation des heures de tous les employés actifs (AJAX)
+    
+    GET : calcul seul ; POST : calcul et enregistrement dans WorkHours /
+    AttendanceSummary. Mêmes règles que api_consolidate_hours.
+    """
+    from app.employees.consolidation import PayrollConsolidationService
+    
+    month = request.values.get('month', type=int)
+    year = request.values.get('year', type=int)
+    if not all([month, year]) or not 1 <= month <= 12:
+        return jsonify({'success': False, 'message': 'Paramètres manquants'})
+    
+    try:
+        if request.method == 'POST':
+            results = PayrollConsolidationService.run(year, month, created_by=current_user.id)
+        else:
+            results = list(PayrollConsolidationService.consolidate(year, month)[0].values())
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Erreur dans api_consolidate_hours_all: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': f'Erreur lors de la consolidation: {str(e)}'
+        }), 500
+    
+    return jsonify({
+        'success': True,
+        'month': month,
+        'year': year,
+        'saved': request.method == 'POST',
+        'employees': results
+    })
+
+
 @employees_bp.route('/payroll/consolidate-hours', methods=['GET', 'POST'])
 @login_required
 @admin_required
 def consolidate_hours():
     """Consolider les heures depuis les pointages vers WorkHours"""
     from app.employees.forms import ConsolidateHoursForm
-    from app.employees.models import WorkHours, SalaryAdvance
+    from app.employees.consolidation import PayrollConsolidationService
     
     form = ConsolidateHoursForm()
     
@@ -1311,128 +1350,12 @@ def consolidate_hours():
             emp = Employee.query.get(form.employee_id.data)
             employees_to_process = [emp] if emp else []
         
-        for employee in employees_to_process:
-            # Utiliser la même logique que l'API
-            schedule = employee.get_work_schedule()
-            day_off = None
-            if schedule:
-                day_names = ['lundi', 'mardi', 'mercredi', 'jeudi', 'vendredi', 'samedi', 'dimanche']
-                for day_name, config in schedule.items():
-                    if not config.get('active', True):
-                        try:
-                            day_off = day_names.index(day_name.lower())
-                        except ValueError:
-                            pass
-            
-            total_regular = 0
-            total_overtime = 0
-            days_worked = 0
-            
-            from calendar import monthrange
-            _, last_day = monthrange(year, month)
-            start_date = date(year, month, 1)
-            end_date = date(year, month, last_day)
-            
-            records = AttendanceRecord.query.filter(
-                AttendanceRecord.employee_id == employee.id,
-                db.func.date(AttendanceRecord.timestamp) >= start_date,
-                db.func.date(AttendanceRecord.timestamp) <= end_date
-            ).order_by(AttendanceRecord.timestamp).all()
-            
-            daily_records = {}
-            for record in records:
-                day_key = record.timestamp.date()
-                if day_key not in daily_records:
-                    daily_records[day_key] = {'in': [], 'out': []}
-                if record.punch_type == 'in':
-                    daily_records[day_key]['in'].append(record.timestamp)
-                elif record.punch_type == 'out':
-                    daily_records[day_key]['out'].append(record.timestamp)
-            
-            days_by_week = {}
-            for day_key, punches in daily_records.items():
-                if punches['in'] and punches['out']:
-                    first_in = min(punches['in'])
-                    last_out = max(punches['out'])
-                    
-                    if last_out > first_in:
-                        hours = (last_out - first_in).total_seconds() / 3600
-                        days_worked += 1
-                        
-                        week_num = day_key.isocalendar()[1]
-                        if week_num not in days_by_week:
-                            days_by_week[week_num] = []
-                        days_by_week[week_num].append(day_key)
-                        
-                        weekday = day_key.weekday()
-                        is_friday = weekday == 4
-                        is_day_off = (day_off is not None) and (weekday == day_off)
-                        
-                        # Calculer les heures (vendredi = double heures, jour off = heures normales)
-                        if is_friday:
-                            hours = hours * 2
-                        # Jour off travaillé : heures normales (heures supplémentaires saisies manuellement)
-                        
-                        # Heures régulières (max 16h si vendredi, sinon 8h) et supplémentaires
-                        daily_max = 16 if is_friday else 8
-                        if hours <= daily_max:
-                            total_regular += hours
-                        else:
-                            total_regular += daily_max
-                            total_overtime += (hours - daily_max)
-            
-            weeks_in_month = set()
-            current_day = start_date
-            while current_day <= end_date:
-                weeks_in_month.add(current_day.isocalendar()[1])
-                current_day += timedelta(days=1)
-            
-            expected_days_per_week = 6 if day_off is not None else 7
-            other_absences = 0
-            for week_num in weeks_in_month:
-                days_worked_this_week = len(days_by_week.get(week_num, []))
-                if days_worked_this_week < expected_days_per_week:
-                    other_absences += (expected_days_per_week - days_worked_this_week)
-            
-            total_advances = SalaryAdvance.get_total_for_period(employee.id, month, year)
-            
-            existing = WorkHours.query.filter_by(
-                employee_id=employee.id,
-                period_month=month,
-                period_year=year
-            ).first()
-            
-            if existing:
-                existing.regular_hours = round(total_regular, 2)
-                existing.overtime_hours = round(total_overtime, 2)
-                existing.other_absences = other_absences
-                existing.advance_deduction = total_advances
-                existing.updated_at = datetime.utcnow()
-                action = "mis à jour"
-            else:
-                work_hours = WorkHours(
-                    employee_id=employee.id,
-                    period_month=month,
-                    period_year=year,
-                    regular_hours=round(total_regular, 2),
-                    overtime_hours=round(total_overtime, 2),
-                    other_absences=other_absences,
-                    advance_deduction=total_advances,
-                    created_by=current_user.id
-                )
-                db.session.add(work_hours)
-                action = "créé"
-            
-            results.append({
-                'employee': employee.name,
-                'regular_hours': round(total_regular, 2),
-                'overtime_hours': round(total_overtime, 2),
-                'days_worked': days_worked,
-                'advances': total_advances,
-                'action': action
-            })
-        
-        db.session.commit()
+        # Même logique que l'API, calculée pour tous les employés en une passe
+        results = PayrollConsolidationService.run(
+            year, month,
+            employee_ids=[employee.id for employee in employees_to_process],
+            created_by=current_user.id
+        )
         
         if results:
             flash(f'Consolidation terminée pour {len(results)} employé(s)!', 'success')
@@ -219,21 +219,21 @@ class InventoryItem(db.Model):
         if not product:
             return False
         
-        # Appliquer l'ajustement selon l'emplacement
-        if self.location_type == 'ingredients_magasin':
-            product.stock_ingredients_magasin = self.physical_stock
-        elif self.location_type == 'ingredients_local':
-            product.stock_ingredients_local = self.physical_stock
-        elif self.location_type == 'consommables':
-            product.stock_consommables = self.physical_stock
-        
+        # Appliquer l'écart à l'emplacement (valeur et mouvement 'inventaire' inclus)
+        if self.location_type in ('ingredients_magasin', 'ingredients_local', 'consommables'):
+            location_key = f"stock_{self.location_type}"
+            current_stock = float(getattr(product, location_key) or 0.0)
+            product.update_stock_by_location(
+                location_key,
+                float(self.physical_stock) - current_stock,
+                movement_type='inventaire',
+                reason=f"Inventaire #{self.inventory_id}"
+            )
+
         # Marquer comme appliqué
         self.adjustment_applied = True
         self.adjustment_applied_at = datetime.utcnow()
-        
-        # Mettre à jour la date de dernière modification du stock
-        product.last_stock_update = datetime.utcnow()
-        
+
         return True
 
 class InventorySnapshot(db.Model):
@@ -613,11 +613,14 @@ def declare_daily_waste():
             if quantity > product.stock_comptoir:
                 flash(f'⚠️ {product.name}: Quantité déclarée ({quantity}) supérieure au stock disponible ({product.stock_comptoir}). Stock ajusté à 0.', 'warning')
                 actual_quantity = product.stock_comptoir
-                product.stock_comptoir = 0
             else:
                 actual_quantity = quantity
-                product.stock_comptoir -= actual_quantity
-            
+            product.update_stock_by_location(
+                'stock_comptoir', -actual_quantity,
+                movement_type='sortie',
+                reason=f"Invendus du {form.waste_date.data.strftime('%d/%m/%Y')} ({reason})"
+            )
+
             # Créer la déclaration
             waste = DailyWaste(
                 waste_date=form.waste_date.data,
@@ -5,6 +5,7 @@ from models import Order, Product, Recipe  # ✅ CORRECTION : Recipe est dans mo
 from app.employees.models import Employee    # ✅ Seul Employee est dans un module séparé
 from datetime import datetime, date
 from extensions import db
+from app.utils.date_ranges import on_day
 
 main = Blueprint('main', __name__)
 
@@ -45,7 +46,7 @@ def dashboard_concept1():
     
     # KPI de base
     orders_today = Order.query.filter(
-        db.func.date(Order.created_at) == today
+        on_day(Order.created_at, today)
     ).count()
     
     employees_count = Employee.query.filter(Employee.is_active == True).count()
@@ -79,7 +80,7 @@ def dashboard_concept2():
     
     # KPI de base
     orders_today = Order.query.filter(
-        db.func.date(Order.created_at) == today
+        on_day(Order.created_at, today)
     ).count()
     
     employees_count = Employee.query.filter(Employee.is_active == True).count()
@@ -6,6 +6,8 @@ from app.sales.models import CashRegisterSession
 from datetime import datetime, timedelta
 from decorators import admin_required
 from extensions import db
+from app.utils.date_ranges import on_day
+from app.recipes.planner import IngredientPlannerService, DEFAULT_HORIZON_DAYS, CACHE_TTL_SECONDS as PLANNER_CACHE_TTL_SECONDS
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
@@ -194,7 +196,7 @@ def shop_dashboard():
         Order.order_type == 'customer_order'
     )
     if selected_date:
-        query_customer = query_customer.filter(db.func.date(Order.due_date) == selected_date)
+        query_customer = query_customer.filter(on_day(Order.due_date, selected_date))
     if search_query:
         query_customer = query_customer.filter(
             db.or_(
@@ -212,7 +214,7 @@ def shop_dashboard():
         Order.order_type != 'customer_order'
     )
     if selected_date:
-        query_production = query_production.filter(db.func.date(Order.due_date) == selected_date)
+        query_production = query_production.filter(on_day(Order.due_date, selected_date))
     if search_query:
         query_production = query_production.filter(
             Order.items.any(db.func.lower(Product.name).contains(search_query.lower()))
@@ -226,7 +228,7 @@ def shop_dashboard():
         Order.delivery_option == 'pickup'
     )
     if selected_date:
-        query_pickup = query_pickup.filter(db.func.date(Order.due_date) == selected_date)
+        query_pickup = query_pickup.filter(on_day(Order.due_date, selected_date))
     if search_query:
         query_pickup = query_pickup.filter(
             db.or_(
@@ -244,7 +246,7 @@ def shop_dashboard():
         Order.order_type.in_(['customer_order', 'in_store'])
     )
     if selected_date:
-        query_delivery = query_delivery.filter(db.func.date(Order.due_date) == selected_date)
+        query_delivery = query_delivery.filter(on_day(Order.due_date, selected_date))
     if search_query:
         query_delivery = query_delivery.filter(
             db.or_(
@@ -264,7 +266,7 @@ def shop_dashboard():
         Order.created_at >= cutoff_datetime
     )
     if selected_date:
-        query_counter = query_counter.filter(db.func.date(Order.created_at) == selected_date)
+        query_counter = query_counter.filter(on_day(Order.created_at, selected_date))
     if search_query:
         query_counter = query_counter.filter(
             Order.items.any(db.func.lower(Product.name).contains(search_query.lower()))
@@ -300,19 +302,50 @@ def shop_dashboard():
 @login_required
 @admin_required
 def ingredients_alerts():
-    low_stock_ingredients = Product.query.filter(
-        Product.product_type == 'ingredient',
-        Product.quantity_in_stock <= 5
-    ).order_by(Product.name.asc()).all()
-    out_of_stock_ingredients = Product.query.filter(
-        Product.product_type == 'ingredient',
-        Product.quantity_in_stock <= 0
-    ).order_by(Product.name.asc()).all()
+    """Ruptures d'ingrédients pour les commandes à produire (planificateur en cache)"""
+    days = request.args.get('days', DEFAULT_HORIZON_DAYS, type=int)
+    plan = IngredientPlannerService.cached_plan(days=max(1, min(days, 31)))
+    
+    missing_ingredients = []
+    for item in plan['shortages']:
+        if item['stock'] <= 0:
+            urgency, urgency_class, urgency_label = 'critical', 'critical-shortage', 'Critique'
+        elif item['missing'] >= item['needed_qty'] / 2:
+            urgency, urgency_class, urgency_label = 'high', 'low-stock', 'Urgent'
+        else:
+            urgency, urgency_class, urgency_label = 'medium', 'medium-stock', 'À surveiller'
+        missing_ingredients.append({
+            'name': item['name'],
+            'category': f"{item['category']} · {item['location_label']}",
+            'unit': item['unit'],
+            'current_stock': item['stock'],
+            'required_stock': item['needed_qty'],
+            'deficit': item['missing'],
+            'orders_affected': item['orders_count'],
+            'estimated_cost': f"{item['estimated_cost']:,.0f}",
+            'supplier': None,
+            'urgency': urgency,
+            'urgency_class': urgency_class,
+            'urgency_label': urgency_label,
+        })
+    
     return render_template('dashboards/ingredients_alerts.html',
-                         low_stock_ingredients=low_stock_ingredients,
-                         out_of_stock_ingredients=out_of_stock_ingredients,
+                         missing_ingredients=missing_ingredients,
+                         plan_totals=plan['totals'],
+                         plan_end=plan['end'],
                          title="Alertes Ingrédients")
 
+@dashboard_bp.route('/api/ingredient-requirements')
+@login_required
+@admin_required
+def api_ingredient_requirements():
+    """Besoins en ingrédients et ruptures (JSON, mis en cache côté serveur)"""
+    days = request.args.get('days', DEFAULT_HORIZON_DAYS, type=int)
+    plan = IngredientPlannerService.cached_plan(days=max(1, min(days, 31)))
+    response = jsonify(IngredientPlannerService.to_json(plan))
+    response.headers['Cache-Control'] = f'private, max-age={PLANNER_CACHE_TTL_SECONDS}'
+    return response
+
 @dashboard_bp.route('/admin')
 @login_required
 @admin_required
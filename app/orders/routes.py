@@ -916,15 +916,13 @@ def assign_deliveryman(order_id):
                 # ✅ CORRECTION : Décrémenter les consommables lors de l'encaissement
                 for order_item in order.items:
                     product_fini = order_item.product
-                    if product_fini and product_fini.category:
+                    if product_fini and product_fini.category_id:
                         from app.consumables.models import ConsumableCategory
-                        consumable_category = ConsumableCategory.query.filter(
-                            ConsumableCategory.product_category_id == product_fini.category.id,
-                            ConsumableCategory.is_active == True
-                        ).first()
+                        consumables_needed = ConsumableCategory.consumables_for_product_category(
+                            product_fini.category_id, int(order_item.quantity)
+                        )
                         
-                        if consumable_category:
-                            consumables_needed = consumable_category.calculate_consumables_needed(int(order_item.quantity))
+                        if consumables_needed:
                             for consumable_product, qty in consumables_needed:
                                 if consumable_product:
                                     consumable_product.update_stock_by_location('stock_consommables', -float(qty))
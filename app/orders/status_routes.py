@@ -14,6 +14,18 @@ from decorators import admin_required
 
 status_bp = Blueprint('status', __name__)
 
+
+def _restore_stock_comptoir(product, stock_comptoir_value, order_id):
+    """Ramène le stock comptoir à sa valeur d'origine (valeur et mouvement inclus)"""
+    delta = stock_comptoir_value - float(product.stock_comptoir or 0.0)
+    product.update_stock_by_location(
+        'stock_comptoir', delta,
+        movement_type='ajustement_positif' if delta > 0 else 'ajustement_negatif',
+        order_id=order_id,
+        reason=f"Restauration du stock comptoir (commande #{order_id})"
+    )
+
+
 @status_bp.route('/<int:order_id>/change-status-to-ready', methods=['POST'])
 @login_required
 @admin_required
@@ -96,30 +108,21 @@ def change_status_to_ready(order_id):
                         current_app.logger.warning(f"ATTENTION - stock_attr utilisé: {stock_attr} (ne doit PAS être stock_comptoir)")
                     
                     # 3. On met à jour la quantité ET la valeur du stock de l'ingrédient
-                    # TRACE: Logger avant l'appel
-                    if ingredient_product.id == product_fini.id:
-                        current_app.logger.warning(f"TRACE - Avant update_stock_by_location - Produit: {ingredient_product.name}, Location: {stock_attr}, Changement: {-quantity_to_decrement}, Stock comptoir actuel: {float(ingredient_product.stock_comptoir or 0.0)}")
+                    # (traçage détaillé : canal d'audit app/stock/audit.py)
+                    ingredient_product.update_stock_by_location(
+                        stock_attr, -quantity_to_decrement,
+                        movement_type='production', order_id=order.id,
+                        reason=f"Production commande #{order.id}"
+                    )
                     
-                    ingredient_product.update_stock_by_location(stock_attr, -quantity_to_decrement)
-                    
-                    # TRACE: Logger après l'appel
                     if ingredient_product.id == product_fini.id:
                         stock_comptoir_after_update = float(ingredient_product.stock_comptoir or 0.0)
-                        current_app.logger.warning(f"TRACE - Après update_stock_by_location - Produit: {ingredient_product.name}, Stock comptoir: {stock_comptoir_after_update}")
                         if stock_comptoir_ingredient_before != stock_comptoir_after_update:
                             error_msg = f"ERREUR CRITIQUE: Stock comptoir modifié lors de la décrémentation des ingrédients! Produit: {ingredient_product.name}, Avant: {stock_comptoir_ingredient_before}, Après: {stock_comptoir_after_update}, Location utilisée: {stock_attr}, Commande: #{order_id}"
                             current_app.logger.error(error_msg)
                             print(f"❌ {error_msg}")
                             # Restaurer le stock_comptoir à sa valeur d'origine
-                            ingredient_product.stock_comptoir = stock_comptoir_ingredient_before
-                    
-                    ingredient_product.total_stock_value = float(ingredient_product.total_stock_value or 0.0) - value_to_decrement
-                    
-                    # Décrémenter la valeur du stock par emplacement
-                    if stock_attr == "stock_ingredients_magasin":
-                        ingredient_product.valeur_stock_ingredients_magasin = float(getattr(ingredient_product, "valeur_stock_ingredients_magasin", 0.0)) - value_to_decrement
-                    elif stock_attr == "stock_ingredients_local":
-                        ingredient_product.valeur_stock_ingredients_local = float(getattr(ingredient_product, "valeur_stock_ingredients_local", 0.0)) - value_to_decrement
+                            _restore_stock_comptoir(ingredient_product, stock_comptoir_ingredient_before, order.id)
                     
                     print(f"DECREMENT: {quantity_to_decrement:.2f}g de {ingredient_product.name} (Valeur: {value_to_decrement:.2f} DA)")
         
@@ -148,11 +151,8 @@ def change_status_to_ready(order_id):
                         error_msg = f"🚨🚨🚨 ERREUR CRITIQUE: Stock comptoir modifié lors de la réception d'une commande client! Produit: {item.product.name} (ID: {item.product.id}), Avant: {stock_comptoir_before_value}, Après: {stock_comptoir_after}, Différence: {stock_comptoir_after - stock_comptoir_before_value}, Commande: #{order.id}"
                         current_app.logger.error(error_msg)
                         print(f"❌ {error_msg}")
-                        import traceback
-                        stack = traceback.format_stack()
-                        current_app.logger.error(f"🚨 Stack trace complète:\n{''.join(stack)}")
                         # Restaurer le stock_comptoir à sa valeur d'origine
-                        item.product.stock_comptoir = stock_comptoir_before_value
+                        _restore_stock_comptoir(item.product, stock_comptoir_before_value, order.id)
                         current_app.logger.error(f"🚨 Stock comptoir restauré à: {stock_comptoir_before_value}")
             
             # Décision basée sur delivery_option
@@ -180,7 +180,7 @@ def change_status_to_ready(order_id):
                         current_app.logger.error(error_msg)
                         print(f"❌ {error_msg}")
                         # Restaurer le stock_comptoir à sa valeur d'origine
-                        item.product.stock_comptoir = stock_comptoir_before_value
+                        _restore_stock_comptoir(item.product, stock_comptoir_before_value, order.id)
         
         db.session.commit()
         
@@ -198,7 +198,7 @@ def change_status_to_ready(order_id):
                         current_app.logger.error(error_msg)
                         print(f"❌❌❌ {error_msg}")
                         # Restaurer le stock_comptoir à sa valeur d'origine
-                        item.product.stock_comptoir = stock_comptoir_before_value
+                        _restore_stock_comptoir(item.product, stock_comptoir_before_value, order.id)
                         db.session.commit()
                         current_app.logger.error(f"🚨 Stock comptoir restauré à: {stock_comptoir_before_value}")
         
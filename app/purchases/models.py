@@ -89,6 +89,10 @@ class Purchase(db.Model):
     approved_by = db.relationship('User', foreign_keys=[approved_by_id], backref='approved_purchases', lazy=True)
     received_by = db.relationship('User', foreign_keys=[received_by_id], backref='received_purchases', lazy=True)
     
+    __table_args__ = (
+        db.Index('idx_purchases_created_at', 'created_at'),
+    )
+    
     def __init__(self, **kwargs):
         super(Purchase, self).__init__(**kwargs)
         if not self.reference:
@@ -173,12 +173,21 @@ def new_purchase():
             unit_ids = request.form.getlist('items[][unit]')
             stock_locations = request.form.getlist('items[][stock_location]')
             
+            # Produits et unités de toutes les lignes en deux requêtes : la boucle
+            # n'interroge plus la base et le stock (mouvements compris) est écrit
+            # en un seul flush au commit
+            line_product_ids = {int(value) for value in product_ids if value}
+            line_unit_ids = {int(value) for value in unit_ids if value}
+            products_by_id = {p.id: p for p in Product.query.filter(Product.id.in_(line_product_ids)).all()}
+            units_by_id = {u.id: u for u in Unit.query.filter(Unit.id.in_(line_unit_ids)).all()}
+            stock_movement = {'movement_type': 'entree', 'reason': f"Achat {purchase.reference}"}
+            
             for i in range(len(product_ids)):
                 if not product_ids[i] or not quantities[i] or not prices[i] or not unit_ids[i]:
                     continue
 
                 product_id = int(product_ids[i])
-                product = Product.query.get(product_id)
+                product = products_by_id.get(product_id)
                 
                 if not product:
                      raise ValueError(f"Produit avec l'ID {product_id} non trouvé.")
@@ -194,7 +203,7 @@ def new_purchase():
                 quantity_ordered = Decimal(quantities[i])
                 price_per_unit_achat = Decimal(prices[i])
                 unit_id = int(unit_ids[i])
-                unit_object = Unit.query.get(unit_id)
+                unit_object = units_by_id.get(unit_id)
 
                 if not unit_object or quantity_ordered <= 0 or price_per_unit_achat < 0:
                     raise ValueError(f"Données invalides pour la ligne du produit {product.name}.")
@@ -221,7 +230,8 @@ def new_purchase():
                     product.update_stock_by_location(
                         stock_location,
                         quantity_in_base_unit,
-                        unit_cost_override=price_per_base_unit
+                        unit_cost_override=price_per_base_unit,
+                        **stock_movement
                     )
                     
                     # ✅ CORRECTION : Recalculer le PMP
@@ -261,7 +271,8 @@ def new_purchase():
                     product.update_stock_by_location(
                         stock_location_key,
                         quantity_in_base_unit,
-                        unit_cost_override=price_per_base_unit
+                        unit_cost_override=price_per_base_unit,
+                        **stock_movement
                     )
                     
                     # ✅ CORRECTION : Recalculer le PMP basé sur la valeur totale / quantité totale
@@ -291,7 +302,8 @@ def new_purchase():
                     product.update_stock_by_location(
                         stock_location,
                         quantity_in_base_unit,
-                        unit_cost_override=price_per_base_unit
+                        unit_cost_override=price_per_base_unit,
+                        **stock_movement
                     )
                     
                     # ✅ CORRECTION : Recalculer le PMP
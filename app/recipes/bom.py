@@ -0,0 +1,203 @@
+"""
+Nomenclatures (BOM) compilées des recettes
+Module: app/recipes/bom.py
+
+Coût de revient, décrémentation à la production et besoins en ingrédients
+parcouraient `recipe.ingredients` (relation dynamique : une requête par
+recette) puis chargeaient chaque produit ingrédient pour convertir son
+unité. La nomenclature de toutes les recettes est ici compilée une fois en
+mémoire : par recette, la liste (ingrédient, quantité par unité produite,
+facteur de conversion du coût) et l'emplacement de stock à décrémenter.
+
+Les quantités restent exprimées dans l'unité de la recette, comme pour la
+décrémentation existante ; seul le coût est converti vers l'unité du
+produit. Les prix de revient (PMP) changent à chaque achat : ils ne sont pas
+figés dans le cache mais relus en une requête pour toutes les recettes
+demandées.
+
+Le cache est invalidé par toute écriture sur Recipe / RecipeIngredient et
+par un changement d'unité ou de nom d'un produit, et expire après
+CACHE_TTL_SECONDS pour les autres workers.
+"""
+
+import threading
+import time
+from collections import namedtuple
+from decimal import Decimal
+
+from sqlalchemy import select
+
+from extensions import db
+from models import Product, Recipe, RecipeIngredient, unit_cost_factor
+from app.utils.session_hooks import CacheInvalidationHooks
+
+
+CACHE_TTL_SECONDS = 300
+
+# Emplacement de production de la recette -> colonne de stock des ingrédients
+LOCATION_STOCK_ATTRS = {
+    'ingredients_magasin': 'stock_ingredients_magasin',
+    'ingredients_local': 'stock_ingredients_local',
+}
+
+# Attributs produit figés dans une nomenclature (le PMP, lui, est relu)
+_TRACKED_PRODUCT_ATTRS = ('unit', 'name')
+
+BomLine = namedtuple('BomLine', ['product_id', 'product_name', 'quantity_needed', 'quantity_per_unit',
+                                 'unit', 'product_unit', 'cost_factor'])
+CompiledRecipe = namedtuple('CompiledRecipe', ['id', 'name', 'product_id', 'yield_quantity',
+                                               'production_location', 'stock_attr', 'lines'])
+BomSnapshot = namedtuple('BomSnapshot', ['version', 'loaded_at', 'recipes', 'by_product'])
+
+_lock = threading.Lock()
+_snapshot = None
+_version = 0
+
+
+class RecipeBomCache:
+    """Nomenclatures compilées de toutes les recettes"""
+
+    @staticmethod
+    def snapshot():
+        """Instantané courant, rechargé (2 requêtes) s'il est invalidé ou expiré."""
+        # Autoflush : les modifications en attente de la session doivent être vues
+        if db.session.autoflush and _touches_bom(db.session):
+            db.session.flush()
+        current = _snapshot
+        if current is not None and time.monotonic() - current.loaded_at < CACHE_TTL_SECONDS:
+            return current
+        with _lock:
+            if _snapshot is current:
+                RecipeBomCache._load(current.version if current else _version)
+            return _snapshot
+
+    @staticmethod
+    def _load(version):
+        global _snapshot
+
+        lines_by_recipe = {}
+        rows = db.session.execute(
+            select(RecipeIngredient.recipe_id, RecipeIngredient.product_id, RecipeIngredient.quantity_needed,
+                   RecipeIngredient.unit, Product.name, Product.unit)
+            .join(Product, Product.id == RecipeIngredient.product_id)
+            .order_by(RecipeIngredient.recipe_id, RecipeIngredient.id)
+        )
+        for recipe_id, product_id, quantity_needed, unit, product_name, product_unit in rows:
+            lines_by_recipe.setdefault(recipe_id, []).append(
+                (product_id, product_name, Decimal(quantity_needed or 0), unit, product_unit)
+            )
+
+        recipes = {}
+        by_product = {}
+        rows = db.session.execute(
+            select(Recipe.id, Recipe.name, Recipe.product_id, Recipe.yield_quantity, Recipe.production_location)
+        )
+        for recipe_id, name, product_id, yield_quantity, production_location in rows:
+            divisor = float(yield_quantity or 1)
+            lines = tuple(
+                BomLine(ingredient_id, product_name, quantity_needed, float(quantity_needed) / divisor,
+                        unit, product_unit, unit_cost_factor(product_unit, unit))
+                for ingredient_id, product_name, quantity_needed, unit, product_unit
+                in lines_by_recipe.get(recipe_id, ())
+            )
+            compiled = CompiledRecipe(
+                recipe_id, name, product_id, yield_quantity, production_location,
+                LOCATION_STOCK_ATTRS.get(production_location, production_location), lines
+            )
+            recipes[recipe_id] = compiled
+            if product_id:
+                by_product[product_id] = compiled
+
+        _snapshot = BomSnapshot(version, time.monotonic(), recipes, by_product)
+
+    @staticmethod
+    def invalidate():
+        """Force la recompilation au prochain accès."""
+        global _snapshot, _version
+        with _lock:
+            _version += 1
+            _snapshot = None
+
+    @staticmethod
+    def get(recipe_id):
+        """CompiledRecipe d'une recette (ou None)."""
+        return RecipeBomCache.snapshot().recipes.get(recipe_id)
+
+    @staticmethod
+    def for_product(product_id):
+        """CompiledRecipe produisant ce produit fini (ou None)."""
+        return RecipeBomCache.snapshot().by_product.get(product_id)
+
+    @staticmethod
+    def total_costs(recipe_ids):
+        """
+        Coût de revient total de plusieurs recettes.
+
+        Les PMP des ingrédients sont lus en une requête ; un ingrédient sans
+        prix coûte 0, une conversion inconnue garde le prix du produit (même
+        règle que RecipeIngredient.cost).
+
+        Returns:
+            dict: {recipe_id: Decimal}
+        """
+        snapshot = RecipeBomCache.snapshot()
+        compiled = [snapshot.recipes[recipe_id] for recipe_id in set(recipe_ids) if recipe_id in snapshot.recipes]
+        ingredient_ids = {line.product_id for recipe in compiled for line in recipe.lines}
+        if not ingredient_ids:
+            return {recipe.id: Decimal('0.0') for recipe in compiled}
+
+        cost_prices = dict(db.session.execute(
+            select(Product.id, Product.cost_price).where(Product.id.in_(ingredient_ids))
+        ).all())
+
+        costs = {}
+        for recipe in compiled:
+            total = Decimal('0.0')
+            for line in recipe.lines:
+                cost_price = cost_prices.get(line.product_id)
+                if not cost_price:
+                    continue
+                factor = line.cost_factor if line.cost_factor is not None else Decimal('1')
+                total += line.quantity_needed * Decimal(cost_price) * factor
+            costs[recipe.id] = total
+        return costs
+
+    @staticmethod
+    def costs_per_unit(recipe_ids):
+        """Coût de revient par unité produite (rendement), par recette."""
+        snapshot = RecipeBomCache.snapshot()
+        costs = {}
+        for recipe_id, total in RecipeBomCache.total_costs(recipe_ids).items():
+            yield_quantity = snapshot.recipes[recipe_id].yield_quantity
+            costs[recipe_id] = total / Decimal(yield_quantity) if yield_quantity and yield_quantity > 0 else Decimal('0.0')
+        return costs
+
+
+# --- Invalidation -----------------------------------------------------------
+
+def _touches_bom(session):
+    for obj in (*session.new, *session.deleted):
+        if isinstance(obj, (Recipe, RecipeIngredient)):
+            return True
+    for obj in session.dirty:
+        if isinstance(obj, (Recipe, RecipeIngredient)):
+            return True
+        if isinstance(obj, Product):
+            state = db.inspect(obj)
+            if any(state.attrs[attr].history.has_changes() for attr in _TRACKED_PRODUCT_ATTRS):
+                return True
+    return False
+
+
+_hooks = CacheInvalidationHooks(
+    'recipe_bom',
+    invalidate=RecipeBomCache.invalidate,
+    changed=_touches_bom,
+    bulk_models=(Recipe, RecipeIngredient, Product),
+    tables=(Recipe.__table__, RecipeIngredient.__table__, Product.__table__),
+)
+
+
+def register_bom_cache_hooks():
+    """Branche l'invalidation des nomenclatures sur la classe de session Flask-SQLAlchemy."""
+    _hooks.register()
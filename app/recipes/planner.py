@@ -0,0 +1,207 @@
+"""
+Planification des besoins en ingrédients des commandes à produire
+Module: app/recipes/planner.py
+
+Les besoins sont calculés en une requête ensembliste :
+commandes à produire × lignes × ingrédients de recette, mis à l'échelle du
+rendement et groupés par (ingrédient, emplacement de production). Les
+stocks sont ensuite lus en une requête et comparés à la colonne de
+l'emplacement (stock_ingredients_magasin / stock_ingredients_local).
+
+Les quantités sont exprimées dans l'unité de la recette, comme pour la
+décrémentation à la production.
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Float, cast, func, select
+
+from extensions import db
+from models import Order, OrderItem, Product, Recipe, RecipeIngredient
+from app.recipes.bom import LOCATION_STOCK_ATTRS
+
+
+# Commandes dont les ingrédients ne sont pas encore sortis du stock
+PLANNED_STATUSES = ['pending', 'in_production']
+
+DEFAULT_HORIZON_DAYS = 3
+
+# Durée de vie des plans servis par l'API / la page d'alertes
+CACHE_TTL_SECONDS = 60
+
+LOCATION_LABELS = {
+    'stock_ingredients_magasin': 'Labo A (Magasin)',
+    'stock_ingredients_local': 'Labo B (Local)',
+}
+
+_cache_lock = threading.Lock()
+_cache = {}
+
+
+class IngredientPlannerService:
+    """Besoins en ingrédients et ruptures pour une fenêtre d'échéances"""
+
+    @staticmethod
+    def window(start=None, days=DEFAULT_HORIZON_DAYS):
+        """Fenêtre [start, start + days[ ; par défaut à partir d'aujourd'hui minuit."""
+        if start is None:
+            start = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+        return start, start + timedelta(days=days)
+
+    @staticmethod
+    def requirements(start, end, include_overdue=True):
+        """
+        Besoins agrégés par (ingrédient, emplacement) en une requête.
+
+        Args:
+            start, end: fenêtre d'échéance [start, end[
+            include_overdue: inclure les commandes en retard (échéance < start)
+                             pas encore produites
+
+        Returns:
+            list: [{'product_id', 'stock_attr', 'needed_qty', 'orders_count', 'deadline'}]
+        """
+        yield_quantity = cast(func.coalesce(func.nullif(Recipe.yield_quantity, 0), 1), Float)
+        needed = func.sum(
+            cast(OrderItem.quantity, Float) * cast(RecipeIngredient.quantity_needed, Float) / yield_quantity
+        )
+
+        query = (
+            select(
+                RecipeIngredient.product_id,
+                Recipe.production_location,
+                needed.label('needed_qty'),
+                func.count(func.distinct(Order.id)).label('orders_count'),
+                func.min(Order.due_date).label('deadline'),
+            )
+            .select_from(Order)
+            .join(OrderItem, OrderItem.order_id == Order.id)
+            .join(Recipe, Recipe.product_id == OrderItem.product_id)
+            .join(RecipeIngredient, RecipeIngredient.recipe_id == Recipe.id)
+            .where(Order.status.in_(PLANNED_STATUSES), Order.due_date < end)
+            .group_by(RecipeIngredient.product_id, Recipe.production_location)
+        )
+        if not include_overdue:
+            query = query.where(Order.due_date >= start)
+
+        rows = []
+        for product_id, location, needed_qty, orders_count, deadline in db.session.execute(query):
+            stock_attr = LOCATION_STOCK_ATTRS.get(location, location)
+            if stock_attr not in LOCATION_LABELS:
+                # Même garde-fou que la décrémentation : jamais le stock de vente
+                stock_attr = 'stock_ingredients_magasin'
+            rows.append({
+                'product_id': product_id,
+                'stock_attr': stock_attr,
+                'needed_qty': float(needed_qty or 0),
+                'orders_count': orders_count,
+                'deadline': deadline,
+            })
+        return rows
+
+    @staticmethod
+    def plan(start=None, end=None, include_overdue=True):
+        """
+        Besoins comparés aux stocks de chaque emplacement.
+
+        Un ingrédient utilisé dans les deux labos donne une ligne par
+        emplacement (chaque labo a son propre stock).
+
+        Returns:
+            dict: {'start', 'end', 'items': [...], 'shortages': [...], 'totals': {...}}
+        """
+        if start is None or end is None:
+            start, end = IngredientPlannerService.window(start)
+
+        merged = {}
+        for row in IngredientPlannerService.requirements(start, end, include_overdue=include_overdue):
+            key = (row['product_id'], row['stock_attr'])
+            entry = merged.get(key)
+            if entry is None:
+                merged[key] = row
+            else:
+                entry['needed_qty'] += row['needed_qty']
+                entry['orders_count'] = max(entry['orders_count'], row['orders_count'])
+                entry['deadline'] = min(filter(None, (entry['deadline'], row['deadline'])), default=None)
+
+        product_ids = {product_id for product_id, _ in merged}
+        products = {
+            product.id: product
+            for product in Product.query.options(db.joinedload(Product.category))
+                                        .filter(Product.id.in_(product_ids)).all()
+        } if product_ids else {}
+
+        items = []
+        for (product_id, stock_attr), row in merged.items():
+            product = products.get(product_id)
+            if product is None:
+                continue
+            stock = float(getattr(product, stock_attr) or 0)
+            needed_qty = row['needed_qty']
+            missing = max(0.0, needed_qty - stock)
+            items.append({
+                'product_id': product_id,
+                'name': product.name,
+                'category': product.category.name if product.category else 'N/A',
+                'unit': product.unit,
+                'location': stock_attr,
+                'location_label': LOCATION_LABELS[stock_attr],
+                'stock': round(stock, 3),
+                'needed_qty': round(needed_qty, 3),
+                'missing': round(missing, 3),
+                'orders_count': row['orders_count'],
+                'deadline': row['deadline'],
+                'estimated_cost': round(missing * float(product.cost_price or 0), 2),
+            })
+
+        items.sort(key=lambda item: (-item['missing'], item['name']))
+        shortages = [item for item in items if item['missing'] > 0]
+        return {
+            'start': start,
+            'end': end,
+            'items': items,
+            'shortages': shortages,
+            'totals': {
+                'ingredients': len(items),
+                'shortages': len(shortages),
+                'critical': sum(1 for item in shortages if item['stock'] <= 0),
+                'estimated_cost': round(sum(item['estimated_cost'] for item in shortages), 2),
+            },
+        }
+
+    @staticmethod
+    def cached_plan(days=DEFAULT_HORIZON_DAYS):
+        """plan() de la fenêtre par défaut, mis en cache CACHE_TTL_SECONDS par worker."""
+        start, end = IngredientPlannerService.window(days=days)
+        key = (start, end)
+        now = time.monotonic()
+        cached = _cache.get(key)
+        if cached is not None and now - cached[0] < CACHE_TTL_SECONDS:
+            return cached[1]
+        result = IngredientPlannerService.plan(start, end)
+        with _cache_lock:
+            # Les fenêtres des jours précédents ne servent plus
+            for stale in [k for k, (at, _) in _cache.items() if now - at >= CACHE_TTL_SECONDS]:
+                _cache.pop(stale, None)
+            _cache[key] = (now, result)
+        return result
+
+    @staticmethod
+    def clear_cache():
+        with _cache_lock:
+            _cache.clear()
+
+    @staticmethod
+    def to_json(plan):
+        """Version sérialisable (dates ISO) d'un plan."""
+        def serialize(item):
+            return {**item, 'deadline': item['deadline'].isoformat() if item['deadline'] else None}
+        return {
+            'start': plan['start'].isoformat(),
+            'end': plan['end'].isoformat(),
+            'items': [serialize(item) for item in plan['items']],
+            'shortages': [serialize(item) for item in plan['shortages']],
+            'totals': plan['totals'],
+        }
@@ -23,7 +23,7 @@ def list_recipes():
     search_query = request.args.get('search', '').strip()
     
     # Construire la requête de base
-    query = Recipe.query
+    query = Recipe.query.options(db.joinedload(Recipe.finished_product))
     
     # Si une recherche est effectuée
     if search_query:
@@ -46,8 +46,13 @@ def list_recipes():
         page=page, per_page=current_app.config.get('ITEMS_PER_PAGE', 10)
     )
     
+    # Coûts de la page en une requête (nomenclatures en cache)
+    from app.recipes.bom import RecipeBomCache
+    recipe_costs = RecipeBomCache.costs_per_unit(recipe.id for recipe in pagination.items)
+    
     return render_template('recipes/list_recipes.html', 
                          recipes_pagination=pagination, 
+                         recipe_costs=recipe_costs,
                          form=form,
                          search_query=search_query,
                          title='Gestion des Recettes')
@@ -1,8 +1,10 @@
 from datetime import datetime, date, timedelta
 from sqlalchemy import func, case
 from extensions import db
+from app.utils.date_ranges import on_day
 from models import Order, OrderItem, Product
-from app.employees.models import Employee, AttendanceSummary, AttendanceRecord
+from app.employees.models import Employee, AttendanceSummary
+from app.employees.attendance_summary import AttendanceSummaryService
 from app.sales.models import CashMovement
 from app.purchases.models import Purchase
 from app.inventory.models import DailyWaste
@@ -26,13 +28,13 @@ class RealKpiService:
         pos_revenue = db.session.query(func.sum(Order.total_amount))\
             .filter(
                 Order.order_type == 'in_store',
-                func.date(Order.created_at) == target_date
+                on_day(Order.created_at, target_date)
             ).scalar() or 0.0
             
         pos_count = db.session.query(func.count(Order.id))\
             .filter(
                 Order.order_type == 'in_store',
-                func.date(Order.created_at) == target_date
+                on_day(Order.created_at, target_date)
             ).scalar() or 0
 
         # B. Commandes Livrées/Terminées ce jour
@@ -43,7 +45,7 @@ class RealKpiService:
                 Order.order_type != 'in_store',
                 Order.order_type != 'counter_production_request',  # Exclure les ordres de production
                 Order.status.in_(['delivered', 'completed', 'delivered_unpaid']),
-                func.date(Order.due_date) == target_date  # ✅ Réception = due_date (approximation)
+                on_day(Order.due_date, target_date)  # ✅ Réception = due_date (approximation)
             ).scalar() or 0.0
 
         shop_count = db.session.query(func.count(Order.id))\
@@ -51,7 +53,7 @@ class RealKpiService:
                 Order.order_type != 'in_store',
                 Order.order_type != 'counter_production_request',  # Exclure les ordres de production
                 Order.status.in_(['delivered', 'completed', 'delivered_unpaid']),
-                func.date(Order.due_date) == target_date  # ✅ Réception = due_date (approximation)
+                on_day(Order.due_date, target_date)  # ✅ Réception = due_date (approximation)
             ).scalar() or 0
             
         total_revenue = float(pos_revenue) + float(shop_revenue)
@@ -65,7 +67,7 @@ class RealKpiService:
         # Identifiants des commandes POS du jour
         pos_order_ids = db.session.query(Order.id).filter(
             Order.order_type == 'in_store',
-            func.date(Order.created_at) == target_date
+            on_day(Order.created_at, target_date)
         ).all()
         pos_ids = [r[0] for r in pos_order_ids]
         
@@ -74,7 +76,7 @@ class RealKpiService:
             Order.order_type != 'in_store',
             Order.order_type != 'counter_production_request',  # Exclure les ordres de production
             Order.status.in_(['delivered', 'completed', 'delivered_unpaid']),
-            func.date(Order.due_date) == target_date  # ✅ Réception = due_date (approximation)
+            on_day(Order.due_date, target_date)  # ✅ Réception = due_date (approximation)
         ).all()
         shop_ids = [r[0] for r in shop_order_ids]
         
@@ -95,9 +97,8 @@ class RealKpiService:
         # Basé sur les présences du jour (Temps Réel)
         labor_cost = 0.0
         
-        # On utilise get_daily_summary pour avoir les heures calculées à la volée
-        # au lieu de AttendanceSummary qui peut être vide
-        daily_attendance = AttendanceRecord.get_daily_summary(target_date)
+        # Résumés de présence maintenus à chaque pointage : une ligne par employé
+        daily_attendance = AttendanceSummaryService.for_day(target_date)
         
         for emp_data in daily_attendance.values():
             emp = emp_data['employee']
@@ -135,12 +136,12 @@ class RealKpiService:
         cash_out = db.session.query(func.sum(CashMovement.amount))\
             .filter(
                 func.lower(CashMovement.type).in_(['sortie', 'retrait', 'paiement']),
-                func.date(CashMovement.created_at) == target_date
+                on_day(CashMovement.created_at, target_date)
             ).scalar() or 0.0
             
         # Valeur Achat du Jour
         purchases_today = db.session.query(func.sum(Purchase.total_amount))\
-            .filter(func.date(Purchase.created_at) == target_date)\
+            .filter(on_day(Purchase.created_at, target_date))\
             .scalar() or 0.0
 
         # Dette Livreur du Jour (Reste à payer sur les commandes réceptionnées ce jour)
@@ -152,7 +153,7 @@ class RealKpiService:
                 Order.order_type != 'in_store',
                 Order.order_type != 'counter_production_request',  # Exclure les ordres de production
                 Order.status.in_(['delivered', 'completed', 'delivered_unpaid']),
-                func.date(Order.due_date) == target_date  # ✅ Réception = due_date (approximation)
+                on_day(Order.due_date, target_date)  # ✅ Réception = due_date (approximation)
             ).all()
             
         for o_total, o_paid in shop_orders_debt:
@@ -210,14 +211,14 @@ class RealKpiService:
         cash_in = db.session.query(func.sum(CashMovement.amount))\
             .filter(
                 func.lower(CashMovement.type).in_(['entrée', 'entree']),
-                func.date(CashMovement.created_at) == target_date
+                on_day(CashMovement.created_at, target_date)
             ).scalar() or 0.0
         
         # Somme de tous les mouvements de caisse de type "sortie" du jour
         cash_out = db.session.query(func.sum(CashMovement.amount))\
             .filter(
                 func.lower(CashMovement.type).in_(['sortie', 'retrait', 'paiement']),
-                func.date(CashMovement.created_at) == target_date
+                on_day(CashMovement.created_at, target_date)
             ).scalar() or 0.0
         
         return {
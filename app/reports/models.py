@@ -0,0 +1,46 @@
+"""
+Modèles du module Rapports
+Module: app/reports/models.py
+"""
+
+from datetime import datetime
+from extensions import db
+
+
+class DailySalesFact(db.Model):
+    """
+    Table de faits pré-agrégée des ventes : une ligne par jour × produit × canal.
+
+    - fact_date : jour de comptabilisation du CA (created_at pour le POS,
+      due_date pour les commandes Shop livrées)
+    - order_date : jour de création des commandes agrégées (nécessaire pour
+      reproduire le filtre période de _get_orders_filter_real)
+    - cogs : coût des ventes valorisé au coût du produit au moment de la vente
+
+    Maintenue par app/reports/sales_facts.py, reconstruisible via
+    `flask rebuild-sales-facts`.
+    """
+    __tablename__ = 'daily_sales_facts'
+
+    id = db.Column(db.Integer, primary_key=True)
+    fact_date = db.Column(db.Date, nullable=False)
+    order_date = db.Column(db.Date, nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    channel = db.Column(db.String(10), nullable=False)  # 'pos' ou 'shop'
+
+    quantity = db.Column(db.Numeric(12, 3), nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    cogs = db.Column(db.Numeric(14, 4), nullable=False, default=0)
+    orders_count = db.Column(db.Integer, nullable=False, default=0)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    product = db.relationship('Product')
+
+    __table_args__ = (
+        db.UniqueConstraint('fact_date', 'product_id', 'channel', 'order_date', name='uq_daily_sales_fact'),
+        db.Index('idx_daily_sales_facts_date_channel', 'fact_date', 'channel'),
+    )
+
+    def __repr__(self):
+        return f'<DailySalesFact {self.fact_date} {self.channel} P{self.product_id}>'
@@ -0,0 +1,298 @@
+"""
+Table de faits des ventes quotidiennes (daily_sales_facts)
+
+Pré-agrège les lignes de commande par jour × produit × canal pour que les
+rapports hebdomadaires/mensuels somment quelques dizaines de lignes au lieu
+de rejoindre orders/order_items sur tout l'historique.
+
+Règles de comptabilisation (identiques à _get_orders_filter_real) :
+- POS  : order_type == 'in_store', comptabilisé au jour de created_at
+- Shop : hors 'in_store' et 'counter_production_request', statut livré,
+         comptabilisé au jour de due_date
+
+La table est maintenue automatiquement : chaque flush qui touche une commande
+(statut, type, dates) ou une ligne de commande marque les jours concernés,
+qui sont ré-agrégés juste avant le commit.
+"""
+
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from itertools import chain
+
+from sqlalchemy import and_, delete, func
+from sqlalchemy.orm import attributes
+
+from extensions import db
+from models import Order, OrderItem, Product
+from app.reports.models import DailySalesFact
+from app.utils.session_hooks import DeferredRefreshHooks
+from app.utils.upsert import upsert
+
+
+DELIVERED_STATUSES = ['delivered', 'completed', 'delivered_unpaid']
+
+# Attributs d'une commande qui modifient sa comptabilisation
+_TRACKED_ORDER_ATTRS = ('status', 'order_type', 'created_at', 'due_date')
+
+# Taille des lots de jours lors d'une reconstruction complète
+_REBUILD_CHUNK_DAYS = 31
+
+
+def _as_date(value):
+    """Normalise une valeur renvoyée par func.date() (str sous SQLite) en date."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+def _q(value, places='0.0001'):
+    return Decimal(str(value or 0)).quantize(Decimal(places))
+
+
+class SalesFactService:
+    """Maintenance et lecture de la table daily_sales_facts"""
+
+    @staticmethod
+    def facts_filter(report_date=None, start_date=None, end_date=None):
+        """
+        Équivalent de _get_orders_filter_real pour la table de faits.
+
+        - report_date : tout ce qui est comptabilisé ce jour
+        - période : comptabilisé ET commandé dans la période (les commandes Shop
+          créées avant la période sont exclues, comme dans le filtre d'origine)
+        """
+        if report_date:
+            return DailySalesFact.fact_date == report_date
+        elif start_date and end_date:
+            return and_(
+                DailySalesFact.fact_date >= start_date,
+                DailySalesFact.fact_date <= end_date,
+                DailySalesFact.order_date >= start_date,
+                DailySalesFact.order_date <= end_date
+            )
+        return DailySalesFact.id.isnot(None)
+
+    @staticmethod
+    def total_cogs(report_date=None, start_date=None, end_date=None):
+        """Coût des ventes (au coût du moment de la vente) pour un jour ou une période."""
+        result = db.session.query(func.sum(DailySalesFact.cogs)).filter(
+            SalesFactService.facts_filter(report_date, start_date, end_date)
+        ).scalar()
+        return float(result or 0)
+
+    @staticmethod
+    def rebuild(start_date, end_date):
+        """
+        Reconstruit les faits pour [start_date, end_date] par lots d'un mois.
+
+        Returns:
+            int: Nombre de lignes de faits écrites
+        """
+        written = 0
+        chunk_start = start_date
+        while chunk_start <= end_date:
+            chunk_end = min(end_date, chunk_start + timedelta(days=_REBUILD_CHUNK_DAYS - 1))
+            written += SalesFactService._rebuild_range(chunk_start, chunk_end)
+            chunk_start = chunk_end + timedelta(days=1)
+        return written
+
+    @staticmethod
+    def refresh_days(days):
+        """Ré-agrège une liste de jours (regroupés en plages contiguës)."""
+        written = 0
+        sorted_days = sorted(set(d for d in days if d))
+        if not sorted_days:
+            return 0
+
+        range_start = range_end = sorted_days[0]
+        for day in sorted_days[1:]:
+            if day == range_end + timedelta(days=1):
+                range_end = day
+                continue
+            written += SalesFactService._rebuild_range(range_start, range_end)
+            range_start = range_end = day
+        written += SalesFactService._rebuild_range(range_start, range_end)
+        return written
+
+    @staticmethod
+    def _rebuild_range(start_date, end_date):
+        session = db.session
+        start_dt = datetime.combine(start_date, datetime.min.time())
+        end_dt = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+
+        # 1. Conserver le coût unitaire déjà figé pour les faits existants
+        #    (coût au moment de la vente, pas le PMP actuel)
+        existing = session.query(
+            DailySalesFact.id,
+            DailySalesFact.fact_date,
+            DailySalesFact.order_date,
+            DailySalesFact.product_id,
+            DailySalesFact.channel,
+            DailySalesFact.cogs,
+            DailySalesFact.quantity
+        ).filter(
+            DailySalesFact.fact_date >= start_date,
+            DailySalesFact.fact_date <= end_date
+        ).all()
+        totals = {}
+        for row in existing:
+            cogs, quantity = totals.get((_as_date(row.fact_date), row.product_id), (Decimal('0'), Decimal('0')))
+            totals[(_as_date(row.fact_date), row.product_id)] = (
+                cogs + Decimal(str(row.cogs or 0)), quantity + Decimal(str(row.quantity or 0))
+            )
+        frozen_costs = {key: cogs / quantity for key, (cogs, quantity) in totals.items() if quantity}
+
+        # 2. Agrégation POS (jour de création)
+        pos_day = func.date(Order.created_at)
+        pos_rows = session.query(
+            pos_day.label('fact_date'),
+            pos_day.label('order_date'),
+            OrderItem.product_id,
+            func.sum(OrderItem.quantity).label('quantity'),
+            func.sum(OrderItem.quantity * OrderItem.unit_price).label('revenue'),
+            func.count(func.distinct(Order.id)).label('orders_count')
+        ).select_from(OrderItem).join(
+            Order, Order.id == OrderItem.order_id
+        ).filter(
+            Order.order_type == 'in_store',
+            Order.created_at >= start_dt,
+            Order.created_at < end_dt
+        ).group_by(pos_day, OrderItem.product_id).all()
+
+        # 3. Agrégation Shop (jour de livraison)
+        shop_day = func.date(Order.due_date)
+        created_day = func.date(Order.created_at)
+        shop_rows = session.query(
+            shop_day.label('fact_date'),
+            created_day.label('order_date'),
+            OrderItem.product_id,
+            func.sum(OrderItem.quantity).label('quantity'),
+            func.sum(OrderItem.quantity * OrderItem.unit_price).label('revenue'),
+            func.count(func.distinct(Order.id)).label('orders_count')
+        ).select_from(OrderItem).join(
+            Order, Order.id == OrderItem.order_id
+        ).filter(
+            Order.order_type != 'in_store',
+            Order.order_type != 'counter_production_request',
+            Order.status.in_(DELIVERED_STATUSES),
+            Order.due_date >= start_dt,
+            Order.due_date < end_dt
+        ).group_by(shop_day, created_day, OrderItem.product_id).all()
+
+        product_ids = {row.product_id for row in chain(pos_rows, shop_rows)}
+        current_costs = {}
+        if product_ids:
+            current_costs = {
+                pid: Decimal(str(cost or 0))
+                for pid, cost in session.query(Product.id, Product.cost_price).filter(
+                    Product.id.in_(product_ids)
+                )
+            }
+
+        now = datetime.utcnow()
+        payload = []
+        for channel, rows in (('pos', pos_rows), ('shop', shop_rows)):
+            for row in rows:
+                fact_date = _as_date(row.fact_date)
+                quantity = Decimal(str(row.quantity or 0))
+                unit_cost = frozen_costs.get((fact_date, row.product_id), current_costs.get(row.product_id, Decimal('0')))
+                payload.append({
+                    'fact_date': fact_date,
+                    'order_date': _as_date(row.order_date),
+                    'product_id': row.product_id,
+                    'channel': channel,
+                    'quantity': _q(quantity, '0.001'),
+                    'revenue': _q(row.revenue, '0.01'),
+                    'cogs': _q(quantity * unit_cost),
+                    'orders_count': int(row.orders_count or 0),
+                    'updated_at': now,
+                })
+
+        # 4. Upsert : deux caisses qui valident le même jour mettent à jour les mêmes
+        #    lignes au lieu de se heurter à uq_daily_sales_fact
+        if payload:
+            _upsert_facts(session, payload)
+
+        # 5. Supprimer les faits qui n'ont plus de ventes (commande annulée, date modifiée)
+        kept = {(row['fact_date'], row['order_date'], row['product_id'], row['channel']) for row in payload}
+        stale_ids = [
+            row.id for row in existing
+            if (_as_date(row.fact_date), _as_date(row.order_date), row.product_id, row.channel) not in kept
+        ]
+        if stale_ids:
+            session.execute(delete(DailySalesFact).where(DailySalesFact.id.in_(stale_ids)))
+        return len(payload)
+
+
+def _upsert_facts(session, payload):
+    """Écrit les faits sur la contrainte uq_daily_sales_fact (ON CONFLICT, ou lecture puis UPDATE / INSERT)."""
+    upsert(
+        session, DailySalesFact, payload,
+        ('fact_date', 'product_id', 'channel', 'order_date'),
+        ('quantity', 'revenue', 'cogs', 'orders_count', 'updated_at')
+    )
+
+
+# ============================================================================
+# MAINTENANCE INCRÉMENTALE (événements de session)
+# ============================================================================
+
+def _collect_dirty_days(session, pending):
+    """after_flush : repère les jours dont les faits doivent être recalculés."""
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Order):
+            if obj in session.dirty and not any(
+                attributes.get_history(obj, attr).has_changes() for attr in _TRACKED_ORDER_ATTRS
+            ):
+                continue
+            # Dates actuelles relues avant le commit via order_ids ; on garde ici
+            # les anciennes valeurs (changement de date) et celles des commandes supprimées
+            if obj.id and obj not in session.deleted:
+                pending['order_ids'].add(obj.id)
+            for attr in ('created_at', 'due_date'):
+                history = attributes.get_history(obj, attr)
+                values = history.deleted or ()
+                if obj in session.deleted:
+                    values = chain(values, history.unchanged or ())
+                for value in values:
+                    day = _as_date(value) if isinstance(value, (date, datetime)) else None
+                    if day:
+                        pending['days'].add(day)
+        elif isinstance(obj, OrderItem):
+            history = attributes.get_history(obj, 'order_id')
+            for order_id in chain(history.added or (), history.unchanged or (), history.deleted or ()):
+                if order_id:
+                    pending['order_ids'].add(order_id)
+
+
+def _refresh_days(session, pending):
+    """before_commit : ré-agrège les jours marqués, dans la même transaction."""
+    days = set(pending['days'])
+    if pending['order_ids']:
+        for created_at, due_date in session.query(Order.created_at, Order.due_date).filter(
+            Order.id.in_(pending['order_ids'])
+        ):
+            days.add(_as_date(created_at))
+            days.add(_as_date(due_date))
+    SalesFactService.refresh_days(days)
+
+
+# SAVEPOINT : un échec du recalcul ne doit jamais bloquer une vente.
+# Ancien jour nécessaire pour retirer la vente des faits quand une date change.
+_hooks = DeferredRefreshHooks(
+    'sales_facts',
+    new_pending=lambda: {'days': set(), 'order_ids': set()},
+    collect=_collect_dirty_days,
+    refresh=_refresh_days,
+    history_attributes=(Order.created_at, Order.due_date),
+    failure_message="daily_sales_facts non mis à jour ({error}) - lancer `flask rebuild-sales-facts`",
+)
+
+
+def register_sales_facts_hooks():
+    """Branche la maintenance incrémentale sur la classe de session Flask-SQLAlchemy."""
+    _hooks.register()
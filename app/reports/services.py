@@ -7,12 +7,16 @@ from datetime import datetime, date, timedelta
 from decimal import Decimal
 from sqlalchemy import func, and_, or_, extract, case
 from extensions import db
+from app.utils.date_ranges import on_day, not_on_day, in_period
 from models import Product, Order, OrderItem, Category
 from app.sales.models import CashRegisterSession, CashMovement
-from app.employees.models import Employee, WorkHours, PayrollEntry, PayrollPeriod, AttendanceSummary
+from app.employees.models import Employee, WorkHours, PayrollEntry, PayrollPeriod, AttendanceSummary, OrderIssue, order_employees
 from app.inventory.models import DailyWaste
 from app.purchases.models import Purchase
 from app.accounting.services import DashboardService
+from app.reports.models import DailySalesFact
+from app.reports.sales_facts import SalesFactService
+from app.stock.valuation import StockValuationService
 import yaml
 import os
 
@@ -98,11 +102,10 @@ def _compute_revenue(report_date=None, start_date=None, end_date=None):
     
     # Filtrage par date
     if report_date:
-        query = query.filter(func.date(Order.created_at) == report_date)
+        query = query.filter(on_day(Order.created_at, report_date))
     elif start_date and end_date:
         query = query.filter(
-            func.date(Order.created_at) >= start_date,
-            func.date(Order.created_at) <= end_date
+            in_period(Order.created_at, start_date, end_date)
         )
     
     result = query.scalar() or 0
@@ -130,7 +133,7 @@ def _get_orders_filter_real(report_date=None, start_date=None, end_date=None):
         # POS : créées ce jour
         pos_condition = and_(
             Order.order_type == 'in_store',
-            func.date(Order.created_at) == report_date
+            on_day(Order.created_at, report_date)
         )
         
         # Shop : livrées ce jour (exclure ordres de production)
@@ -138,7 +141,7 @@ def _get_orders_filter_real(report_date=None, start_date=None, end_date=None):
             Order.order_type != 'in_store',
             Order.order_type != 'counter_production_request',  # Exclure les ordres de production
             Order.status.in_(['delivered', 'completed', 'delivered_unpaid']),
-            func.date(Order.due_date) == report_date
+            on_day(Order.due_date, report_date)
         )
         
         return or_(pos_condition, shop_condition)
@@ -147,8 +150,7 @@ def _get_orders_filter_real(report_date=None, start_date=None, end_date=None):
         # POS : créées dans la période
         pos_condition = and_(
             Order.order_type == 'in_store',
-            func.date(Order.created_at) >= start_date,
-            func.date(Order.created_at) <= end_date
+            in_period(Order.created_at, start_date, end_date)
         )
         
         # Shop : créées ET livrées dans la période (exclure ordres de production)
@@ -156,10 +158,8 @@ def _get_orders_filter_real(report_date=None, start_date=None, end_date=None):
             Order.order_type != 'in_store',
             Order.order_type != 'counter_production_request',  # Exclure les ordres de production
             Order.status.in_(['delivered', 'completed', 'delivered_unpaid']),
-            func.date(Order.created_at) >= start_date,  # Créée dans la période
-            func.date(Order.created_at) <= end_date,
-            func.date(Order.due_date) >= start_date,  # Livrée dans la période
-            func.date(Order.due_date) <= end_date
+            in_period(Order.created_at, start_date, end_date),  # Créée dans la période
+            in_period(Order.due_date, start_date, end_date)  # Livrée dans la période
         )
         
         return or_(pos_condition, shop_condition)
@@ -195,7 +195,7 @@ def _compute_revenue_real(report_date=None, start_date=None, end_date=None):
         pos_revenue = db.session.query(func.sum(Order.total_amount))\
             .filter(
                 Order.order_type == 'in_store',
-                func.date(Order.created_at) == report_date
+                on_day(Order.created_at, report_date)
             ).scalar() or 0.0
         
         # Shop : commandes créées ET livrées ce jour
@@ -207,8 +207,8 @@ def _compute_revenue_real(report_date=None, start_date=None, end_date=None):
                 Order.order_type != 'in_store',
                 Order.order_type != 'counter_production_request',  # Exclure les ordres de production
                 Order.status.in_(['delivered', 'completed', 'delivered_unpaid']),
-                func.date(Order.created_at) == report_date,  # Créée le jour J
-                func.date(Order.due_date) == report_date  # Livrée le jour J
+                on_day(Order.created_at, report_date),  # Créée le jour J
+                on_day(Order.due_date, report_date)  # Livrée le jour J
             ).scalar() or 0.0
         
         return float(pos_revenue) + float(shop_revenue)
@@ -220,8 +220,7 @@ def _compute_revenue_real(report_date=None, start_date=None, end_date=None):
         pos_revenue = db.session.query(func.sum(Order.total_amount))\
             .filter(
                 Order.order_type == 'in_store',
-                func.date(Order.created_at) >= start_date,
-                func.date(Order.created_at) <= end_date
+                in_period(Order.created_at, start_date, end_date)
             ).scalar() or 0.0
         
         # Shop : commandes créées ET livrées dans la période
@@ -233,10 +232,8 @@ def _compute_revenue_real(report_date=None, start_date=None, end_date=None):
                 Order.order_type != 'in_store',
                 Order.order_type != 'counter_production_request',  # Exclure les ordres de production
                 Order.status.in_(['delivered', 'completed', 'delivered_unpaid']),
-                func.date(Order.created_at) >= start_date,  # Créée dans la période
-                func.date(Order.created_at) <= end_date,
-                func.date(Order.due_date) >= start_date,  # Livrée dans la période
-                func.date(Order.due_date) <= end_date
+                in_period(Order.created_at, start_date, end_date),  # Créée dans la période
+                in_period(Order.due_date, start_date, end_date)  # Livrée dans la période
             ).scalar() or 0.0
         
         return float(pos_revenue) + float(shop_revenue)
@@ -352,13 +349,11 @@ def _get_stock_value(reference_date=None, location='comptoir'):
     """
     Fonction utilitaire pour calculer la valeur totale du stock à une date donnée.
     
-    Note : Cette version utilise le stock actuel comme approximation.
-    Lorsqu'un système d'historique de stock sera disponible, cette fonction
-    pourra être étendue pour interroger les snapshots historiques.
+    Avec une date, le stock à la fin de ce jour est reconstitué à partir des
+    photos quotidiennes et des mouvements de stock (app/stock/valuation.py).
     
     Args:
-        reference_date: Date de référence (non utilisée actuellement, 
-                       préparée pour évolution future)
+        reference_date: Date de référence (None : stock actuel)
         location: Emplacement du stock à considérer
                  'comptoir' : stock_comptoir (défaut)
                  'local' : stock_ingredients_local
@@ -367,10 +362,10 @@ def _get_stock_value(reference_date=None, location='comptoir'):
                  'all' : somme de tous les emplacements
         
     Returns:
-        float: Valeur totale du stock (stock * cost_price)
+        float: Valeur totale du stock (stock * cost_price, ou valorisation à la date)
     """
-    # Actuellement : utilise le stock actuel (instantané)
-    # TODO Future : Interroger table d'historique de stock si disponible
+    if reference_date is not None:
+        return StockValuationService.value_at(reference_date, location)
     
     # Définir le champ de stock selon l'emplacement
     if location == 'comptoir':
@@ -459,17 +454,16 @@ class DailySalesReportService:
         total_transactions = len(orders)
         average_basket = total_revenue / total_transactions if total_transactions > 0 else 0
         
-        # Top 5 produits (utiliser le filtre cohérent)
+        # Top 5 produits (table de faits, même règle que le filtre cohérent)
+        facts_filter = SalesFactService.facts_filter(report_date=report_date)
         top_products_rows = db.session.query(
             Product.name,
-            func.sum(OrderItem.quantity).label('quantity'),
-            func.sum(OrderItem.quantity * OrderItem.unit_price).label('revenue')
-        ).select_from(Product).join(
-            OrderItem, OrderItem.product_id == Product.id
-        ).join(
-            Order, Order.id == OrderItem.order_id
-        ).filter(orders_filter).group_by(Product.id, Product.name).order_by(
-            func.sum(OrderItem.quantity * OrderItem.unit_price).desc()
+            func.sum(DailySalesFact.quantity).label('quantity'),
+            func.sum(DailySalesFact.revenue).label('revenue')
+        ).select_from(DailySalesFact).join(
+            Product, Product.id == DailySalesFact.product_id
+        ).filter(facts_filter).group_by(Product.id, Product.name).order_by(
+            func.sum(DailySalesFact.revenue).desc()
         ).limit(5).all()
         top_products_json = [
             {
@@ -479,17 +473,15 @@ class DailySalesReportService:
             } for row in top_products_rows
         ]
         
-        # Ventes par catégorie (utiliser le filtre cohérent)
+        # Ventes par catégorie (table de faits)
         sales_by_category_rows = db.session.query(
             Category.name,
-            func.sum(OrderItem.quantity * OrderItem.unit_price).label('revenue')
-        ).select_from(Category).join(
-            Product, Product.category_id == Category.id
-        ).join(
-            OrderItem, OrderItem.product_id == Product.id
+            func.sum(DailySalesFact.revenue).label('revenue')
+        ).select_from(DailySalesFact).join(
+            Product, Product.id == DailySalesFact.product_id
         ).join(
-            Order, Order.id == OrderItem.order_id
-        ).filter(orders_filter).group_by(Category.id, Category.name).all()
+            Category, Category.id == Product.category_id
+        ).filter(facts_filter).group_by(Category.id, Category.name).all()
         sales_by_category_json = [
             {
                 'name': row.name,
@@ -577,39 +569,11 @@ class PrimeCostReportService:
         if not report_date:
             report_date = date.today()
         
-        # Chiffre d'affaires (utilise DailySalesReportService qui est maintenant cohérent)
-        revenue = DailySalesReportService.generate(report_date)['total_revenue']
+        # Chiffre d'affaires (même calcul que DailySalesReportService, sans générer tout le rapport)
+        revenue = _compute_revenue_real(report_date=report_date)
         
-        # COGS (Cost of Goods Sold) - calcul cohérent avec RealKpiService
-        # IMPORTANT : Utiliser la même méthode que RealKpiService pour garantir la cohérence
-        # On calcule directement via une requête SQL : OrderItem.quantity * Product.cost_price
-        
-        # Récupérer les IDs des commandes concernées (même logique que RealKpiService)
-        pos_order_ids = db.session.query(Order.id).filter(
-            Order.order_type == 'in_store',
-            func.date(Order.created_at) == report_date
-        ).all()
-        pos_ids = [r[0] for r in pos_order_ids]
-        
-        shop_order_ids = db.session.query(Order.id).filter(
-            Order.order_type != 'in_store',
-            Order.status.in_(['delivered', 'completed', 'delivered_unpaid']),
-            func.date(Order.due_date) == report_date
-        ).all()
-        shop_ids = [r[0] for r in shop_order_ids]
-        
-        all_order_ids = pos_ids + shop_ids
-        
-        # Calculer le COGS directement via requête SQL (même méthode que RealKpiService)
-        if all_order_ids:
-            cogs_query = db.session.query(
-                func.sum(OrderItem.quantity * Product.cost_price)
-            ).join(Product, OrderItem.product_id == Product.id)\
-             .filter(OrderItem.order_id.in_(all_order_ids))
-            
-            cogs = float(cogs_query.scalar() or 0.0)
-        else:
-            cogs = 0.0
+        # COGS (Cost of Goods Sold) - table de faits (POS du jour + Shop livrées ce jour)
+        cogs = SalesFactService.total_cogs(report_date=report_date)
         
         # Coût de main d'œuvre du jour
         # Utiliser AttendanceSummary si disponible, sinon AttendanceRecord
@@ -707,7 +671,7 @@ class ProductionReportService:
         
         # Ordres de production du jour
         production_orders = Order.query.filter(
-            func.date(Order.created_at) == report_date,
+            on_day(Order.created_at, report_date),
             Order.order_type == 'counter_production_request'
         ).all()
         
@@ -720,7 +684,7 @@ class ProductionReportService:
         ).join(
             Order, Order.id == OrderItem.order_id
         ).filter(
-            func.date(Order.created_at) == report_date,
+            on_day(Order.created_at, report_date),
             Order.order_type == 'counter_production_request'
         ).group_by(Product.id, Product.name, Product.unit).all()
         production_by_product_json = [
@@ -910,16 +874,8 @@ class WasteLossReportService:
             waste_by_reason[reason]['count'] += 1
             waste_by_reason[reason]['value'] += waste.value_lost
         
-        # Coût alimentaire total (COGS) - utiliser filtre cohérent avec RealKpiService
-        orders_filter = _get_orders_filter_real(start_date=start_date, end_date=end_date)
-        total_cogs = db.session.query(
-            func.sum(OrderItem.quantity * Product.cost_price)
-        ).select_from(OrderItem).join(
-            Product, Product.id == OrderItem.product_id
-        ).join(
-            Order, Order.id == OrderItem.order_id
-        ).filter(orders_filter).scalar() or 1  # Éviter division par zéro
-        total_cogs = float(total_cogs)
+        # Coût alimentaire total (COGS) - table de faits, filtre cohérent avec RealKpiService
+        total_cogs = SalesFactService.total_cogs(start_date=start_date, end_date=end_date) or 1  # Éviter division par zéro
         
         # Pourcentage du coût alimentaire
         waste_percentage = (total_value_lost / total_cogs * 100) if total_cogs > 0 else 0
@@ -1004,31 +960,27 @@ class WeeklyProductPerformanceService:
         if not start_date or not end_date:
             start_date, end_date = ReportService.get_date_range('week')
         
-        # Ventes par produit cette semaine - utiliser filtre cohérent avec RealKpiService
-        orders_filter = _get_orders_filter_real(start_date=start_date, end_date=end_date)
+        # Ventes par produit cette semaine - table de faits (filtre cohérent avec RealKpiService)
         current_week_sales = db.session.query(
             Product.id,
             Product.name,
-            func.sum(OrderItem.quantity).label('quantity_sold'),
-            func.sum(OrderItem.quantity * OrderItem.unit_price).label('revenue')
-        ).select_from(Product).join(
-            OrderItem, OrderItem.product_id == Product.id
-        ).join(
-            Order, Order.id == OrderItem.order_id
-        ).filter(orders_filter).group_by(Product.id, Product.name).all()
+            func.sum(DailySalesFact.quantity).label('quantity_sold'),
+            func.sum(DailySalesFact.revenue).label('revenue')
+        ).select_from(DailySalesFact).join(
+            Product, Product.id == DailySalesFact.product_id
+        ).filter(
+            SalesFactService.facts_filter(start_date=start_date, end_date=end_date)
+        ).group_by(Product.id, Product.name).all()
         
-        # Ventes semaine précédente - utiliser filtre cohérent
+        # Ventes semaine précédente
         prev_start = start_date - timedelta(days=7)
         prev_end = end_date - timedelta(days=7)
-        prev_orders_filter = _get_orders_filter_real(start_date=prev_start, end_date=prev_end)
         prev_week_sales = db.session.query(
-            Product.id,
-            func.sum(OrderItem.quantity * OrderItem.unit_price).label('revenue')
-        ).select_from(Product).join(
-            OrderItem, OrderItem.product_id == Product.id
-        ).join(
-            Order, Order.id == OrderItem.order_id
-        ).filter(prev_orders_filter).group_by(Product.id).all()
+            DailySalesFact.product_id.label('id'),
+            func.sum(DailySalesFact.revenue).label('revenue')
+        ).filter(
+            SalesFactService.facts_filter(start_date=prev_start, end_date=prev_end)
+        ).group_by(DailySalesFact.product_id).all()
         
         # Créer un dict pour comparaison
         prev_sales_dict = {p.id: float(p.revenue) for p in prev_week_sales}
@@ -1106,20 +1058,12 @@ class StockRotationReportService:
         if not start_date or not end_date:
             start_date, end_date = ReportService.get_date_range('week')
         
-        # COGS de la période - utiliser filtre cohérent avec RealKpiService
-        orders_filter = _get_orders_filter_real(start_date=start_date, end_date=end_date)
-        cogs = db.session.query(
-            func.sum(OrderItem.quantity * Product.cost_price)
-        ).select_from(OrderItem).join(
-            Product, Product.id == OrderItem.product_id
-        ).join(
-            Order, Order.id == OrderItem.order_id
-        ).filter(orders_filter).scalar() or 0
-        cogs = float(cogs)
+        # COGS de la période - table de faits (filtre cohérent avec RealKpiService)
+        cogs = SalesFactService.total_cogs(start_date=start_date, end_date=end_date)
         
         # Valeur moyenne du stock (formule correcte : moyenne période)
-        # Note : Utilisation stock actuel comme approximation (voir _get_stock_value)
-        stock_start = _get_stock_value(reference_date=start_date)
+        # Début de période = fin de la veille ; fin de période = fin du dernier jour
+        stock_start = _get_stock_value(reference_date=start_date - timedelta(days=1))
         stock_end = _get_stock_value(reference_date=end_date)
         stock_moyen = (stock_start + stock_end) / 2 if (stock_start + stock_end) > 0 else 1
         
@@ -1303,6 +1247,94 @@ class LaborCostReportService:
         }
 
 
+class EmployeePerformanceService:
+    """Performance mensuelle des employés (CA produit, volume, qualité, ROI)"""
+    
+    @staticmethod
+    def monthly(year, month):
+        """
+        Performance des employés actifs sur un mois.
+        
+        Requêtes groupées par employé (order_employees, order_issues) puis
+        assemblage en mémoire : nombre de requêtes constant quel que soit
+        le nombre d'employés.
+        
+        Returns:
+            dict: {'employees': [...], 'summary': {...}}
+        """
+        start_date = date(year, month, 1)
+        if month == 12:
+            end_date = date(year + 1, 1, 1) - timedelta(days=1)
+        else:
+            end_date = date(year, month + 1, 1) - timedelta(days=1)
+        
+        active_employees = Employee.query.filter_by(is_active=True).all()
+        
+        # CA (commandes terminées) et nombre de commandes produites par employé
+        production_rows = db.session.query(
+            order_employees.c.employee_id,
+            func.sum(case(
+                (Order.status.in_(['completed', 'delivered']), Order.total_amount),
+                else_=0
+            )),
+            func.count(Order.id)
+        ).select_from(order_employees).join(
+            Order, Order.id == order_employees.c.order_id
+        ).filter(
+            in_period(Order.created_at, start_date, end_date)
+        ).group_by(order_employees.c.employee_id).all()
+        production = {
+            employee_id: (float(revenue or 0), int(orders or 0))
+            for employee_id, revenue, orders in production_rows
+        }
+        
+        # Problèmes de qualité par employé
+        issues = dict(
+            db.session.query(OrderIssue.employee_id, func.count(OrderIssue.id)).filter(
+                in_period(OrderIssue.detected_at, start_date, end_date)
+            ).group_by(OrderIssue.employee_id).all()
+        )
+        
+        employee_performance = []
+        for emp in active_employees:
+            employee_revenue, employee_orders = production.get(emp.id, (0.0, 0))
+            quality_issues = issues.get(emp.id, 0)
+            employee_cost = emp.get_monthly_salary_cost(year, month)
+            
+            # ROI employé
+            roi = (employee_revenue / employee_cost * 100) if employee_cost > 0 else 0
+            
+            # Taux d'erreur
+            error_rate = (quality_issues / employee_orders * 100) if employee_orders > 0 else 0
+            
+            employee_performance.append({
+                'id': emp.id,
+                'name': emp.name,
+                'role': emp.get_role_display(),
+                'revenue_generated': employee_revenue,
+                'orders_produced': employee_orders,
+                'quality_issues': quality_issues,
+                'error_rate': error_rate,
+                'monthly_cost': employee_cost,
+                'roi': roi,
+                'avg_order_value': employee_revenue / employee_orders if employee_orders > 0 else 0
+            })
+        
+        # Trier par ROI
+        employee_performance.sort(key=lambda x: x['roi'], reverse=True)
+        
+        return {
+            'employees': employee_performance,
+            'summary': {
+                'total_employees': len(active_employees),
+                'total_revenue': sum(e['revenue_generated'] for e in employee_performance),
+                'total_cost': sum(e['monthly_cost'] for e in employee_performance),
+                'avg_roi': sum(e['roi'] for e in employee_performance) / len(employee_performance) if employee_performance else 0,
+                'avg_error_rate': sum(e['error_rate'] for e in employee_performance) / len(employee_performance) if employee_performance else 0
+            }
+        }
+
+
 class CashFlowForecastService:
     """Prévision de trésorerie hebdomadaire"""
     
@@ -1331,8 +1363,7 @@ class CashFlowForecastService:
                 # Cas 2 : payment_date non renseigné, on utilise requested_date
                 and_(
                     Purchase.payment_date.is_(None),
-                    func.date(Purchase.requested_date) >= start_date,
-                    func.date(Purchase.requested_date) <= end_date
+                    in_period(Purchase.requested_date, start_date, end_date)
                 )
             )
         ).scalar() or 0
@@ -1436,19 +1467,18 @@ class MonthlyGrossMarginService:
         else:
             end_date = date(year, month + 1, 1) - timedelta(days=1)
         
-        # Ventes et COGS par catégorie - utiliser filtre cohérent avec RealKpiService
-        orders_filter = _get_orders_filter_real(start_date=start_date, end_date=end_date)
+        # Ventes et COGS par catégorie - table de faits (≤ 31 jours de lignes agrégées)
         category_data = db.session.query(
             Category.name,
-            func.sum(OrderItem.quantity * OrderItem.unit_price).label('revenue'),
-            func.sum(OrderItem.quantity * Product.cost_price).label('cogs')
-        ).select_from(Category).join(
-            Product, Product.category_id == Category.id
+            func.sum(DailySalesFact.revenue).label('revenue'),
+            func.sum(DailySalesFact.cogs).label('cogs')
+        ).select_from(DailySalesFact).join(
+            Product, Product.id == DailySalesFact.product_id
         ).join(
-            OrderItem, OrderItem.product_id == Product.id
-        ).join(
-            Order, Order.id == OrderItem.order_id
-        ).filter(orders_filter).group_by(Category.id, Category.name).all()
+            Category, Category.id == Product.category_id
+        ).filter(
+            SalesFactService.facts_filter(start_date=start_date, end_date=end_date)
+        ).group_by(Category.id, Category.name).all()
         
         # Calculer les marges
         margin_data = []
@@ -1509,6 +1539,10 @@ class MonthlyGrossMarginService:
             'is_healthy': global_margin_percentage >= target_margin
         }
         
+        # Stock d'ouverture et de clôture du mois (tous emplacements)
+        opening_stock_value = _get_stock_value(reference_date=start_date - timedelta(days=1), location='all')
+        closing_stock_value = _get_stock_value(reference_date=min(end_date, date.today()), location='all')
+        
         # Métadonnées temporelles
         metadata = _get_temporal_metadata(end_date)
         
@@ -1518,6 +1552,8 @@ class MonthlyGrossMarginService:
             'start_date': start_date,
             'end_date': end_date,
             'margin_data': margin_data,
+            'opening_stock_value': opening_stock_value,
+            'closing_stock_value': closing_stock_value,
             # Métadonnées IA
             'growth_rate': growth_rate,
             'variance': variance,
@@ -1548,16 +1584,8 @@ class MonthlyProfitLossService:
         # Chiffre d'affaires (utilisation fonction cohérente avec RealKpiService)
         revenue = _compute_revenue_real(start_date=start_date, end_date=end_date)
         
-        # COGS - utiliser le même filtre que le CA pour garantir la cohérence
-        orders_filter = _get_orders_filter_real(start_date=start_date, end_date=end_date)
-        cogs = db.session.query(
-            func.sum(OrderItem.quantity * Product.cost_price)
-        ).select_from(OrderItem).join(
-            Product, Product.id == OrderItem.product_id
-        ).join(
-            Order, Order.id == OrderItem.order_id
-        ).filter(orders_filter).scalar() or 0
-        cogs = float(cogs)
+        # COGS - table de faits, même règle de comptabilisation que le CA
+        cogs = SalesFactService.total_cogs(start_date=start_date, end_date=end_date)
         
         # Marge brute
         gross_margin = revenue - cogs
@@ -1675,7 +1703,7 @@ class DailyProfitabilityService:
         exit_types = {'sortie', 'retrait', 'frais', 'paiement'}
         
         movements = CashMovement.query.filter(
-            func.date(CashMovement.created_at) == target_date
+            on_day(CashMovement.created_at, target_date)
         ).all()
         
         cash_in = 0.0
@@ -1716,7 +1744,7 @@ class DailyProfitabilityService:
         # 5.1 Commandes POS (Ventes au Comptoir)
         pos_orders_query = Order.query.filter(
             Order.order_type == 'in_store',
-            func.date(Order.created_at) == target_date
+            on_day(Order.created_at, target_date)
         ).order_by(Order.created_at.desc())
         
         pos_orders_detail = []
@@ -1732,8 +1760,8 @@ class DailyProfitabilityService:
             Order.order_type != 'in_store',
             Order.order_type != 'counter_production_request',
             Order.status.in_(['delivered', 'completed', 'delivered_unpaid']),
-            func.date(Order.created_at) == target_date,
-            func.date(Order.due_date) == target_date
+            on_day(Order.created_at, target_date),
+            on_day(Order.due_date, target_date)
         ).order_by(Order.created_at.desc())
         
         shop_orders_same_day_detail = []
@@ -1751,8 +1779,8 @@ class DailyProfitabilityService:
             Order.order_type != 'in_store',
             Order.order_type != 'counter_production_request',
             Order.status.in_(['delivered', 'completed', 'delivered_unpaid']),
-            func.date(Order.due_date) == target_date,  # Livrée aujourd'hui
-            func.date(Order.created_at) != target_date  # Mais créée avant
+            on_day(Order.due_date, target_date),  # Livrée aujourd'hui
+            not_on_day(Order.created_at, target_date)  # Mais créée avant
         ).order_by(Order.total_amount.desc())
         
         old_orders_detail = []
@@ -1767,7 +1795,7 @@ class DailyProfitabilityService:
             
             # Chercher tous les CashMovement du jour qui mentionnent cette commande
             movements_today = CashMovement.query.filter(
-                func.date(CashMovement.created_at) == target_date,
+                on_day(CashMovement.created_at, target_date),
                 CashMovement.type.in_(['entrée', 'vente', 'acompte'])
             ).all()
             
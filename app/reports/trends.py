@@ -0,0 +1,133 @@
+"""
+Agrégation de séries temporelles (tendances de CA, volumes...)
+
+Une seule requête GROUP BY par série au lieu d'une requête par jour ou par
+mois : les buckets vides sont complétés à 0 côté Python.
+
+Granularités :
+- day   : GROUP BY date(col)
+- week  : GROUP BY date(col), regroupé en semaines (lundi) côté Python
+- month : GROUP BY année, mois
+"""
+
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import DateTime, extract, func
+
+from extensions import db
+from models import Order, OrderItem
+from app.utils.date_ranges import in_period
+
+
+GRANULARITIES = ('day', 'week', 'month')
+
+# Statuts retenus par _compute_revenue
+REVENUE_STATUSES = ['completed', 'delivered', 'delivered_unpaid']
+
+
+def _as_date(value):
+    """Normalise une clé de bucket (str sous SQLite, date/datetime ailleurs)."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+class TimeSeriesService:
+    """Moteur d'agrégation par buckets de temps"""
+
+    @staticmethod
+    def bucket_start(day, granularity='day'):
+        """Premier jour du bucket contenant `day`."""
+        if granularity == 'week':
+            return day - timedelta(days=day.weekday())
+        if granularity == 'month':
+            return day.replace(day=1)
+        return day
+
+    @staticmethod
+    def bucket_range(start_date, end_date, granularity='day'):
+        """Liste ordonnée des débuts de buckets couvrant [start_date, end_date]."""
+        buckets = []
+        current = TimeSeriesService.bucket_start(start_date, granularity)
+        while current <= end_date:
+            buckets.append(current)
+            if granularity == 'week':
+                current += timedelta(days=7)
+            elif granularity == 'month':
+                current = date(current.year + current.month // 12, current.month % 12 + 1, 1)
+            else:
+                current += timedelta(days=1)
+        return buckets
+
+    @staticmethod
+    def aggregate(date_column, measures, start_date, end_date, granularity='day',
+                  filters=None, select_from=None, joins=None):
+        """
+        Agrège des mesures par bucket de temps en une seule requête.
+
+        Args:
+            date_column: Colonne Date/DateTime servant au découpage
+            measures: dict {nom: expression d'agrégat SQL}
+            start_date, end_date: Bornes incluses (date)
+            granularity: 'day', 'week' ou 'month'
+            filters: Liste de conditions supplémentaires
+            select_from: Entité de départ (si différente de celle de date_column)
+            joins: Liste de (cible, condition) à joindre
+
+        Returns:
+            list: [{'bucket': date, <mesure>: float, ...}] ordonné, sans trou
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Granularité inconnue : {granularity}")
+
+        names = list(measures.keys())
+        if granularity == 'month':
+            keys = [extract('year', date_column).label('bucket_year'),
+                    extract('month', date_column).label('bucket_month')]
+        else:
+            keys = [func.date(date_column).label('bucket_day')]
+
+        query = db.session.query(*keys, *(measures[name].label(name) for name in names))
+        if select_from is not None:
+            query = query.select_from(select_from)
+        for target, onclause in joins or []:
+            query = query.join(target, onclause)
+
+        if isinstance(date_column.type, DateTime):
+            query = query.filter(in_period(date_column, start_date, end_date))
+        else:
+            query = query.filter(date_column >= start_date, date_column <= end_date)
+        if filters:
+            query = query.filter(*filters)
+
+        totals = {}
+        for row in query.group_by(*keys).all():
+            if granularity == 'month':
+                bucket = date(int(row.bucket_year), int(row.bucket_month), 1)
+            else:
+                bucket = TimeSeriesService.bucket_start(_as_date(row.bucket_day), granularity)
+            values = totals.setdefault(bucket, dict.fromkeys(names, 0.0))
+            for name in names:
+                values[name] += float(getattr(row, name) or 0)
+
+        return [
+            {'bucket': bucket, **totals.get(bucket, dict.fromkeys(names, 0.0))}
+            for bucket in TimeSeriesService.bucket_range(start_date, end_date, granularity)
+        ]
+
+    @staticmethod
+    def revenue_series(start_date, end_date, granularity='day'):
+        """
+        CA par bucket, mêmes règles que _compute_revenue
+        (lignes de commande des commandes terminées, au jour de création).
+        """
+        return TimeSeriesService.aggregate(
+            Order.created_at,
+            {'revenue': func.sum(func.coalesce(OrderItem.quantity, 0) * func.coalesce(OrderItem.unit_price, 0))},
+            start_date, end_date, granularity,
+            filters=[Order.status.in_(REVENUE_STATUSES)],
+            select_from=OrderItem,
+            joins=[(Order, Order.id == OrderItem.order_id)]
+        )
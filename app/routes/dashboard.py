@@ -5,11 +5,14 @@ from statistics import mean
 from flask import current_app, render_template, request
 from flask_login import login_required
 from sqlalchemy import func, desc, case
+from sqlalchemy.orm import joinedload
 
 from extensions import db
+from app.utils.date_ranges import on_day, in_period
 from models import Order, OrderItem, Product
 from app.reports.services import DailySalesReportService, ReportService # Modified import
 from app.reports.kpi_service import RealKpiService
+from app.reports.trends import TimeSeriesService
 from app.sales.models import CashRegisterSession, CashMovement
 from app.purchases.models import Purchase
 from app.stock.models import StockMovement
@@ -229,7 +232,7 @@ def build_overview_block(sales_report, today):
 def build_production_block(production_report, today, now):
     production_orders = Order.query.filter(
         Order.status.in_(['pending', 'in_production']),
-        func.date(Order.due_date) == today
+        on_day(Order.due_date, today)
     ).order_by(Order.due_date.asc()).all()
 
     orders_by_priority = []
@@ -330,36 +333,51 @@ def build_production_bar_data(production_report):
 
 
 def compute_ingredient_requirements(orders):
+    from app.recipes.bom import RecipeBomCache
+    orders_by_id = {order.id: order for order in orders}
+    if not orders_by_id:
+        return []
+
+    # Lignes de toutes les commandes, nomenclatures en cache, ingrédients en une requête
+    items = OrderItem.query.filter(OrderItem.order_id.in_(orders_by_id.keys())).all()
+    bom = RecipeBomCache.snapshot().by_product
+    ingredient_ids = {
+        line.product_id
+        for item in items if item.product_id in bom
+        for line in bom[item.product_id].lines
+    }
+    ingredients = {
+        product.id: product
+        for product in Product.query.filter(Product.id.in_(ingredient_ids)).all()
+    } if ingredient_ids else {}
+
     needs = {}
-    for order in orders:
-        for item in order.items:
-            product = item.product
-            if not product or not product.recipe_definition:
+    for item in items:
+        recipe = bom.get(item.product_id)
+        if not recipe:
+            continue
+        order = orders_by_id[item.order_id]
+        for line in recipe.lines:
+            ingredient_product = ingredients.get(line.product_id)
+            if not ingredient_product:
                 continue
-            recipe = product.recipe_definition
-            for ingredient_in_recipe in recipe.ingredients:
-                ingredient_product = ingredient_in_recipe.product
-                if not ingredient_product:
-                    continue
-                qty_per_unit = float(ingredient_in_recipe.quantity_needed) / float(recipe.yield_quantity or 1)
-                needed_qty = qty_per_unit * float(item.quantity)
-                entry = needs.setdefault(ingredient_product.id, {
-                    'id': ingredient_product.id,
-                    'name': ingredient_product.name,
-                    'unit': ingredient_in_recipe.unit or ingredient_product.unit,
-                    'stock': float(ingredient_product.stock_ingredients_magasin or 0),
-                    'min_stock': float(ingredient_product.seuil_min_ingredients_magasin or 0),
-                    'needed_qty': 0.0,
-                    'deadline': order.due_date,
-                    'orders': set()
-                })
-                entry['needed_qty'] += needed_qty
-                entry['stock'] = float(ingredient_product.stock_ingredients_magasin or 0)
-                if order.due_date and entry['deadline']:
-                    entry['deadline'] = min(entry['deadline'], order.due_date)
-                elif order.due_date and not entry['deadline']:
-                    entry['deadline'] = order.due_date
-                entry['orders'].add(order.id)
+            needed_qty = line.quantity_per_unit * float(item.quantity)
+            entry = needs.setdefault(ingredient_product.id, {
+                'id': ingredient_product.id,
+                'name': ingredient_product.name,
+                'unit': line.unit or ingredient_product.unit,
+                'stock': float(ingredient_product.stock_ingredients_magasin or 0),
+                'min_stock': float(ingredient_product.seuil_min_ingredients_magasin or 0),
+                'needed_qty': 0.0,
+                'deadline': order.due_date,
+                'orders': set()
+            })
+            entry['needed_qty'] += needed_qty
+            if order.due_date and entry['deadline']:
+                entry['deadline'] = min(entry['deadline'], order.due_date)
+            elif order.due_date and not entry['deadline']:
+                entry['deadline'] = order.due_date
+            entry['orders'].add(order.id)
 
     summary = []
     for entry in needs.values():
@@ -430,7 +448,7 @@ def build_stock_block(stock_report, today, week_start, now, trend_days):
                 # Achats créés aujourd'hui mais non payés
                 db.and_(
                     db.or_(Purchase.is_paid == False, Purchase.is_paid.is_(None)),
-                    func.date(Purchase.created_at) == today
+                    on_day(Purchase.created_at, today)
                 )
             )
         )
@@ -438,7 +456,7 @@ def build_stock_block(stock_report, today, week_start, now, trend_days):
     )
     purchase_cost_week = float(
         db.session.query(func.sum(Purchase.total_amount))
-        .filter(func.date(Purchase.created_at).between(week_start, today))
+        .filter(in_period(Purchase.created_at, week_start, today))
         .scalar() or 0
     )
 
@@ -469,7 +487,7 @@ def compute_stock_variation(days):
         day = start + timedelta(days=i)
         total_value = db.session.query(
             func.sum(StockMovement.quantity * func.coalesce(StockMovement.unit_cost, 0))
-        ).filter(func.date(StockMovement.created_at) == day).scalar() or 0
+        ).filter(on_day(StockMovement.created_at, day)).scalar() or 0
         results.append({
             'label': day.strftime('%d/%m'),
             'value': float(total_value)
@@ -494,14 +512,14 @@ def compute_stock_movements(target_date):
     incoming = db.session.query(
         func.sum(StockMovement.quantity * func.coalesce(StockMovement.unit_cost, 0))
     ).filter(
-        func.date(StockMovement.created_at) == target_date,
+        on_day(StockMovement.created_at, target_date),
         StockMovement.quantity > 0
     ).scalar() or 0
 
     outgoing = db.session.query(
         func.sum(func.abs(StockMovement.quantity) * func.coalesce(StockMovement.unit_cost, 0))
     ).filter(
-        func.date(StockMovement.created_at) == target_date,
+        on_day(StockMovement.created_at, target_date),
         StockMovement.quantity < 0
     ).scalar() or 0
 
@@ -541,7 +559,7 @@ def compute_order_type_breakdown(target_date):
         func.count(Order.id).label('count'),
         func.sum(Order.total_amount).label('revenue')
     ).filter(
-        func.date(Order.created_at) == target_date,
+        on_day(Order.created_at, target_date),
         Order.status != 'cancelled'
     ).group_by('channel').all()
 
@@ -568,13 +586,13 @@ def build_sales_block(sales_report, today, week_start, week_end, month_start, mo
     monthly_revenue = float(_compute_revenue(start_date=month_start, end_date=month_end))
 
     weekly_orders = Order.query.filter(
-        func.date(Order.created_at).between(week_start, week_end)
+        in_period(Order.created_at, week_start, week_end)
     ).count()
     monthly_orders = Order.query.filter(
-        func.date(Order.created_at).between(month_start, month_end)
+        in_period(Order.created_at, month_start, month_end)
     ).count()
 
-    daily_orders = Order.query.filter(func.date(Order.created_at) == today).all()
+    daily_orders = Order.query.filter(on_day(Order.created_at, today)).all()
     delivered_orders = [o for o in daily_orders if o.status in ['delivered', 'completed']]
     on_time_deliveries = [
         o for o in delivered_orders
@@ -589,7 +607,7 @@ def build_sales_block(sales_report, today, week_start, week_end, month_start, mo
             Order.payment_method,
             func.count(Order.id).label('count')
         ).filter(
-            func.date(Order.created_at) == today
+            on_day(Order.created_at, today)
         ).group_by(Order.payment_method).all()
         payment_modes = [{'label': row.payment_method or 'indéfini', 'value': int(row.count)} for row in payment_rows]
         payment_modes_json = payment_modes
@@ -653,7 +671,7 @@ def build_cash_block(target_date):
     ).first()
 
     movements = CashMovement.query.filter(
-        func.date(CashMovement.created_at) == target_date
+        on_day(CashMovement.created_at, target_date)
     ).all()
 
     entry_types = {'entrée', 'vente', 'acompte', 'deposit'}
@@ -694,7 +712,7 @@ def compute_cash_history(reference_date, days):
     for i in range(days):
         day = reference_date - timedelta(days=days - i - 1)
         movements = CashMovement.query.filter(
-            func.date(CashMovement.created_at) == day
+            on_day(CashMovement.created_at, day)
         ).all()
         entry_types = {'entrée', 'vente', 'acompte', 'deposit'}
         exit_types = {'sortie', 'retrait', 'frais', 'paiement'}
@@ -720,7 +738,7 @@ def build_attendance_block(target_date):
     total_employees = Employee.query.filter(Employee.is_active.is_(True)).count()
     
     # Essayer d'abord avec AttendanceSummary
-    summaries = AttendanceSummary.query.filter(
+    summaries = AttendanceSummary.query.options(joinedload(AttendanceSummary.employee)).filter(
         AttendanceSummary.work_date == target_date
     ).all()
 
@@ -760,10 +778,11 @@ def build_attendance_block(target_date):
             'best_employee': best_employee
         }
     
-    # Si AttendanceSummary existe, utiliser le code original
+    # Résumés maintenus à chaque pointage : présent = dernier pointage en entrée
+    # (anciens résumés sans statut : drapeaux de présence)
     present = len([
         summary for summary in summaries
-        if not summary.is_absent and summary.is_present
+        if (summary.status == 'present' if summary.status else not summary.is_absent and summary.is_present)
     ])
 
     presence_rate = round((present / total_employees) * 100, 1) if total_employees else 0.0
@@ -1127,12 +1146,9 @@ def build_chart_payload(production_block, stock_block, sales_block, attendance_b
 
 
 def compute_revenue_trend_series(reference_date, days, forecast_points=3):
-    labels = []
-    actuals = []
-    for i in range(days):
-        current_day = reference_date - timedelta(days=days - i - 1)
-        labels.append(current_day.strftime('%d/%m'))
-        actuals.append(float(_compute_revenue(report_date=current_day)))
+    series = TimeSeriesService.revenue_series(reference_date - timedelta(days=days - 1), reference_date)
+    labels = [point['bucket'].strftime('%d/%m') for point in series]
+    actuals = [point['revenue'] for point in series]
 
     diffs = [actuals[i] - actuals[i - 1] for i in range(1, len(actuals))] if len(actuals) > 1 else [0]
     avg_diff = mean(diffs) if diffs else 0
@@ -0,0 +1,255 @@
+"""
+Catalogue du PDV en cache
+Module: app/sales/catalog.py
+
+pos_interface et /sales/api/products reconstruisaient à chaque appel la
+liste complète (catégories, produits finis, product.category chargé produit
+par produit, slugs recalculés), alors que les caisses la rechargent après
+chaque vente. On garde en mémoire :
+
+- la fiche catalogue (catégories visibles au PDV, produits finis avec prix,
+  slug de catégorie, unité de vente, image), rechargée en 2 requêtes quand un
+  produit ou une catégorie change,
+- le stock comptoir de ces produits, relu en 1 requête après une écriture de
+  stock ; la comparaison avec la lecture précédente date chaque changement.
+
+Chaque changement incrémente une version (préfixée par un identifiant de
+processus : les versions de deux workers ne se comparent pas). Elle sert
+d'ETag (réponse 304 si rien n'a changé) et de point de départ du mode delta
+(?since=version) qui ne renvoie que les produits dont le stock a changé.
+Des durées de vie courtes bornent le décalage entre workers.
+"""
+
+import threading
+import time
+import uuid
+from collections import namedtuple
+from functools import partial
+
+from sqlalchemy import select
+from sqlalchemy.orm import attributes
+
+from extensions import db
+from models import Category, Product
+from app.utils.session_hooks import CacheInvalidationHooks
+
+
+# Durées de vie : les écritures d'un autre worker ne sont pas vues avant
+CATALOG_TTL_SECONDS = 300
+STOCK_TTL_SECONDS = 15
+
+# Attributs produit affichés au PDV (hors stock)
+CATALOG_ATTRIBUTES = ('name', 'price', 'category_id', 'product_type', 'unit', 'sale_unit', 'image_filename')
+
+CatalogView = namedtuple('CatalogView', ['version', 'products', 'categories'])
+
+_lock = threading.Lock()
+_epoch = uuid.uuid4().hex[:8]
+_version = 0
+_catalog_version = 0      # dernière version où la fiche catalogue a changé
+_catalog = None           # (catégories, {product_id: fiche sans stock})
+_catalog_loaded_at = None
+_stock = {}               # {product_id: stock comptoir}
+_stock_versions = {}      # {product_id: version du dernier changement de stock}
+_stock_loaded_at = None
+_view = None              # CatalogView de la version courante
+
+
+def slugify_category(name):
+    """Slug de catégorie attendu par le frontend du PDV."""
+    return name.lower().replace(' ', '-').replace('é', 'e').replace('è', 'e')
+
+
+def _token(version):
+    return f'{_epoch}-{version}'
+
+
+def _pos_product_filter(category_ids):
+    return (
+        Product.product_type == 'finished',  # Uniquement produits finis
+        Product.category_id.in_(category_ids) if category_ids else Product.category_id.isnot(None),
+    )
+
+
+class PosCatalogCache:
+    """Catalogue PDV versionné en mémoire"""
+
+    @staticmethod
+    def _load_catalog():
+        global _catalog, _catalog_loaded_at, _catalog_version, _version
+
+        categories = [
+            {'id': category_id, 'name': name, 'slug': slugify_category(name)}
+            for category_id, name in db.session.execute(
+                select(Category.id, Category.name).where(Category.show_in_pos == True).order_by(Category.name)
+            )
+        ]
+        slugs = {category['id']: category['slug'] for category in categories}
+        if not slugs:
+            # Aucune catégorie visible : tous les produits catégorisés (comportement historique)
+            slugs = dict(db.session.execute(select(Category.id, Category.name)).all())
+            slugs = {category_id: slugify_category(name) for category_id, name in slugs.items()}
+
+        products = {}
+        rows = db.session.execute(
+            select(Product.id, Product.name, Product.price, Product.category_id, Product.unit,
+                   Product.sale_unit, Product.image_filename)
+            .where(*_pos_product_filter([category['id'] for category in categories]))
+            .order_by(Product.id)
+        )
+        for product_id, name, price, category_id, unit, sale_unit, image_filename in rows:
+            products[product_id] = {
+                'id': product_id,
+                'name': name,
+                'price': float(price or 0),
+                'category': slugs.get(category_id, 'autres'),
+                'category_id': category_id,
+                'unit': sale_unit or unit,  # Unité de vente
+                'image_filename': image_filename,
+            }
+
+        _version += 1
+        _catalog_version = _version
+        _catalog = (categories, products)
+        _catalog_loaded_at = time.monotonic()
+
+    @staticmethod
+    def _load_stock():
+        """Relit le stock comptoir et date les produits dont il a changé."""
+        global _stock, _stock_loaded_at, _version
+
+        categories, _ = _catalog
+        stock = {
+            product_id: float(quantity or 0)
+            for product_id, quantity in db.session.execute(
+                select(Product.id, Product.stock_comptoir)
+                .where(*_pos_product_filter([category['id'] for category in categories]))
+            )
+        }
+        changed = [product_id for product_id in stock.keys() | _stock.keys()
+                   if stock.get(product_id, 0.0) != _stock.get(product_id, 0.0)]
+        if changed:
+            _version += 1
+            for product_id in changed:
+                _stock_versions[product_id] = _version
+        _stock = stock
+        _stock_loaded_at = time.monotonic()
+
+    @staticmethod
+    def _refresh():
+        global _view
+        now = time.monotonic()
+        if _catalog is None or now - _catalog_loaded_at >= CATALOG_TTL_SECONDS:
+            PosCatalogCache._load_catalog()
+            PosCatalogCache._load_stock()
+        elif _stock_loaded_at is None or now - _stock_loaded_at >= STOCK_TTL_SECONDS:
+            PosCatalogCache._load_stock()
+        if _view is None or _view.version != _version:
+            categories, products = _catalog
+            # Seuls les produits avec stock disponible sont affichés
+            _view = CatalogView(_token(_version), [
+                dict(product, stock=_stock[product_id], stock_comptoir=_stock[product_id])
+                for product_id, product in products.items()
+                if _stock.get(product_id, 0) > 0
+            ], categories)
+        return _view
+
+    @staticmethod
+    def snapshot():
+        """Catalogue courant : version, produits en stock, catégories."""
+        view = _view
+        if (view is not None and _catalog is not None
+                and time.monotonic() - _stock_loaded_at < STOCK_TTL_SECONDS
+                and time.monotonic() - _catalog_loaded_at < CATALOG_TTL_SECONDS):
+            return view
+        with _lock:
+            return PosCatalogCache._refresh()
+
+    @staticmethod
+    def changes_since(since):
+        """
+        Produits dont le stock a changé depuis la version `since`.
+
+        Returns:
+            (CatalogView, list) ou (CatalogView, None) si la version est
+            inconnue ou antérieure à un changement de fiche catalogue :
+            le catalogue complet doit alors être renvoyé. Les produits dont
+            le stock est retombé à 0 sont inclus (à retirer côté caisse).
+        """
+        view = PosCatalogCache.snapshot()
+        epoch, _, number = (since or '').partition('-')
+        if epoch != _epoch or not number.isdigit():
+            return view, None
+        since_version = int(number)
+        with _lock:
+            if since_version < _catalog_version or since_version > _version:
+                return view, None
+            _, products = _catalog
+            changes = [
+                dict(products[product_id], stock=_stock.get(product_id, 0.0),
+                     stock_comptoir=_stock.get(product_id, 0.0))
+                for product_id, version in _stock_versions.items()
+                if version > since_version and product_id in products
+            ]
+        return view, changes
+
+    @staticmethod
+    def invalidate(stock_only=False):
+        """Force la relecture du stock (ou de tout le catalogue) au prochain accès."""
+        global _catalog_loaded_at, _stock_loaded_at
+        with _lock:
+            if _stock_loaded_at is not None:
+                _stock_loaded_at = float('-inf')
+            if not stock_only and _catalog_loaded_at is not None:
+                _catalog_loaded_at = float('-inf')
+
+
+# ============================================================================
+# INVALIDATION (événements de session)
+# ============================================================================
+
+def _catalog_changed(obj):
+    if isinstance(obj, Category):
+        return True
+    return any(attributes.get_history(obj, name).has_changes() for name in CATALOG_ATTRIBUTES)
+
+
+def _catalog_touched(session):
+    if any(isinstance(obj, (Product, Category)) for obj in (*session.new, *session.deleted)):
+        return True
+    return any(isinstance(obj, (Product, Category)) and _catalog_changed(obj) for obj in session.dirty)
+
+
+def _stock_touched(session):
+    return any(
+        isinstance(obj, Product) and attributes.get_history(obj, 'stock_comptoir').has_changes()
+        for obj in session.dirty
+    )
+
+
+def _drop_catalog():
+    global _catalog
+    with _lock:
+        _catalog = None
+
+
+# Fiche catalogue (tout est relu) et stock comptoir seul (relecture légère)
+_catalog_hooks = CacheInvalidationHooks(
+    'pos_catalog',
+    invalidate=PosCatalogCache.invalidate,
+    changed=_catalog_touched,
+    bulk_models=(Product, Category),
+    tables=(Product.__table__, Category.__table__),
+    on_schema_change=_drop_catalog,
+)
+_stock_hooks = CacheInvalidationHooks(
+    'pos_catalog_stock',
+    invalidate=partial(PosCatalogCache.invalidate, stock_only=True),
+    changed=_stock_touched,
+)
+
+
+def register_pos_catalog_hooks():
+    """Branche l'invalidation du catalogue sur la classe de session Flask-SQLAlchemy."""
+    _catalog_hooks.register()
+    _stock_hooks.register()
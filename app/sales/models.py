@@ -26,4 +26,8 @@ class CashMovement(db.Model):
     reason = db.Column(db.String(128))
     notes = db.Column(db.Text, nullable=True)  # Remarques optionnelles
     employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'))
-    employee = db.relationship('Employee') 
\ No newline at end of file
+    employee = db.relationship('Employee')
+
+    __table_args__ = (
+        db.Index('idx_cash_movement_created_type', 'created_at', 'type'),
+    ) 
\ No newline at end of file
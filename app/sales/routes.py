@@ -1,12 +1,15 @@
 from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, current_app
 from flask_login import login_required, current_user
 from extensions import db
+from app.utils.date_ranges import on_day
 from models import Product, Order, OrderItem, DeliveryDebt, Category
 from datetime import datetime, timedelta
 from decimal import Decimal
 from sqlalchemy import func, or_
 from app.sales.models import CashRegisterSession, CashMovement
 from app.employees.models import Employee
+from app.stock.reservation import StockReservationService, InsufficientStockError, retry_transaction, should_retry
+from app.sales.catalog import PosCatalogCache
 from decorators import require_open_cash_session, require_closed_cash_session
 
 sales = Blueprint('sales', __name__, url_prefix='/sales')
@@ -44,107 +47,47 @@ def get_reserved_stock_by_product():
 @require_open_cash_session
 def pos_interface():
     """Interface POS (Point of Sale) pour vente directe"""
-    # Récupérer les catégories visibles au POV
-    pos_categories = Category.query.filter(Category.show_in_pos == True).order_by(Category.name).all()
-    
-    # Récupérer uniquement les produits finis avec stock_comptoir > 0
-    # et appartenant à une catégorie visible au POV
-    category_ids = [c.id for c in pos_categories]
-    products = Product.query.filter(
-        Product.product_type == 'finished',  # Uniquement produits finis
-        Product.stock_comptoir > 0,  # Uniquement avec stock disponible
-        Product.category_id.in_(category_ids) if category_ids else Product.category_id.isnot(None)
-    ).all()
-    
-    # Préparer les données pour le JavaScript
-    products_js = []
-    for product in products:
-        # Le stock comptoir représente le stock disponible à la vente
-        # Les commandes clients réservées ne sont PAS incluses dans ce stock
-        stock_comptoir = float(product.stock_comptoir or 0)
-        available_stock = stock_comptoir
-        
-        # Ne pas afficher les produits sans stock
-        if available_stock <= 0:
-            continue
-        
-        # Utiliser le nom réel de la catégorie (slugifié pour le frontend)
-        category_slug = 'autres'
-        if product.category:
-            # Créer un slug à partir du nom de la catégorie
-            category_slug = product.category.name.lower().replace(' ', '-').replace('é', 'e').replace('è', 'e')
-        
-        products_js.append({
-            'id': product.id,
-            'name': product.name,
-            'price': float(product.price or 0),
-            'category': category_slug,
-            'category_id': product.category_id,
-            'stock': available_stock,
-            'unit': product.display_sale_unit  # Utiliser l'unité de vente
-        })
-    
-    # Préparer les catégories pour le frontend
-    categories_js = [{'id': c.id, 'name': c.name, 'slug': c.name.lower().replace(' ', '-').replace('é', 'e').replace('è', 'e')} 
-                     for c in pos_categories]
+    # Catalogue en cache : produits finis des catégories visibles au PDV avec stock comptoir > 0
+    # (les commandes clients réservées ne sont PAS incluses dans le stock comptoir)
+    catalog = PosCatalogCache.snapshot()
     
     return render_template('sales/pos_interface.html', 
-                         products_js=products_js,
-                         categories_js=categories_js,
+                         products_js=catalog.products,
+                         categories_js=catalog.categories,
+                         catalog_version=catalog.version,
                          now=datetime.now())
 
 @sales.route('/api/products')
 @login_required
 def get_products():
-    """API pour récupérer les produits disponibles avec leurs catégories"""
-    # Récupérer les catégories visibles au POV
-    pos_categories = Category.query.filter(Category.show_in_pos == True).order_by(Category.name).all()
-    category_ids = [c.id for c in pos_categories]
-    
-    # Récupérer uniquement les produits finis avec stock_comptoir > 0
-    products = Product.query.filter(
-        Product.product_type == 'finished',  # Uniquement produits finis
-        Product.stock_comptoir > 0,  # Uniquement avec stock disponible
-        Product.category_id.in_(category_ids) if category_ids else Product.category_id.isnot(None)
-    ).all()
+    """
+    API pour récupérer les produits disponibles avec leurs catégories.
     
-    # Le stock comptoir représente le stock disponible à la vente
+    Réponse versionnée (ETag) : 304 si la caisse a déjà cette version.
+    ?since=<version> : seuls les produits dont le stock a changé depuis
+    ('changes', stock <= 0 = produit à retirer), ou le catalogue complet
+    si la version est trop ancienne ou inconnue.
+    """
+    since = request.args.get('since')
+    if since:
+        catalog, changes = PosCatalogCache.changes_since(since)
+    else:
+        catalog, changes = PosCatalogCache.snapshot(), None
     
-    products_data = []
-    for product in products:
-        # Le stock comptoir est le stock disponible
-        stock_comptoir = float(product.stock_comptoir or 0)
-        available_stock = stock_comptoir
-        
-        # Ne pas inclure les produits sans stock
-        if available_stock <= 0:
-            continue
-        
-        # Utiliser le slug de la catégorie réelle
-        category_slug = 'autres'
-        if product.category:
-            category_slug = product.category.name.lower().replace(' ', '-').replace('é', 'e').replace('è', 'e')
-        
-        products_data.append({
-            'id': product.id,
-            'name': product.name,
-            'price': float(product.price or 0),
-            'stock': available_stock,
-            'stock_comptoir': stock_comptoir,
-            'category': category_slug,
-            'category_id': product.category_id,
-            'unit': product.display_sale_unit,  # Utiliser l'unité de vente
-            'image_filename': product.image_filename
+    if request.if_none_match.contains_weak(catalog.version):
+        response = current_app.response_class(status=304)
+    elif changes is not None:
+        response = jsonify({'version': catalog.version, 'since': since, 'changes': changes})
+    else:
+        response = jsonify({
+            'version': catalog.version,
+            'products': catalog.products,
+            'categories': catalog.categories
         })
-    
-    # Inclure aussi les catégories dans la réponse
-    categories_data = [{'id': c.id, 'name': c.name, 'slug': c.name.lower().replace(' ', '-').replace('é', 'e').replace('è', 'e')} 
-                       for c in pos_categories]
-    
-    return jsonify({
-        'products': products_data,
-        'categories': categories_data
-    })
+    response.set_etag(catalog.version, weak=True)
+    # La caisse revalide à chaque appel (304 tant que rien ne change)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 @sales.route('/api/favorites')
 @login_required
@@ -184,6 +127,7 @@ def get_favorite_products():
 
 @sales.route('/api/create-delivery-order', methods=['POST'])
 @login_required
+@retry_transaction()
 def create_delivery_order():
     """Créer une commande de livraison depuis le PDV"""
     try:
@@ -223,22 +167,25 @@ def create_delivery_order():
         
         total_amount = Decimal('0.0')
         
-        # Ajouter les articles et décrémenter les stocks (réservation temporaire)
+        # Verrouiller, vérifier et décrémenter le stock comptoir (réservation temporaire)
+        try:
+            StockReservationService.decrement(
+                ((item_data['product_id'], item_data['quantity']) for item_data in items),
+                movement_type='vente', order_id=order.id, reason=f"Vente PDV #{order.id}"
+            )
+        except LookupError as lookup_error:
+            db.session.rollback()
+            return jsonify({'success': False, 'message': str(lookup_error)}), 400
+        except InsufficientStockError as stock_error:
+            db.session.rollback()
+            return jsonify({'success': False, 'message': f'Stock insuffisant pour {stock_error.product.name}'}), 400
+        
+        # Ajouter les articles
         for item_data in items:
-            product_id = item_data['product_id']
+            product_id = int(item_data['product_id'])
             quantity = Decimal(str(item_data['quantity']))
             unit_price = Decimal(str(item_data['unit_price']))
             
-            product = Product.query.get(product_id)
-            if not product:
-                db.session.rollback()
-                return jsonify({'success': False, 'message': f'Produit {product_id} non trouvé'}), 400
-            
-            # Vérifier le stock
-            if product.stock_comptoir < float(quantity):
-                db.session.rollback()
-                return jsonify({'success': False, 'message': f'Stock insuffisant pour {product.name}'}), 400
-            
             # Créer l'article de commande
             order_item = OrderItem(
                 order_id=order.id,
@@ -247,15 +194,9 @@ def create_delivery_order():
                 unit_price=unit_price
             )
             
-            # Décrémenter le stock comptoir ET la valeur (update_stock_by_location gère les deux)
-            # Note: update_stock_by_location utilise cost_price pour calculer la valeur à décrémenter
-            # et met à jour valeur_stock_comptoir ET total_stock_value de manière synchronisée
-            product.update_stock_by_location('stock_comptoir', -float(quantity))
-            
             total_amount += quantity * unit_price
             
             db.session.add(order_item)
-            db.session.add(product)
         
         # Maintenant que c'est customer_order, utiliser calculate_total_amount() pour inclure les frais de livraison
         # Cela garantit la cohérence avec les autres commandes customer_order
@@ -269,6 +210,8 @@ def create_delivery_order():
             'order_id': order.id
         })
     except Exception as e:
+        if should_retry(e):
+            raise
         db.session.rollback()
         current_app.logger.error(f"Erreur création commande livraison: {e}", exc_info=True)
         return jsonify({'success': False, 'message': f'Erreur: {str(e)}'}), 500
@@ -276,6 +219,7 @@ def create_delivery_order():
 @sales.route('/api/complete-sale', methods=['POST'])
 @login_required
 @require_open_cash_session
+@retry_transaction()
 def complete_sale():
     """Finaliser une vente et mettre à jour les stocks"""
     try:
@@ -308,27 +252,38 @@ def complete_sale():
         
         total_amount = Decimal('0.0')
         
-        # Ajouter les articles et décrémenter les stocks
+        # Verrouiller (SELECT ... FOR UPDATE, ordre des ids) puis vérifier et décrémenter
+        # le stock comptoir de tout le panier : deux caisses ne peuvent plus vendre
+        # la même dernière pièce
+        try:
+            products = StockReservationService.decrement(
+                ((item_data['product_id'], item_data['quantity']) for item_data in items),
+                movement_type='vente', order_id=order.id, reason=f"Vente PDV #{order.id}"
+            )
+        except LookupError as lookup_error:
+            db.session.rollback()
+            current_app.logger.error(f"{lookup_error} lors de la vente")
+            return jsonify({'success': False, 'message': str(lookup_error)}), 400
+        except InsufficientStockError as stock_error:
+            db.session.rollback()
+            current_app.logger.warning(f"Stock insuffisant pour {stock_error.product.name} (demandé: {stock_error.requested}, disponible: {stock_error.available})")
+            return jsonify({
+                'success': False, 
+                'message': f'Stock insuffisant pour {stock_error.product.name} (disponible: {stock_error.available})'
+            }), 400
+        
+        # Catégories de consommables et leurs plages (cache en mémoire)
+        from app.consumables.packing import ConsumablePackingCache, pack
+        
+        consumables_to_decrement = []
+        sale_lines = []
+        
+        # Ajouter les articles
         for item_data in items:
-            product_id = item_data['product_id']
+            product_id = int(item_data['product_id'])
             quantity = Decimal(str(item_data['quantity']))
             unit_price = Decimal(str(item_data['unit_price']))
-            
-            product = Product.query.get(product_id)
-            if not product:
-                db.session.rollback()
-                current_app.logger.error(f"Produit {product_id} non trouvé lors de la vente")
-                return jsonify({'success': False, 'message': f'Produit {product_id} non trouvé'}), 400
-            
-            # Vérifier le stock AVANT de modifier quoi que ce soit
-            current_stock = float(product.stock_comptoir or 0)
-            if current_stock < float(quantity):
-                db.session.rollback()
-                current_app.logger.warning(f"Stock insuffisant pour {product.name} (demandé: {quantity}, disponible: {current_stock})")
-                return jsonify({
-                    'success': False, 
-                    'message': f'Stock insuffisant pour {product.name} (disponible: {current_stock})'
-                }), 400
+            product = products[product_id]
             
             # Créer l'article de commande (maintenant order.id existe)
             order_item = OrderItem(
@@ -338,40 +293,29 @@ def complete_sale():
                 unit_price=unit_price
             )
             
-            # Décrémenter le stock comptoir ET la valeur (update_stock_by_location gère les deux)
-            # Note: update_stock_by_location met à jour valeur_stock_comptoir ET total_stock_value de manière synchronisée
-            try:
-                product.update_stock_by_location('stock_comptoir', -float(quantity))
-            except Exception as stock_error:
-                db.session.rollback()
-                current_app.logger.error(f"Erreur lors de la décrémentation du stock pour {product.name}: {stock_error}", exc_info=True)
-                return jsonify({
-                    'success': False, 
-                    'message': f'Erreur lors de la mise à jour du stock pour {product.name}'
-                }), 500
-            
-            # DÉCRÉMENTER LES CONSOMMABLES selon la catégorie
-            if product.category:
-                from app.consumables.models import ConsumableCategory
-                consumable_category = ConsumableCategory.query.filter(
-                    ConsumableCategory.product_category_id == product.category.id,
-                    ConsumableCategory.is_active == True
-                ).first()
-                
-                if consumable_category:
-                    # Calculer les consommables nécessaires
-                    consumables_needed = consumable_category.calculate_consumables_needed(int(quantity))
-                    
-                    for consumable_product, qty in consumables_needed:
-                        if consumable_product:
-                            # Décrémenter le stock consommables
-                            consumable_product.update_stock_by_location('stock_consommables', -float(qty))
-                            print(f"Décrémentation consommable (PDV): {consumable_product.name} - {qty} {consumable_product.unit}")
+            # CONSOMMABLES selon la catégorie (décrémentés après verrouillage, voir plus bas)
+            consumable_plan = ConsumablePackingCache.for_product_category(product.category_id)
+            if consumable_plan:
+                # Calculer les consommables nécessaires (aucune requête)
+                consumables_to_decrement.extend(
+                    (range_spec.consumable_product_id, boxes)
+                    for range_spec, boxes in pack(consumable_plan.ranges, int(quantity))
+                )
             
+            sale_lines.append(f"{quantity}x {product.name}")
             total_amount += quantity * unit_price
             
             db.session.add(order_item)
-            db.session.add(product)
+        
+        # DÉCRÉMENTER LES CONSOMMABLES (stock négatif autorisé, mais sous verrou)
+        if consumables_to_decrement:
+            consumables = StockReservationService.aggregate_cart(consumables_to_decrement)
+            locked_consumables = StockReservationService.lock_products(consumables.keys())
+            for consumable_id, qty in consumables.items():
+                consumable_product = locked_consumables[consumable_id]
+                consumable_product.update_stock_by_location('stock_consommables', -float(qty),
+                                                            order_id=order.id, reason=f"Emballage vente PDV #{order.id}")
+                print(f"Décrémentation consommable (PDV): {consumable_product.name} - {qty} {consumable_product.unit}")
         
         order.total_amount = total_amount
         amount_received = Decimal(str(data.get('amount_received') or total_amount)).quantize(Decimal('0.01'))
@@ -401,11 +345,13 @@ def complete_sale():
                 type='entrée',
                 amount=float(amount_for_cash),
                 reason=f'Vente commande #{order.id}',
-                notes=f'Commande client: {", ".join([f"{item.quantity}x {item.product.name}" for item in order.items])}',
+                notes=f'Commande client: {", ".join(sale_lines)}',
                 employee_id=current_user.id
             )
             db.session.add(cash_movement)
         except Exception as cash_error:
+            if should_retry(cash_error):
+                raise
             db.session.rollback()
             current_app.logger.error(f"Erreur lors de la création du mouvement de caisse: {cash_error}", exc_info=True)
             return jsonify({
@@ -418,6 +364,8 @@ def complete_sale():
             db.session.commit()
             current_app.logger.info(f"Vente #{order.id} finalisée avec succès (montant: {total_amount} DA)")
         except Exception as commit_error:
+            if should_retry(commit_error):
+                raise
             db.session.rollback()
             import traceback
             error_details = traceback.format_exc()
@@ -469,6 +417,8 @@ def complete_sale():
         })
         
     except Exception as e:
+        if should_retry(e):
+            raise
         db.session.rollback()
         import traceback
         error_details = traceback.format_exc()
@@ -516,12 +466,12 @@ def sales_reports():
     today = datetime.utcnow().date()
     today_sales = Order.query.filter(
         Order.order_type == 'in_store',
-        db.func.date(Order.created_at) == today
+        on_day(Order.created_at, today)
     ).count()
     
     today_revenue = db.session.query(db.func.sum(Order.total_amount)).filter(
         Order.order_type == 'in_store',
-        db.func.date(Order.created_at) == today
+        on_day(Order.created_at, today)
     ).scalar() or 0
     
     return render_template('sales/reports.html',
@@ -533,6 +483,7 @@ def sales_reports():
 @sales.route('/pos/checkout', methods=['POST'])
 @login_required
 @require_open_cash_session
+@retry_transaction()
 def process_sale():
     """Traiter une vente et décrémenter le stock"""
     try:
@@ -544,30 +495,43 @@ def process_sale():
         if not items:
             return jsonify({'success': False, 'error': 'Panier vide'}), 400
         
-        # Vérifier le stock avant de procéder
-        for item in items:
-            product = Product.query.get(item['id'])
-            if not product:
-                return jsonify({'success': False, 'error': f'Produit {item["id"]} non trouvé'}), 404
-            
-            if product.stock_comptoir < item['quantity']:
-                return jsonify({
-                    'success': False, 
-                    'error': f'Stock insuffisant pour {product.name} (disponible: {product.stock_comptoir})'
-                }), 400
-        
         # Récupérer la session de caisse ouverte
         cash_session = get_open_cash_session()
         if not cash_session:
             return jsonify({'success': False, 'error': 'Aucune session de caisse ouverte'}), 400
         
-        # Créer la vente et enregistrer le mouvement de caisse
-        total_amount = 0
+        total_amount = sum(item['price'] * item['quantity'] for item in items)
+        
+        # Créer une commande temporaire pour l'impression du ticket (et rattacher les mouvements de stock)
+        temp_order = Order(
+            user_id=current_user.id,
+            order_type='pos_direct',
+            customer_name='Vente POS',
+            due_date=datetime.utcnow(),
+            status='completed',
+            total_amount=total_amount
+        )
+        db.session.add(temp_order)
+        db.session.flush()  # Pour obtenir l'ID
+        
+        # Verrouiller, vérifier et décrémenter le stock comptoir de tout le panier
+        try:
+            products = StockReservationService.decrement(
+                ((item['id'], item['quantity']) for item in items),
+                movement_type='vente', order_id=temp_order.id, reason=f"Vente POS #{temp_order.id}"
+            )
+        except LookupError as lookup_error:
+            db.session.rollback()
+            return jsonify({'success': False, 'error': str(lookup_error)}), 404
+        except InsufficientStockError as stock_error:
+            db.session.rollback()
+            return jsonify({
+                'success': False, 
+                'error': f'Stock insuffisant pour {stock_error.product.name} (disponible: {stock_error.available})'
+            }), 400
+        
         for item in items:
-            product = Product.query.get(item['id'])
-            product.stock_comptoir -= item['quantity']
-            total_amount += item['price'] * item['quantity']
-            
+            product = products[int(item['id'])]
             # Log de la décrémentation
             print(f"VENTE: {item['quantity']} x {product.name} (Stock comptoir: {product.stock_comptoir})")
         
@@ -578,7 +542,7 @@ def process_sale():
             type='entrée',
             amount=total_amount,
             reason=f'Vente POS - {len(items)} article(s)',
-            notes=f'Vente directe: {", ".join([f"{item["quantity"]}x {Product.query.get(item["id"]).name}" for item in items])}',
+            notes=f'Vente directe: {", ".join([f"{item["quantity"]}x {products[int(item["id"])].name}" for item in items])}',
             employee_id=current_user.id
         )
         db.session.add(cash_movement)
@@ -594,24 +558,13 @@ def process_sale():
                 description=f'Vente POS - {len(items)} article(s)'
             )
         except Exception as e:
+            if should_retry(e):
+                raise
             current_app.logger.error(f"Erreur intégration comptable vente POS (cash_movement_id={cash_movement.id}): {e}", exc_info=True)
             # On continue même si l'intégration comptable échoue
         
-        # Créer une commande temporaire pour l'impression du ticket
-        temp_order = Order(
-            user_id=current_user.id,
-            order_type='pos_direct',
-            customer_name='Vente POS',
-            due_date=datetime.utcnow(),
-            status='completed',
-            total_amount=total_amount
-        )
-        db.session.add(temp_order)
-        db.session.flush()  # Pour obtenir l'ID
-        
         # Ajouter les articles à la commande temporaire
         for item in items:
-            product = Product.query.get(item['id'])
             order_item = OrderItem(
                 order_id=temp_order.id,
                 product_id=item['id'],
@@ -658,6 +611,8 @@ def process_sale():
         })
         
     except Exception as e:
+        if should_retry(e):
+            raise
         db.session.rollback()
         print(f"Erreur lors de la vente: {e}")
         return jsonify({'success': False, 'error': 'Erreur serveur'}), 500
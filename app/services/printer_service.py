@@ -625,9 +625,10 @@ class PrinterService:
         
         # Préparer les données de la commande (utilisé par mode réseau ET local)
         try:
-            from models import Order
+            from models import Order, OrderItem
             from flask import current_app
             from flask_login import current_user
+            from sqlalchemy.orm import joinedload
             
             if not current_app:
                 logger.error("❌ Contexte d'application non disponible")
@@ -663,8 +664,8 @@ class PrinterService:
                 'items': []
             }
             
-            # Récupérer les items (forcer l'évaluation de la relation)
-            items_list = order.items.all()  # Convertir AppenderQuery en liste
+            # Récupérer les items avec leurs produits en une requête (forcer l'évaluation de la relation)
+            items_list = order.items.options(joinedload(OrderItem.product)).all()  # Convertir AppenderQuery en liste
             for item in items_list:
                 # OrderItem n'a pas d'attribut description, contrairement à B2BOrderItem
                 product_name = item.product.name if item.product else "Article"
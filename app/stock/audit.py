@@ -0,0 +1,95 @@
+"""
+Canal d'audit du stock
+Module: app/stock/audit.py
+
+Product.update_stock_by_location journalisait chaque modification du
+stock_comptoir en ERROR avec la pile d'appels (traceback.extract_stack) :
+sur une journée chargée au PDV ce traçage dominait le temps d'encaissement
+et noyait les journaux. Le traçage est désormais un canal dédié, désactivé
+par défaut, activé :
+
+- pour certains produits (STOCK_AUDIT_PRODUCT_IDS),
+- par échantillonnage (STOCK_AUDIT_SAMPLE_RATE, entre 0 et 1),
+- pour une requête donnée d'un administrateur connecté (en-tête
+  X-Stock-Audit: 1 ; ignoré pour les autres requêtes).
+
+Chaque entrée est une ligne JSON (produit, emplacement, variation, avant,
+après, appelant) écrite sur le logger `fee_maison.stock_audit`, dans
+STOCK_AUDIT_LOG_FILE si défini, sinon sur la sortie d'erreur.
+"""
+
+import json
+import logging
+import os
+import random
+import sys
+from datetime import datetime
+
+from flask import current_app, has_app_context, has_request_context, request
+
+
+AUDIT_HEADER = 'X-Stock-Audit'
+LOGGER_NAME = 'fee_maison.stock_audit'
+
+_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+
+def _audit_logger():
+    logger = logging.getLogger(LOGGER_NAME)
+    # Niveau et propagation fixés même si un handler est déjà attaché (config, tests)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if not logger.handlers:
+        log_file = current_app.config.get('STOCK_AUDIT_LOG_FILE')
+        handler = logging.FileHandler(log_file, encoding='utf-8') if log_file else logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+    return logger
+
+
+def _audit_requested():
+    """En-tête X-Stock-Audit d'un administrateur connecté."""
+    if request.headers.get(AUDIT_HEADER, '').lower() not in ('1', 'true', 'on'):
+        return False
+    from flask_login import current_user
+    return bool(current_user and current_user.is_authenticated and current_user.is_admin)
+
+
+def is_enabled(product_id):
+    """Audit demandé pour ce produit ? (quelques lectures de config si désactivé)"""
+    if not has_app_context():
+        return False
+    config = current_app.config
+    if product_id in config.get('STOCK_AUDIT_PRODUCT_IDS', ()):
+        return True
+    if has_request_context() and _audit_requested():
+        return True
+    rate = config.get('STOCK_AUDIT_SAMPLE_RATE', 0)
+    return bool(rate) and random.random() < rate
+
+
+def _caller(depth):
+    """Premier appelant hors models.py / ledger : 'fichier:ligne fonction'."""
+    frame = sys._getframe(depth)
+    while frame is not None and frame.f_code.co_filename.endswith(('models.py', 'ledger.py')):
+        frame = frame.f_back
+    if frame is None:
+        return None
+    return f"{os.path.relpath(frame.f_code.co_filename, _ROOT)}:{frame.f_lineno} {frame.f_code.co_name}"
+
+
+def record(product, location_key, quantity_change, stock_before, stock_after):
+    """Écrit une entrée d'audit (à n'appeler que si is_enabled)."""
+    entry = {
+        'at': datetime.utcnow().isoformat(timespec='seconds'),
+        'product_id': product.id,
+        'product': product.name,
+        'location': location_key,
+        'change': float(quantity_change),
+        'before': float(stock_before),
+        'after': float(stock_after),
+        'caller': _caller(2),
+    }
+    if has_request_context():
+        entry['endpoint'] = request.endpoint
+    _audit_logger().info(json.dumps(entry, ensure_ascii=False))
@@ -0,0 +1,173 @@
+"""
+Grand livre des mouvements de stock
+Module: app/stock/ledger.py
+
+Product.update_stock_by_location modifiait quantités et valeurs sans laisser
+de trace ; update_stock_quantity écrivait un mouvement mais committait à
+chaque appel et bloquait le stock à 0. Désormais :
+
+- chaque appel à update_stock_by_location mémorise son mouvement (avant /
+  après, coût unitaire, motif, commande) dans la session,
+- les mouvements mémorisés sont insérés en un seul INSERT multi-lignes au
+  flush suivant (événement after_flush),
+- StockLedger.apply applique un lot de variations (achat, vente, production,
+  ajustement) en chargeant les produits en une requête et en committant une
+  seule fois.
+
+La table stock_movements est ainsi complète : valorisation à une date
+passée (app/stock/valuation.py) et graphiques de mouvements.
+"""
+
+import uuid
+from datetime import datetime
+
+from flask import has_request_context
+from sqlalchemy import event, insert
+
+from extensions import db
+from app.stock.models import StockLocationType, StockMovement, StockMovementType
+
+
+# Noms d'emplacement acceptés → colonne de stock du produit
+LOCATION_KEYS = {
+    'comptoir': 'stock_comptoir',
+    'ingredients_local': 'stock_ingredients_local',
+    'ingredients_magasin': 'stock_ingredients_magasin',
+    'consommables': 'stock_consommables',
+}
+LOCATION_KEYS.update({key: key for key in list(LOCATION_KEYS.values())})
+
+LOCATION_TYPES = {
+    'stock_comptoir': StockLocationType.COMPTOIR,
+    'stock_ingredients_local': StockLocationType.INGREDIENTS_LOCAL,
+    'stock_ingredients_magasin': StockLocationType.INGREDIENTS_MAGASIN,
+    'stock_consommables': StockLocationType.CONSOMMABLES,
+}
+
+_PENDING_KEY = 'stock_ledger_pending'
+
+
+def normalize_location_key(location):
+    """'comptoir', 'stock_comptoir' ou StockLocationType → 'stock_comptoir' (None si inconnu)."""
+    if isinstance(location, StockLocationType):
+        location = location.value
+    return LOCATION_KEYS.get(location)
+
+
+def _current_user_id():
+    if not has_request_context():
+        return None
+    from flask_login import current_user
+    return current_user.id if current_user and current_user.is_authenticated else None
+
+
+def record_movement(product, location_key, quantity, unit_cost, stock_before, stock_after,
+                    movement_type=None, reason=None, order_id=None, transfer_id=None, user_id=None,
+                    value_change=None):
+    """Mémorise un mouvement de stock, inséré en lot au prochain flush."""
+    if not quantity:
+        return
+    if movement_type is None:
+        movement_type = StockMovementType.ENTREE if quantity > 0 else StockMovementType.SORTIE
+    elif not isinstance(movement_type, StockMovementType):
+        movement_type = StockMovementType(movement_type)
+    db.session.info.setdefault(_PENDING_KEY, []).append({
+        'product': product,
+        'stock_location': LOCATION_TYPES[location_key],
+        'movement_type': movement_type,
+        'quantity': float(quantity),
+        'unit_cost': float(unit_cost or 0),
+        'total_value': abs(float(quantity)) * float(unit_cost or 0),
+        'value_change': float(value_change) if value_change is not None else None,
+        'stock_before': float(stock_before or 0),
+        'stock_after': float(stock_after or 0),
+        'reason': reason,
+        'order_id': order_id,
+        'transfer_id': transfer_id,
+        'user_id': user_id or _current_user_id(),
+        'created_at': datetime.utcnow(),
+    })
+
+
+class StockLedger:
+    """Application groupée des variations de stock"""
+
+    @staticmethod
+    def apply(changes, user_id=None, commit=True):
+        """
+        Applique un lot de variations de stock : valeur et déficit par
+        update_stock_by_location, mouvements insérés en lot, un seul commit.
+
+        Args:
+            changes: itérable de dicts {product ou product_id, location, delta,
+                     unit_cost?, reason?, order_id?, transfer_id?, movement_type?}
+            user_id: auteur des mouvements (défaut : utilisateur connecté)
+
+        Returns:
+            dict: {product_id: Product} des produits modifiés
+
+        Raises:
+            LookupError: produit introuvable
+            ValueError: emplacement inconnu
+        """
+        from models import Product
+
+        changes = list(changes)
+        product_ids = {change['product_id'] for change in changes if change.get('product') is None}
+        products = {
+            product.id: product for product in Product.query.filter(Product.id.in_(product_ids)).all()
+        } if product_ids else {}
+
+        touched = {}
+        # Un seul flush à la fin : pas d'INSERT de mouvements ligne à ligne
+        with db.session.no_autoflush:
+            for change in changes:
+                product = change.get('product') or products.get(change['product_id'])
+                if product is None:
+                    raise LookupError(f"Produit {change['product_id']} non trouvé")
+                location_key = normalize_location_key(change['location'])
+                if location_key is None:
+                    raise ValueError(f"Emplacement de stock inconnu : {change['location']}")
+                product.update_stock_by_location(
+                    location_key, float(change['delta']),
+                    unit_cost_override=change.get('unit_cost'),
+                    movement_type=change.get('movement_type'),
+                    reason=change.get('reason'),
+                    order_id=change.get('order_id'),
+                    transfer_id=change.get('transfer_id'),
+                    user_id=user_id,
+                )
+                touched[product.id] = product
+
+        if commit:
+            db.session.commit()
+        return touched
+
+
+# ============================================================================
+# INSERTION EN LOT DES MOUVEMENTS (événements de session)
+# ============================================================================
+
+def _insert_pending_movements(session, flush_context):
+    """after_flush : un INSERT multi-lignes pour les mouvements mémorisés."""
+    rows = session.info.pop(_PENDING_KEY, None)
+    if not rows:
+        return
+    date_str = datetime.now().strftime('%Y%m%d')
+    for row in rows:
+        row['product_id'] = row.pop('product').id
+        row['reference'] = f'MVT-{date_str}-{uuid.uuid4().hex[:12].upper()}'
+    session.execute(insert(StockMovement.__table__), rows)
+
+
+def _clear_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def register_stock_ledger_hooks():
+    """Branche l'insertion des mouvements sur la classe de session Flask-SQLAlchemy."""
+    session_class = db.session.session_factory.class_
+    if event.contains(session_class, 'after_flush', _insert_pending_movements):
+        return
+    event.listen(session_class, 'after_flush', _insert_pending_movements)
+    event.listen(session_class, 'after_rollback', _clear_pending)
@@ -56,6 +56,9 @@ class StockMovement(db.Model):
     quantity = db.Column(db.Float, nullable=False)  # Positif=entrée, Négatif=sortie
     unit_cost = db.Column(db.Float, default=0.0)
     total_value = db.Column(db.Float, default=0.0)
+    # Variation réelle de la valeur à l'emplacement (après - avant) : une sortie
+    # à découvert ou une entrée qui résorbe un déficit ne bouge pas la valeur
+    value_change = db.Column(db.Float, nullable=True)
     
     # Stock avant/après (pour vérification)
     stock_before = db.Column(db.Float, default=0.0)
@@ -64,7 +67,7 @@ class StockMovement(db.Model):
     # Références et traçabilité
     order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=True)
     transfer_id = db.Column(db.Integer, db.ForeignKey('stock_transfers.id'), nullable=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # None : mouvement automatique
     
     # Informations complémentaires
     reason = db.Column(db.String(255))
@@ -76,6 +79,10 @@ class StockMovement(db.Model):
     order = db.relationship('Order', backref='related_stock_movements')
     user = db.relationship('User', backref='stock_movements_created')
     
+    __table_args__ = (
+        db.Index('idx_stock_movements_created_product', 'created_at', 'product_id'),
+    )
+    
     def __init__(self, **kwargs):
         super(StockMovement, self).__init__(**kwargs)
         if not self.reference:
@@ -109,6 +116,36 @@ class StockMovement(db.Model):
     def __repr__(self):
         return f'<StockMovement {self.reference}: {self.product.name if self.product else "N/A"} {self.quantity:+.2f}>'
 
+class StockSnapshot(db.Model):
+    """
+    Photo quotidienne du stock : quantité et valeur par produit × emplacement
+    à la fin de snapshot_date.
+
+    Point de départ de la valorisation à une date passée (les mouvements
+    postérieurs sont rejoués), maintenue par app/stock/valuation.py.
+    """
+    __tablename__ = 'stock_snapshots'
+
+    id = db.Column(db.Integer, primary_key=True)
+    snapshot_date = db.Column(db.Date, nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    stock_location = db.Column(db.Enum(StockLocationType), nullable=False)
+
+    quantity = db.Column(db.Float, nullable=False, default=0.0)
+    value = db.Column(db.Numeric(14, 4), nullable=False, default=0.0)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    product = db.relationship('Product')
+
+    __table_args__ = (
+        db.UniqueConstraint('snapshot_date', 'product_id', 'stock_location', name='uq_stock_snapshot'),
+        db.Index('idx_stock_snapshots_date', 'snapshot_date'),
+    )
+
+    def __repr__(self):
+        return f'<StockSnapshot {self.snapshot_date} P{self.product_id} {self.stock_location.value}: {self.quantity:.2f}>'
+
 class StockTransfer(db.Model):
     """
     Transferts entre les 4 types de stocks
@@ -355,6 +392,7 @@ def get_stock_by_location(product_id, location_type):
 def update_stock_quantity(product_id, location_type, quantity_change, user_id, reason=None, order_id=None):
     """
     Met à jour le stock et crée un mouvement de traçabilité
+    (StockLedger : valeur et déficit mis à jour, stock négatif autorisé)
     
     Args:
         product_id (int): ID du produit
@@ -367,59 +405,16 @@ def update_stock_quantity(product_id, location_type, quantity_change, user_id, r
     Returns:
         bool: Succès de l'opération
     """
-    from models import Product
+    from app.stock.ledger import StockLedger
     
     try:
-        # Récupération du produit
-        product = Product.query.get(product_id)
-        if not product:
-            return False
-        
-        # Mapping vers les attributs du modèle Product
-        location_attrs = {
-            StockLocationType.COMPTOIR: 'stock_comptoir',
-            StockLocationType.INGREDIENTS_LOCAL: 'stock_ingredients_local',
-            StockLocationType.INGREDIENTS_MAGASIN: 'stock_ingredients_magasin',
-            StockLocationType.CONSOMMABLES: 'stock_consommables'
-        }
-        
-        attr_name = location_attrs.get(location_type)
-        if not attr_name:
-            return False
-        
-        # Stock avant modification
-        stock_before = getattr(product, attr_name, 0.0)
-        
-        # Nouveau stock après modification
-        stock_after = max(0, stock_before + quantity_change)
-        
-        # Mise à jour du stock
-        setattr(product, attr_name, stock_after)
-        
-        # Détermination du type de mouvement
-        if quantity_change > 0:
-            movement_type = StockMovementType.ENTREE
-        else:
-            movement_type = StockMovementType.SORTIE
-        
-        # Création du mouvement de traçabilité
-        movement = StockMovement(
-            product_id=product_id,
-            stock_location=location_type,
-            movement_type=movement_type,
-            quantity=quantity_change,
-            unit_cost=product.cost_price or 0.0,
-            stock_before=stock_before,
-            stock_after=stock_after,
-            user_id=user_id,
-            order_id=order_id,
-            reason=reason
-        )
-        
-        # Sauvegarde
-        db.session.add(movement)
-        db.session.commit()
-        
+        StockLedger.apply([{
+            'product_id': product_id,
+            'location': location_type,
+            'delta': quantity_change,
+            'reason': reason,
+            'order_id': order_id,
+        }], user_id=user_id)
         return True
         
     except Exception as e:
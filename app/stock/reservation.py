@@ -0,0 +1,173 @@
+"""
+Décrémentation de stock sûre en concurrence (ventes PDV)
+
+Deux caisses qui vendent les dernières pièces en même temps lisaient chacune
+le stock avant de le décrémenter : les deux ventes passaient et le stock
+dérivait. Ici les lignes produits du panier sont verrouillées
+(SELECT ... FOR UPDATE) en une seule requête, triées par id pour que toutes
+les caisses prennent les verrous dans le même ordre (pas d'interblocage),
+puis le stock est relu, vérifié et décrémenté (quantité + valeur) dans la
+même transaction.
+
+Les échecs de verrouillage transitoires (interblocage, échec de
+sérialisation, NOWAIT) sont rejoués dans un SAVEPOINT, sans perdre le reste
+de la transaction en cours. Un conflit qui survient plus tard (UPDATE,
+commit) annule toute la transaction : les vues décorées par
+@retry_transaction la rejouent alors entièrement.
+"""
+
+import time
+from decimal import Decimal
+from functools import wraps
+
+from flask import current_app, g
+from sqlalchemy.exc import OperationalError
+
+from extensions import db
+from models import Product
+
+
+# Codes SQLSTATE PostgreSQL considérés comme transitoires
+RETRYABLE_SQLSTATES = {
+    '40001',  # serialization_failure
+    '40P01',  # deadlock_detected
+    '55P03',  # lock_not_available (NOWAIT)
+}
+
+DEFAULT_ATTEMPTS = 3
+RETRY_BACKOFF_SECONDS = 0.05
+
+
+class InsufficientStockError(Exception):
+    """Stock insuffisant pour un produit du panier"""
+
+    def __init__(self, product, requested, available):
+        self.product = product
+        self.requested = requested
+        self.available = available
+        super().__init__(f"Stock insuffisant pour {product.name} (disponible: {available})")
+
+
+def is_retryable(error):
+    """Vrai si l'erreur SQL est un conflit de verrou/sérialisation qu'on peut rejouer."""
+    pgcode = getattr(getattr(error, 'orig', None), 'pgcode', None)
+    return pgcode in RETRYABLE_SQLSTATES
+
+
+def retry_transaction(attempts=DEFAULT_ATTEMPTS):
+    """
+    Décorateur de vue : rejoue toute la transaction sur conflit transitoire.
+
+    La vue laisse remonter les erreurs pour lesquelles should_retry() est
+    vrai ; la session est alors annulée et la vue ré-exécutée depuis le
+    début (relecture et reverrouillage du stock compris).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            for attempt in range(1, attempts + 1):
+                g.transaction_retries_left = attempts - attempt
+                try:
+                    return view(*args, **kwargs)
+                except OperationalError as e:
+                    db.session.rollback()
+                    if not is_retryable(e) or attempt == attempts:
+                        raise
+                    current_app.logger.warning(
+                        f"Conflit de transaction dans {view.__name__} (tentative {attempt}/{attempts}) : {e.orig}"
+                    )
+                    time.sleep(RETRY_BACKOFF_SECONDS * attempt)
+                finally:
+                    g.pop('transaction_retries_left', None)
+        return wrapper
+    return decorator
+
+
+def should_retry(error):
+    """Vrai si, dans une vue @retry_transaction, l'erreur doit remonter pour rejouer la transaction."""
+    return (isinstance(error, OperationalError) and is_retryable(error)
+            and g.get('transaction_retries_left', 0) > 0)
+
+
+class StockReservationService:
+    """Verrouillage et décrémentation atomique du stock d'un panier"""
+
+    @staticmethod
+    def aggregate_cart(items):
+        """
+        Regroupe les lignes d'un panier par produit.
+
+        Args:
+            items: itérable de (product_id, quantité)
+
+        Returns:
+            dict: {product_id: Decimal quantité totale}
+        """
+        cart = {}
+        for product_id, quantity in items:
+            cart[int(product_id)] = cart.get(int(product_id), Decimal('0')) + Decimal(str(quantity))
+        return cart
+
+    @staticmethod
+    def lock_products(product_ids, nowait=False, attempts=DEFAULT_ATTEMPTS):
+        """
+        Verrouille les produits en une requête, dans l'ordre des ids.
+
+        Les valeurs déjà chargées en session sont rafraîchies (populate_existing)
+        pour que les contrôles portent sur le stock réellement verrouillé.
+
+        Returns:
+            dict: {product_id: Product}
+        """
+        ids = sorted(set(product_ids))
+        if not ids:
+            return {}
+
+        for attempt in range(1, attempts + 1):
+            try:
+                with db.session.begin_nested():
+                    products = Product.query.filter(Product.id.in_(ids)).order_by(Product.id)\
+                        .with_for_update(nowait=nowait).populate_existing().all()
+                return {product.id: product for product in products}
+            except OperationalError as e:
+                if not is_retryable(e) or attempt == attempts:
+                    raise
+                current_app.logger.warning(f"Verrou stock indisponible (tentative {attempt}/{attempts}) : {e.orig}")
+                time.sleep(RETRY_BACKOFF_SECONDS * attempt)
+
+    @staticmethod
+    def decrement(items, location_key='stock_comptoir', nowait=False, attempts=DEFAULT_ATTEMPTS, **movement_info):
+        """
+        Verrouille, vérifie puis décrémente le stock de tout un panier.
+
+        Rien n'est décrémenté si un seul produit manque : l'appelant fait
+        le rollback et renvoie l'erreur.
+
+        Args:
+            items: itérable de (product_id, quantité)
+            location_key: colonne de stock à décrémenter
+            nowait: échouer immédiatement (puis rejouer) si un verrou est pris
+            movement_info: movement_type, reason, order_id des mouvements de stock
+
+        Returns:
+            dict: {product_id: Product} (produits verrouillés et mis à jour)
+
+        Raises:
+            LookupError: produit introuvable
+            InsufficientStockError: stock insuffisant
+        """
+        cart = StockReservationService.aggregate_cart(items)
+        products = StockReservationService.lock_products(cart.keys(), nowait=nowait, attempts=attempts)
+
+        for product_id, quantity in cart.items():
+            product = products.get(product_id)
+            if product is None:
+                raise LookupError(f"Produit {product_id} non trouvé")
+            available = float(getattr(product, location_key) or 0)
+            if available < float(quantity):
+                raise InsufficientStockError(product, float(quantity), available)
+
+        for product_id, quantity in cart.items():
+            products[product_id].update_stock_by_location(location_key, -float(quantity), **movement_info)
+
+        return products
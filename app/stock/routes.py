@@ -201,20 +201,12 @@ def quick_entry():
         quantity_received = form.quantity_received.data
         location_type = form.location_type.data
         
-        # Mise à jour du stock selon la localisation
-        if product_obj.update_stock_location(location_type, quantity_received):
+        # Mise à jour du stock selon la localisation (mouvement de traçabilité inclus)
+        if product_obj.update_stock_location(location_type, quantity_received,
+                                             movement_type=StockMovementType.ENTREE,
+                                             reason=f"Réception rapide - {form.reason.data or 'Arrivage marchandise'}"):
             db.session.commit()
             
-            # Création du mouvement de traçabilité
-            from .models import update_stock_quantity
-            update_stock_quantity(
-                product_obj.id,
-                getattr(StockLocationType, location_type.upper()),
-                quantity_received,
-                current_user.id,
-                reason=f"Réception rapide - {form.reason.data or 'Arrivage marchandise'}"
-            )
-            
             flash(f'Stock {product_obj.get_location_display_name(location_type)} pour "{product_obj.name}" mis à jour : +{quantity_received}.', 'success')
         else:
             flash('Erreur lors de la mise à jour du stock.', 'danger')
@@ -243,20 +235,12 @@ def adjustment():
         if new_stock < 0:
             flash(f'Le stock {product_obj.get_location_display_name(location_type)} de "{product_obj.name}" ne peut pas devenir négatif.', 'danger')
         else:
-            # Mise à jour du stock
-            if product_obj.update_stock_location(location_type, quantity_change):
+            # Mise à jour du stock (mouvement de traçabilité inclus)
+            movement_type = StockMovementType.AJUSTEMENT_POSITIF if quantity_change >= 0 else StockMovementType.AJUSTEMENT_NEGATIF
+            if product_obj.update_stock_location(location_type, quantity_change, movement_type=movement_type,
+                                                 reason=reason or "Ajustement manuel"):
                 db.session.commit()
                 
-                # Création du mouvement de traçabilité
-                from .models import update_stock_quantity
-                update_stock_quantity(
-                    product_obj.id,
-                    getattr(StockLocationType, location_type.upper()),
-                    quantity_change,
-                    current_user.id,
-                    reason=reason or "Ajustement manuel"
-                )
-                
                 flash(f'Stock {product_obj.get_location_display_name(location_type)} de "{product_obj.name}" ajusté : {current_stock:+.2f} → {new_stock:.2f}.', 'success')
             else:
                 flash('Erreur lors de l\'ajustement du stock.', 'danger')
@@ -690,44 +674,23 @@ def complete_transfer(transfer_id):
                 db.session.rollback()
                 return redirect(url_for('stock.transfers_list'))
             
-            # Décrémentation stock source
-            product.update_stock_by_location(source_stock_key, -quantity)
+            # Décrémentation stock source (mouvements de traçabilité inclus)
+            product.update_stock_by_location(source_stock_key, -quantity,
+                                             movement_type=StockMovementType.TRANSFERT_SORTIE,
+                                             transfer_id=transfer.id,
+                                             reason=f"Transfert {transfer.reference} - Sortie")
             
             # Incrémentation stock destination
-            product.update_stock_by_location(dest_stock_key, quantity)
+            product.update_stock_by_location(dest_stock_key, quantity,
+                                             movement_type=StockMovementType.TRANSFERT_ENTREE,
+                                             transfer_id=transfer.id,
+                                             reason=f"Transfert {transfer.reference} - Entrée")
             
             # Ajouter le produit à la session pour s'assurer qu'il est suivi
             db.session.add(product)
             
             current_app.logger.info(f"DEBUG - Transfert {transfer.reference}: {product.name} -{quantity} ({source_stock_key}) +{quantity} ({dest_stock_key})")
             
-            # Création des mouvements de traçabilité
-            # Mouvement sortie
-            movement_out = StockMovement(
-                product_id=product.id,
-                stock_location=transfer.source_location,
-                movement_type=StockMovementType.TRANSFERT_SORTIE,
-                quantity=-quantity,
-                unit_cost=line.unit_cost,
-                user_id=current_user.id,
-                transfer_id=transfer.id,
-                reason=f"Transfert {transfer.reference} - Sortie"
-            )
-            db.session.add(movement_out)
-            
-            # Mouvement entrée
-            movement_in = StockMovement(
-                product_id=product.id,
-                stock_location=transfer.destination_location,
-                movement_type=StockMovementType.TRANSFERT_ENTREE,
-                quantity=quantity,
-                unit_cost=line.unit_cost,
-                user_id=current_user.id,
-                transfer_id=transfer.id,
-                reason=f"Transfert {transfer.reference} - Entrée"
-            )
-            db.session.add(movement_in)
-            
             # Mise à jour de la ligne de transfert
             line.quantity_transferred = quantity
         
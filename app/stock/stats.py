@@ -0,0 +1,108 @@
+"""
+Statistiques de stock des templates
+Module: app/stock/stats.py
+
+Le context processor global exécutait trois COUNT sur Product (total, stock
+faible, rupture) à chaque rendu de template, y compris le PDV, les
+formulaires et les pages d'erreur, alors qu'un seul template les affiche.
+Les compteurs sont désormais :
+
+- calculés en une requête (agrégats conditionnels),
+- seulement quand un template les lit (LocalProxy injecté par le context
+  processor),
+- gardés en cache quelques secondes, invalidés par toute écriture sur le
+  stock des produits.
+"""
+
+import threading
+import time
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import attributes
+from werkzeug.local import LocalProxy
+
+from extensions import db
+from models import Product
+from app.utils.session_hooks import CacheInvalidationHooks
+
+
+# Durée de vie : les écritures d'un autre worker ne sont pas vues avant
+CACHE_TTL_SECONDS = 60
+
+LOW_STOCK_THRESHOLD = 5
+
+_EMPTY_STATS = {'total_products_count': 0, 'low_stock_products': 0, 'out_of_stock_products': 0}
+
+_lock = threading.Lock()
+_stats = None
+_loaded_at = None
+
+
+class StockStatsCache:
+    """Compteurs produits (total, stock faible, rupture) en mémoire"""
+
+    @staticmethod
+    def get():
+        """Compteurs courants, recalculés (1 requête) s'ils sont invalidés ou expirés."""
+        global _stats, _loaded_at
+        current = _stats
+        if current is not None and time.monotonic() - _loaded_at < CACHE_TTL_SECONDS:
+            return current
+        with _lock:
+            if _stats is current:
+                total, low, out = db.session.execute(select(
+                    func.count(Product.id),
+                    func.coalesce(func.sum(case((Product.quantity_in_stock <= LOW_STOCK_THRESHOLD, 1), else_=0)), 0),
+                    func.coalesce(func.sum(case((Product.quantity_in_stock <= 0, 1), else_=0)), 0),
+                )).one()
+                _stats = {'total_products_count': total, 'low_stock_products': low, 'out_of_stock_products': out}
+                _loaded_at = time.monotonic()
+            return _stats
+
+    @staticmethod
+    def invalidate():
+        """Force le recalcul au prochain accès."""
+        global _stats
+        with _lock:
+            _stats = None
+
+    @staticmethod
+    def template_variables(logger=None):
+        """Variables de template paresseuses : aucune requête si le template ne les lit pas."""
+        def lazy(name):
+            def load():
+                try:
+                    return StockStatsCache.get()[name]
+                except Exception as e:
+                    # En cas d'erreur DB, fournir des valeurs par défaut
+                    if logger is not None:
+                        logger.warning(f"Erreur context processor statistiques: {e}")
+                    return _EMPTY_STATS[name]
+            return LocalProxy(load)
+
+        return {name: lazy(name) for name in _EMPTY_STATS}
+
+
+# ============================================================================
+# INVALIDATION (événements de session)
+# ============================================================================
+
+def _stock_changed(session):
+    return any(isinstance(obj, Product) for obj in (*session.new, *session.deleted)) or any(
+        isinstance(obj, Product) and attributes.get_history(obj, 'quantity_in_stock').has_changes()
+        for obj in session.dirty
+    )
+
+
+_hooks = CacheInvalidationHooks(
+    'stock_stats',
+    invalidate=StockStatsCache.invalidate,
+    changed=_stock_changed,
+    bulk_models=(Product,),
+    tables=(Product.__table__,),
+)
+
+
+def register_stock_stats_hooks():
+    """Branche l'invalidation des compteurs sur la classe de session Flask-SQLAlchemy."""
+    _hooks.register()
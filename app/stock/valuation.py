@@ -0,0 +1,159 @@
+"""
+Valorisation du stock à une date passée
+Module: app/stock/valuation.py
+
+Les rapports (rotation, clôture) ne connaissaient que le stock actuel :
+la valeur « au début » et « à la fin » d'une période passée était la même.
+Le stock d'un jour D est désormais reconstitué à partir :
+
+- d'une photo quotidienne (stock_snapshots : quantité et valeur par
+  produit × emplacement à la fin d'un jour), prise par la tâche planifiée
+  `flask stock-snapshot` (hors des ventes) ; une photo manquante ne fausse
+  rien, les mouvements sont alors rejoués depuis une photo plus lointaine
+  ou depuis le stock actuel,
+- des mouvements de stock (stock_movements) rejoués depuis la photo la
+  plus proche : en avant depuis une photo antérieure, en arrière depuis une
+  photo postérieure ou depuis le stock actuel.
+
+Chaque calcul coûte trois requêtes, proportionnelles au nombre de produits
+et non à l'historique.
+"""
+
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import case, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from extensions import db
+from models import Product
+from app.stock.models import StockLocationType, StockMovement, StockSnapshot
+
+
+# Colonnes (quantité, valeur) du produit pour chaque emplacement
+LOCATION_COLUMNS = {
+    StockLocationType.COMPTOIR: ('stock_comptoir', 'valeur_stock_comptoir'),
+    StockLocationType.INGREDIENTS_LOCAL: ('stock_ingredients_local', 'valeur_stock_ingredients_local'),
+    StockLocationType.INGREDIENTS_MAGASIN: ('stock_ingredients_magasin', 'valeur_stock_ingredients_magasin'),
+    StockLocationType.CONSOMMABLES: ('stock_consommables', 'valeur_stock_consommables'),
+}
+
+# Noms d'emplacement des rapports (_get_stock_value)
+REPORT_LOCATIONS = {
+    'comptoir': [StockLocationType.COMPTOIR],
+    'local': [StockLocationType.INGREDIENTS_LOCAL],
+    'magasin': [StockLocationType.INGREDIENTS_MAGASIN],
+    'consommables': [StockLocationType.CONSOMMABLES],
+    'all': list(LOCATION_COLUMNS),
+}
+
+
+def _day_end(day):
+    return datetime.combine(day + timedelta(days=1), time.min)
+
+
+class StockValuationService:
+    """Stock et valeur du stock à la fin d'un jour donné"""
+
+    @staticmethod
+    def _current_positions(locations):
+        columns = [Product.id]
+        for location in locations:
+            columns.extend(getattr(Product, name) for name in LOCATION_COLUMNS[location])
+        positions = {}
+        for row in db.session.execute(select(*columns)):
+            for index, location in enumerate(locations):
+                quantity, value = row[1 + 2 * index], row[2 + 2 * index]
+                positions[(row[0], location)] = [float(quantity or 0), float(value or 0)]
+        return positions
+
+    @staticmethod
+    def _snapshot_positions(snapshot_date, locations):
+        rows = db.session.execute(
+            select(StockSnapshot.product_id, StockSnapshot.stock_location, StockSnapshot.quantity, StockSnapshot.value)
+            .where(StockSnapshot.snapshot_date == snapshot_date, StockSnapshot.stock_location.in_(locations))
+        )
+        return {(product_id, location): [float(quantity or 0), float(value or 0)]
+                for product_id, location, quantity, value in rows}
+
+    @staticmethod
+    def _replay(positions, locations, start, end, sign):
+        """Ajoute (sign=1) ou retire (sign=-1) les mouvements de [start, end[ aux positions."""
+        # Mouvements antérieurs à value_change : valeur quantité × coût signée
+        signed_value = func.coalesce(
+            StockMovement.value_change,
+            case((StockMovement.quantity < 0, -StockMovement.total_value), else_=StockMovement.total_value)
+        )
+        query = select(
+            StockMovement.product_id, StockMovement.stock_location,
+            func.sum(StockMovement.quantity), func.sum(func.coalesce(signed_value, 0))
+        ).where(StockMovement.stock_location.in_(locations), StockMovement.created_at >= start)
+        if end is not None:
+            query = query.where(StockMovement.created_at < end)
+        query = query.group_by(StockMovement.product_id, StockMovement.stock_location)
+        for product_id, location, quantity, value in db.session.execute(query):
+            position = positions.setdefault((product_id, location), [0.0, 0.0])
+            position[0] += sign * float(quantity or 0)
+            position[1] += sign * float(value or 0)
+        return positions
+
+    @staticmethod
+    def positions_at(target_date, location='all'):
+        """
+        Quantité et valeur par produit × emplacement à la fin de target_date.
+
+        Returns:
+            dict: {(product_id, StockLocationType): [quantité, valeur]}
+        """
+        locations = REPORT_LOCATIONS.get(location, REPORT_LOCATIONS['comptoir'])
+        earlier = db.session.query(func.max(StockSnapshot.snapshot_date)).filter(
+            StockSnapshot.snapshot_date <= target_date
+        ).scalar()
+        if earlier is not None:
+            positions = StockValuationService._snapshot_positions(earlier, locations)
+            if earlier < target_date:
+                StockValuationService._replay(positions, locations, _day_end(earlier), _day_end(target_date), 1)
+            return positions
+
+        later = db.session.query(func.min(StockSnapshot.snapshot_date)).filter(
+            StockSnapshot.snapshot_date > target_date
+        ).scalar()
+        if later is not None:
+            positions = StockValuationService._snapshot_positions(later, locations)
+            return StockValuationService._replay(positions, locations, _day_end(target_date), _day_end(later), -1)
+
+        positions = StockValuationService._current_positions(locations)
+        return StockValuationService._replay(positions, locations, _day_end(target_date), None, -1)
+
+    @staticmethod
+    def value_at(target_date, location='all'):
+        """Valeur totale du stock à la fin de target_date."""
+        positions = StockValuationService.positions_at(target_date, location)
+        return round(sum(value for _, value in positions.values()), 2)
+
+    @staticmethod
+    def take_snapshot(snapshot_date=None):
+        """
+        Enregistre la photo du stock à la fin de snapshot_date (défaut : hier).
+        Une photo existante pour ce jour est conservée.
+
+        Returns:
+            int: nombre de lignes écrites
+        """
+        snapshot_date = snapshot_date or date.today() - timedelta(days=1)
+        positions = StockValuationService.positions_at(snapshot_date)
+        rows = [
+            {'snapshot_date': snapshot_date, 'product_id': product_id, 'stock_location': location,
+             'quantity': round(quantity, 4), 'value': round(value, 4), 'created_at': datetime.utcnow()}
+            for (product_id, location), (quantity, value) in positions.items()
+            if quantity or value
+        ]
+        if rows:
+            dialect = db.session.get_bind().dialect.name
+            insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+            # Plusieurs workers peuvent photographier le même jour en même temps
+            statement = insert(StockSnapshot.__table__).on_conflict_do_nothing(
+                index_elements=['snapshot_date', 'product_id', 'stock_location']
+            )
+            db.session.execute(statement, rows)
+        return len(rows)
+
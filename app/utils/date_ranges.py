@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Prédicats de plages de dates "sargables" pour les requêtes SQLAlchemy
+
+`func.date(col) == jour` oblige PostgreSQL/SQLite à calculer date() sur chaque
+ligne, ce qui empêche l'utilisation des index sur `col`. Ces helpers produisent
+des bornes semi-ouvertes `col >= début AND col < fin` équivalentes, qui
+exploitent les index (ex: idx_employee_date, idx_orders_created_at).
+"""
+
+from datetime import datetime, time, timedelta
+from sqlalchemy import and_, or_
+
+
+def day_bounds(day):
+    """
+    Bornes [début, fin[ d'une journée.
+
+    Args:
+        day: date (ou datetime, dont seule la date est conservée)
+
+    Returns:
+        tuple: (datetime début inclus, datetime fin exclue)
+    """
+    if isinstance(day, datetime):
+        day = day.date()
+    start = datetime.combine(day, time.min)
+    return start, start + timedelta(days=1)
+
+
+def period_bounds(start_date, end_date):
+    """
+    Bornes [début, fin[ d'une période de jours entiers (end_date incluse).
+
+    Returns:
+        tuple: (datetime début inclus, datetime fin exclue)
+    """
+    start, _ = day_bounds(start_date)
+    _, end = day_bounds(end_date)
+    return start, end
+
+
+def on_day(column, day):
+    """Équivalent indexable de `func.date(column) == day`."""
+    start, end = day_bounds(day)
+    return and_(column >= start, column < end)
+
+
+def not_on_day(column, day):
+    """Équivalent indexable de `func.date(column) != day`."""
+    start, end = day_bounds(day)
+    return or_(column < start, column >= end)
+
+
+def in_period(column, start_date, end_date):
+    """Équivalent indexable de `func.date(column).between(start_date, end_date)`."""
+    start, end = period_bounds(start_date, end_date)
+    return and_(column >= start, column < end)
+
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Événements de session partagés par les caches et les agrégats maintenus
+
+Deux mécanismes revenaient à l'identique dans plusieurs modules :
+
+- CacheInvalidationHooks : un cache mémoire (instantané versionné, compteurs...)
+  invalidé par les écritures de la session. Le flush qui écrit invalide tout
+  de suite (la session relit ses propres modifications), un UPDATE/DELETE en
+  masse aussi, puis le commit ou le rollback invalide à nouveau : une lecture
+  faite entre-temps par un autre thread peut être fausse.
+
+- DeferredRefreshHooks : une table d'agrégats recalculée juste avant le commit,
+  dans la même transaction. after_flush accumule les clés touchées dans
+  session.info, before_commit les recalcule, after_rollback les oublie.
+
+Les deux se branchent sur la classe de session Flask-SQLAlchemy ; register()
+est idempotent.
+"""
+
+from flask import current_app
+from sqlalchemy import event
+
+from extensions import db
+
+
+class CacheInvalidationHooks:
+    """Invalidation d'un cache mémoire par les événements de session"""
+
+    def __init__(self, name, invalidate, changed, bulk_models=(), tables=(), on_schema_change=None):
+        """
+        Args:
+            name: Préfixe de la clé session.info du cache
+            invalidate: Fonction sans argument qui invalide le cache
+            changed: changed(session) -> True si le flush touche le cache
+                (session.new / dirty / deleted et leur historique)
+            bulk_models: Modèles dont un UPDATE/DELETE en masse invalide le cache
+            tables: Tables dont la création/suppression invalide le cache
+            on_schema_change: Invalidation sur changement de schéma (défaut: invalidate)
+        """
+        self.dirty_key = f'{name}_dirty'
+        self.invalidate = invalidate
+        self.changed = changed
+        self.bulk_models = tuple(bulk_models)
+        self.tables = tuple(tables)
+        self.on_schema_change = on_schema_change or invalidate
+
+    def _mark_dirty_on_flush(self, session, flush_context):
+        if self.changed(session):
+            session.info[self.dirty_key] = True
+            # La session qui écrit doit relire ses propres modifications
+            self.invalidate()
+
+    def _mark_dirty_on_bulk(self, orm_execute_state):
+        if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+            return
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ in self.bulk_models:
+            orm_execute_state.session.info[self.dirty_key] = True
+            self.invalidate()
+
+    def _invalidate_after_transaction(self, session):
+        # Après commit ou rollback, une lecture faite entre-temps peut être fausse
+        if session.info.pop(self.dirty_key, False):
+            self.invalidate()
+
+    def _invalidate_on_schema_change(self, target, connection, **kw):
+        self.on_schema_change()
+
+    def register(self):
+        """Branche l'invalidation sur la classe de session Flask-SQLAlchemy."""
+        session_class = db.session.session_factory.class_
+        if event.contains(session_class, 'after_flush', self._mark_dirty_on_flush):
+            return
+        event.listen(session_class, 'after_flush', self._mark_dirty_on_flush)
+        if self.bulk_models:
+            event.listen(session_class, 'do_orm_execute', self._mark_dirty_on_bulk)
+        event.listen(session_class, 'after_commit', self._invalidate_after_transaction)
+        event.listen(session_class, 'after_rollback', self._invalidate_after_transaction)
+        for table in self.tables:
+            event.listen(table, 'after_create', self._invalidate_on_schema_change)
+            event.listen(table, 'after_drop', self._invalidate_on_schema_change)
+
+
+def _keep_previous_value(target, value, oldvalue, initiator):
+    """Listener vide : active_history=True charge l'ancienne valeur même expirée."""
+
+
+class DeferredRefreshHooks:
+    """Recalcul d'agrégats juste avant le commit, pour les clés touchées par la transaction"""
+
+    def __init__(self, name, new_pending, collect, refresh, collect_bulk=None,
+                 history_attributes=(), failure_message=None):
+        """
+        Args:
+            name: Préfixe des clés session.info
+            new_pending: Fabrique du conteneur des clés à recalculer (set, dict...)
+            collect: collect(session, pending) appelé à chaque flush
+            refresh: refresh(session, pending) appelé avant le commit
+            collect_bulk: collect_bulk(orm_execute_state, pending) pour les
+                UPDATE/DELETE en masse (optionnel)
+            history_attributes: Attributs dont l'ancienne valeur doit rester
+                lisible au flush même s'ils étaient expirés
+            failure_message: Si fourni, le recalcul s'exécute dans un SAVEPOINT
+                et un échec est journalisé avec ce message ({error} remplacé
+                par l'exception) sans bloquer le commit ; sinon l'échec fait
+                échouer le commit
+        """
+        self.pending_key = f'{name}_pending'
+        self.refreshing_key = f'{name}_refreshing'
+        self.new_pending = new_pending
+        self.collect = collect
+        self.refresh = refresh
+        self.collect_bulk = collect_bulk
+        self.history_attributes = tuple(history_attributes)
+        self.failure_message = failure_message
+
+    def pending(self, session):
+        """Clés en attente de recalcul pour cette session."""
+        return session.info.setdefault(self.pending_key, self.new_pending())
+
+    def _collect_on_flush(self, session, flush_context):
+        if session.info.get(self.refreshing_key):
+            return
+        self.collect(session, self.pending(session))
+
+    def _collect_on_bulk(self, orm_execute_state):
+        if orm_execute_state.session.info.get(self.refreshing_key):
+            return
+        if not (orm_execute_state.is_delete or orm_execute_state.is_update):
+            return
+        self.collect_bulk(orm_execute_state, self.pending(orm_execute_state.session))
+
+    def _refresh_before_commit(self, session):
+        # before_commit est aussi émis à la libération d'un SAVEPOINT : attendre le vrai commit
+        if session.info.get(self.refreshing_key) or session.in_nested_transaction():
+            return
+
+        session.flush()
+        pending = session.info.pop(self.pending_key, None)
+        if not pending or (isinstance(pending, dict) and not any(pending.values())):
+            return
+
+        session.info[self.refreshing_key] = True
+        try:
+            if self.failure_message is None:
+                self.refresh(session, pending)
+                return
+            try:
+                with session.begin_nested():
+                    self.refresh(session, pending)
+            except Exception as e:
+                current_app.logger.warning(self.failure_message.format(error=e))
+        finally:
+            session.info.pop(self.refreshing_key, None)
+
+    def _clear_pending(self, session):
+        session.info.pop(self.pending_key, None)
+
+    def register(self):
+        """Branche la maintenance sur la classe de session Flask-SQLAlchemy."""
+        session_class = db.session.session_factory.class_
+        if event.contains(session_class, 'after_flush', self._collect_on_flush):
+            return
+        event.listen(session_class, 'after_flush', self._collect_on_flush)
+        if self.collect_bulk is not None:
+            event.listen(session_class, 'do_orm_execute', self._collect_on_bulk)
+        event.listen(session_class, 'before_commit', self._refresh_before_commit)
+        event.listen(session_class, 'after_rollback', self._clear_pending)
+        for attr in self.history_attributes:
+            event.listen(attr, 'set', _keep_previous_value, active_history=True)
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Écritures idempotentes sur une contrainte d'unicité
+
+Les tables d'agrégats (soldes par période, faits de ventes) sont réécrites
+ligne par clé. Un DELETE suivi d'un INSERT échoue dès que deux transactions
+écrivent la même clé (IntegrityError sur la contrainte unique) : on passe
+par INSERT ... ON CONFLICT sur PostgreSQL et SQLite, et par une lecture des
+clés existantes suivie d'UPDATE / INSERT sur les autres bases.
+"""
+
+from sqlalchemy import and_, insert, or_, select, update
+
+
+def _dialect_insert(session):
+    dialect = session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        return dialect_insert
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        return dialect_insert
+    return None
+
+
+def _existing_keys(session, model, rows, index_elements):
+    columns = [getattr(model, name) for name in index_elements]
+    conditions = [
+        and_(*(column == row[name] for column, name in zip(columns, index_elements)))
+        for row in rows
+    ]
+    return set(session.execute(select(*columns).where(or_(*conditions))).all())
+
+
+def insert_missing(session, model, rows, index_elements):
+    """Insère les lignes dont la clé n'existe pas encore (les autres sont ignorées)."""
+    if not rows:
+        return
+    dialect_insert = _dialect_insert(session)
+    if dialect_insert is not None:
+        session.execute(dialect_insert(model).on_conflict_do_nothing(index_elements=list(index_elements)), rows)
+        return
+    existing = _existing_keys(session, model, rows, index_elements)
+    missing = [row for row in rows if tuple(row[name] for name in index_elements) not in existing]
+    if missing:
+        session.execute(insert(model), missing)
+
+
+def upsert(session, model, rows, index_elements, update_columns):
+    """
+    Insère les lignes, ou met à jour update_columns si la clé existe déjà.
+
+    Args:
+        model: Modèle cible
+        rows: Liste de dicts (colonnes de la clé et update_columns au moins)
+        index_elements: Colonnes de la contrainte d'unicité
+        update_columns: Colonnes réécrites en cas de conflit
+    """
+    if not rows:
+        return
+    dialect_insert = _dialect_insert(session)
+    if dialect_insert is not None:
+        statement = dialect_insert(model)
+        session.execute(
+            statement.on_conflict_do_update(
+                index_elements=list(index_elements),
+                set_={column: statement.excluded[column] for column in update_columns}
+            ),
+            rows
+        )
+        return
+
+    existing = _existing_keys(session, model, rows, index_elements)
+    missing = []
+    for row in rows:
+        key = tuple(row[name] for name in index_elements)
+        if key not in existing:
+            missing.append(row)
+            continue
+        session.execute(
+            update(model)
+            .where(*(getattr(model, name) == row[name] for name in index_elements))
+            .values({column: row[column] for column in update_columns})
+        )
+    if missing:
+        session.execute(insert(model), missing)
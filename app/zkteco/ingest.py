@@ -0,0 +1,259 @@
+"""
+Import en lot des pointages ZKTeco
+Module: app/zkteco/ingest.py
+
+Les agents renvoyaient toute la mémoire de la pointeuse, un pointage par
+requête HTTP, chaque requête faisant deux recherches d'employé et un
+commit. Ici un lot complet (JSON ou texte ATTLOG iClock) est traité en
+une transaction :
+
+- une requête pour résoudre tous les employés (zk_user_id puis id),
+- une requête pour les derniers pointages des jours concernés
+  (auto-détection entrée/sortie quand le type n'est pas fourni),
+- INSERT ... ON CONFLICT DO NOTHING sur (employee_id, timestamp) : renvoyer
+  un pointage déjà connu est sans effet.
+
+Chaque ligne reçoit un statut : inserted, duplicate, unknown_employee ou
+invalid. Quand la pointeuse est identifiée, son curseur (dernier pointage
+reçu) est avancé dans la même transaction : un agent qui a perdu son état
+local peut reprendre à partir de là. Les résumés de présence des jours
+touchés sont recalculés au commit (app/employees/attendance_summary.py).
+"""
+
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from extensions import db
+from app.employees.attendance_summary import mark_days
+from app.employees.models import AttendanceRecord, Employee
+from app.zkteco.models import AttendanceDeviceCursor
+
+
+TIMESTAMP_FORMATS = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%d/%m/%Y %H:%M:%S']
+
+# Codes de pointage de la pointeuse (champ punch / statut ATTLOG) :
+# 1 = entrée, 2 = sortie, 0 = entrée par défaut ; les autres sont traités comme entrée
+DEVICE_PUNCH_TYPES = {'0': 'in', '1': 'in', '2': 'out'}
+
+# Mode de vérification ATTLOG
+VERIFICATION_TYPES = {'0': 'password', '1': 'fingerprint', '4': 'card', '15': 'face'}
+
+MAX_BATCH_SIZE = 20000
+_INSERT_CHUNK = 1000
+
+
+def parse_timestamp(value):
+    """Horodatage d'un pointage (None si illisible)."""
+    if isinstance(value, datetime):
+        return value
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    for fmt in TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def normalize_punch_type(value):
+    """'in' / 'out' explicite (JSON : 0 = entrée, 1 = sortie), sinon None."""
+    if value is None:
+        return None
+    value = str(value).lower()
+    return {'in': 'in', 'out': 'out', '0': 'in', '1': 'out'}.get(value)
+
+
+def parse_attlog(text):
+    """
+    Parse un envoi iClock ATTLOG (une ligne par pointage, champs tabulés) :
+    PIN, horodatage, statut, mode de vérification, code travail...
+
+    Returns:
+        list: pointages au format JSON de l'API
+    """
+    punches = []
+    for line in text.splitlines():
+        fields = line.strip().split('\t')
+        if len(fields) < 2 or not fields[0]:
+            continue
+        status = fields[2].strip() if len(fields) > 2 else ''
+        verify = fields[3].strip() if len(fields) > 3 else ''
+        punches.append({
+            'user_id': fields[0].strip(),
+            'timestamp': fields[1].strip(),
+            'punch_type': DEVICE_PUNCH_TYPES.get(status, 'in'),
+            'verification_type': VERIFICATION_TYPES.get(verify),
+        })
+    return punches
+
+
+class AttendanceIngestService:
+    """Import idempotent d'un lot de pointages"""
+
+    @staticmethod
+    def resolve_employees(user_ids):
+        """
+        Employés actifs par identifiant pointeuse, en une requête.
+        Même règle que l'import unitaire : zk_user_id d'abord, puis id.
+
+        Returns:
+            dict: {str(user_id): Employee}
+        """
+        numeric_ids = set()
+        for user_id in user_ids:
+            try:
+                numeric_ids.add(int(user_id))
+            except (TypeError, ValueError):
+                continue
+        if not numeric_ids:
+            return {}
+
+        employees = Employee.query.filter(
+            Employee.is_active == True,
+            or_(Employee.zk_user_id.in_(numeric_ids), Employee.id.in_(numeric_ids))
+        ).all()
+        by_zk = {employee.zk_user_id: employee for employee in employees if employee.zk_user_id is not None}
+        by_id = {employee.id: employee for employee in employees}
+
+        resolved = {}
+        for user_id in user_ids:
+            try:
+                key = int(user_id)
+            except (TypeError, ValueError):
+                continue
+            employee = by_zk.get(key) or by_id.get(key)
+            if employee:
+                resolved[str(user_id)] = employee
+        return resolved
+
+    @staticmethod
+    def _last_punches(employee_days):
+        """Dernier pointage enregistré par (employee_id, jour), en une requête."""
+        if not employee_days:
+            return {}
+        employee_ids = {employee_id for employee_id, _ in employee_days}
+        days = [day for _, day in employee_days]
+        last = {}
+        rows = db.session.execute(
+            select(AttendanceRecord.employee_id, AttendanceRecord.timestamp, AttendanceRecord.punch_type)
+            .where(AttendanceRecord.employee_id.in_(employee_ids),
+                   AttendanceRecord.timestamp >= datetime.combine(min(days), datetime.min.time()),
+                   AttendanceRecord.timestamp < datetime.combine(max(days) + timedelta(days=1), datetime.min.time()))
+            .order_by(AttendanceRecord.timestamp)
+        )
+        for employee_id, timestamp, punch_type in rows:
+            key = (employee_id, timestamp.date())
+            if key in employee_days:
+                last[key] = punch_type
+        return last
+
+    @staticmethod
+    def _insert_ignoring_duplicates(rows):
+        """INSERT ... ON CONFLICT DO NOTHING ; retourne les (employee_id, timestamp) insérés."""
+        dialect = db.session.get_bind().dialect.name
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        inserted = set()
+        for start in range(0, len(rows), _INSERT_CHUNK):
+            statement = insert(AttendanceRecord.__table__).values(rows[start:start + _INSERT_CHUNK])
+            statement = statement.on_conflict_do_nothing(index_elements=['employee_id', 'timestamp'])
+            statement = statement.returning(AttendanceRecord.employee_id, AttendanceRecord.timestamp)
+            inserted.update((employee_id, timestamp) for employee_id, timestamp in db.session.execute(statement))
+        return inserted
+
+    @staticmethod
+    def ingest(punches, device_id=None, commit=True):
+        """
+        Enregistre un lot de pointages en une transaction.
+
+        Args:
+            punches: liste de dicts {user_id, timestamp, punch_type?, verification_type?}
+            device_id: identifiant de la pointeuse (optionnel)
+
+        Returns:
+            dict: {'results': [{'index', 'status', ...}], 'counts': {statut: n}}
+        """
+        results = [None] * len(punches)
+        parsed = []
+        for index, punch in enumerate(punches):
+            if not isinstance(punch, dict):
+                results[index] = {'index': index, 'status': 'invalid', 'message': 'Format de pointage invalide'}
+                continue
+            user_id = punch.get('user_id') or punch.get('zk_user_id')
+            timestamp = parse_timestamp(punch.get('timestamp') or punch.get('time'))
+            if not user_id or timestamp is None:
+                results[index] = {'index': index, 'status': 'invalid',
+                                  'message': 'user_id et timestamp valides requis'}
+                continue
+            parsed.append((index, str(user_id), timestamp, normalize_punch_type(punch.get('punch_type')), punch))
+
+        employees = AttendanceIngestService.resolve_employees({user_id for _, user_id, _, _, _ in parsed})
+
+        # Lignes à insérer, dans l'ordre chronologique (auto-détection entrée/sortie)
+        pending = []
+        for index, user_id, timestamp, punch_type, punch in parsed:
+            employee = employees.get(user_id)
+            if employee is None:
+                results[index] = {'index': index, 'status': 'unknown_employee',
+                                  'message': f'Employé non trouvé pour ID: {user_id}'}
+                continue
+            pending.append((timestamp, index, employee, punch_type, punch))
+        pending.sort(key=lambda row: (row[0], row[1]))
+
+        needs_detection = {(employee.id, timestamp.date())
+                           for timestamp, _, employee, punch_type, _ in pending if punch_type is None}
+        last_punch = AttendanceIngestService._last_punches(needs_detection)
+
+        rows = []
+        seen = {}
+        received_at = datetime.utcnow()
+        for timestamp, index, employee, punch_type, punch in pending:
+            key = (employee.id, timestamp)
+            if key in seen:
+                results[index] = {'index': index, 'status': 'duplicate', 'employee_id': employee.id,
+                                  'timestamp': timestamp.isoformat()}
+                continue
+            auto_detected = punch_type is None
+            day_key = (employee.id, timestamp.date())
+            if auto_detected:
+                # Pas de pointage ce jour → entrée ; sinon alternance avec le dernier
+                punch_type = 'out' if last_punch.get(day_key) == 'in' else 'in'
+            last_punch[day_key] = punch_type
+            seen[key] = index
+            rows.append({
+                'employee_id': employee.id,
+                'timestamp': timestamp,
+                'punch_type': punch_type,
+                'device_id': punch.get('device_id') or device_id,
+                'verification_type': punch.get('verification_type'),
+                'raw_data': json.dumps(punch, default=str),
+                'created_at': received_at,
+                'processed': False,
+            })
+            results[index] = {'index': index, 'status': 'inserted', 'employee_id': employee.id,
+                              'employee_name': employee.name, 'timestamp': timestamp.isoformat(),
+                              'punch_type': punch_type, 'auto_detected': auto_detected}
+
+        inserted = AttendanceIngestService._insert_ignoring_duplicates(rows) if rows else set()
+        # INSERT hors ORM : résumés de présence des jours touchés recalculés au commit
+        mark_days(inserted)
+        for key, index in seen.items():
+            if key not in inserted:
+                results[index]['status'] = 'duplicate'
+
+        # Curseur de la pointeuse : dernier pointage reçu (nouveau ou déjà connu)
+        cursor = None
+        if device_id:
+            acknowledged = [timestamp for _, timestamp in seen]
+            cursor = AttendanceDeviceCursor.advance(device_id, max(acknowledged, default=None), len(punches))
+        if commit:
+            db.session.commit()
+
+        counts = {}
+        for result in results:
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+        return {'results': results, 'counts': counts, 'cursor': cursor.to_dict() if cursor else None}
@@ -0,0 +1,78 @@
+"""
+Modèles du module ZKTeco
+Module: app/zkteco/models.py
+"""
+
+from datetime import datetime
+
+from extensions import db
+
+
+class AttendanceDeviceCursor(db.Model):
+    """Dernier pointage reçu par pointeuse (reprise incrémentale des agents)"""
+    __tablename__ = 'attendance_device_cursors'
+
+    id = db.Column(db.Integer, primary_key=True)
+    device_id = db.Column(db.String(50), nullable=False, unique=True)
+    last_timestamp = db.Column(db.DateTime, nullable=True)
+    last_batch_size = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @staticmethod
+    def advance(device_id, timestamp, batch_size=0):
+        """Avance le curseur d'une pointeuse (jamais en arrière)."""
+        cursor = AttendanceDeviceCursor.query.filter_by(device_id=device_id).with_for_update().first()
+        if cursor is None:
+            cursor = AttendanceDeviceCursor(device_id=device_id)
+            db.session.add(cursor)
+        if timestamp is not None and (cursor.last_timestamp is None or timestamp > cursor.last_timestamp):
+            cursor.last_timestamp = timestamp
+        cursor.last_batch_size = batch_size
+        cursor.updated_at = datetime.utcnow()
+        return cursor
+
+    def to_dict(self):
+        return {
+            'device_id': self.device_id,
+            'last_timestamp': self.last_timestamp.strftime('%Y-%m-%d %H:%M:%S') if self.last_timestamp else None,
+            'last_batch_size': self.last_batch_size,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+    def __repr__(self):
+        return f'<AttendanceDeviceCursor {self.device_id} - {self.last_timestamp}>'
+
+
+class AttendanceRelayMessage(db.Model):
+    """Pointage reçu localement, en attente de relais vers le VPS"""
+    __tablename__ = 'attendance_relay_outbox'
+
+    id = db.Column(db.Integer, primary_key=True)
+    payload = db.Column(db.Text, nullable=False)
+    content_type = db.Column(db.String(100), nullable=True)
+    # pending → sending (lot réclamé par un relais) → sent, ou dead après
+    # ZKTECO_RELAY_MAX_ATTEMPTS échecs
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('idx_relay_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'attempts': self.attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'sent_at': self.sent_at.isoformat() if self.sent_at else None,
+        }
+
+    def __repr__(self):
+        return f'<AttendanceRelayMessage {self.id} - {self.status}>'
@@ -0,0 +1,290 @@
+"""
+Relais asynchrone des pointages vers le VPS (pont local)
+Module: app/zkteco/relay.py
+
+Avec ZKTECO_SYNC_ENABLED, la vue attendance() envoyait chaque pointage au
+VPS par un requests.post synchrone avant de l'enregistrer : un VPS lent
+bloquait la pointeuse et le worker gunicorn. Le pointage reçu est désormais
+écrit dans la table attendance_relay_outbox (une insertion locale) et un
+processus dédié la vide (`flask zkteco-relay --loop`, lancé à côté de
+gunicorn : ni les workers web ni les commandes CLI ne démarrent de thread) :
+
+- un lot est réclamé (statut sending) puis la transaction est validée :
+  les appels au VPS se font hors transaction, sans verrou de ligne,
+- les pointages JSON en attente sont regroupés en un seul appel à l'import
+  en lot du VPS (idempotent : un renvoi est sans effet),
+- les envois non-JSON sont relayés tels quels, un par un,
+- un échec reporte le message avec un délai exponentiel ; après
+  ZKTECO_RELAY_MAX_ATTEMPTS échecs il passe en lettre morte (dead),
+- un lot réclamé par un relais arrêté en cours d'envoi redevient échu
+  après CLAIM_SECONDS (renvoi sans effet côté VPS).
+
+L'état de la file est exposé par /zkteco/api/relay/status et la commande
+`flask zkteco-relay`.
+"""
+
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import requests
+from flask import current_app
+from sqlalchemy import func
+
+from extensions import db
+from app.zkteco.models import AttendanceRelayMessage
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+DEFAULT_MAX_ATTEMPTS = 8
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 3600
+POLL_INTERVAL_SECONDS = 5
+# Les messages relayés sont conservés quelques jours pour diagnostic
+SENT_RETENTION_DAYS = 7
+REQUEST_TIMEOUT = 30
+# Durée d'un lot réclamé avant qu'un autre relais puisse le reprendre
+CLAIM_SECONDS = 10 * 60
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def backoff_delay(attempts):
+    """Délai avant nouvel essai : 30 s, 60 s, 120 s... plafonné à 1 h"""
+    return timedelta(seconds=min(BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)), BACKOFF_MAX_SECONDS))
+
+
+def _punches_from_payload(payload):
+    """Pointages JSON d'un message (None si le message doit être relayé brut)."""
+    try:
+        data = json.loads(payload)
+    except (TypeError, ValueError):
+        return None
+    if isinstance(data, dict):
+        punches = data.get('punches')
+        return punches if isinstance(punches, list) else [data]
+    if isinstance(data, list):
+        return data
+    return None
+
+
+class AttendanceRelayService:
+    """File locale des pointages à relayer vers le VPS"""
+
+    @staticmethod
+    def enqueue(data, content_type=None, commit=True):
+        """
+        Met un envoi de la pointeuse en file de relais.
+
+        Args:
+            data: corps de la requête (bytes ou str)
+            content_type: Content-Type d'origine (relais brut)
+        """
+        if isinstance(data, bytes):
+            data = data.decode('utf-8', errors='replace')
+        message = AttendanceRelayMessage(payload=data, content_type=content_type)
+        db.session.add(message)
+        if commit:
+            db.session.commit()
+        wake_relay_worker()
+        return message
+
+    @staticmethod
+    def _claim(limit):
+        """
+        Réclame les messages échus (statut sending) et valide la transaction.
+
+        Returns:
+            list: [(id, payload, content_type)] des messages réclamés
+        """
+        now = datetime.utcnow()
+        query = AttendanceRelayMessage.query.filter(
+            AttendanceRelayMessage.status.in_(('pending', 'sending')),
+            AttendanceRelayMessage.next_attempt_at <= now
+        ).order_by(AttendanceRelayMessage.id).limit(limit)
+        # Plusieurs relais peuvent vider la file en même temps
+        if db.session.get_bind().dialect.name == 'postgresql':
+            query = query.with_for_update(skip_locked=True)
+        claimed = []
+        for message in query.all():
+            message.status = 'sending'
+            message.next_attempt_at = now + timedelta(seconds=CLAIM_SECONDS)
+            claimed.append((message.id, message.payload, message.content_type))
+        db.session.commit()
+        return claimed
+
+    @staticmethod
+    def _headers(content_type='application/json'):
+        return {
+            'Authorization': f"Bearer {current_app.config.get('ZKTECO_API_TOKEN', '')}",
+            'Content-Type': content_type or 'application/json',
+            'User-Agent': 'FeeMaison-LocalBridge',
+        }
+
+    @staticmethod
+    def _post(url, **kwargs):
+        response = requests.post(url, timeout=REQUEST_TIMEOUT, verify=False, **kwargs)
+        if response.status_code >= 300:
+            raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+        return response
+
+    @staticmethod
+    def drain(limit=BATCH_SIZE):
+        """
+        Relaie les messages échus (un lot JSON + les envois bruts).
+
+        Returns:
+            dict: {'sent': n, 'failed': n, 'dead': n}
+        """
+        config = current_app.config
+        vps_url = config.get('ZKTECO_VPS_URL')
+        bulk_url = config.get('ZKTECO_VPS_BULK_URL') or f"{vps_url.rstrip('/')}/bulk"
+        max_attempts = config.get('ZKTECO_RELAY_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+
+        claimed = AttendanceRelayService._claim(limit)
+        counts = {'sent': 0, 'failed': 0, 'dead': 0}
+        if not claimed:
+            return counts
+
+        # Envois hors transaction : {id: None si relayé, sinon l'erreur}
+        results = {}
+        batched, punches = [], []
+        for message_id, payload, content_type in claimed:
+            message_punches = _punches_from_payload(payload)
+            if message_punches is None:
+                try:
+                    AttendanceRelayService._post(vps_url, data=payload.encode('utf-8'),
+                                                 headers=AttendanceRelayService._headers(content_type))
+                    results[message_id] = None
+                except Exception as e:
+                    results[message_id] = e
+            else:
+                batched.append(message_id)
+                punches.extend(message_punches)
+
+        if batched:
+            try:
+                AttendanceRelayService._post(bulk_url, json={'punches': punches},
+                                             headers=AttendanceRelayService._headers())
+                error = None
+            except Exception as e:
+                error = e
+            results.update(dict.fromkeys(batched, error))
+
+        now = datetime.utcnow()
+        messages = AttendanceRelayMessage.query.filter(
+            AttendanceRelayMessage.id.in_(results),
+            AttendanceRelayMessage.status == 'sending'
+        ).all()
+        for message in messages:
+            error = results[message.id]
+            if error is None:
+                message.status = 'sent'
+                message.sent_at = now
+                message.last_error = None
+                counts['sent'] += 1
+                continue
+            message.attempts += 1
+            message.last_error = str(error)[:1000]
+            if message.attempts >= max_attempts:
+                message.status = 'dead'
+                counts['dead'] += 1
+            else:
+                message.status = 'pending'
+                message.next_attempt_at = now + backoff_delay(message.attempts)
+                counts['failed'] += 1
+
+        AttendanceRelayMessage.query.filter(
+            AttendanceRelayMessage.status == 'sent',
+            AttendanceRelayMessage.sent_at < now - timedelta(days=SENT_RETENTION_DAYS)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+
+        if counts['failed'] or counts['dead']:
+            logger.warning(f"❌ Relais VPS : {counts}")
+        return counts
+
+    @staticmethod
+    def requeue_dead():
+        """Remet les lettres mortes en file (après correction côté VPS)."""
+        requeued = AttendanceRelayMessage.query.filter_by(status='dead').update(
+            {'status': 'pending', 'attempts': 0, 'next_attempt_at': datetime.utcnow()},
+            synchronize_session=False
+        )
+        db.session.commit()
+        wake_relay_worker()
+        return requeued
+
+    @staticmethod
+    def status():
+        """État de la file : compteurs par statut, plus ancien en attente, dernières erreurs."""
+        counts = dict(
+            db.session.query(AttendanceRelayMessage.status, func.count(AttendanceRelayMessage.id))
+            .group_by(AttendanceRelayMessage.status).all()
+        )
+        oldest_pending = db.session.query(func.min(AttendanceRelayMessage.created_at)).filter(
+            AttendanceRelayMessage.status.in_(('pending', 'sending'))
+        ).scalar()
+        last_sent = db.session.query(func.max(AttendanceRelayMessage.sent_at)).scalar()
+        dead = AttendanceRelayMessage.query.filter_by(status='dead').order_by(
+            AttendanceRelayMessage.id.desc()
+        ).limit(10).all()
+        return {
+            'pending': counts.get('pending', 0),
+            'sending': counts.get('sending', 0),
+            'sent': counts.get('sent', 0),
+            'dead': counts.get('dead', 0),
+            'oldest_pending_at': oldest_pending.isoformat() if oldest_pending else None,
+            'last_sent_at': last_sent.isoformat() if last_sent else None,
+            'recent_dead': [message.to_dict() for message in dead],
+        }
+
+
+class AttendanceRelayWorker(threading.Thread):
+    """Thread qui vide la file de relais (processus `flask zkteco-relay --loop`)"""
+
+    def __init__(self, app):
+        super().__init__(daemon=True, name='zkteco-relay')
+        self.app = app
+        self.wakeup = threading.Event()
+        self.running = True
+
+    def run(self):
+        logger.info("🔄 Worker de relais VPS démarré")
+        while self.running:
+            try:
+                with self.app.app_context():
+                    counts = AttendanceRelayService.drain()
+                    db.session.remove()
+                # File non vide : enchaîner sans attendre
+                if counts['sent'] == BATCH_SIZE:
+                    continue
+            except Exception as e:
+                logger.error(f"❌ Erreur dans le worker de relais: {e}")
+            self.wakeup.wait(POLL_INTERVAL_SECONDS)
+            self.wakeup.clear()
+        logger.info("🔄 Worker de relais VPS arrêté")
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
+
+
+def start_relay_worker(app):
+    """Démarre le worker de relais (une fois par processus, voir `flask zkteco-relay --loop`)."""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = AttendanceRelayWorker(app)
+            _worker.start()
+    return _worker
+
+
+def wake_relay_worker():
+    """Réveille le worker après une mise en file (relais sans attendre le prochain cycle)."""
+    if _worker is not None:
+        _worker.wakeup.set()
@@ -3,9 +3,12 @@ from app.zkteco import zkteco
 from datetime import datetime
 from sqlalchemy import text
 from extensions import db, csrf
+from app.utils.date_ranges import on_day
 from app.employees.models import Employee, AttendanceRecord
+from app.zkteco.ingest import AttendanceIngestService, MAX_BATCH_SIZE, parse_attlog
+from app.zkteco.models import AttendanceDeviceCursor
+from app.zkteco.relay import AttendanceRelayService
 import json
-import requests
 
 @zkteco.route('/')
 def root():
@@ -71,31 +74,14 @@ def attendance():
             try:
                 # Essayer de parser les données JSON
                 if data:
-                    # 🚀 LOGIQUE DE RELAIS VERS LE VPS (Si activé dans config)
+                    # 🚀 RELAIS VERS LE VPS (Si activé dans config) : mis en file locale,
+                    # envoyé par le worker de relais sans bloquer la pointeuse
                     if current_app.config.get('ZKTECO_SYNC_ENABLED'):
                         try:
-                            vps_url = current_app.config.get('ZKTECO_VPS_URL')
-                            current_app.logger.info(f"🔄 Relai activé : Envoi vers {vps_url}")
-                            
-                            # Copier les headers pertinents
-                            headers = {
-                                'Authorization': request.headers.get('Authorization', ''),
-                                'Content-Type': request.headers.get('Content-Type', 'application/json'),
-                                'User-Agent': 'FeeMaison-LocalBridge'
-                            }
-                            
-                            # Envoyer au VPS avec un timeout court pour ne pas bloquer
-                            resp = requests.post(
-                                vps_url, 
-                                data=data, 
-                                headers=headers, 
-                                timeout=5,
-                                verify=False # Au cas où SSL auto-signé ou expiré
-                            )
-                            current_app.logger.info(f"✅ Réponse du VPS: {resp.status_code}")
-                            
+                            AttendanceRelayService.enqueue(data, request.headers.get('Content-Type'))
                         except Exception as e:
-                            current_app.logger.error(f"❌ Échec du relai vers VPS: {str(e)}")
+                            db.session.rollback()
+                            current_app.logger.error(f"❌ Échec de la mise en file du relai VPS: {str(e)}")
 
                     try:
                         json_data = json.loads(data.decode('utf-8'))
@@ -144,6 +130,109 @@ def attendance():
             'status': 'error'
         }), 500
 
+def has_valid_api_token():
+    """Vrai si la requête porte le token API des agents (Authorization: Bearer ...)"""
+    token = request.headers.get('Authorization', '').replace('Bearer ', '').strip()
+    return token == current_app.config.get('ZKTECO_API_TOKEN', 'TokenSecretFeeMaison2025')
+
+@zkteco.route('/api/attendance/bulk', methods=['POST'])
+@csrf.exempt  # ✅ Exemption CSRF pour API machine-à-machine
+def attendance_bulk():
+    """
+    Réception d'un lot de pointages en une requête.
+
+    Corps accepté :
+    - JSON : liste de pointages, ou {"device_id": ..., "punches": [...]}
+    - texte iClock ATTLOG (une ligne tabulée par pointage)
+
+    Renvoyer des pointages déjà enregistrés est sans effet (statut duplicate).
+    """
+    # Token obligatoire pour l'import en lot
+    if not has_valid_api_token():
+        current_app.logger.warning("Import en lot refusé : token absent ou invalide")
+        return jsonify({
+            'message': 'Token d\'authentification invalide',
+            'status': 'error'
+        }), 401
+    
+    device_id = request.args.get('SN') or request.args.get('device_id')
+    if request.is_json:
+        payload = request.get_json(silent=True)
+        if isinstance(payload, dict):
+            device_id = payload.get('device_id') or device_id
+            punches = payload.get('punches')
+        else:
+            punches = payload
+        if not isinstance(punches, list):
+            return jsonify({
+                'message': 'Liste de pointages attendue',
+                'status': 'error'
+            }), 400
+    else:
+        punches = parse_attlog(request.get_data(as_text=True))
+    
+    if len(punches) > MAX_BATCH_SIZE:
+        return jsonify({
+            'message': f'Lot trop volumineux (maximum {MAX_BATCH_SIZE} pointages)',
+            'status': 'error'
+        }), 413
+    
+    try:
+        result = AttendanceIngestService.ingest(punches, device_id=device_id)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Erreur import en lot des pointages: {str(e)}")
+        return jsonify({
+            'message': 'Erreur lors de l\'enregistrement des pointages',
+            'status': 'error',
+            'error': str(e)
+        }), 500
+    
+    current_app.logger.info(f"Import en lot ({device_id or 'pointeuse inconnue'}) : {result['counts']}")
+    
+    return jsonify({
+        'message': f"{result['counts'].get('inserted', 0)} pointage(s) enregistré(s) sur {len(punches)}",
+        'status': 'success',
+        'counts': result['counts'],
+        'results': result['results'],
+        'cursor': result['cursor'],
+        'timestamp': datetime.utcnow().isoformat()
+    })
+
+@zkteco.route('/api/devices/<device_id>/cursor')
+@csrf.exempt  # ✅ Exemption CSRF pour API
+def device_cursor(device_id):
+    """Dernier pointage reçu d'une pointeuse (reprise des agents sans état local)"""
+    if not has_valid_api_token():
+        return jsonify({
+            'message': 'Token d\'authentification invalide',
+            'status': 'error'
+        }), 401
+    
+    cursor = AttendanceDeviceCursor.query.filter_by(device_id=device_id).first()
+    return jsonify({
+        'status': 'success',
+        'cursor': cursor.to_dict() if cursor else {'device_id': device_id, 'last_timestamp': None},
+        'timestamp': datetime.utcnow().isoformat()
+    })
+
+@zkteco.route('/api/relay/status')
+@csrf.exempt  # ✅ Exemption CSRF pour API
+def relay_status():
+    """État de la file de relais vers le VPS (pont local)"""
+    if not has_valid_api_token():
+        return jsonify({
+            'message': 'Token d\'authentification invalide',
+            'status': 'error'
+        }), 401
+    
+    return jsonify({
+        'status': 'success',
+        'enabled': bool(current_app.config.get('ZKTECO_SYNC_ENABLED')),
+        'relay': AttendanceRelayService.status(),
+        'timestamp': datetime.utcnow().isoformat()
+    })
+
 def determine_auto_punch_type(employee_id, punch_date):
     """
     Détermine automatiquement si le pointage est une entrée ou sortie
@@ -157,7 +246,7 @@ def determine_auto_punch_type(employee_id, punch_date):
     # Récupérer le dernier pointage de l'employé pour cette journée
     last_record = AttendanceRecord.query.filter(
         AttendanceRecord.employee_id == employee_id,
-        db.func.date(AttendanceRecord.timestamp) == punch_date
+        on_day(AttendanceRecord.timestamp, punch_date)
     ).order_by(AttendanceRecord.timestamp.desc()).first()
     
     if not last_record:
@@ -214,6 +303,17 @@ def process_attendance_data(data):
                 'message': f'Employé non trouvé pour ID: {user_id}'
             }
         
+        # Pointage déjà reçu (renvoi de la mémoire de la pointeuse) : rien à faire
+        existing = AttendanceRecord.query.filter_by(employee_id=employee.id, timestamp=timestamp).first()
+        if existing:
+            return {
+                'success': True,
+                'duplicate': True,
+                'employee_name': employee.name,
+                'timestamp': timestamp.isoformat(),
+                'punch_type': existing.punch_type
+            }
+        
         # DÉTERMINATION DU TYPE DE POINTAGE (IN/OUT)
         # 1. Priorité aux données explicites envoyées par le script
         if provided_punch_type and str(provided_punch_type).lower() in ['in', 'out', '0', '1']:
@@ -25,6 +25,22 @@ class Config:
     # Configuration Synchro Pointeuse (Local -> VPS)
     ZKTECO_SYNC_ENABLED = os.environ.get('ZKTECO_SYNC_ENABLED', 'False').lower() in ('true', '1', 't')
     ZKTECO_VPS_URL = os.environ.get('ZKTECO_VPS_URL', 'https://erp.declaimers.com/zkteco/api/attendance')
+    # Import en lot du VPS (défaut : ZKTECO_VPS_URL + '/bulk')
+    ZKTECO_VPS_BULK_URL = os.environ.get('ZKTECO_VPS_BULK_URL', None)
+    # Échecs avant passage en lettre morte d'un pointage à relayer
+    ZKTECO_RELAY_MAX_ATTEMPTS = int(os.environ.get('ZKTECO_RELAY_MAX_ATTEMPTS', 8))
+
+    # Canal d'audit du stock (app/stock/audit.py) : désactivé par défaut
+    # Produits tracés (ex: "12,45"), taux d'échantillonnage (0 à 1), fichier JSON
+    STOCK_AUDIT_PRODUCT_IDS = {int(pid) for pid in os.environ.get('STOCK_AUDIT_PRODUCT_IDS', '').split(',') if pid.strip()}
+    STOCK_AUDIT_SAMPLE_RATE = float(os.environ.get('STOCK_AUDIT_SAMPLE_RATE', 0))
+    STOCK_AUDIT_LOG_FILE = os.environ.get('STOCK_AUDIT_LOG_FILE', None)
+
+    # Module AI (app/ai/jobs.py) : appels simultanés et délai par appel (secondes)
+    AI_MAX_CONCURRENCY = int(os.environ.get('AI_MAX_CONCURRENCY', 4))
+    AI_CALL_TIMEOUT = float(os.environ.get('AI_CALL_TIMEOUT', 45))
+    # Processus d'entraînement Prophet en parallèle (vide = nombre de CPU - 1)
+    AI_TRAINING_WORKERS = int(os.environ['AI_TRAINING_WORKERS']) if os.environ.get('AI_TRAINING_WORKERS') else None
 
 class DevelopmentConfigSQLite(Config):
     DEBUG = True
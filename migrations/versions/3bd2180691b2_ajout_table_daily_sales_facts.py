@@ -0,0 +1,89 @@
+"""Ajout table de faits daily_sales_facts (ventes pré-agrégées)
+
+Revision ID: 3bd2180691b2
+Revises: a93b61be4080
+Create Date: 2026-01-05 10:12:41.204417
+
+La table est alimentée ici à partir des commandes existantes (coût des
+ventes au coût produit actuel) ; `flask rebuild-sales-facts` permet de la
+reconstruire sur une période.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3bd2180691b2'
+down_revision = 'a93b61be4080'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('daily_sales_facts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('fact_date', sa.Date(), nullable=False),
+        sa.Column('order_date', sa.Date(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('channel', sa.String(length=10), nullable=False),
+        sa.Column('quantity', sa.Numeric(precision=12, scale=3), nullable=False),
+        sa.Column('revenue', sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.Column('cogs', sa.Numeric(precision=14, scale=4), nullable=False),
+        sa.Column('orders_count', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('fact_date', 'product_id', 'channel', 'order_date', name='uq_daily_sales_fact')
+    )
+    op.create_index('idx_daily_sales_facts_date_channel', 'daily_sales_facts', ['fact_date', 'channel'], unique=False)
+
+    # Alimentation initiale depuis les commandes existantes (mêmes règles que SalesFactService)
+    facts = sa.table('daily_sales_facts',
+        sa.column('fact_date', sa.Date), sa.column('order_date', sa.Date), sa.column('product_id', sa.Integer),
+        sa.column('channel', sa.String), sa.column('quantity', sa.Numeric), sa.column('revenue', sa.Numeric),
+        sa.column('cogs', sa.Numeric), sa.column('orders_count', sa.Integer), sa.column('updated_at', sa.DateTime))
+    orders = sa.table('orders',
+        sa.column('id', sa.Integer), sa.column('order_type', sa.String), sa.column('status', sa.String),
+        sa.column('created_at', sa.DateTime), sa.column('due_date', sa.DateTime))
+    items = sa.table('order_items',
+        sa.column('order_id', sa.Integer), sa.column('product_id', sa.Integer),
+        sa.column('quantity', sa.Numeric), sa.column('unit_price', sa.Numeric))
+    products = sa.table('products', sa.column('id', sa.Integer), sa.column('cost_price', sa.Numeric))
+
+    columns = ['fact_date', 'order_date', 'product_id', 'channel', 'quantity', 'revenue', 'cogs',
+               'orders_count', 'updated_at']
+    joined = items.join(orders, orders.c.id == items.c.order_id).join(products, products.c.id == items.c.product_id)
+
+    def aggregated(channel, fact_day, order_day, condition):
+        return sa.select(
+            fact_day,
+            order_day,
+            items.c.product_id,
+            sa.literal(channel),
+            sa.func.sum(items.c.quantity),
+            sa.func.sum(items.c.quantity * items.c.unit_price),
+            sa.func.sum(items.c.quantity * sa.func.coalesce(products.c.cost_price, 0)),
+            sa.func.count(sa.distinct(orders.c.id)),
+            sa.func.now()
+        ).select_from(joined).where(condition).group_by(fact_day, order_day, items.c.product_id)
+
+    # POS : jour de création
+    pos_day = sa.func.date(orders.c.created_at)
+    op.execute(facts.insert().from_select(columns, aggregated(
+        'pos', pos_day, pos_day, orders.c.order_type == 'in_store'
+    )))
+    # Shop livré : jour de livraison
+    op.execute(facts.insert().from_select(columns, aggregated(
+        'shop', sa.func.date(orders.c.due_date), sa.func.date(orders.c.created_at),
+        sa.and_(
+            orders.c.order_type.notin_(['in_store', 'counter_production_request']),
+            orders.c.status.in_(['delivered', 'completed', 'delivered_unpaid']),
+            orders.c.due_date.isnot(None)
+        )
+    )))
+
+
+def downgrade():
+    op.drop_index('idx_daily_sales_facts_date_channel', table_name='daily_sales_facts')
+    op.drop_table('daily_sales_facts')
@@ -0,0 +1,41 @@
+"""Unicité des pointages par (employee_id, timestamp)
+
+Revision ID: 4e8b2c71a9f0
+Revises: c58f2a7e1d34
+Create Date: 2026-01-09 10:12:44.207531
+
+Rend l'import en lot des pointages idempotent (INSERT ... ON CONFLICT DO
+NOTHING). Les doublons déjà enregistrés (même employé, même horodatage)
+sont supprimés en gardant le plus ancien. La contrainte remplace l'index
+idx_employee_date (mêmes colonnes).
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4e8b2c71a9f0'
+down_revision = 'c58f2a7e1d34'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        DELETE FROM attendance_records
+        WHERE id NOT IN (
+            SELECT keep_id FROM (
+                SELECT MIN(id) AS keep_id FROM attendance_records GROUP BY employee_id, timestamp
+            ) AS kept
+        )
+    """)
+    with op.batch_alter_table('attendance_records', schema=None) as batch_op:
+        batch_op.drop_index('idx_employee_date')
+        batch_op.create_unique_constraint('uq_attendance_employee_timestamp', ['employee_id', 'timestamp'])
+
+
+def downgrade():
+    with op.batch_alter_table('attendance_records', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_attendance_employee_timestamp', type_='unique')
+        batch_op.create_index('idx_employee_date', ['employee_id', 'timestamp'], unique=False)
@@ -0,0 +1,28 @@
+"""Ajout status / punch_count sur attendance_summaries (résumés maintenus à chaque pointage)
+
+Revision ID: 5f3a9c1e7b24
+Revises: b2e6f4a9d0c1
+Create Date: 2026-01-14 09:37:52.118406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f3a9c1e7b24'
+down_revision = 'b2e6f4a9d0c1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('attendance_summaries', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('status', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('punch_count', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('attendance_summaries', schema=None) as batch_op:
+        batch_op.drop_column('punch_count')
+        batch_op.drop_column('status')
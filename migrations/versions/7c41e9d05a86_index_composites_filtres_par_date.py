@@ -0,0 +1,35 @@
+"""Index composites pour les filtres par plage de dates
+
+Revision ID: 7c41e9d05a86
+Revises: 3bd2180691b2
+Create Date: 2026-01-06 09:27:18.553102
+
+Accompagne le passage de `func.date(col) == jour` à des bornes
+`col >= début AND col < fin` (app/utils/date_ranges.py).
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c41e9d05a86'
+down_revision = '3bd2180691b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('idx_orders_type_status_due', 'orders', ['order_type', 'status', 'due_date'], unique=False)
+    op.create_index('idx_orders_created_at', 'orders', ['created_at'], unique=False)
+    op.create_index('idx_stock_movements_created_product', 'stock_movements', ['created_at', 'product_id'], unique=False)
+    op.create_index('idx_cash_movement_created_type', 'cash_movement', ['created_at', 'type'], unique=False)
+    op.create_index('idx_purchases_created_at', 'purchases', ['created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('idx_purchases_created_at', table_name='purchases')
+    op.drop_index('idx_cash_movement_created_type', table_name='cash_movement')
+    op.drop_index('idx_stock_movements_created_product', table_name='stock_movements')
+    op.drop_index('idx_orders_created_at', table_name='orders')
+    op.drop_index('idx_orders_type_status_due', table_name='orders')
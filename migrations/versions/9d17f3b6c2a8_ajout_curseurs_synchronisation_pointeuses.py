@@ -0,0 +1,32 @@
+"""Ajout table attendance_device_cursors (reprise incrémentale des pointeuses)
+
+Revision ID: 9d17f3b6c2a8
+Revises: 4e8b2c71a9f0
+Create Date: 2026-01-09 16:48:05.613902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d17f3b6c2a8'
+down_revision = '4e8b2c71a9f0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('attendance_device_cursors',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('device_id', sa.String(length=50), nullable=False),
+        sa.Column('last_timestamp', sa.DateTime(), nullable=True),
+        sa.Column('last_batch_size', sa.Integer(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('device_id')
+    )
+
+
+def downgrade():
+    op.drop_table('attendance_device_cursors')
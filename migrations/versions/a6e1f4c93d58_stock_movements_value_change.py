@@ -0,0 +1,26 @@
+"""stock_movements.value_change (variation réelle de la valeur du stock)
+
+Revision ID: a6e1f4c93d58
+Revises: e4b9c2d7a613
+Create Date: 2026-01-21 09:42:51.208314
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6e1f4c93d58'
+down_revision = 'e4b9c2d7a613'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('stock_movements', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('value_change', sa.Float(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('stock_movements', schema=None) as batch_op:
+        batch_op.drop_column('value_change')
@@ -0,0 +1,40 @@
+"""Ajout table attendance_relay_outbox (relais asynchrone des pointages vers le VPS)
+
+Revision ID: b2e6f4a9d0c1
+Revises: 9d17f3b6c2a8
+Create Date: 2026-01-12 10:21:37.402518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2e6f4a9d0c1'
+down_revision = '9d17f3b6c2a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('attendance_relay_outbox',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('content_type', sa.String(length=100), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('attendance_relay_outbox', schema=None) as batch_op:
+        batch_op.create_index('idx_relay_status_next_attempt', ['status', 'next_attempt_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('attendance_relay_outbox', schema=None) as batch_op:
+        batch_op.drop_index('idx_relay_status_next_attempt')
+
+    op.drop_table('attendance_relay_outbox')
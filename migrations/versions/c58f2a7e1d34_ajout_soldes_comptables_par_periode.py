@@ -0,0 +1,64 @@
+"""Ajout table accounting_account_period_balances (soldes par compte et par mois)
+
+Revision ID: c58f2a7e1d34
+Revises: 7c41e9d05a86
+Create Date: 2026-01-07 15:40:02.918377
+
+La table est alimentée ici à partir des écritures existantes ;
+`flask rebuild-account-balances --verify-only` permet ensuite de contrôler
+la cohérence.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c58f2a7e1d34'
+down_revision = '7c41e9d05a86'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    balances = op.create_table('accounting_account_period_balances',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('account_id', sa.Integer(), nullable=False),
+        sa.Column('period_year', sa.Integer(), nullable=False),
+        sa.Column('period_month', sa.Integer(), nullable=False),
+        sa.Column('debit_total', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.Column('credit_total', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.Column('lines_count', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['account_id'], ['accounting_accounts.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('account_id', 'period_year', 'period_month', name='uq_account_period_balance')
+    )
+    op.create_index('idx_account_period_balance_period', 'accounting_account_period_balances', ['period_year', 'period_month'], unique=False)
+
+    # Alimentation initiale depuis les écritures existantes
+    entries = sa.table('accounting_journal_entries',
+        sa.column('id', sa.Integer), sa.column('entry_date', sa.Date))
+    lines = sa.table('accounting_journal_entry_lines',
+        sa.column('id', sa.Integer), sa.column('entry_id', sa.Integer), sa.column('account_id', sa.Integer),
+        sa.column('debit_amount', sa.Numeric), sa.column('credit_amount', sa.Numeric))
+    year = sa.cast(sa.extract('year', entries.c.entry_date), sa.Integer)
+    month = sa.cast(sa.extract('month', entries.c.entry_date), sa.Integer)
+    aggregated = sa.select(
+        lines.c.account_id,
+        year,
+        month,
+        sa.func.sum(sa.func.coalesce(lines.c.debit_amount, 0)),
+        sa.func.sum(sa.func.coalesce(lines.c.credit_amount, 0)),
+        sa.func.count(lines.c.id),
+        sa.func.now()
+    ).select_from(lines.join(entries, entries.c.id == lines.c.entry_id)).group_by(lines.c.account_id, year, month)
+    op.execute(balances.insert().from_select(
+        ['account_id', 'period_year', 'period_month', 'debit_total', 'credit_total', 'lines_count', 'updated_at'],
+        aggregated
+    ))
+
+
+def downgrade():
+    op.drop_index('idx_account_period_balance_period', table_name='accounting_account_period_balances')
+    op.drop_table('accounting_account_period_balances')
@@ -0,0 +1,44 @@
+"""Ajout table stock_snapshots (valorisation du stock à une date passée)
+
+Revision ID: c7d3a1f58e92
+Revises: 5f3a9c1e7b24
+Create Date: 2026-01-16 11:04:19.536127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d3a1f58e92'
+down_revision = '5f3a9c1e7b24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Type stocklocationtype déjà créé avec stock_movements
+    stock_location = postgresql.ENUM('COMPTOIR', 'INGREDIENTS_LOCAL', 'INGREDIENTS_MAGASIN', 'CONSOMMABLES',
+                                     name='stocklocationtype', create_type=False)
+    op.create_table('stock_snapshots',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('snapshot_date', sa.Date(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('stock_location', stock_location, nullable=False),
+        sa.Column('quantity', sa.Float(), nullable=False),
+        sa.Column('value', sa.Numeric(precision=14, scale=4), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('snapshot_date', 'product_id', 'stock_location', name='uq_stock_snapshot')
+    )
+    with op.batch_alter_table('stock_snapshots', schema=None) as batch_op:
+        batch_op.create_index('idx_stock_snapshots_date', ['snapshot_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('stock_snapshots', schema=None) as batch_op:
+        batch_op.drop_index('idx_stock_snapshots_date')
+
+    op.drop_table('stock_snapshots')
@@ -0,0 +1,30 @@
+"""stock_movements.user_id facultatif (mouvements automatiques du grand livre de stock)
+
+Revision ID: e4b9c2d7a613
+Revises: c7d3a1f58e92
+Create Date: 2026-01-19 15:12:08.774203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b9c2d7a613'
+down_revision = 'c7d3a1f58e92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('stock_movements', schema=None) as batch_op:
+        batch_op.alter_column('user_id',
+               existing_type=sa.Integer(),
+               nullable=True)
+
+
+def downgrade():
+    with op.batch_alter_table('stock_movements', schema=None) as batch_op:
+        batch_op.alter_column('user_id',
+               existing_type=sa.Integer(),
+               nullable=False)
@@ -219,21 +219,26 @@ class Product(db.Model):
         }
         return names.get(location_type, location_type.title())
 
-    def update_stock_location(self, location_type, quantity_change):
-        return self.update_stock_by_location(location_type, quantity_change)
+    def update_stock_location(self, location_type, quantity_change, **movement_info):
+        return self.update_stock_by_location(location_type, quantity_change, **movement_info)
 
     def get_stock_by_location(self, location_key: str) -> float:
         return getattr(self, location_key, 0.0)
 
-    def update_stock_by_location(self, location_key: str, quantity_change: float, unit_cost_override=None) -> bool:
+    def update_stock_by_location(self, location_key: str, quantity_change: float, unit_cost_override=None,
+                                 **movement_info) -> bool:
         """
         Met à jour le stock d'un produit à un emplacement spécifique ainsi que la valorisation associée.
         Autorise les stocks négatifs mais conserve une valorisation cohérente grâce à un déficit de valeur
         (consommation à découvert) qui sera résorbé lors des prochaines entrées.
+        
+        Chaque variation est tracée dans stock_movements (app/stock/ledger.py) ;
+        movement_info : movement_type, reason, order_id, transfer_id, user_id du mouvement.
         """
-        from flask import current_app
-        import traceback
+        from app.stock import audit
+        from app.stock.ledger import normalize_location_key, record_movement
         
+        location_key = normalize_location_key(location_key) or location_key
         location_mappings = {
             'stock_ingredients_magasin': ('stock_ingredients_magasin', 'valeur_stock_ingredients_magasin', 'deficit_stock_ingredients_magasin'),
             'stock_ingredients_local': ('stock_ingredients_local', 'valeur_stock_ingredients_local', 'deficit_stock_ingredients_local'),
@@ -247,22 +252,6 @@ class Product(db.Model):
         
         qty_attr, value_attr, deficit_attr = mapping
         
-        # TRACE: Si on modifie stock_comptoir, logger
-        if qty_attr == 'stock_comptoir':
-            old_stock_comptoir = float(getattr(self, 'stock_comptoir', 0.0))
-            stack = traceback.extract_stack()
-            caller = stack[-2] if len(stack) >= 2 else stack[-1] if stack else None
-            caller2 = stack[-3] if len(stack) >= 3 else None
-            caller3 = stack[-4] if len(stack) >= 4 else None
-            current_app.logger.error(f"🚨 TRACE update_stock_by_location - stock_comptoir modifié! Produit: {self.name} (ID: {self.id}), Location: {location_key}, Changement: {quantity_change}, Avant: {old_stock_comptoir}")
-            current_app.logger.error(f"🚨 Appelant direct: {caller.filename if caller else 'unknown'}:{caller.lineno if caller else 0} - {caller.name if caller else 'unknown'}")
-            if caller2:
-                current_app.logger.error(f"🚨 Appelant niveau 2: {caller2.filename}:{caller2.lineno} - {caller2.name}")
-            if caller3:
-                current_app.logger.error(f"🚨 Appelant niveau 3: {caller3.filename}:{caller3.lineno} - {caller3.name}")
-            current_app.logger.error(f"🚨 Code appelant: {caller.line if caller else 'unknown'}")
-            print(f"🚨🚨🚨 MODIFICATION STOCK_COMPTOIR DÉTECTÉE! Produit: {self.name} (ID: {self.id}), Changement: {quantity_change}, Avant: {old_stock_comptoir}")
-        
         if unit_cost_override is not None:
             unit_cost = Decimal(str(unit_cost_override))
         else:
@@ -273,12 +262,12 @@ class Product(db.Model):
         new_qty = current_qty + qty_change
         setattr(self, qty_attr, float(new_qty))
         
-        # TRACE: Si on a modifié stock_comptoir, vérifier la nouvelle valeur
-        if qty_attr == 'stock_comptoir':
-            new_stock_comptoir = float(getattr(self, 'stock_comptoir', 0.0))
-            current_app.logger.warning(f"TRACE update_stock_by_location - stock_comptoir APRÈS modification! Produit: {self.name} (ID: {self.id}), Avant: {old_stock_comptoir}, Après: {new_stock_comptoir}")
+        # Audit (désactivé par défaut) : voir app/stock/audit.py
+        if audit.is_enabled(self.id):
+            audit.record(self, qty_attr, qty_change, current_qty, new_qty)
         
         current_value = Decimal(str(getattr(self, value_attr) or 0.0))
+        value_before = current_value
         current_deficit = Decimal(str(getattr(self, deficit_attr) or 0.0))
         total_value = Decimal(str(self.total_stock_value or 0.0))
         total_deficit = Decimal(str(self.value_deficit_total or 0.0))
@@ -317,11 +306,14 @@ class Product(db.Model):
                 total_value += value_increase
         # qty_change == 0 → pas de variation de valeur
         
-        setattr(self, value_attr, q(max(Decimal('0'), current_value)))
+        value_after = q(max(Decimal('0'), current_value))
+        setattr(self, value_attr, value_after)
         setattr(self, deficit_attr, q(max(Decimal('0'), current_deficit)))
         self.total_stock_value = q(max(Decimal('0'), total_value))
         self.value_deficit_total = q(max(Decimal('0'), total_deficit))
         self.last_stock_update = datetime.utcnow()
+        record_movement(self, qty_attr, qty_change, unit_cost, current_qty, new_qty,
+                        value_change=value_after - value_before, **movement_info)
         return True
 
     def get_stock_display(self, location_type='total'):
@@ -380,6 +372,26 @@ class Product(db.Model):
     def __repr__(self):
         return f'<Product {self.name}>'
 
+# Coût par unité de recette = coût par unité produit × facteur
+UNIT_COST_FACTORS = {
+    ('KG', 'G'): Decimal('0.001'),
+    ('L', 'ML'): Decimal('0.001'),
+    ('G', 'KG'): Decimal('1000'),
+    ('ML', 'L'): Decimal('1000'),
+    ('KG', 'MG'): Decimal('0.000001'),
+    ('L', 'CL'): Decimal('0.01'),
+}
+
+
+def unit_cost_factor(product_unit, recipe_unit):
+    """Facteur de conversion du coût unitaire produit vers l'unité de recette (None si inconnu)."""
+    product_unit = (product_unit or '').upper()
+    recipe_unit = (recipe_unit or '').upper()
+    if product_unit == recipe_unit:
+        return Decimal('1')
+    return UNIT_COST_FACTORS.get((product_unit, recipe_unit))
+
+
 class RecipeIngredient(db.Model):
     __tablename__ = 'recipe_ingredients'
     
@@ -396,24 +408,12 @@ class RecipeIngredient(db.Model):
     def _convert_unit_cost(self):
         if not self.product or not self.product.cost_price:
             return Decimal('0.0')
-        product_unit = self.product.unit.upper()
-        recipe_unit = self.unit.upper()
         base_cost = Decimal(self.product.cost_price)
-        if product_unit == recipe_unit:
+        factor = unit_cost_factor(self.product.unit, self.unit)
+        if factor is None:
+            print(f"⚠️ Conversion non trouvée: {self.product.unit.upper()} → {self.unit.upper()} pour {self.product.name}")
             return base_cost
-        conversions = {
-            ('KG', 'G'): base_cost / 1000,
-            ('L', 'ML'): base_cost / 1000,
-            ('G', 'KG'): base_cost * 1000,
-            ('ML', 'L'): base_cost * 1000,
-            ('KG', 'MG'): base_cost / 1000000,
-            ('L', 'CL'): base_cost / 100,
-        }
-        conversion_key = (product_unit, recipe_unit)
-        if conversion_key in conversions:
-            return conversions[conversion_key]
-        print(f"⚠️ Conversion non trouvée: {product_unit} → {recipe_unit} pour {self.product.name}")
-        return base_cost
+        return base_cost * factor
     
     @property
     def cost(self):
@@ -451,7 +451,11 @@ class Recipe(db.Model):
     
     @property
     def total_cost(self):
-        return sum(ing.cost for ing in self.ingredients)
+        if self.id is None:
+            return sum(ing.cost for ing in self.ingredients)
+        # Nomenclature compilée en cache + PMP relus en une requête
+        from app.recipes.bom import RecipeBomCache
+        return RecipeBomCache.total_costs([self.id]).get(self.id, Decimal('0.0'))
     
     @property
     def cost_per_unit(self):
@@ -491,6 +495,11 @@ class Order(db.Model):
     produced_by = db.relationship('Employee', secondary=order_employees, back_populates='orders_produced')
     deliveryman = db.relationship('Deliveryman', backref='orders')
     
+    __table_args__ = (
+        db.Index('idx_orders_type_status_due', 'order_type', 'status', 'due_date'),
+        db.Index('idx_orders_created_at', 'created_at'),
+    )
+    
     @property
     def order_date(self):
         return self.due_date
@@ -617,7 +626,8 @@ class Order(db.Model):
         print("AVERTISSEMENT: _increment_shop_stock est dépréciée et ne met pas à jour la valeur du stock.")
         for item in self.items:
             if item.product:
-                item.product.update_stock_by_location('stock_comptoir', float(item.quantity))
+                item.product.update_stock_by_location('stock_comptoir', float(item.quantity),
+                                                      movement_type='production', order_id=self.id)
 
     def _increment_shop_stock_with_value(self):
         """
@@ -643,7 +653,10 @@ class Order(db.Model):
                 product_fini.update_stock_by_location(
                     'stock_comptoir', 
                     quantity_to_increment,
-                    unit_cost_override=float(cost_per_unit)
+                    unit_cost_override=float(cost_per_unit),
+                    movement_type='production',
+                    order_id=self.id,
+                    reason=f"Production commande #{self.id}"
                 )
                 
                 # 3. Recalculer le PMP du produit fini
@@ -663,8 +676,6 @@ class Order(db.Model):
         Utilisé pour la comptabilité et le calcul du PMP, mais pas pour le stock disponible.
         """
         from extensions import db
-        from flask import current_app
-        import traceback
         
         for item in self.items:
             product_fini = item.product
@@ -673,13 +684,7 @@ class Order(db.Model):
                 
             quantity = float(item.quantity)
             
-            # IMPORTANT: Sauvegarder le stock_comptoir AVANT toute modification
-            stock_comptoir_avant = float(product_fini.stock_comptoir or 0.0)
-            current_app.logger.info(f"TRACE - Commande #{self.id} - Produit {product_fini.name} (ID: {product_fini.id}) - Stock comptoir AVANT: {stock_comptoir_avant}")
-            
-            value_to_increment = Decimal('0.0')
-            
-            # Calculer la valeur à ajouter
+            # Calculer la valeur produite (information)
             if product_fini.recipe_definition:
                 # Produit avec recette : utiliser le coût de production
                 cost_per_unit = product_fini.recipe_definition.cost_per_unit
@@ -691,81 +696,16 @@ class Order(db.Model):
                 # Pas de coût disponible : valeur à 0
                 value_to_increment = Decimal('0.0')
             
-            # Vérifier le stock_comptoir avant modification de total_stock_value
-            stock_comptoir_apres_total_stock = float(product_fini.stock_comptoir or 0.0)
-            if stock_comptoir_avant != stock_comptoir_apres_total_stock:
-                current_app.logger.error(f"TRACE - Stock comptoir modifié APRÈS lecture initiale! Avant: {stock_comptoir_avant}, Après: {stock_comptoir_apres_total_stock}")
-            
             # CORRECTION BUG PMP DOUBLING (12/12/2025)
             # On ne doit PAS incrémenter la valeur du stock global pour une commande client
             # car la quantité physique n'est pas incrémentée (réservée).
             # Si on augmente la valeur sans augmenter la quantité, le PMP explose.
-            
-            # product_fini.total_stock_value = (product_fini.total_stock_value or Decimal('0.0')) + value_to_increment
-            current_app.logger.info(f"FIX PMP - Commande #{self.id}: Pas de mise à jour de total_stock_value pour éviter doublon.")
-            
-            # Vérifier le stock_comptoir après modification de total_stock_value
-            stock_comptoir_apres_total_stock = float(product_fini.stock_comptoir or 0.0)
-            if stock_comptoir_avant != stock_comptoir_apres_total_stock:
-                current_app.logger.error(f"TRACE - Stock comptoir modifié APRÈS modification total_stock_value! Avant: {stock_comptoir_avant}, Après: {stock_comptoir_apres_total_stock}")
-                stack = traceback.format_stack()
-                current_app.logger.error(f"TRACE - Stack: {''.join(stack)}")
-            
-            # Recalculer le PMP du produit fini
-            # CORRECTION BUG PMP DOUBLING
-            # On ne doit PAS recalculer le PMP ici car le stock n'a pas changé.
-            # Le PMP doit rester stable (basé sur la production/achat stocké).
-            
-            # IMPORTANT: Pour les commandes client, on ne doit PAS inclure le stock_comptoir
-            # dans le calcul du PMP car ces produits sont réservés, pas disponibles à la vente
-            # On calcule le stock total SANS le stock_comptoir pour le PMP
-            stock_sans_comptoir = (
-                Decimal(str(product_fini.stock_ingredients_local or 0.0)) +
-                Decimal(str(product_fini.stock_ingredients_magasin or 0.0)) +
-                Decimal(str(product_fini.stock_consommables or 0.0))
-            )
-            # Pour les commandes client, on ajoute la quantité produite (réservée) au calcul
-            # mais on ne l'ajoute PAS au stock_comptoir
-            stock_pour_pmp = stock_sans_comptoir + Decimal(str(quantity))
-            
-            # Vérifier le stock_comptoir avant modification de cost_price
-            stock_comptoir_apres_calc_pmp = float(product_fini.stock_comptoir or 0.0)
-            if stock_comptoir_avant != stock_comptoir_apres_calc_pmp:
-                current_app.logger.error(f"TRACE - Stock comptoir modifié APRÈS calcul PMP (avant modification cost_price)! Avant: {stock_comptoir_avant}, Après: {stock_comptoir_apres_calc_pmp}")
-            
-            # if stock_pour_pmp > 0:
-            #    product_fini.cost_price = product_fini.total_stock_value / stock_pour_pmp
-            current_app.logger.info(f"FIX PMP - Commande #{self.id}: Pas de recalcul de cost_price pour éviter doublon.")
-            
-            # Vérifier le stock_comptoir après modification de cost_price
-            stock_comptoir_apres_cost_price = float(product_fini.stock_comptoir or 0.0)
-            if stock_comptoir_avant != stock_comptoir_apres_cost_price:
-                current_app.logger.error(f"TRACE - Stock comptoir modifié APRÈS modification cost_price! Avant: {stock_comptoir_avant}, Après: {stock_comptoir_apres_cost_price}")
-                stack = traceback.format_stack()
-                current_app.logger.error(f"TRACE - Stack: {''.join(stack)}")
-            
-            # VÉRIFICATION CRITIQUE: Le stock_comptoir ne doit PAS avoir changé
-            stock_comptoir_apres = float(product_fini.stock_comptoir or 0.0)
-            if stock_comptoir_avant != stock_comptoir_apres:
-                error_msg = f"ERREUR CRITIQUE: Stock comptoir modifié lors de la réception d'une commande client! Avant: {stock_comptoir_avant}, Après: {stock_comptoir_apres}, Produit: {product_fini.name}, Commande: #{self.id}"
-                current_app.logger.error(error_msg)
-                stack = traceback.format_stack()
-                current_app.logger.error(f"TRACE - Stack complète: {''.join(stack)}")
-                print(f"❌ {error_msg}")
-                # Restaurer le stock_comptoir à sa valeur d'origine
-                product_fini.stock_comptoir = stock_comptoir_avant
+            # Le PMP doit rester stable (basé sur la production/achat stocké) : pas de recalcul.
             
             # NE PAS incrémenter stock_comptoir car c'est réservé pour le client
             db.session.add(product_fini)
             
-            # Vérifier le stock_comptoir après db.session.add
-            stock_comptoir_apres_add = float(product_fini.stock_comptoir or 0.0)
-            if stock_comptoir_avant != stock_comptoir_apres_add:
-                current_app.logger.error(f"TRACE - Stock comptoir modifié APRÈS db.session.add! Avant: {stock_comptoir_avant}, Après: {stock_comptoir_apres_add}")
-                # Restaurer à nouveau
-                product_fini.stock_comptoir = stock_comptoir_avant
-            
-            print(f"COMMANDE CLIENT - Valeur ajoutée (stock réservé): {quantity} {product_fini.unit} de {product_fini.name} (Valeur: {value_to_increment:.2f} DA) - Stock comptoir: {stock_comptoir_avant} (inchangé)")
+            print(f"COMMANDE CLIENT - Valeur ajoutée (stock réservé): {quantity} {product_fini.unit} de {product_fini.name} (Valeur: {value_to_increment:.2f} DA) - Stock comptoir: {float(product_fini.stock_comptoir or 0.0)} (inchangé)")
 
     def _decrement_stock_with_value_on_delivery(self):
         """
@@ -778,7 +718,9 @@ class Order(db.Model):
             if product_fini:
                 # Décrémenter quantité ET valeur (update_stock_by_location gère les deux)
                 quantity_to_decrement = float(item.quantity)
-                product_fini.update_stock_by_location('stock_comptoir', -quantity_to_decrement)
+                product_fini.update_stock_by_location('stock_comptoir', -quantity_to_decrement,
+                                                      movement_type='vente', order_id=self.id,
+                                                      reason=f"Vente commande #{self.id}")
                 # Le PMP du produit fini ne change pas lors d'une sortie de stock.
     
     def restore_stock_on_cancellation(self):
@@ -794,7 +736,9 @@ class Order(db.Model):
             if product_fini:
                 # Réincrémenter quantité ET valeur (update_stock_by_location gère les deux)
                 quantity_to_restore = float(item.quantity)
-                product_fini.update_stock_by_location('stock_comptoir', quantity_to_restore)
+                product_fini.update_stock_by_location('stock_comptoir', quantity_to_restore,
+                                                      order_id=self.id,
+                                                      reason=f"Annulation commande #{self.id}")
                 # Le PMP ne change pas lors d'une restauration
                 db.session.add(product_fini)
     
@@ -803,35 +747,41 @@ class Order(db.Model):
         Décrémente le stock des ingrédients ET consommables lors de la production d'un produit fini,
         en tenant compte du rendement de la recette (yield_quantity).
         """
-        for item in self.items:
+        from app.recipes.bom import RecipeBomCache
+        items = self.items.options(db.joinedload(OrderItem.product)).all()
+        
+        # Nomenclatures en cache, ingrédients de toute la commande chargés en une requête
+        compiled_recipes = {}
+        for item in items:
+            recipe = RecipeBomCache.for_product(item.product_id)
+            if recipe:
+                compiled_recipes[item.product_id] = recipe
+        ingredient_ids = {line.product_id for recipe in compiled_recipes.values() for line in recipe.lines}
+        ingredients = {
+            product.id: product
+            for product in Product.query.filter(Product.id.in_(ingredient_ids)).all()
+        } if ingredient_ids else {}
+        
+        for item in items:
             product_fini = item.product
             if not product_fini:
                 continue
             
             # 1. DÉCRÉMENTATION DES INGRÉDIENTS (si recette existe)
-            if product_fini.recipe_definition:
-                recipe = product_fini.recipe_definition
-                labo_key = recipe.production_location
-                
+            recipe = compiled_recipes.get(product_fini.id)
+            if recipe:
                 # Pour chaque ingrédient de la recette
-                for ingredient_in_recipe in recipe.ingredients:
-                    ingredient_product = ingredient_in_recipe.product
+                for line in recipe.lines:
+                    ingredient_product = ingredients.get(line.product_id)
                     if not ingredient_product:
                         continue
-                    # Quantité d'ingrédient par unité produite
-                    qty_per_unit = float(ingredient_in_recipe.quantity_needed) / float(recipe.yield_quantity)
                     # Quantité totale à décrémenter pour la production réelle
-                    needed_qty = qty_per_unit * float(item.quantity)
-                    # Mapping de la localisation
-                    location_map = {
-                        "ingredients_magasin": "stock_ingredients_magasin",
-                        "ingredients_local": "stock_ingredients_local"
-                    }
-                    stock_attr = location_map.get(labo_key, labo_key)
+                    needed_qty = line.quantity_per_unit * float(item.quantity)
                     # Décrémentation du stock
-                    ingredient_product.update_stock_by_location(stock_attr, -needed_qty)
+                    ingredient_product.update_stock_by_location(recipe.stock_attr, -needed_qty,
+                                                                movement_type='production', order_id=self.id)
                     # Log/debug
-                    print(f"Décrémentation ingrédient: {ingredient_product.name} - {needed_qty:.3f} {ingredient_in_recipe.unit} (stock: {stock_attr})")
+                    print(f"Décrémentation ingrédient: {ingredient_product.name} - {needed_qty:.3f} {line.unit} (stock: {recipe.stock_attr})")
             
             # 2. DÉCRÉMENTATION DES CONSOMMABLES (toujours exécutée)
             # Deux systèmes: Ancien (ConsumableRecipe) et Nouveau (ConsumableCategory)
@@ -854,29 +804,28 @@ class Order(db.Model):
                     needed_qty_consumable = qty_per_unit * float(item.quantity)
                     
                     # Décrémentation du stock consommables
-                    consumable_product.update_stock_by_location('stock_consommables', -needed_qty_consumable)
+                    consumable_product.update_stock_by_location('stock_consommables', -needed_qty_consumable,
+                                                                movement_type='production', order_id=self.id)
                     
                     # Log/debug
                     print(f"Décrémentation consommable (recette): {consumable_product.name} - {needed_qty_consumable:.3f} {consumable_product.unit} (stock_consommables)")
             
             # --- NOUVEAU SYSTÈME : Catégories avec plages de quantités ---
             # Trouver si une catégorie de consommables existe pour cette catégorie de produit
-            if product_fini.category:
-                consumable_category = ConsumableCategory.query.filter(
-                    ConsumableCategory.product_category_id == product_fini.category.id,
-                    ConsumableCategory.is_active == True
-                ).first()
+            if product_fini.category_id:
+                # Utiliser la logique intelligente des catégories (plages en cache)
+                consumables_needed = ConsumableCategory.consumables_for_product_category(
+                    product_fini.category_id, int(item.quantity)
+                )
                 
-                if consumable_category:
-                    # Utiliser la logique intelligente des catégories
-                    consumables_needed = consumable_category.calculate_consumables_needed(int(item.quantity))
-                    
+                if consumables_needed:
                     for consumable_product, quantity in consumables_needed:
                         if not consumable_product:
                             continue
                         
                         # Décrémentation du stock consommables
-                        consumable_product.update_stock_by_location('stock_consommables', -float(quantity))
+                        consumable_product.update_stock_by_location('stock_consommables', -float(quantity),
+                                                                    movement_type='production', order_id=self.id)
                         
                         # Log/debug
                         print(f"Décrémentation consommable (catégorie): {consumable_product.name} - {quantity} {consumable_product.unit} (stock_consommables)")
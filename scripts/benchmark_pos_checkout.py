@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de l'encaissement PDV (/sales/api/complete-sale)
+
+Mesure la latence d'encaissement d'un panier sur une base SQLite en mémoire :
+- audit du stock désactivé (fonctionnement normal),
+- audit forcé par l'en-tête X-Stock-Audit (coût du traçage, voir app/stock/audit.py).
+
+Usage:
+    python scripts/benchmark_pos_checkout.py [--lines 15] [--runs 200]
+"""
+
+import argparse
+import contextlib
+import io
+import logging
+import os
+import statistics
+import sys
+import time
+from decimal import Decimal
+
+# Ajouter le répertoire parent au path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('STOCK_AUDIT_LOG_FILE', os.devnull)
+
+from app import create_app
+from extensions import db
+from models import Category, Product, User
+from app.sales.models import CashRegisterSession
+
+
+def seed(lines):
+    """Crée un caissier, une caisse ouverte et `lines` produits en vitrine."""
+    user = User(username='bench', email='bench@example.com', role='admin')
+    user.set_password('bench')
+    category = Category(name="Benchmark")
+    db.session.add_all([user, category])
+    db.session.flush()
+    products = [
+        Product(name=f"Produit {i}", product_type='finished', unit='pièce', price=Decimal('100'),
+                cost_price=Decimal('30'), category_id=category.id, stock_comptoir=1_000_000)
+        for i in range(lines)
+    ]
+    db.session.add_all(products)
+    db.session.add(CashRegisterSession(initial_amount=0, is_open=True))
+    db.session.commit()
+    return [product.id for product in products]
+
+
+def run(client, product_ids, runs, headers=None):
+    """Encaisse `runs` paniers et renvoie les durées en millisecondes."""
+    payload = {'items': [{'product_id': pid, 'quantity': 1, 'unit_price': 100} for pid in product_ids]}
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        # Les print() de la vente ne doivent pas polluer le rapport
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = client.post('/sales/api/complete-sale', json=payload, headers=headers or {})
+        durations.append((time.perf_counter() - start) * 1000)
+        if not response.get_json().get('success'):
+            raise RuntimeError(response.get_json())
+    return durations
+
+
+def report(label, durations):
+    durations = sorted(durations)
+    p95 = durations[int(len(durations) * 0.95) - 1]
+    print(f"{label:<28} médiane {statistics.median(durations):7.2f} ms   p95 {p95:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de l'encaissement PDV")
+    parser.add_argument('--lines', type=int, default=15, help="lignes par panier")
+    parser.add_argument('--runs', type=int, default=200, help="encaissements par scénario")
+    args = parser.parse_args()
+
+    app = create_app('testing')
+    # Journaux applicatifs écrits (coût compris) mais pas affichés ;
+    # le canal d'audit a son propre handler (STOCK_AUDIT_LOG_FILE)
+    null_handler = logging.FileHandler(os.devnull)
+    for logger in (logging.getLogger(), app.logger):
+        logger.handlers[:] = [null_handler]
+    with app.app_context():
+        db.create_all()
+        product_ids = seed(args.lines)
+        client = app.test_client()
+        client.post('/auth/login', data={'email': 'bench@example.com', 'password': 'bench'})
+
+        print(f"📊 Encaissement de {args.lines} lignes × {args.runs} paniers")
+        run(client, product_ids, 10)  # échauffement (caches)
+        report("Audit désactivé", run(client, product_ids, args.runs))
+        report("Audit forcé (X-Stock-Audit)", run(client, product_ids, args.runs, {'X-Stock-Audit': '1'}))
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
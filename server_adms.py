@@ -5,12 +5,14 @@ Version améliorée avec détection automatique d'IP
 """
 
 from zk import ZK
-import requests
 import time
 import sys
 import subprocess
 import re
 import platform
+import argparse
+
+from zk_sync_outbox import SyncOutbox, add_sync_arguments, device_identifier
 
 # ================= CONFIGURATION =================
 # 🔧 AMÉLIORATION : Détection automatique de l'IP par MAC
@@ -19,8 +21,9 @@ ZK_IP_FALLBACK = "192.168.8.104"  # IP par défaut si détection échoue
 ZK_PORT = 4370
 
 # Config ERP
-API_URL = "https://erp.declaimers.com/zkteco/api/attendance"
+API_URL = "https://erp.declaimers.com/zkteco/api/attendance/bulk"
 TOKEN = "TokenSecretFeeMaison2025"
+BATCH_SIZE = 5000  # Pointages par requête
 # =================================================
 
 
@@ -110,7 +113,18 @@ def detect_pointeuse_ip():
         return ZK_IP_FALLBACK
 
 
-def main():
+def send_pending(outbox):
+    """Envoie la file locale par lots à l'ERP (les doublons sont ignorés côté serveur)"""
+    counts = outbox.flush(BATCH_SIZE)
+    remaining = outbox.pending_count()
+    print(f"✅ Envoyé : {counts.get('inserted', 0)} nouveaux, {counts.get('duplicate', 0)} déjà connus, "
+          f"{counts.get('unknown_employee', 0)} employés inconnus ; {remaining} en attente.")
+    return counts
+
+
+def main(since=None, state_path=None):
+    outbox = SyncOutbox(state_path, API_URL, TOKEN)
+
     # 🔧 AMÉLIORATION : Détecter l'IP automatiquement
     ZK_IP = detect_pointeuse_ip()
     
@@ -133,52 +147,16 @@ def main():
             attendance = conn.get_attendance()
             print(f"📊 {len(attendance)} pointages trouvés en mémoire.")
             
-            if attendance:
-                print("📤 Envoi vers l'ERP...")
-                count_ok = 0
-                for punch in attendance:
-                    # ---------------------------------------------------------
-                    # 🔧 CORRECTION MAJEURE ICI (Selon votre photo)
-                    # Code 1 = Entrée (Check-In)
-                    # Code 2 = Sortie (Check-Out)
-                    # Code 0 = Entrée par défaut (souvent)
-                    # ---------------------------------------------------------
-                    punch_code = str(punch.punch)
-                    
-                    if punch_code == '2':
-                        punch_type = "out"
-                    elif punch_code == '1':
-                        punch_type = "in"
-                    elif punch_code == '0':
-                        punch_type = "in" # Par défaut
-                    else:
-                        # Autres codes (Pauses, etc.) -> On traite comme IN par défaut ou on ignore
-                        punch_type = "in" 
-                    
-                    payload = {
-                        "user_id": punch.user_id,
-                        "timestamp": str(punch.timestamp),
-                        "punch_type": punch_type 
-                    }
-                    
-                    headers = {
-                        "Authorization": f"Bearer {TOKEN}",
-                        "Content-Type": "application/json"
-                    }
-                    
-                    try:
-                        resp = requests.post(API_URL, json=payload, headers=headers, timeout=5)
-                        if resp.status_code == 200:
-                            print(".", end="", flush=True) # Petit point = Succès
-                            count_ok += 1
-                        else:
-                            print(f"x({resp.status_code})", end="", flush=True)
-                    except Exception as e:
-                        print(f"![{e}]", end="", flush=True)
-
-                print(f"\n✅ Terminé : {count_ok} envoyés sur {len(attendance)}.")
-            else:
-                print("💤 Aucun historique récent.")
+            # ---------------------------------------------------------
+            # Code 1 = Entrée (Check-In), Code 2 = Sortie (Check-Out)
+            # Code 0 et autres codes (Pauses, etc.) -> traités comme IN
+            # (conversion dans SyncOutbox.enqueue)
+            # Seuls les pointages plus récents que le curseur sont mis en file
+            # ---------------------------------------------------------
+            device_id = device_identifier(conn, POINTEUSE_MAC)
+            resume_from = outbox.resume_point(device_id, since)
+            queued = outbox.enqueue(device_id, attendance, resume_from)
+            print(f"   -> {queued} nouveaux pointages mis en file (pointeuse {device_id})")
 
         except Exception as e:
             print(f"⚠️ Erreur lecture logs : {e}")
@@ -195,6 +173,12 @@ def main():
         print(f"   -> {users_count} utilisateurs détectés (Scan partiel).")
 
         conn.enable_device()
+
+        if outbox.pending_count():
+            print("📤 Envoi vers l'ERP...")
+            send_pending(outbox)
+        else:
+            print("💤 Aucun nouveau pointage.")
         print("🏁 Synchronisation finie avec succès.")
 
     except Exception as e:
@@ -212,16 +196,20 @@ def main():
                 print("🔌 Déconnecté.")
             except: 
                 pass
+        outbox.close()
 
 
 if __name__ == "__main__":
+    parser = add_sync_arguments(argparse.ArgumentParser(description="Synchronisation pointeuse → ERP"))
+    args = parser.parse_args()
+
     print("=" * 60)
     print("🚀 SYNCHRONISATION POINTEUSE → ERP")
     print("   Version avec détection automatique d'IP")
     print("=" * 60)
     print()
     
-    main()
+    main(args.since, args.state)
     
     # On laisse la fenêtre ouverte 5 secondes pour lire
     print("\n⏳ Fermeture dans 5 secondes...")
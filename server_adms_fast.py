@@ -5,22 +5,25 @@ Version RAPIDE avec scan multithread
 """
 
 from zk import ZK
-import requests
 import time
 import sys
 import subprocess
 import re
 import platform
+import argparse
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from zk_sync_outbox import SyncOutbox, add_sync_arguments, device_identifier
+
 # ================= CONFIGURATION =================
 POINTEUSE_MAC = "8C:AA:B5:D7:44:29"  # MAC de la pointeuse
 ZK_IP_FALLBACK = "192.168.8.104"  # IP par défaut si détection échoue
 ZK_PORT = 4370
 
 # Config ERP
-API_URL = "https://erp.declaimers.com/zkteco/api/attendance"
+API_URL = "https://erp.declaimers.com/zkteco/api/attendance/bulk"
 TOKEN = "TokenSecretFeeMaison2025"
+BATCH_SIZE = 5000  # Pointages par requête
 # =================================================
 
 
@@ -113,7 +116,18 @@ def detect_pointeuse_ip_fast():
         return ZK_IP_FALLBACK
 
 
-def main():
+def send_pending(outbox):
+    """Envoie la file locale par lots à l'ERP (les doublons sont ignorés côté serveur)"""
+    counts = outbox.flush(BATCH_SIZE)
+    remaining = outbox.pending_count()
+    print(f"✅ Envoyé : {counts.get('inserted', 0)} nouveaux, {counts.get('duplicate', 0)} déjà connus, "
+          f"{counts.get('unknown_employee', 0)} employés inconnus ; {remaining} en attente.")
+    return counts
+
+
+def main(since=None, state_path=None):
+    outbox = SyncOutbox(state_path, API_URL, TOKEN)
+
     # Détection rapide
     ZK_IP = detect_pointeuse_ip_fast()
     
@@ -132,46 +146,14 @@ def main():
         try:
             attendance = conn.get_attendance()
             print(f"📊 {len(attendance)} pointages trouvés en mémoire.")
-            
-            if attendance:
-                print("📤 Envoi vers l'ERP...")
-                count_ok = 0
-                for punch in attendance:
-                    punch_code = str(punch.punch)
-                    
-                    if punch_code == '2':
-                        punch_type = "out"
-                    elif punch_code == '1':
-                        punch_type = "in"
-                    elif punch_code == '0':
-                        punch_type = "in"
-                    else:
-                        punch_type = "in" 
-                    
-                    payload = {
-                        "user_id": punch.user_id,
-                        "timestamp": str(punch.timestamp),
-                        "punch_type": punch_type 
-                    }
-                    
-                    headers = {
-                        "Authorization": f"Bearer {TOKEN}",
-                        "Content-Type": "application/json"
-                    }
-                    
-                    try:
-                        resp = requests.post(API_URL, json=payload, headers=headers, timeout=5)
-                        if resp.status_code == 200:
-                            print(".", end="", flush=True)
-                            count_ok += 1
-                        else:
-                            print(f"x({resp.status_code})", end="", flush=True)
-                    except Exception as e:
-                        print(f"![{e}]", end="", flush=True)
-
-                print(f"\n✅ Terminé : {count_ok} envoyés sur {len(attendance)}.")
+
+            device_id = device_identifier(conn, POINTEUSE_MAC)
+            resume_from = outbox.resume_point(device_id, since)
+            queued = outbox.enqueue(device_id, attendance, resume_from)
+            if resume_from:
+                print(f"   -> {queued} nouveaux depuis {resume_from} (pointeuse {device_id})")
             else:
-                print("💤 Aucun historique récent.")
+                print(f"   -> {queued} mis en file (première synchronisation de {device_id})")
 
         except Exception as e:
             print(f"⚠️ Erreur lecture logs : {e}")
@@ -187,6 +169,12 @@ def main():
         print(f"   -> {users_count} utilisateurs détectés (Scan partiel).")
 
         conn.enable_device()
+
+        if outbox.pending_count():
+            print("📤 Envoi vers l'ERP...")
+            send_pending(outbox)
+        else:
+            print("💤 Aucun nouveau pointage.")
         print("🏁 Synchronisation finie avec succès.")
 
     except Exception as e:
@@ -203,16 +191,20 @@ def main():
                 print("🔌 Déconnecté.")
             except: 
                 pass
+        outbox.close()
 
 
 if __name__ == "__main__":
+    parser = add_sync_arguments(argparse.ArgumentParser(description="Synchronisation pointeuse → ERP"))
+    args = parser.parse_args()
+
     print("=" * 60)
     print("🚀 SYNCHRONISATION POINTEUSE → ERP (VERSION RAPIDE)")
     print("=" * 60)
     print()
     
     start_time = time.time()
-    main()
+    main(args.since, args.state)
     elapsed = time.time() - start_time
     
     print(f"\n⏱️  Temps total: {elapsed:.1f}s")
@@ -5,21 +5,24 @@ Récupère les pointages toutes les 30 secondes
 """
 
 from zk import ZK
-import requests
 import time
 import sys
 import subprocess
 import re
 import platform
+import argparse
 from datetime import datetime
 
+from zk_sync_outbox import SyncOutbox, add_sync_arguments, device_identifier
+
 # ================= CONFIGURATION =================
 POINTEUSE_MAC = "8C:AA:B5:D7:44:29"
 ZK_IP_FALLBACK = "192.168.8.104"
 ZK_PORT = 4370
 
-API_URL = "https://erp.declaimers.com/zkteco/api/attendance"
+API_URL = "https://erp.declaimers.com/zkteco/api/attendance/bulk"
 TOKEN = "TokenSecretFeeMaison2025"
+BATCH_SIZE = 5000  # Pointages par requête
 
 CHECK_INTERVAL = 30  # Vérifier toutes les 30 secondes
 # =================================================
@@ -58,8 +61,17 @@ def detect_pointeuse_ip_fast():
         return ZK_IP_FALLBACK
 
 
-def sync_once():
-    """Une synchronisation complète"""
+def send_pending(outbox):
+    """Envoie la file locale par lots à l'ERP (les doublons sont ignorés côté serveur)"""
+    counts = outbox.flush(BATCH_SIZE)
+    remaining = outbox.pending_count()
+    print(f"✅ Envoyé : {counts.get('inserted', 0)} nouveaux, {counts.get('duplicate', 0)} déjà connus, "
+          f"{counts.get('unknown_employee', 0)} employés inconnus ; {remaining} en attente.")
+    return counts
+
+
+def sync_once(outbox, since=None):
+    """Une synchronisation : pointages plus récents que le curseur → file locale → ERP"""
     try:
         ZK_IP = detect_pointeuse_ip_fast()
         
@@ -70,35 +82,10 @@ def sync_once():
         attendance = conn.get_attendance()
         
         if attendance:
-            print(f"📊 {len(attendance)} nouveaux pointages !")
-            count_ok = 0
-            
-            for punch in attendance:
-                punch_code = str(punch.punch)
-                punch_type = "out" if punch_code == '2' else "in"
-                
-                payload = {
-                    "user_id": punch.user_id,
-                    "timestamp": str(punch.timestamp),
-                    "punch_type": punch_type
-                }
-                
-                headers = {
-                    "Authorization": f"Bearer {TOKEN}",
-                    "Content-Type": "application/json"
-                }
-                
-                try:
-                    resp = requests.post(API_URL, json=payload, headers=headers, timeout=5)
-                    if resp.status_code == 200:
-                        print(f"  ✅ User {punch.user_id} à {punch.timestamp} ({punch_type})")
-                        count_ok += 1
-                    else:
-                        print(f"  ❌ Erreur {resp.status_code}")
-                except Exception as e:
-                    print(f"  ❌ {e}")
-            
-            print(f"✅ {count_ok}/{len(attendance)} envoyés")
+            device_id = device_identifier(conn, POINTEUSE_MAC)
+            queued = outbox.enqueue(device_id, attendance, outbox.resume_point(device_id, since))
+            if queued:
+                print(f"📊 {queued} nouveaux pointages (sur {len(attendance)} en mémoire)")
         
         conn.enable_device()
         conn.disconnect()
@@ -107,9 +94,15 @@ def sync_once():
     except Exception as e:
         # Erreur silencieuse (normal si pas de nouveaux pointages ou connexion temporaire échouée)
         return False
+    finally:
+        # La file est renvoyée même si la pointeuse est injoignable
+        if outbox.pending_count():
+            send_pending(outbox)
+
 
+def main(since=None, state_path=None):
+    outbox = SyncOutbox(state_path, API_URL, TOKEN)
 
-def main():
     print("=" * 60)
     print("🚀 SYNCHRONISATION CONTINUE POINTEUSE → ERP")
     print("=" * 60)
@@ -128,7 +121,9 @@ def main():
             now = datetime.now().strftime('%H:%M:%S')
             print(f"\n[{now}] Cycle #{cycle} - Vérification...")
             
-            sync_once()
+            sync_once(outbox, since)
+            # --since ne sert qu'au premier cycle, ensuite le curseur prend le relais
+            since = None
             
             # Attendre avant le prochain cycle
             time.sleep(CHECK_INTERVAL)
@@ -137,10 +132,14 @@ def main():
         print("\n\n🛑 Arrêt demandé (Ctrl+C)")
         print(f"   Total cycles: {cycle}")
         print(f"   Durée: {cycle * CHECK_INTERVAL // 60} minutes")
+    finally:
+        outbox.close()
 
 
 if __name__ == "__main__":
-    main()
+    parser = add_sync_arguments(argparse.ArgumentParser(description="Synchronisation continue pointeuse → ERP"))
+    args = parser.parse_args()
+    main(args.since, args.state)
 
 
 
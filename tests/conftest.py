@@ -3,6 +3,7 @@ import pytest
 import sys
 import os
 from flask import url_for
+from sqlalchemy import event
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
@@ -89,4 +90,25 @@ def admin_client(client, admin_user, app):
             'email': admin_user.email,
             'password': 'adminpassword'
         }, follow_redirects=True)
-    return client
\ No newline at end of file
+    return client
+
+@pytest.fixture(scope='function')
+def count_queries(db_session):
+    """Compte les requêtes SQL émises par un appel : count_queries(fn, prefix=None) -> (résultat, nombre).
+
+    prefix (chaîne ou tuple, ex. 'SELECT') ne compte que les requêtes qui commencent ainsi.
+    """
+    def count(fn, prefix=None):
+        statements = []
+
+        def before_execute(conn, cursor, statement, *args):
+            if prefix is None or statement.lstrip().upper().startswith(prefix):
+                statements.append(statement)
+
+        event.listen(_db.engine, 'before_cursor_execute', before_execute)
+        try:
+            result = fn()
+        finally:
+            event.remove(_db.engine, 'before_cursor_execute', before_execute)
+        return result, len(statements)
+    return count
@@ -0,0 +1,147 @@
+# tests/test_account_ledger.py
+import threading
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from extensions import db
+
+from app.accounting.models import (
+    Account, AccountNature, AccountPeriodBalance, AccountType, Journal, JournalEntry,
+    JournalEntryLine, JournalType
+)
+from app.accounting.ledger import AccountBalanceService
+from app.accounting.services import DashboardService
+
+
+def create_accounts(db_session):
+    bank = Account(code='512', name='Banque', account_type=AccountType.CLASSE_5,
+                   account_nature=AccountNature.DEBIT)
+    sales = Account(code='701', name='Ventes', account_type=AccountType.CLASSE_7,
+                    account_nature=AccountNature.CREDIT)
+    journal = Journal(code='BQ', name='Banque', journal_type=JournalType.BANQUE)
+    db_session.add_all([bank, sales, journal])
+    db_session.commit()
+    return bank, sales, journal
+
+
+def create_entry(db_session, journal, entry_date, number, lines):
+    entry = JournalEntry(entry_number=number, entry_date=entry_date, journal_id=journal.id,
+                         description='Vente')
+    db_session.add(entry)
+    db_session.flush()
+    for account, debit, credit in lines:
+        db_session.add(JournalEntryLine(entry_id=entry.id, account_id=account.id,
+                                        debit_amount=Decimal(debit), credit_amount=Decimal(credit)))
+    db_session.commit()
+    return entry
+
+
+def test_balances_follow_entries(db_session):
+    bank, sales, journal = create_accounts(db_session)
+    create_entry(db_session, journal, date(2025, 3, 5), 'BQ-2025-001', [(bank, '500', '0'), (sales, '0', '500')])
+    create_entry(db_session, journal, date(2025, 4, 2), 'BQ-2025-002', [(bank, '200', '0'), (sales, '0', '200')])
+
+    assert AccountPeriodBalance.query.filter_by(account_id=bank.id).count() == 2
+    assert bank.balance == Decimal('700')
+    assert sales.balance == Decimal('700')
+    assert DashboardService.get_bank_balance() == 700.0
+    assert AccountBalanceService.verify() == []
+
+
+def test_edit_with_bulk_delete_and_date_change(db_session):
+    bank, sales, journal = create_accounts(db_session)
+    entry = create_entry(db_session, journal, date(2025, 3, 5), 'BQ-2025-001',
+                         [(bank, '500', '0'), (sales, '0', '500')])
+
+    # Même déroulé que accounting.edit_entry
+    entry.entry_date = date(2025, 5, 20)
+    JournalEntryLine.query.filter_by(entry_id=entry.id).delete()
+    db_session.add(JournalEntryLine(entry_id=entry.id, account_id=bank.id,
+                                    debit_amount=Decimal('300'), credit_amount=Decimal('0')))
+    db_session.add(JournalEntryLine(entry_id=entry.id, account_id=sales.id,
+                                    debit_amount=Decimal('0'), credit_amount=Decimal('300')))
+    db_session.commit()
+
+    periods = {(b.period_year, b.period_month) for b in AccountPeriodBalance.query.filter_by(account_id=bank.id)}
+    assert periods == {(2025, 5)}
+    assert bank.balance == Decimal('300')
+    assert AccountBalanceService.verify() == []
+
+    # Même déroulé que accounting.delete_entry
+    JournalEntryLine.query.filter_by(entry_id=entry.id).delete()
+    db_session.delete(entry)
+    db_session.commit()
+
+    assert AccountPeriodBalance.query.count() == 0
+    assert bank.balance == Decimal('0')
+
+
+def test_failed_balance_refresh_fails_the_commit(db_session, monkeypatch):
+    bank, sales, journal = create_accounts(db_session)
+
+    def broken_refresh(keys):
+        raise RuntimeError("soldes indisponibles")
+
+    monkeypatch.setattr(AccountBalanceService, 'refresh', staticmethod(broken_refresh))
+    with pytest.raises(RuntimeError):
+        create_entry(db_session, journal, date(2025, 3, 5), 'BQ-2025-001',
+                     [(bank, '500', '0'), (sales, '0', '500')])
+    db_session.rollback()
+
+    assert JournalEntry.query.count() == 0
+    assert AccountPeriodBalance.query.count() == 0
+
+
+def test_rebuild_cli_repairs_drift(db_session, runner):
+    bank, sales, journal = create_accounts(db_session)
+    create_entry(db_session, journal, date(2025, 3, 5), 'BQ-2025-001', [(bank, '500', '0'), (sales, '0', '500')])
+    AccountPeriodBalance.query.filter_by(account_id=bank.id).update({'debit_total': Decimal('1')})
+    db_session.commit()
+
+    result = runner.invoke(args=['rebuild-account-balances', '--verify-only'])
+    assert result.exit_code == 0, result.output
+    assert '1 écart(s)' in result.output
+    assert bank.balance == Decimal('1')
+
+    result = runner.invoke(args=['rebuild-account-balances'])
+    assert result.exit_code == 0, result.output
+    assert AccountBalanceService.verify() == []
+    assert bank.balance == Decimal('500')
+
+
+def test_concurrent_entries_on_same_period(app, db_session):
+    if db.engine.dialect.name != 'postgresql':
+        pytest.skip("Verrous de ligne non supportés par SQLite (TEST_DATABASE_URL=postgresql://...)")
+
+    bank, sales, journal = create_accounts(db_session)
+    bank_id, sales_id, journal_id = bank.id, sales.id, journal.id
+    db_session.remove()
+
+    barrier = threading.Barrier(10)
+    errors = []
+
+    def post_entry(index):
+        with app.app_context():
+            barrier.wait()
+            try:
+                create_entry(db.session, db.session.get(Journal, journal_id), date(2025, 3, 5),
+                             f'BQ-2025-{index:03d}',
+                             [(db.session.get(Account, bank_id), '100', '0'),
+                              (db.session.get(Account, sales_id), '0', '100')])
+            except Exception as exc:
+                db.session.rollback()
+                errors.append(exc)
+            finally:
+                db.session.remove()
+
+    threads = [threading.Thread(target=post_entry, args=(index,)) for index in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert db.session.get(Account, bank_id).balance == Decimal('1000')
+    assert AccountBalanceService.verify() == []
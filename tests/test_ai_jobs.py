@@ -0,0 +1,85 @@
+# tests/test_ai_jobs.py
+import time
+from datetime import date
+
+import pytest
+
+from app.ai import jobs
+from app.ai.jobs import AIJobs
+from app.ai.services.llm_analyzer import LLMAnalyzer
+from app.ai.services.llm_cache import LLMCache
+from models import Product
+
+
+class SlowAnalyzer(LLMAnalyzer):
+    """Provider factice : chaque appel dure le délai indiqué dans le contexte"""
+
+    def __init__(self, cache):
+        super().__init__(provider='stub', model='stub-1', cache=cache)
+
+    def _call_llm(self, system_message, user_message, temperature):
+        delay = float(user_message.split("'delay': ")[1].split('}')[0])
+        time.sleep(delay)
+        return f"analyse en {delay}s"
+
+
+def context(name, delay):
+    return {'report_name': name, 'date': date.today().isoformat(), 'kpi_data': {'delay': delay},
+            'growth_rate': 0, 'trend_direction': 'stable', 'variance': 0}
+
+
+@pytest.fixture
+def jobs_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, 'JOBS_DIR', str(tmp_path / 'jobs'))
+
+
+def wait_for(job_id):
+    for _ in range(100):
+        job = AIJobs.get(job_id)
+        if job['status'] in ('done', 'error'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError('tâche non terminée')
+
+
+def test_batch_analyze_runs_in_parallel_and_returns_partial_results(app, tmp_path):
+    analyzer = SlowAnalyzer(LLMCache(str(tmp_path)))
+
+    started = time.monotonic()
+    results = analyzer.batch_analyze(
+        [context('a', 0.3), context('b', 0.3), context('c', 0.3), context('lent', 3)],
+        max_workers=4, timeout=1
+    )
+    elapsed = time.monotonic() - started
+
+    assert elapsed < 2
+    assert [r['success'] for r in results] == [True, True, True, False]
+    assert results[0]['analysis'] == "analyse en 0.3s"
+    assert 'Délai dépassé' in results[3]['error']
+    assert 'lent' in results[3]['fallback']['analysis']
+
+
+def test_background_job_runs_in_its_own_app_context(db_session, jobs_dir):
+    db_session.add(Product(name="Farine", product_type='ingredient', unit='kg', price=0))
+    db_session.commit()
+
+    job_id = AIJobs.submit('count_products', lambda: Product.query.count())
+    job = wait_for(job_id)
+
+    assert (job['status'], job['result']) == ('done', 1)
+    assert AIJobs.get('../../config') is None
+    assert AIJobs.get('0' * 32) is None
+
+
+def test_daily_insights_async_mode(admin_client, jobs_dir, monkeypatch):
+    monkeypatch.delenv('GROQ_API_KEY', raising=False)
+    monkeypatch.delenv('OPENAI_API_KEY', raising=False)
+
+    response = admin_client.get('/dashboards/api/daily/ai-insights?mode=async')
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+    wait_for(job_id)
+
+    payload = admin_client.get(response.get_json()['status_url']).get_json()
+    assert payload['status'] == 'done'
+    assert set(payload['data']) == {'sales', 'stock', 'production', 'timestamp'}
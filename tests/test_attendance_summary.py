@@ -0,0 +1,109 @@
+# tests/test_attendance_summary.py
+from datetime import date, datetime, time, timedelta
+
+from app.employees.attendance_summary import AttendanceSummaryService
+from app.employees.models import AttendanceRecord, AttendanceSummary, Employee
+from app.reports.kpi_service import RealKpiService
+from app.routes.dashboard import build_attendance_block
+from app.zkteco.ingest import AttendanceIngestService
+
+
+DAY = date(2025, 3, 3)
+
+
+def create_employees(db_session, count):
+    employees = [Employee(name=f"Employé {i}", role='production', zk_user_id=100 + i, hourly_rate=100)
+                 for i in range(count)]
+    db_session.add_all(employees)
+    db_session.commit()
+    return employees
+
+
+def test_bulk_ingest_maintains_summaries_like_daily_summary(db_session):
+    create_employees(db_session, 6)
+    start = datetime.combine(DAY, time(7, 0))
+    punches = []
+    for i in range(6):
+        punches.append({'user_id': 100 + i, 'timestamp': str(start + timedelta(minutes=10 * i)), 'punch_type': 'in'})
+        if i % 3:
+            # Sortie après 7 à 10 h : heures supplémentaires au-delà de 8 h
+            punches.append({'user_id': 100 + i, 'timestamp': str(start + timedelta(hours=6 + i, minutes=20)),
+                            'punch_type': 'out'})
+    AttendanceIngestService.ingest(punches)
+
+    expected = AttendanceRecord.get_daily_summary(DAY)
+    summaries = AttendanceSummaryService.for_day(DAY)
+    assert set(summaries) == set(expected)
+    for employee_id, data in expected.items():
+        summary = summaries[employee_id]
+        assert summary['total_hours'] == data['total_hours']
+        assert summary['status'] == data['status']
+        assert summary['first_in'] == data['records'][0].timestamp.time()
+        assert summary['summary'].worked_hours <= 8
+
+    # Renvoi du même lot : aucun pointage inséré, résumés inchangés
+    AttendanceIngestService.ingest(punches)
+    assert AttendanceSummary.query.count() == len(expected)
+
+
+def test_edited_and_deleted_punches_update_summary(db_session):
+    employee, other = create_employees(db_session, 2)
+    arrival = AttendanceRecord(employee_id=employee.id, timestamp=datetime.combine(DAY, time(8, 0)), punch_type='in')
+    departure = AttendanceRecord(employee_id=employee.id, timestamp=datetime.combine(DAY, time(12, 0)),
+                                 punch_type='out')
+    db_session.add_all([arrival, departure])
+    db_session.commit()
+
+    summary = AttendanceSummary.query.filter_by(employee_id=employee.id, work_date=DAY).one()
+    assert (summary.total_hours, summary.status, summary.punch_count) == (4.0, 'absent', 2)
+
+    # Correction manuelle de l'heure de sortie
+    departure.timestamp = datetime.combine(DAY, time(18, 30))
+    db_session.commit()
+    assert (summary.worked_hours, summary.overtime_hours, summary.left_at) == (8.0, 2.5, time(18, 30))
+
+    # Pointage réattribué à un autre employé et déplacé au lendemain
+    departure.employee_id = other.id
+    departure.timestamp = datetime.combine(DAY + timedelta(days=1), time(17, 0))
+    db_session.commit()
+    assert (summary.total_hours, summary.status, summary.punch_count) == (0.0, 'present', 1)
+    assert AttendanceSummary.query.filter_by(employee_id=other.id, work_date=DAY + timedelta(days=1)).count() == 1
+
+    # Plus aucun pointage ce jour : résumé supprimé
+    db_session.delete(arrival)
+    db_session.commit()
+    assert AttendanceSummary.query.filter_by(employee_id=employee.id, work_date=DAY).count() == 0
+
+
+def test_status_and_flags_follow_normalised_last_punch(db_session):
+    employee, other = create_employees(db_session, 2)
+    # Codes ZKTeco bruts : 0 = entrée, 1 = sortie
+    db_session.add_all([
+        AttendanceRecord(employee_id=employee.id, timestamp=datetime.combine(DAY, time(8, 0)), punch_type='0'),
+        AttendanceRecord(employee_id=other.id, timestamp=datetime.combine(DAY, time(8, 0)), punch_type='0'),
+        AttendanceRecord(employee_id=other.id, timestamp=datetime.combine(DAY, time(16, 0)), punch_type='1'),
+    ])
+    db_session.commit()
+
+    inside = AttendanceSummary.query.filter_by(employee_id=employee.id, work_date=DAY).one()
+    assert (inside.status, inside.is_present, inside.is_absent) == ('present', True, False)
+    gone = AttendanceSummary.query.filter_by(employee_id=other.id, work_date=DAY).one()
+    assert (gone.status, gone.is_present, gone.is_absent, gone.total_hours) == ('absent', False, True, 8.0)
+
+
+def test_presence_widgets_read_one_row_per_employee(db_session, count_queries):
+    employees = create_employees(db_session, 5)
+    for employee in employees:
+        db_session.add_all([
+            AttendanceRecord(employee_id=employee.id, timestamp=datetime.combine(DAY, time(8, 0)), punch_type='in'),
+            AttendanceRecord(employee_id=employee.id, timestamp=datetime.combine(DAY, time(12, 0)), punch_type='out'),
+            AttendanceRecord(employee_id=employee.id, timestamp=datetime.combine(DAY, time(13, 0)), punch_type='in'),
+        ])
+    db_session.commit()
+    block, queries = count_queries(lambda: build_attendance_block(DAY))
+    # Effectif actif + résumés avec leurs employés, sans requête par employé
+    assert queries == 2
+    assert (block['present'], block['total']) == (5, 5)
+    assert block['top_workers'][0]['hours'] == 4.0
+
+    assert RealKpiService.get_daily_kpis(DAY)['cogs']['labor'] == 5 * 4 * 100
@@ -0,0 +1,62 @@
+# tests/test_consumable_packing.py
+from decimal import Decimal
+
+from models import Category, Product
+from app.consumables.models import ConsumableCategory, ConsumableRange
+from app.consumables.packing import ConsumablePackingCache, RangeSpec, pack
+
+
+SMALL = RangeSpec(1, 1, 2, 10)
+LARGE = RangeSpec(2, 3, 6, 20)
+
+
+def test_pack_uses_fewest_boxes():
+    assert pack([SMALL, LARGE], 0) == []
+    assert pack([SMALL, LARGE], 2) == [(SMALL, 1)]
+    # Une boîte de 6 suffit pour 3 pièces (l'ancien glouton prenait 2 petites boîtes)
+    assert pack([SMALL, LARGE], 3) == [(LARGE, 1)]
+    assert pack([SMALL, LARGE], 8) == [(LARGE, 1), (SMALL, 1)]
+    assert pack([SMALL, LARGE], 13) == [(LARGE, 2), (SMALL, 1)]
+    # Grandes quantités : boîtes pleines posées d'office, reste optimisé
+    assert pack([SMALL, LARGE], 601) == [(LARGE, 100), (SMALL, 1)]
+    # Seulement une grande boîte : utilisée sous son minimum
+    assert pack([LARGE], 2) == [(LARGE, 1)]
+
+
+def test_cache_serves_ranges_without_queries_and_follows_writes(db_session, count_queries):
+    category = Category(name="Entremets")
+    db_session.add(category)
+    db_session.flush()
+    box_small = Product(name="Boîte 2", product_type='consommable', unit='pièce', price=Decimal('0'),
+                        cost_price=Decimal('5'))
+    box_large = Product(name="Boîte 6", product_type='consommable', unit='pièce', price=Decimal('0'),
+                        cost_price=Decimal('9'))
+    db_session.add_all([box_small, box_large])
+    db_session.flush()
+    consumable_category = ConsumableCategory(name="Entremets", product_category_id=category.id)
+    db_session.add(consumable_category)
+    db_session.flush()
+    db_session.add(ConsumableRange(category_id=consumable_category.id, min_quantity=1, max_quantity=2,
+                                   consumable_product_id=box_small.id))
+    db_session.commit()
+
+    needed = consumable_category.calculate_consumables_needed(4)
+    assert needed == [(box_small, 2)]
+    version = ConsumablePackingCache.version()
+
+    category_id = category.id
+    needed, queries = count_queries(lambda: ConsumableCategory.consumables_for_product_category(category_id, 4),
+                                    'SELECT')
+    assert needed == [(box_small, 2)]
+    assert queries == 0
+
+    db_session.add(ConsumableRange(category_id=consumable_category.id, min_quantity=3, max_quantity=6,
+                                   consumable_product_id=box_large.id))
+    db_session.commit()
+
+    assert ConsumableCategory.consumables_for_product_category(category.id, 4) == [(box_large, 1)]
+    assert ConsumablePackingCache.version() > version
+
+    consumable_category.is_active = False
+    db_session.commit()
+    assert ConsumableCategory.consumables_for_product_category(category.id, 4) == []
@@ -0,0 +1,53 @@
+# tests/test_date_ranges.py
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy import func
+
+from extensions import db
+from models import Order
+from app.employees.models import AttendanceRecord
+from app.sales.models import CashMovement
+from app.utils.date_ranges import on_day, not_on_day, in_period
+
+
+def query_plan(query):
+    """Plan SQLite (EXPLAIN QUERY PLAN) d'une requête ORM, en une seule chaîne."""
+    compiled = query.statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+    rows = db.session.execute(db.text(f'EXPLAIN QUERY PLAN {compiled}')).fetchall()
+    return ' | '.join(row[-1] for row in rows)
+
+
+def test_day_and_period_boundaries(db_session):
+    for created_at in (datetime(2025, 3, 9, 23, 59, 59), datetime(2025, 3, 10, 0, 0),
+                       datetime(2025, 3, 10, 23, 59, 59), datetime(2025, 3, 11, 0, 0)):
+        db_session.add(Order(order_type='in_store', created_at=created_at, due_date=created_at,
+                             total_amount=Decimal('10')))
+    db_session.commit()
+
+    assert Order.query.filter(on_day(Order.created_at, date(2025, 3, 10))).count() == 2
+    assert Order.query.filter(on_day(Order.created_at, datetime(2025, 3, 10, 15, 0))).count() == 2
+    assert Order.query.filter(not_on_day(Order.created_at, date(2025, 3, 10))).count() == 2
+    assert Order.query.filter(in_period(Order.created_at, date(2025, 3, 9), date(2025, 3, 10))).count() == 3
+    # Même résultat que l'ancien prédicat func.date()
+    assert Order.query.filter(func.date(Order.created_at) == date(2025, 3, 10)).count() == 2
+
+
+def test_predicates_use_indexes(db_session):
+    day = date(2025, 3, 10)
+
+    plan = query_plan(AttendanceRecord.query.filter(
+        AttendanceRecord.employee_id == 1, on_day(AttendanceRecord.timestamp, day)
+    ))
+    # Index de la contrainte uq_attendance_employee_timestamp
+    assert 'employee_id=? AND timestamp>? AND timestamp<?' in plan
+
+    plan = query_plan(Order.query.filter(on_day(Order.created_at, day)))
+    assert 'idx_orders_created_at' in plan
+
+    plan = query_plan(CashMovement.query.filter(in_period(CashMovement.created_at, day, day)))
+    assert 'idx_cash_movement_created_type' in plan
+
+    # Régression : l'ancien prédicat force un parcours complet de la table
+    plan = query_plan(Order.query.filter(func.date(Order.created_at) == day))
+    assert 'SCAN' in plan and 'idx_orders_created_at' not in plan
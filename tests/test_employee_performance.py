@@ -0,0 +1,71 @@
+# tests/test_employee_performance.py
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import insert
+
+from models import Order
+from app.employees.models import Employee, OrderIssue, order_employees
+from app.reports.services import EmployeePerformanceService
+
+
+def seed_production(db_session, employees_count, orders_count):
+    """Insère en masse des employés et des commandes réparties entre eux (mars 2025)."""
+    role = Employee.ROLES[0][0]
+    db_session.execute(insert(Employee), [
+        {'name': f"Employé {i}", 'role': role, 'salaire_fixe': Decimal('40000'), 'is_active': True}
+        for i in range(employees_count)
+    ])
+    employee_ids = [e.id for e in Employee.query.order_by(Employee.id)]
+
+    start = datetime(2025, 3, 1, 8, 0)
+    db_session.execute(insert(Order), [
+        {'order_type': 'customer_order', 'status': 'completed' if i % 4 else 'pending',
+         'created_at': start + timedelta(minutes=7 * i), 'due_date': start + timedelta(minutes=7 * i),
+         'total_amount': Decimal('1000')}
+        for i in range(orders_count)
+    ])
+    order_ids = [o.id for o in Order.query.order_by(Order.id)]
+    db_session.execute(insert(order_employees), [
+        {'order_id': order_id, 'employee_id': employee_ids[i % len(employee_ids)]}
+        for i, order_id in enumerate(order_ids)
+    ])
+    db_session.commit()
+    return employee_ids, order_ids
+
+
+def test_monthly_performance_figures(db_session):
+    employee_ids, order_ids = seed_production(db_session, 2, 8)
+    db_session.add(OrderIssue(order_id=order_ids[0], employee_id=employee_ids[0],
+                              issue_type='cuisson', detected_at=datetime(2025, 3, 2, 9, 0)))
+    db_session.add(OrderIssue(order_id=order_ids[1], employee_id=employee_ids[1],
+                              issue_type='cuisson', detected_at=datetime(2025, 2, 27, 9, 0)))
+    db_session.commit()
+
+    data = EmployeePerformanceService.monthly(2025, 3)
+    by_id = {e['id']: e for e in data['employees']}
+
+    # Employé 0 : commandes 0, 2, 4, 6 (0 et 4 en attente)
+    assert by_id[employee_ids[0]]['orders_produced'] == 4
+    assert by_id[employee_ids[0]]['revenue_generated'] == 2000.0
+    assert by_id[employee_ids[0]]['quality_issues'] == 1
+    assert by_id[employee_ids[0]]['error_rate'] == 25.0
+    assert by_id[employee_ids[0]]['roi'] == 5.0
+    # Employé 1 : 4 commandes terminées, problème hors période ignoré
+    assert by_id[employee_ids[1]]['revenue_generated'] == 4000.0
+    assert by_id[employee_ids[1]]['quality_issues'] == 0
+    assert data['employees'][0]['id'] == employee_ids[1]
+    assert data['summary']['total_revenue'] == 6000.0
+    assert data['summary']['total_employees'] == 2
+
+
+@pytest.mark.parametrize('employees_count', [5, 50])
+def test_query_count_is_constant(db_session, count_queries, employees_count):
+    seed_production(db_session, employees_count, 5000)
+
+    data, queries = count_queries(lambda: EmployeePerformanceService.monthly(2025, 3))
+
+    assert len(data['employees']) == employees_count
+    assert sum(e['orders_produced'] for e in data['employees']) == 5000
+    assert queries == 3
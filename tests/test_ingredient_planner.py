@@ -0,0 +1,86 @@
+# tests/test_ingredient_planner.py
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from flask import url_for
+
+from models import Order, OrderItem, Product, Recipe, RecipeIngredient
+from app.recipes.planner import IngredientPlannerService
+
+
+def create_plan_data(db_session, start):
+    flour = Product(name="Farine", product_type='ingredient', unit='g', price=Decimal('0'),
+                    cost_price=Decimal('0.1'), stock_ingredients_magasin=1000, stock_ingredients_local=5000)
+    db_session.add(flour)
+    db_session.flush()
+    cakes = []
+    for name, location in (("Tarte", 'ingredients_magasin'), ("Galette", 'ingredients_local')):
+        cake = Product(name=name, product_type='finished', unit='pièce', price=Decimal('200'))
+        db_session.add(cake)
+        db_session.flush()
+        recipe = Recipe(name=name, product_id=cake.id, yield_quantity=10, production_location=location)
+        db_session.add(recipe)
+        db_session.flush()
+        db_session.add(RecipeIngredient(recipe_id=recipe.id, product_id=flour.id,
+                                        quantity_needed=Decimal('500'), unit='g'))
+        cakes.append(cake)
+
+    def add_order(due_date, status, product, quantity):
+        order = Order(order_type='customer_order', status=status, due_date=due_date)
+        db_session.add(order)
+        db_session.flush()
+        db_session.add(OrderItem(order_id=order.id, product_id=product.id,
+                                 quantity=Decimal(quantity), unit_price=Decimal('0')))
+
+    add_order(start + timedelta(hours=10), 'pending', cakes[0], 20)        # 1000 g magasin
+    add_order(start - timedelta(hours=2), 'in_production', cakes[0], 10)   # en retard : 500 g magasin
+    add_order(start + timedelta(days=1), 'pending', cakes[1], 30)          # 1500 g local
+    add_order(start + timedelta(hours=9), 'completed', cakes[0], 100)      # déjà produite
+    add_order(start + timedelta(days=10), 'pending', cakes[0], 100)        # hors fenêtre
+    db_session.commit()
+    return flour
+
+
+def test_plan_aggregates_per_location_in_constant_queries(db_session, count_queries):
+    start = datetime(2025, 6, 1)
+    flour = create_plan_data(db_session, start)
+
+    plan, queries = count_queries(lambda: IngredientPlannerService.plan(start, start + timedelta(days=3)))
+
+    assert queries == 2
+    by_location = {item['location']: item for item in plan['items']}
+    magasin = by_location['stock_ingredients_magasin']
+    assert magasin['product_id'] == flour.id
+    assert magasin['needed_qty'] == 1500.0
+    assert magasin['missing'] == 500.0
+    assert magasin['orders_count'] == 2
+    assert magasin['deadline'] == start - timedelta(hours=2)
+    assert magasin['estimated_cost'] == 50.0
+    assert by_location['stock_ingredients_local']['missing'] == 0.0
+    assert plan['totals']['shortages'] == 1
+
+    without_overdue = IngredientPlannerService.plan(start, start + timedelta(days=3), include_overdue=False)
+    assert without_overdue['shortages'] == []
+
+
+def test_json_endpoint_and_alerts_page(client, admin_user, app, db_session):
+    start, _ = IngredientPlannerService.window()
+    create_plan_data(db_session, start)
+    IngredientPlannerService.clear_cache()
+
+    with app.test_request_context():
+        # Sans suivre la redirection vers le tableau de bord
+        client.post(url_for('auth.login'), data={'email': admin_user.email, 'password': 'adminpassword'})
+        api_url = url_for('dashboard.api_ingredient_requirements')
+        page_url = url_for('dashboard.ingredients_alerts')
+
+    response = client.get(api_url)
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['totals']['shortages'] == 1
+    assert data['shortages'][0]['name'] == "Farine"
+    assert 'max-age' in response.headers['Cache-Control']
+
+    response = client.get(page_url)
+    assert response.status_code == 200
+    assert "Labo A (Magasin)" in response.get_data(as_text=True)
@@ -0,0 +1,78 @@
+# tests/test_kpi_history.py
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from models import Category, Order, OrderItem, Product
+from app.ai.history import KpiHistory
+from app.employees.models import AttendanceSummary, Employee
+from app.inventory.models import DailyWaste
+from app.reports.services import PrimeCostReportService, ProductionReportService, WasteLossReportService
+
+DAY = date(2025, 3, 10)
+
+
+def add_order(db_session, product, quantity, order_type='in_store', status='completed',
+              created_at=None, due_date=None):
+    created_at = created_at or datetime.combine(DAY, datetime.min.time()) + timedelta(hours=9)
+    order = Order(order_type=order_type, status=status, created_at=created_at, due_date=due_date or created_at,
+                  total_amount=Decimal(str(quantity * 50)))
+    db_session.add(order)
+    db_session.flush()
+    db_session.add(OrderItem(order_id=order.id, product_id=product.id,
+                             quantity=Decimal(str(quantity)), unit_price=Decimal('50')))
+    db_session.commit()
+
+
+def seed(db_session, user):
+    category = Category(name="Viennoiseries")
+    db_session.add(category)
+    db_session.flush()
+    product = Product(name="Croissant", product_type='finished', unit='pièce', price=Decimal('50'),
+                      cost_price=Decimal('20'), category_id=category.id)
+    employee = Employee(name="Boulanger", role='production', hourly_rate=100)
+    db_session.add_all([product, employee])
+    db_session.commit()
+
+    add_order(db_session, product, 4)                                         # POS du 10
+    add_order(db_session, product, 2, order_type='customer_order', status='delivered',
+              created_at=datetime(2025, 3, 10, 8), due_date=datetime(2025, 3, 10, 17))  # Shop du 10
+    add_order(db_session, product, 3, order_type='customer_order', status='delivered',
+              created_at=datetime(2025, 3, 8, 8), due_date=datetime(2025, 3, 10, 18))   # Shop créé le 8
+    add_order(db_session, product, 30, order_type='counter_production_request', status='completed')
+    add_order(db_session, product, 1, created_at=datetime(2025, 3, 12, 11))   # POS du 12
+    db_session.add(DailyWaste(waste_date=DAY, product_id=product.id, quantity=2, reason='invendu',
+                              declared_by_id=user.id))
+    db_session.add(AttendanceSummary(employee_id=employee.id, work_date=DAY, worked_hours=Decimal('7.5'),
+                                     overtime_hours=Decimal('0.5')))
+    db_session.commit()
+
+
+def test_daily_frame_matches_reports_in_five_queries(db_session, regular_user, count_queries):
+    seed(db_session, regular_user)
+    df, queries = count_queries(lambda: KpiHistory.daily_frame(date(2025, 3, 9), date(2025, 3, 12)))
+
+    assert queries == 5
+    assert list(df.index.date) == [date(2025, 3, 9), date(2025, 3, 10), date(2025, 3, 11), date(2025, 3, 12)]
+    day = df.loc[str(DAY)]
+    prime_cost = PrimeCostReportService.generate(DAY, _skip_comparisons=True)
+    assert day['revenue'] == prime_cost['revenue'] == 300
+    assert day['transactions'] == 3
+    assert day['cogs'] == prime_cost['cogs'] == 180
+    assert day['labor_cost'] == prime_cost['labor_cost'] == 800
+    assert day['prime_cost'] == prime_cost['prime_cost']
+    assert day['units_sold'] == 9
+    assert day['units_produced'] == ProductionReportService.generate(DAY, _skip_comparisons=True)['total_units'] == 30
+    assert day['waste_value'] == WasteLossReportService.generate(DAY, DAY, _skip_comparisons=True)['total_value_lost'] == 40
+    assert df.loc['2025-03-11'].sum() == 0
+    assert df.loc['2025-03-12', 'revenue'] == 50
+
+
+def test_prophet_series_for_daily_reports(db_session, regular_user):
+    seed(db_session, regular_user)
+
+    series = KpiHistory.prophet_series('daily_sales', date(2025, 3, 12), days=5)
+    assert list(series.columns) == ['ds', 'y']
+    assert series['y'].tolist() == [0, 0, 300, 0, 50]
+
+    assert KpiHistory.prophet_series('daily_sales', date(2025, 3, 12), days=5, drop_empty_days=True)['y'].tolist() == [300, 50]
+    assert KpiHistory.prophet_series('weekly_cash_flow', date(2025, 3, 12), days=5) is None
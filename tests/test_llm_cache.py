@@ -0,0 +1,53 @@
+# tests/test_llm_cache.py
+from datetime import date, timedelta
+
+from app.ai.services import llm_cache
+from app.ai.services.llm_analyzer import LLMAnalyzer
+from app.ai.services.llm_cache import LLMCache
+
+
+class StubAnalyzer(LLMAnalyzer):
+    """Provider factice : compte les appels au lieu d'appeler une API"""
+
+    def __init__(self, cache):
+        super().__init__(provider='stub', model='stub-1', cache=cache)
+        self.calls = 0
+
+    def _call_llm(self, system_message, user_message, temperature):
+        self.calls += 1
+        return f"analyse #{self.calls}"
+
+
+def context(day, revenue):
+    return {'report_name': 'daily_sales', 'date': day.isoformat(), 'kpi_data': {'total_revenue': revenue},
+            'growth_rate': 0, 'trend_direction': 'stable', 'variance': 0}
+
+
+def test_same_prompt_is_served_from_cache(tmp_path):
+    LLMCache.reset_stats()
+    analyzer = StubAnalyzer(LLMCache(str(tmp_path)))
+    yesterday = date.today() - timedelta(days=1)
+
+    first = analyzer.analyze_report(context(yesterday, 100), period_end=yesterday)
+    second = StubAnalyzer(LLMCache(str(tmp_path))).analyze_report(context(yesterday, 100), period_end=yesterday)
+    other = analyzer.analyze_report(context(yesterday, 120), period_end=yesterday)
+
+    assert (first['cached'], second['cached'], other['cached']) == (False, True, False)
+    assert second['analysis'] == first['analysis'] == "analyse #1"
+    assert other['analysis'] == "analyse #2"
+    stats = analyzer.cache.get_stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 2, 2)
+
+
+def test_open_period_expires_closed_period_does_not(tmp_path, monkeypatch):
+    analyzer = StubAnalyzer(LLMCache(str(tmp_path)))
+    today, yesterday = date.today(), date.today() - timedelta(days=1)
+    analyzer.analyze_report(context(today, 50), period_end=today)
+    analyzer.analyze_report(context(yesterday, 80), period_end=yesterday)
+
+    now = llm_cache.time.time()
+    monkeypatch.setattr(llm_cache.time, 'time', lambda: now + llm_cache.TODAY_TTL_SECONDS + 1)
+
+    assert analyzer.analyze_report(context(today, 50), period_end=today)['cached'] is False
+    assert analyzer.analyze_report(context(yesterday, 80), period_end=yesterday)['cached'] is True
+    assert analyzer.calls == 3
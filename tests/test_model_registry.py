@@ -0,0 +1,69 @@
+# tests/test_model_registry.py
+import pandas as pd
+
+from app.ai.services import model_registry
+from app.ai.services.model_registry import ModelRegistry
+from app.ai.services.prophet_predictor import ProphetPredictor
+
+
+def series(days, value=10.0):
+    return pd.DataFrame({'ds': pd.date_range('2025-01-01', periods=days, freq='D'), 'y': [value] * days})
+
+
+def test_model_is_kept_in_memory_with_metadata(tmp_path):
+    ModelRegistry.clear_memory()
+    registry = ModelRegistry(str(tmp_path))
+    model = {'params': [1, 2, 3]}
+
+    registry.save('daily_sales', model, series(30), {'mape': 4.2})
+
+    assert registry.get('daily_sales').model is model
+    metadata = registry.get('daily_sales').metadata
+    assert (metadata['training_start'], metadata['training_end'], metadata['training_size']) == ('2025-01-01', '2025-01-30', 30)
+    assert metadata['metrics'] == {'mape': 4.2}
+    assert registry.is_current('daily_sales', series(30))
+    assert not registry.is_current('daily_sales', series(31))
+
+    # Un autre worker recharge depuis le disque
+    ModelRegistry.clear_memory()
+    reloaded = registry.get('daily_sales')
+    assert reloaded.model == model and reloaded.model is not model
+    assert registry.get('weekly_cash_flow') is None
+
+
+def test_forecasts_follow_the_model_and_memory_is_bounded(tmp_path, monkeypatch):
+    ModelRegistry.clear_memory()
+    monkeypatch.setattr(model_registry, 'MAX_MODELS_IN_MEMORY', 2)
+    registry = ModelRegistry(str(tmp_path))
+
+    entry = registry.save('daily_sales', {'v': 1}, series(30))
+    registry.save_forecast('daily_sales', entry.metadata['data_hash'], 7, {'forecast': [1] * 7})
+    assert registry.get_forecast('daily_sales', entry.metadata['data_hash'], 7) == {'forecast': [1] * 7}
+    assert registry.get_forecast('daily_sales', entry.metadata['data_hash'], 30) is None
+
+    # Nouveau modèle : les prévisions de l'ancien ne sont plus servies
+    entry = registry.save('daily_sales', {'v': 2}, series(31))
+    assert registry.get_forecast('daily_sales', entry.metadata['data_hash'], 7) is None
+
+    registry.save('daily_production', {'v': 3}, series(30))
+    registry.save('daily_waste_loss', {'v': 4}, series(30))
+    assert ModelRegistry.stats()['in_memory'] == ['daily_production', 'daily_waste_loss']
+
+
+def test_forecast_request_never_fits(tmp_path, monkeypatch):
+    ModelRegistry.clear_memory()
+    predictor = ProphetPredictor()
+    predictor.registry = ModelRegistry(str(tmp_path))
+    predictor.prophet_available = True
+
+    def no_fit(*args, **kwargs):
+        raise AssertionError("ajustement dans la requête")
+    monkeypatch.setattr(predictor, 'fit_model', no_fit)
+
+    # Pas encore de modèle entraîné : moyenne mobile
+    assert predictor.generate_forecast(series(40), 'daily_sales', days=7)['method'] == 'fallback_average'
+
+    # Série plus récente que l'entraînement : le modèle planifié est servi tel quel
+    entry = predictor.registry.save('daily_sales', {'v': 1}, series(30))
+    predictor.registry.save_forecast('daily_sales', entry.metadata['data_hash'], 7, {'forecast': [1] * 7})
+    assert predictor.generate_forecast(series(40), 'daily_sales', days=7) == {'forecast': [1] * 7}
@@ -0,0 +1,108 @@
+# tests/test_payroll_consolidation.py
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from app.employees.consolidation import PayrollConsolidationService
+from app.employees.models import AttendanceRecord, AttendanceSummary, Employee, SalaryAdvance, WorkHours
+
+
+def seed_month(db_session, year=2025, month=3):
+    """Mars 2025 : horaires variés (jour off ou non), vendredis, heures sup, jours incomplets."""
+    rng = random.Random(42)
+    schedules = [
+        None,
+        {'vendredi': {'active': False}, 'lundi': {'active': True}},
+        {'samedi': {'active': False}},
+        {'mardi': {'active': True}},
+    ]
+    employees = []
+    for i in range(8):
+        employee = Employee(name=f"Employé {i}", role='production', zk_user_id=200 + i)
+        employee.set_work_schedule(schedules[i % len(schedules)])
+        employees.append(employee)
+    employees.append(Employee(name="Inactif", role='production', is_active=False))
+    db_session.add_all(employees)
+    db_session.commit()
+
+    rows = []
+    day = datetime(year, month, 1)
+    while day.month == month:
+        for index, employee in enumerate(employees):
+            if rng.random() < 0.15 - index * 0.015:
+                continue
+            start = day + timedelta(hours=7, minutes=rng.randint(0, 90))
+            rows.append({'employee_id': employee.id, 'timestamp': start, 'punch_type': 'in'})
+            kind = rng.random()
+            if kind < 0.05:
+                continue  # entrée sans sortie
+            if kind < 0.08:
+                # sortie avant l'entrée : journée non comptée
+                rows.append({'employee_id': employee.id, 'timestamp': start - timedelta(hours=1), 'punch_type': 'out'})
+                continue
+            end = start + timedelta(hours=rng.uniform(4, 12))
+            if kind < 0.3:
+                rows.append({'employee_id': employee.id, 'timestamp': start + timedelta(hours=3), 'punch_type': 'out'})
+                rows.append({'employee_id': employee.id, 'timestamp': start + timedelta(hours=3, minutes=30),
+                             'punch_type': 'in'})
+            rows.append({'employee_id': employee.id, 'timestamp': end, 'punch_type': 'out'})
+        day += timedelta(days=1)
+    db_session.execute(insert(AttendanceRecord), rows)
+    db_session.add(SalaryAdvance(employee_id=employees[0].id, amount=5000, advance_date=datetime(year, month, 10).date(),
+                                 period_month=month, period_year=year))
+    db_session.commit()
+    return employees
+
+
+def test_vectorized_consolidation_matches_per_employee_api(admin_client, db_session, count_queries):
+    employees = seed_month(db_session)
+    employee_ids = [employee.id for employee in employees]
+
+    (results, daily), queries = count_queries(lambda: PayrollConsolidationService.consolidate(2025, 3, employee_ids))
+    # Employés + pointages du mois, quel que soit le nombre d'employés
+    assert queries == 2
+
+    for employee_id in employee_ids:
+        expected = admin_client.get(f'/employees/api/consolidate-hours?employee_id={employee_id}&month=3&year=2025').get_json()
+        assert expected['success']
+        result = results[employee_id]
+        for key in ('regular_hours', 'overtime_hours', 'days_worked', 'paid_days',
+                    'expected_days_per_week', 'other_absences'):
+            assert result[key] == expected[key], (employee_id, key)
+
+    # API « tous les employés » : employés actifs uniquement
+    response = admin_client.get('/employees/api/consolidate-hours/all?month=3&year=2025').get_json()
+    assert response['success']
+    assert [row['employee_id'] for row in response['employees']] == employee_ids[:-1]
+
+
+def test_cli_writes_work_hours_and_daily_summaries(runner, db_session):
+    employees = seed_month(db_session)
+
+    result = runner.invoke(args=['payroll', 'consolidate', '--month', '2025-03'])
+    assert result.exit_code == 0, result.output
+    assert WorkHours.query.count() == 8
+    work_hours = WorkHours.query.filter_by(employee_id=employees[0].id).one()
+    assert float(work_hours.advance_deduction) == 5000
+
+    results, daily = PayrollConsolidationService.consolidate(2025, 3)
+    assert float(work_hours.regular_hours) == results[employees[0].id]['regular_hours']
+    assert AttendanceSummary.query.count() == len(daily)
+
+    # Relance : mise à jour, pas de doublon
+    result = runner.invoke(args=['payroll', 'consolidate', '--month', '2025-03'])
+    assert 'mis à jour' in result.output
+    assert WorkHours.query.count() == 8
+    assert AttendanceSummary.query.count() == len(daily)
+
+
+def test_monthly_stats_use_one_query(db_session, count_queries):
+    employee = seed_month(db_session)[1]
+    employee.id  # rechargement après commit, hors comptage
+    stats, queries = count_queries(lambda: employee.get_monthly_attendance_stats(2025, 3))
+    assert queries == 1
+
+    present_days = {record.timestamp.date() for record in employee.attendance_records}
+    assert stats['present_days'] == len(present_days)
+    assert stats['total_hours'] == round(sum(employee.get_work_hours_for_date(day) for day in present_days), 2)
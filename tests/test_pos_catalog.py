@@ -0,0 +1,61 @@
+# tests/test_pos_catalog.py
+from decimal import Decimal
+
+from models import Category, Product
+
+
+def setup_catalog(db_session):
+    category = Category(name="Entremets glacés")
+    db_session.add(category)
+    db_session.flush()
+    products = [
+        Product(name=f"Bûche {i}", product_type='finished', unit='pièce', price=Decimal('1200'),
+                cost_price=Decimal('400'), category_id=category.id, stock_comptoir=5)
+        for i in range(3)
+    ]
+    db_session.add_all(products)
+    db_session.commit()
+    return category, products
+
+
+def test_catalog_is_served_from_cache_with_etag(regular_client, db_session, count_queries):
+    client = regular_client
+    category, products = setup_catalog(db_session)
+
+    response = client.get('/sales/api/products')
+    payload = response.get_json()
+    assert [p['name'] for p in payload['products']] == ["Bûche 0", "Bûche 1", "Bûche 2"]
+    assert payload['products'][0]['category'] == 'entremets-glaces'
+    assert payload['categories'] == [{'id': category.id, 'name': "Entremets glacés", 'slug': 'entremets-glaces'}]
+    etag = response.headers['ETag']
+
+    # Caisse au repos : 304 sans requête catalogue
+    response, queries = count_queries(lambda: client.get('/sales/api/products', headers={'If-None-Match': etag}),
+                                      'SELECT')
+    assert response.status_code == 304
+    assert queries <= 1  # chargement de l'utilisateur connecté
+
+    Product.query.filter_by(id=products[0].id).update({'price': Decimal('1500')})
+    db_session.commit()
+    response = client.get('/sales/api/products', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['products'][0]['price'] == 1500
+
+
+def test_since_returns_only_changed_stock_levels(regular_client, db_session):
+    client = regular_client
+    _, products = setup_catalog(db_session)
+    version = client.get('/sales/api/products').get_json()['version']
+
+    products[1].update_stock_by_location('stock_comptoir', -5)
+    products[2].update_stock_by_location('stock_comptoir', -1)
+    db_session.commit()
+
+    payload = client.get(f'/sales/api/products?since={version}').get_json()
+    assert 'products' not in payload
+    assert sorted((p['name'], p['stock']) for p in payload['changes']) == [("Bûche 1", 0), ("Bûche 2", 4)]
+
+    # Version à jour : delta vide ; version inconnue : catalogue complet
+    assert client.get(f"/sales/api/products?since={payload['version']}").get_json()['changes'] == []
+    full = client.get('/sales/api/products?since=autre-worker-3').get_json()
+    assert [p['name'] for p in full['products']] == ["Bûche 0", "Bûche 2"]
@@ -0,0 +1,64 @@
+# tests/test_pos_checkout.py
+from decimal import Decimal
+
+from models import Category, Product, Order
+from app.consumables.models import ConsumableCategory, ConsumableRange
+from app.consumables.packing import ConsumablePackingCache
+from app.sales.models import CashRegisterSession, CashMovement
+
+
+def setup_shop(db_session, lines):
+    category = Category(name="Gâteaux individuels")
+    db_session.add(category)
+    db_session.flush()
+    box_small = Product(name="Boîte 2", product_type='consommable', unit='pièce', price=Decimal('0'),
+                        cost_price=Decimal('5'), stock_consommables=500)
+    box_large = Product(name="Boîte 6", product_type='consommable', unit='pièce', price=Decimal('0'),
+                        cost_price=Decimal('9'), stock_consommables=500)
+    db_session.add_all([box_small, box_large])
+    db_session.flush()
+    consumable_category = ConsumableCategory(name="Individuels", product_category_id=category.id)
+    db_session.add(consumable_category)
+    db_session.flush()
+    db_session.add_all([
+        ConsumableRange(category_id=consumable_category.id, min_quantity=1, max_quantity=2,
+                        consumable_product_id=box_small.id),
+        ConsumableRange(category_id=consumable_category.id, min_quantity=3, max_quantity=6,
+                        consumable_product_id=box_large.id),
+    ])
+    products = [
+        Product(name=f"Gâteau {i}", product_type='finished', unit='pièce', price=Decimal('100'),
+                cost_price=Decimal('30'), category_id=category.id, stock_comptoir=50)
+        for i in range(lines)
+    ]
+    db_session.add_all(products)
+    db_session.add(CashRegisterSession(initial_amount=0, is_open=True))
+    db_session.commit()
+    return products, box_small, box_large
+
+
+def checkout(client, count_queries, products, quantity):
+    payload = {'items': [{'product_id': p.id, 'quantity': quantity, 'unit_price': 100} for p in products]}
+    return count_queries(lambda: client.post('/sales/api/complete-sale', json=payload), 'SELECT')
+
+
+def test_checkout_query_count_does_not_grow_with_cart(regular_client, regular_user, db_session, count_queries):
+    products, box_small, box_large = setup_shop(db_session, 15)
+    ConsumablePackingCache.snapshot()  # plages déjà en cache : aucune requête consommables
+    regular_user.id  # utilisateur connecté rechargé après le commit de setup_shop, hors comptage
+
+    response, single_line_queries = checkout(regular_client, count_queries, products[:1], 3)
+    assert response.get_json()['success'], response.get_json()
+
+    response, full_cart_queries = checkout(regular_client, count_queries, products, 3)
+    assert response.get_json()['success'], response.get_json()
+
+    assert full_cart_queries == single_line_queries
+    db_session.expire_all()
+    assert db_session.get(Product, products[0].id).stock_comptoir == 44
+    # 3 pièces : une boîte de 6 par ligne
+    assert db_session.get(Product, box_small.id).stock_consommables == 500
+    assert db_session.get(Product, box_large.id).stock_consommables == 484
+    movement = CashMovement.query.order_by(CashMovement.id.desc()).first()
+    assert movement.notes.startswith('Commande client: 3x Gâteau 0, 3x Gâteau 1')
+    assert Order.query.count() == 2
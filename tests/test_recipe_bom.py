@@ -0,0 +1,83 @@
+# tests/test_recipe_bom.py
+from datetime import datetime
+from decimal import Decimal
+
+from models import Order, OrderItem, Product, Recipe, RecipeIngredient
+from app.recipes.bom import RecipeBomCache
+from app.routes.dashboard import compute_ingredient_requirements
+
+
+def create_recipes(db_session, count):
+    flour = Product(name="Farine", product_type='ingredient', unit='KG', price=Decimal('0'),
+                    cost_price=Decimal('80'), stock_ingredients_magasin=1000)
+    butter = Product(name="Beurre", product_type='ingredient', unit='G', price=Decimal('0'),
+                     cost_price=Decimal('1.5'), stock_ingredients_magasin=5000)
+    db_session.add_all([flour, butter])
+    db_session.flush()
+    recipes = []
+    for i in range(count):
+        cake = Product(name=f"Gâteau {i}", product_type='finished', unit='pièce', price=Decimal('200'))
+        db_session.add(cake)
+        db_session.flush()
+        recipe = Recipe(name=f"Recette {i}", product_id=cake.id, yield_quantity=10)
+        db_session.add(recipe)
+        db_session.flush()
+        db_session.add_all([
+            RecipeIngredient(recipe_id=recipe.id, product_id=flour.id, quantity_needed=Decimal('500'), unit='G'),
+            RecipeIngredient(recipe_id=recipe.id, product_id=butter.id, quantity_needed=Decimal('200'), unit='G'),
+        ])
+        recipes.append(recipe)
+    db_session.commit()
+    return flour, butter, recipes
+
+
+def test_costing_many_recipes_is_constant_queries(db_session, count_queries):
+    flour, butter, recipes = create_recipes(db_session, 30)
+    recipe_ids = [recipe.id for recipe in recipes]
+    RecipeBomCache.snapshot()
+
+    costs, queries = count_queries(lambda: RecipeBomCache.costs_per_unit(recipe_ids), 'SELECT')
+    assert queries == 1
+    # 500 g à 80 DA/kg + 200 g à 1.5 DA/g = 340 DA pour 10 pièces
+    assert costs[recipe_ids[0]] == Decimal('34')
+    assert recipes[0].cost_per_unit == Decimal('34')
+
+    # Le PMP n'est pas figé dans le cache
+    flour.cost_price = Decimal('100')
+    db_session.commit()
+    assert recipes[0].total_cost == Decimal('350')
+
+
+def test_cache_follows_ingredient_changes(db_session):
+    flour, butter, recipes = create_recipes(db_session, 1)
+    recipe = recipes[0]
+    version = RecipeBomCache.snapshot().version
+
+    RecipeIngredient.query.filter_by(recipe_id=recipe.id, product_id=butter.id).delete()
+    db_session.commit()
+
+    assert RecipeBomCache.snapshot().version > version
+    assert [line.product_id for line in RecipeBomCache.get(recipe.id).lines] == [flour.id]
+    assert recipe.total_cost == Decimal('40')
+
+
+def test_production_and_requirements_use_compiled_bom(db_session):
+    flour, butter, recipes = create_recipes(db_session, 2)
+    order = Order(order_type='counter_production_request', status='pending', due_date=datetime(2025, 6, 1, 10))
+    db_session.add(order)
+    db_session.flush()
+    db_session.add_all([
+        OrderItem(order_id=order.id, product_id=recipes[0].product_id, quantity=Decimal('20'), unit_price=Decimal('0')),
+        OrderItem(order_id=order.id, product_id=recipes[1].product_id, quantity=Decimal('10'), unit_price=Decimal('0')),
+    ])
+    db_session.commit()
+
+    summary = {row['id']: row for row in compute_ingredient_requirements([order])}
+    assert summary[flour.id]['needed_qty'] == 1500.0
+    assert summary[butter.id]['needed_qty'] == 600.0
+    assert summary[butter.id]['orders_count'] == 1
+
+    order.decrement_ingredients_stock_on_production()
+    db_session.commit()
+    # Quantités décrémentées dans l'unité de la recette (comportement existant)
+    assert float(db_session.get(Product, butter.id).stock_ingredients_magasin) == 4400.0
@@ -0,0 +1,130 @@
+# tests/test_sales_facts.py
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from models import Category, Product, Order, OrderItem
+from app.reports.models import DailySalesFact
+from app.reports.sales_facts import SalesFactService
+from app.reports.services import MonthlyGrossMarginService, WeeklyProductPerformanceService
+
+
+def create_product(db_session, name="Croissant", price=50, cost_price=20):
+    category = Category.query.filter_by(name="Viennoiseries").first()
+    if not category:
+        category = Category(name="Viennoiseries")
+        db_session.add(category)
+        db_session.flush()
+    product = Product(name=name, product_type='finished', unit='pièce',
+                      price=Decimal(str(price)), cost_price=Decimal(str(cost_price)),
+                      category_id=category.id)
+    db_session.add(product)
+    db_session.commit()
+    return product
+
+
+def create_order(db_session, product, quantity, order_type='in_store', status='completed',
+                 created_at=None, due_date=None, unit_price=50):
+    created_at = created_at or datetime(2025, 3, 10, 9, 30)
+    order = Order(order_type=order_type, status=status, created_at=created_at,
+                  due_date=due_date or created_at, total_amount=Decimal(str(quantity * unit_price)))
+    db_session.add(order)
+    db_session.flush()
+    db_session.add(OrderItem(order_id=order.id, product_id=product.id,
+                             quantity=Decimal(str(quantity)), unit_price=Decimal(str(unit_price))))
+    db_session.commit()
+    return order
+
+
+def test_pos_sale_creates_fact_on_commit(db_session):
+    product = create_product(db_session)
+    create_order(db_session, product, 3)
+
+    fact = DailySalesFact.query.one()
+    assert fact.fact_date == date(2025, 3, 10)
+    assert fact.channel == 'pos'
+    assert fact.quantity == Decimal('3.000')
+    assert fact.revenue == Decimal('150.00')
+    assert fact.cogs == Decimal('60.0000')
+
+
+def test_shop_order_counted_only_once_delivered(db_session):
+    product = create_product(db_session)
+    order = create_order(db_session, product, 2, order_type='customer_order', status='ready_at_shop',
+                         created_at=datetime(2025, 3, 8, 10, 0), due_date=datetime(2025, 3, 10, 16, 0))
+    assert DailySalesFact.query.count() == 0
+
+    order.status = 'delivered'
+    db_session.commit()
+
+    fact = DailySalesFact.query.one()
+    assert (fact.fact_date, fact.order_date, fact.channel) == (date(2025, 3, 10), date(2025, 3, 8), 'shop')
+
+    order.status = 'cancelled'
+    db_session.commit()
+    assert DailySalesFact.query.count() == 0
+
+
+def test_rebuild_keeps_cost_at_sale(db_session):
+    product = create_product(db_session, cost_price=20)
+    create_order(db_session, product, 5)
+
+    product.cost_price = Decimal('35')
+    db_session.commit()
+    SalesFactService.rebuild(date(2025, 3, 1), date(2025, 3, 31))
+    db_session.commit()
+
+    assert DailySalesFact.query.one().cogs == Decimal('100.0000')
+
+
+def test_reports_read_from_facts(db_session):
+    product = create_product(db_session)
+    create_order(db_session, product, 4, created_at=datetime(2025, 3, 11, 8, 0))
+    create_order(db_session, product, 1, created_at=datetime(2025, 3, 4, 8, 0))
+
+    margin = MonthlyGrossMarginService.generate(2025, 3, _skip_comparisons=True)
+    assert margin['margin_data'] == [{
+        'category': 'Viennoiseries', 'revenue': 250.0, 'cogs': 100.0,
+        'gross_margin': 150.0, 'gross_margin_percentage': 60.0,
+    }]
+
+    weekly = WeeklyProductPerformanceService.generate(date(2025, 3, 10), date(2025, 3, 16))
+    assert weekly['performance_data'][0]['revenue'] == 200.0
+    assert weekly['performance_data'][0]['growth'] == 300.0
+
+
+def test_rebuild_cli(db_session, runner):
+    product = create_product(db_session)
+    create_order(db_session, product, 2)
+    DailySalesFact.query.delete()
+    db_session.commit()
+
+    result = runner.invoke(args=['rebuild-sales-facts', '--start', '2025-03-01', '--end', '2025-03-31'])
+    assert result.exit_code == 0, result.output
+    assert DailySalesFact.query.count() == 1
+
+
+def test_moving_delivery_date_clears_old_day(db_session):
+    product = create_product(db_session)
+    order = create_order(db_session, product, 2, order_type='customer_order', status='delivered',
+                         created_at=datetime(2025, 3, 8, 10, 0), due_date=datetime(2025, 3, 10, 16, 0))
+
+    order.due_date = datetime(2025, 3, 12, 16, 0)
+    db_session.commit()
+
+    fact = DailySalesFact.query.one()
+    assert fact.fact_date == date(2025, 3, 12)
+
+
+def test_refresh_updates_rows_written_by_another_till(db_session):
+    product = create_product(db_session)
+    create_order(db_session, product, 3)
+    # Faits déjà écrits entre-temps par une autre caisse, avec d'autres totaux
+    fact = DailySalesFact.query.one()
+    fact.quantity, fact.revenue = Decimal('1'), Decimal('50')
+    db_session.commit()
+
+    SalesFactService.refresh_days([date(2025, 3, 10)])
+    db_session.commit()
+
+    fact = DailySalesFact.query.one()
+    assert (fact.quantity, fact.revenue) == (Decimal('3.000'), Decimal('150.00'))
@@ -0,0 +1,82 @@
+# tests/test_stock_audit.py
+import json
+import logging
+from decimal import Decimal
+
+import pytest
+from flask_login import login_user, logout_user
+
+from models import Category, Product
+from app.stock import audit
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.entries = []
+
+    def emit(self, record):
+        self.entries.append(json.loads(record.getMessage()))
+
+
+@pytest.fixture
+def audit_entries(app):
+    logger = logging.getLogger(audit.LOGGER_NAME)
+    handler = ListHandler()
+    logger.addHandler(handler)
+    yield handler.entries
+    logger.removeHandler(handler)
+    app.config['STOCK_AUDIT_PRODUCT_IDS'] = set()
+
+
+def create_product(db_session):
+    category = Category(name="Gâteaux")
+    db_session.add(category)
+    db_session.flush()
+    product = Product(name="Fraisier", product_type='finished', unit='pièce', price=Decimal('90'),
+                      cost_price=Decimal('30'), category_id=category.id, stock_comptoir=10)
+    db_session.add(product)
+    db_session.commit()
+    return product
+
+
+def test_audit_is_off_by_default(db_session, audit_entries):
+    product = create_product(db_session)
+
+    product.update_stock_by_location('stock_comptoir', -2)
+
+    assert product.stock_comptoir == 8
+    assert audit_entries == []
+
+
+def test_audit_for_listed_product_records_caller_and_before_after(app, db_session, audit_entries):
+    product = create_product(db_session)
+    app.config['STOCK_AUDIT_PRODUCT_IDS'] = {product.id}
+
+    product.update_stock_by_location('comptoir', -3)
+
+    [entry] = audit_entries
+    assert entry['product_id'] == product.id
+    assert (entry['location'], entry['change'], entry['before'], entry['after']) == ('stock_comptoir', -3, 10, 7)
+    assert entry['caller'].startswith('tests/test_stock_audit.py:')
+
+
+def test_audit_header_enables_a_single_admin_request(app, db_session, audit_entries, admin_user, regular_user):
+    product = create_product(db_session)
+
+    with app.test_request_context(headers={audit.AUDIT_HEADER: '1'}):
+        login_user(admin_user)
+        product.update_stock_by_location('stock_comptoir', 5)
+        logout_user()
+    with app.test_request_context():
+        login_user(admin_user)
+        product.update_stock_by_location('stock_comptoir', 5)
+        logout_user()
+    # En-tête ignoré hors administrateur connecté
+    with app.test_request_context(headers={audit.AUDIT_HEADER: '1'}):
+        product.update_stock_by_location('stock_comptoir', 5)
+    with app.test_request_context(headers={audit.AUDIT_HEADER: '1'}):
+        login_user(regular_user)
+        product.update_stock_by_location('stock_comptoir', 5)
+
+    assert [entry['after'] for entry in audit_entries] == [15]
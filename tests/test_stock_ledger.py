@@ -0,0 +1,128 @@
+# tests/test_stock_ledger.py
+from decimal import Decimal
+
+from sqlalchemy import event
+
+from extensions import db
+from models import Category, Product
+from app.stock.ledger import StockLedger
+from app.stock.models import StockLocationType, StockMovement, StockMovementType, update_stock_quantity
+
+
+def create_products(db_session, count):
+    category = Category(name="Pâtisseries")
+    db_session.add(category)
+    db_session.flush()
+    products = [
+        Product(name=f"Tarte {i}", product_type='finished', unit='pièce', price=Decimal('80'),
+                cost_price=Decimal('25'), category_id=category.id, stock_comptoir=10,
+                valeur_stock_comptoir=Decimal('250'))
+        for i in range(count)
+    ]
+    db_session.add_all(products)
+    db_session.commit()
+    return products
+
+
+def test_apply_writes_one_movement_per_change_in_a_single_insert(db_session, regular_user):
+    products = create_products(db_session, 12)
+    changes = [{'product_id': p.id, 'location': 'comptoir', 'delta': -3, 'order_id': None,
+                'movement_type': 'vente', 'reason': f"Vente {p.name}"} for p in products]
+    inserts = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('INSERT INTO STOCK_MOVEMENTS'):
+            inserts.append(executemany)
+
+    event.listen(db.engine, 'before_cursor_execute', before_execute)
+    try:
+        StockLedger.apply(changes, user_id=regular_user.id)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_execute)
+
+    assert inserts == [True]
+    movements = StockMovement.query.order_by(StockMovement.product_id).all()
+    assert len(movements) == 12
+    first = movements[0]
+    assert first.movement_type == StockMovementType.VENTE
+    assert first.stock_location == StockLocationType.COMPTOIR
+    assert (first.quantity, first.stock_before, first.stock_after) == (-3, 10, 7)
+    assert first.reason == "Vente Tarte 0"
+    assert first.user_id == regular_user.id
+    assert len({m.reference for m in movements}) == 12
+    db_session.expire_all()
+    assert db_session.get(Product, products[0].id).stock_comptoir == 7
+
+
+def test_update_stock_quantity_allows_negative_stock_and_traces_it(db_session, regular_user):
+    product = create_products(db_session, 1)[0]
+
+    assert update_stock_quantity(product.id, StockLocationType.COMPTOIR, -15, regular_user.id, reason="Casse")
+
+    db_session.expire_all()
+    assert db_session.get(Product, product.id).stock_comptoir == -5
+    movement = StockMovement.query.one()
+    assert movement.movement_type == StockMovementType.SORTIE
+    assert (movement.stock_before, movement.stock_after) == (10, -5)
+
+
+def test_direct_update_by_location_is_traced_on_flush(db_session):
+    product = create_products(db_session, 1)[0]
+
+    product.update_stock_by_location('consommables', 4, movement_type='entree', reason="Achat PO-1")
+    product.update_stock_by_location('stock_comptoir', -2)
+    db_session.commit()
+
+    movements = {m.stock_location: m for m in StockMovement.query.all()}
+    assert movements[StockLocationType.CONSOMMABLES].quantity == 4
+    assert movements[StockLocationType.CONSOMMABLES].reason == "Achat PO-1"
+    assert movements[StockLocationType.COMPTOIR].movement_type == StockMovementType.SORTIE
+    assert movements[StockLocationType.COMPTOIR].user_id is None
+
+
+def test_inventory_adjustment_is_traced_as_an_inventory_movement(db_session, regular_user):
+    from datetime import date
+    from app.inventory.models import Inventory, InventoryItem
+
+    product = create_products(db_session, 1)[0]
+    product.stock_consommables = 10
+    inventory = Inventory(inventory_date=date.today(), month=date.today().month,
+                          year=date.today().year, created_by_id=regular_user.id)
+    db_session.add(inventory)
+    db_session.flush()
+    item = InventoryItem(inventory_id=inventory.id, product_id=product.id, location_type='consommables',
+                         theoretical_stock=10, physical_stock=7, variance=-3)
+    db_session.add(item)
+    db_session.commit()
+
+    assert item.apply_adjustment()
+    db_session.commit()
+
+    movement = StockMovement.query.one()
+    assert movement.movement_type == StockMovementType.INVENTAIRE
+    assert movement.stock_location == StockLocationType.CONSOMMABLES
+    assert (movement.quantity, movement.stock_before, movement.stock_after) == (-3, 10, 7)
+    assert movement.reason == f"Inventaire #{inventory.id}"
+
+
+def test_consumable_adjustment_route_records_a_movement(admin_client, db_session):
+    category = Category(name='Boite Consomable')
+    db_session.add(category)
+    db_session.flush()
+    product = Product(name="Boîte 6 parts", product_type='consommable', unit='pièce',
+                      cost_price=Decimal('12'), category_id=category.id, stock_consommables=20)
+    db_session.add(product)
+    db_session.commit()
+
+    response = admin_client.post('/admin/consumables/adjustments/create', data={
+        'product_id': product.id, 'adjustment_date': '2026-10-01', 'adjustment_type': 'waste',
+        'quantity_adjusted': -25, 'reason': "Boîtes abîmées",
+    })
+
+    assert response.status_code == 302
+    db_session.expire_all()
+    assert db_session.get(Product, product.id).stock_consommables == 0
+    movement = StockMovement.query.one()
+    assert movement.movement_type == StockMovementType.AJUSTEMENT_NEGATIF
+    assert (movement.quantity, movement.stock_before, movement.stock_after) == (-20, 20, 0)
+    assert movement.reason == "Boîtes abîmées"
@@ -0,0 +1,147 @@
+# tests/test_stock_reservation.py
+import threading
+from decimal import Decimal
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from extensions import db
+from models import Category, Order, Product
+from app.accounting.models import Account, AccountNature, AccountType, Journal, JournalType
+from app.sales.models import CashRegisterSession
+from app.stock.models import StockMovement
+from app.stock.reservation import InsufficientStockError, StockReservationService, retry_transaction, should_retry
+
+
+def create_product(db_session, name="Millefeuille", stock=5):
+    category = Category(name=f"Pâtisseries {name}")
+    db_session.add(category)
+    db_session.flush()
+    product = Product(name=name, product_type='finished', unit='pièce', price=Decimal('120'),
+                      cost_price=Decimal('40'), category_id=category.id,
+                      stock_comptoir=stock, valeur_stock_comptoir=Decimal(stock * 40),
+                      total_stock_value=Decimal(stock * 40))
+    db_session.add(product)
+    db_session.commit()
+    return product
+
+
+def test_decrement_updates_quantity_and_value(db_session):
+    product = create_product(db_session, stock=5)
+
+    StockReservationService.decrement([(product.id, 2), (str(product.id), '1')])
+    db_session.commit()
+
+    db_session.refresh(product)
+    assert product.stock_comptoir == 2
+    assert float(product.valeur_stock_comptoir) == 80.0
+
+
+def test_insufficient_stock_checks_whole_cart(db_session):
+    first = create_product(db_session, name="Éclair", stock=5)
+    second = create_product(db_session, name="Tarte", stock=1)
+
+    # Deux lignes du même produit : le total (2) dépasse le stock (1)
+    with pytest.raises(InsufficientStockError) as excinfo:
+        StockReservationService.decrement([(first.id, 1), (second.id, 1), (second.id, 1)])
+    db_session.rollback()
+
+    assert excinfo.value.product.id == second.id
+    assert excinfo.value.available == 1.0
+    assert db_session.get(Product, first.id).stock_comptoir == 5
+
+
+def test_unknown_product(db_session):
+    with pytest.raises(LookupError):
+        StockReservationService.decrement([(999, 1)])
+
+
+class SerializationFailure(Exception):
+    pgcode = '40001'
+
+
+def test_retry_transaction_replays_the_whole_transaction(app, db_session):
+    product = create_product(db_session, stock=5)
+    calls = []
+
+    @retry_transaction()
+    def checkout():
+        calls.append(len(calls))
+        try:
+            StockReservationService.decrement([(product.id, 2)])
+            if len(calls) == 1:
+                # Conflit détecté au commit, après le verrouillage
+                raise OperationalError('COMMIT', {}, SerializationFailure())
+            db.session.commit()
+        except Exception as e:
+            if should_retry(e):
+                raise
+            db.session.rollback()
+            return 'error'
+        return 'ok'
+
+    with app.test_request_context():
+        assert checkout() == 'ok'
+    assert calls == [0, 1]
+    # La première tentative a été annulée : une seule décrémentation
+    assert db_session.get(Product, product.id).stock_comptoir == 3
+
+
+def test_legacy_pos_checkout_locks_and_records_movements(regular_client, db_session):
+    product = create_product(db_session, stock=2)
+    db_session.add_all([
+        CashRegisterSession(initial_amount=0, is_open=True),
+        # Comptes de l'écriture de caisse passée par la vente
+        Account(code='530', name='Caisse', account_type=AccountType.CLASSE_5, account_nature=AccountNature.DEBIT),
+        Account(code='758', name='Produits divers', account_type=AccountType.CLASSE_7,
+                account_nature=AccountNature.CREDIT),
+        Journal(code='CA', name='Caisse', journal_type=JournalType.CAISSE),
+    ])
+    db_session.commit()
+
+    response = regular_client.post('/sales/pos/checkout', json={'items': [{'id': product.id, 'quantity': 3, 'price': 120}]})
+    assert response.status_code == 400
+    assert 'Stock insuffisant' in response.get_json()['error']
+
+    response = regular_client.post('/sales/pos/checkout', json={'items': [{'id': product.id, 'quantity': 2, 'price': 120}]})
+    assert response.get_json()['success'], response.get_json()
+    db_session.expire_all()
+    assert db_session.get(Product, product.id).stock_comptoir == 0
+    order = Order.query.filter_by(order_type='pos_direct').one()
+    movement = StockMovement.query.one()
+    assert (movement.order_id, movement.quantity) == (order.id, -2)
+
+
+def test_no_oversell_under_concurrent_checkouts(app, db_session):
+    if db.engine.dialect.name != 'postgresql':
+        pytest.skip("Verrous de ligne non supportés par SQLite (TEST_DATABASE_URL=postgresql://...)")
+
+    product = create_product(db_session, stock=5)
+    product_id = product.id
+    db_session.remove()
+
+    barrier = threading.Barrier(20)
+    results = []
+
+    def checkout():
+        with app.app_context():
+            barrier.wait()
+            try:
+                StockReservationService.decrement([(product_id, 1)])
+                db.session.commit()
+                results.append('ok')
+            except InsufficientStockError:
+                db.session.rollback()
+                results.append('refused')
+            finally:
+                db.session.remove()
+
+    threads = [threading.Thread(target=checkout) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count('ok') == 5
+    assert results.count('refused') == 15
+    assert db.session.get(Product, product_id).stock_comptoir == 0
@@ -0,0 +1,104 @@
+# tests/test_stock_valuation.py
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from models import Category, Product
+from app.reports.services import StockRotationReportService
+from app.stock.models import StockLocationType, StockMovement, StockMovementType, StockSnapshot
+from app.stock.valuation import StockValuationService
+
+
+def create_product(db_session, quantity, value):
+    category = Category(name="Viennoiseries")
+    db_session.add(category)
+    db_session.flush()
+    product = Product(name="Croissant", product_type='finished', unit='pièce', price=Decimal('50'),
+                      cost_price=Decimal('20'), category_id=category.id,
+                      stock_comptoir=quantity, valeur_stock_comptoir=Decimal(str(value)))
+    db_session.add(product)
+    db_session.commit()
+    return product
+
+
+def add_movement(db_session, product, user, day, quantity, unit_cost=20):
+    movement_type = StockMovementType.ENTREE if quantity > 0 else StockMovementType.VENTE
+    db_session.add(StockMovement(product_id=product.id, stock_location=StockLocationType.COMPTOIR,
+                                 movement_type=movement_type, quantity=quantity, unit_cost=unit_cost,
+                                 user_id=user.id, created_at=datetime.combine(day, datetime.min.time()) + timedelta(hours=10)))
+    db_session.commit()
+
+
+def seed_history(db_session, user):
+    """+10 le 3 mars, -4 le 5 mars, +10 le 8 mars : stock actuel 16 (valeur 320)."""
+    product = create_product(db_session, 16, 320)
+    add_movement(db_session, product, user, date(2025, 3, 3), 10)
+    add_movement(db_session, product, user, date(2025, 3, 5), -4)
+    add_movement(db_session, product, user, date(2025, 3, 8), 10)
+    return product
+
+
+def test_value_at_past_dates_from_current_stock_and_snapshots(db_session, regular_user, count_queries):
+    product = seed_history(db_session, regular_user)
+    expected = {date(2025, 3, 2): 0, date(2025, 3, 4): 200, date(2025, 3, 6): 120, date(2025, 3, 9): 320}
+    for day, value in expected.items():
+        assert StockValuationService.value_at(day, 'comptoir') == value, day
+
+    StockValuationService.take_snapshot(date(2025, 3, 4))
+    db_session.commit()
+    snapshot = StockSnapshot.query.one()
+    assert (snapshot.quantity, float(snapshot.value)) == (10, 200)
+
+    # Le stock actuel n'est plus lu : photo + mouvements suffisent
+    Product.query.filter_by(id=product.id).update({'valeur_stock_comptoir': 0})
+    db_session.commit()
+    value, queries = count_queries(lambda: StockValuationService.value_at(date(2025, 3, 6), 'comptoir'))
+    assert value == 120
+    # Photo la plus proche + lignes de la photo + mouvements agrégés
+    assert queries == 3
+    assert StockValuationService.value_at(date(2025, 3, 2), 'comptoir') == 0
+    assert StockValuationService.value_at(date(2025, 3, 9), 'comptoir') == 320
+
+
+def test_rotation_uses_stock_at_period_bounds(db_session, regular_user):
+    seed_history(db_session, regular_user)
+    report = StockRotationReportService.generate(date(2025, 3, 4), date(2025, 3, 8), _skip_comparisons=True)
+    # Fin du 3 mars : 200 ; fin du 8 mars : 320
+    assert report['total_stock_value'] == 260
+
+
+def test_stock_writes_leave_snapshots_to_the_scheduled_job(db_session, regular_user, runner):
+    product = create_product(db_session, 5, 100)
+
+    product.stock_comptoir = 8
+    product.valeur_stock_comptoir = Decimal('160')
+    db_session.commit()
+    assert StockSnapshot.query.count() == 0
+
+    # Photo d'hier prise après les écritures du jour : mouvements rejoués en arrière
+    add_movement(db_session, product, regular_user, date.today(), 3)
+    result = runner.invoke(args=['stock-snapshot'])
+    assert result.exit_code == 0, result.output
+
+    snapshot = StockSnapshot.query.one()
+    assert snapshot.snapshot_date == date.today() - timedelta(days=1)
+    assert (snapshot.quantity, float(snapshot.value)) == (5, 100)
+
+
+def test_replay_follows_value_deficit(db_session):
+    """Vente de 5 à découvert (valeur inchangée), puis entrée de 10 qui résorbe d'abord le déficit."""
+    product = create_product(db_session, 0, 0)
+    product.update_stock_by_location('comptoir', -5, unit_cost_override=10)
+    db_session.commit()
+    product.update_stock_by_location('comptoir', 10, unit_cost_override=10)
+    db_session.commit()
+    assert float(product.valeur_stock_comptoir) == 50
+
+    sale, receipt = StockMovement.query.order_by(StockMovement.id).all()
+    assert (sale.value_change, receipt.value_change) == (0, 50)
+    sale.created_at = datetime(2025, 3, 3, 10)
+    receipt.created_at = datetime(2025, 3, 5, 10)
+    db_session.commit()
+
+    assert StockValuationService.value_at(date(2025, 3, 2), 'comptoir') == 0
+    assert StockValuationService.value_at(date(2025, 3, 4), 'comptoir') == 0
+    assert StockValuationService.value_at(date(2025, 3, 6), 'comptoir') == 50
@@ -0,0 +1,38 @@
+# tests/test_template_stats.py
+from decimal import Decimal
+
+from flask import render_template_string
+from models import Product
+
+
+def add_products(db_session, *quantities):
+    products = [Product(name=f"Farine {i}", product_type='ingredient', unit='kg', price=Decimal('0'),
+                        cost_price=Decimal('90'), quantity_in_stock=quantity)
+                for i, quantity in enumerate(quantities)]
+    db_session.add_all(products)
+    db_session.commit()
+    return products
+
+
+def test_ordinary_page_runs_no_stats_query(client, db_session, count_queries):
+    add_products(db_session, 10, 3)
+
+    response, queries = count_queries(lambda: client.get('/auth/login'))
+
+    assert response.status_code == 200
+    assert queries == 0
+
+
+def test_stats_are_computed_once_then_invalidated_on_stock_change(app, db_session, count_queries):
+    products = add_products(db_session, 10, 3, 0)
+    template = "{{ total_products_count }}/{{ low_stock_products }}/{{ out_of_stock_products }}"
+
+    with app.test_request_context():
+        html, queries = count_queries(lambda: render_template_string(template))
+        assert (html, queries) == ("3/2/1", 1)
+        html, queries = count_queries(lambda: render_template_string(template))
+        assert (html, queries) == ("3/2/1", 0)
+
+        products[0].quantity_in_stock = 0
+        db_session.commit()
+        assert render_template_string(template) == "3/3/2"
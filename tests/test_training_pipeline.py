@@ -0,0 +1,101 @@
+# tests/test_training_pipeline.py
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import os
+
+import pandas as pd
+import pytest
+
+from models import Order
+from app.ai import model_trainer
+from app.ai.history import REPORT_SERIES
+from app.ai.model_trainer import (
+    acquire_training_lock, fetch_training_series, get_training_progress, train_all_reports
+)
+from app.ai.services.prophet_predictor import ProphetPredictor
+
+
+def add_sales(db_session, days):
+    for i in range(days):
+        created_at = datetime.combine(date.today() - timedelta(days=i), datetime.min.time()) + timedelta(hours=10)
+        db_session.add(Order(order_type='in_store', status='completed', created_at=created_at,
+                             due_date=created_at, total_amount=Decimal(100 + i)))
+    db_session.commit()
+
+
+def test_daily_series_share_one_extraction(db_session, count_queries):
+    add_sales(db_session, 12)
+    series, queries = count_queries(lambda: fetch_training_series(list(REPORT_SERIES), days_history=30))
+
+    assert queries == 5
+    # Jusqu'à hier : la journée en cours n'est pas complète
+    assert len(series['daily_sales']) == 11
+    assert series['daily_production'] is None
+
+
+def test_pipeline_publishes_progress(db_session, tmp_path, monkeypatch):
+    monkeypatch.setattr(model_trainer, 'TRAINING_PROGRESS_PATH', str(tmp_path / 'progress.json'))
+    assert get_training_progress() == {'status': 'idle'}
+
+    results = train_all_reports(30, report_names=['daily_production', 'daily_waste_loss'])
+
+    assert [r['report_name'] for r in results] == ['daily_production', 'daily_waste_loss']
+    assert all('Données insuffisantes' in r['error'] for r in results)
+    progress = get_training_progress()
+    assert (progress['status'], progress['completed'], progress['total']) == ('done', 2, 2)
+    assert progress['reports']['daily_production']['status'] == 'error'
+
+
+
+def test_failed_run_publishes_error_and_releases_the_lock(db_session, tmp_path, monkeypatch):
+    monkeypatch.setattr(model_trainer, 'TRAINING_PROGRESS_PATH', str(tmp_path / 'progress.json'))
+
+    def fail(*args, **kwargs):
+        raise MemoryError("plus de mémoire")
+    monkeypatch.setattr(model_trainer, 'fetch_training_series', fail)
+
+    with pytest.raises(MemoryError):
+        train_all_reports(30, report_names=['daily_sales'])
+
+    progress = get_training_progress()
+    assert (progress['status'], progress['error']) == ('error', "plus de mémoire")
+    assert acquire_training_lock()
+    with pytest.raises(RuntimeError):
+        train_all_reports(30, report_names=['daily_sales'])
+
+
+def test_stale_running_training_can_be_restarted(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(model_trainer, 'TRAINING_PROGRESS_PATH', str(tmp_path / 'progress.json'))
+    assert acquire_training_lock()
+    model_trainer._write_progress({'status': 'running', 'started_at': datetime.now().isoformat()})
+    assert get_training_progress()['status'] == 'running'
+    assert not acquire_training_lock()
+
+    # Worker tué : plus aucune progression depuis TRAINING_STALE_SECONDS
+    monkeypatch.setattr(model_trainer, 'TRAINING_STALE_SECONDS', 0)
+
+    assert get_training_progress()['status'] == 'error'
+    assert acquire_training_lock()
+    assert os.path.exists(model_trainer._lock_path())
+
+
+def test_train_route_refuses_a_second_concurrent_run(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(model_trainer, 'TRAINING_PROGRESS_PATH', str(tmp_path / 'progress.json'))
+    assert acquire_training_lock()
+
+    response = client.post('/ai/train', json={})
+
+    assert response.status_code == 409
+    assert os.path.exists(model_trainer._lock_path())
+
+
+def test_fallback_forecast(app):
+    df = pd.DataFrame({'ds': pd.date_range('2025-01-01', periods=10, freq='D'), 'y': [float(v) for v in range(10)]})
+
+    result = ProphetPredictor()._fallback_forecast(df, 3)
+
+    assert [f['ds'] for f in result['forecast']] == ['2025-01-11T00:00:00', '2025-01-12T00:00:00', '2025-01-13T00:00:00']
+    assert result['forecast'][0]['yhat'] == 6.0
+    assert result['forecast'][0]['yhat_lower'] == 6.0 * 0.9
+    assert result['forecast'][0]['yhat_upper'] == 6.0 * 1.1
@@ -0,0 +1,62 @@
+# tests/test_trends.py
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy import func
+
+from models import Category, Product, Order, OrderItem
+from app.reports.trends import TimeSeriesService
+
+
+def create_sale(db_session, created_at, quantity=2, unit_price=50, status='completed'):
+    product = Product.query.first()
+    if not product:
+        category = Category(name="Pains")
+        db_session.add(category)
+        db_session.flush()
+        product = Product(name="Baguette", product_type='finished', unit='pièce',
+                          price=Decimal('50'), cost_price=Decimal('10'), category_id=category.id)
+        db_session.add(product)
+        db_session.flush()
+    order = Order(order_type='in_store', status=status, created_at=created_at, due_date=created_at,
+                  total_amount=Decimal(str(quantity * unit_price)))
+    db_session.add(order)
+    db_session.flush()
+    db_session.add(OrderItem(order_id=order.id, product_id=product.id,
+                             quantity=Decimal(str(quantity)), unit_price=Decimal(str(unit_price))))
+    db_session.commit()
+    return order
+
+
+def test_daily_revenue_series_fills_gaps_in_one_query(db_session, count_queries):
+    create_sale(db_session, datetime(2025, 3, 3, 9, 0))
+    create_sale(db_session, datetime(2025, 3, 5, 23, 30), quantity=1)
+    create_sale(db_session, datetime(2025, 3, 5, 10, 0), status='cancelled')
+
+    series, queries = count_queries(
+        lambda: TimeSeriesService.revenue_series(date(2025, 3, 1), date(2025, 3, 7)), 'SELECT'
+    )
+
+    assert queries == 1
+    assert [point['bucket'] for point in series] == [date(2025, 3, d) for d in range(1, 8)]
+    assert [point['revenue'] for point in series] == [0.0, 0.0, 100.0, 0.0, 50.0, 0.0, 0.0]
+
+
+def test_week_and_month_buckets(db_session):
+    create_sale(db_session, datetime(2025, 1, 31, 12, 0))
+    create_sale(db_session, datetime(2025, 2, 2, 12, 0))
+    create_sale(db_session, datetime(2025, 2, 3, 12, 0), quantity=4)
+
+    weeks = TimeSeriesService.revenue_series(date(2025, 1, 27), date(2025, 2, 9), granularity='week')
+    assert weeks == [
+        {'bucket': date(2025, 1, 27), 'revenue': 200.0},
+        {'bucket': date(2025, 2, 3), 'revenue': 200.0},
+    ]
+
+    months = TimeSeriesService.aggregate(
+        Order.created_at, {'orders': func.count(Order.id)},
+        date(2024, 12, 1), date(2025, 3, 31), granularity='month'
+    )
+    assert [(point['bucket'], point['orders']) for point in months] == [
+        (date(2024, 12, 1), 0.0), (date(2025, 1, 1), 1.0), (date(2025, 2, 1), 2.0), (date(2025, 3, 1), 0.0),
+    ]
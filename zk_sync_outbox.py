@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+État local des agents de synchronisation pointeuse → ERP
+(utilisé par server_adms_fast.py et server_adms_loop.py)
+
+- Curseur par pointeuse : dernier pointage déjà mis en file. La pointeuse
+  renvoie toute sa mémoire à chaque lecture ; seuls les pointages plus
+  récents que le curseur sont envoyés.
+- File d'envoi (outbox) SQLite : les pointages sont d'abord écrits
+  localement, puis envoyés par lots à /zkteco/api/attendance/bulk. Si le VPS
+  est injoignable, ils restent en file et sont renvoyés avec un délai
+  exponentiel (l'API ignore les doublons).
+- Sans état local, le curseur est repris depuis le serveur
+  (/zkteco/api/devices/<id>/cursor) ; --since force une resynchronisation.
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+import requests
+
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'zk_sync_state.db')
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 3600
+
+
+def parse_since(value):
+    """Date de reprise --since : 'AAAA-MM-JJ' ou 'AAAA-MM-JJ HH:MM:SS'"""
+    for fmt in (TIMESTAMP_FORMAT, '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError(f"Date invalide : {value} (attendu AAAA-MM-JJ[ HH:MM:SS])")
+
+
+def add_sync_arguments(parser):
+    """Options communes des agents"""
+    parser.add_argument('--since', type=parse_since, default=None,
+                        help="Renvoyer tous les pointages depuis cette date (resynchronisation)")
+    parser.add_argument('--state', default=DEFAULT_DB_PATH,
+                        help="Fichier SQLite de l'état local (curseurs + file d'envoi)")
+    return parser
+
+
+def backoff_delay(attempts):
+    """Délai avant nouvel essai : 30 s, 60 s, 120 s... plafonné à 1 h"""
+    return min(BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)), BACKOFF_MAX_SECONDS)
+
+
+class SyncOutbox:
+    """Curseurs et file d'envoi persistés dans un fichier SQLite local"""
+
+    def __init__(self, path=None, api_url=None, token=None):
+        self.api_url = api_url
+        self.token = token
+        self.conn = sqlite3.connect(path or DEFAULT_DB_PATH)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS cursors (
+                device_id TEXT PRIMARY KEY,
+                last_timestamp TEXT,
+                updated_at TEXT
+            );
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                device_id TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                punch_type TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                UNIQUE (device_id, user_id, timestamp)
+            );
+        """)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    # --- Curseurs -----------------------------------------------------------
+
+    def get_cursor(self, device_id):
+        row = self.conn.execute("SELECT last_timestamp FROM cursors WHERE device_id = ?", (device_id,)).fetchone()
+        return datetime.strptime(row[0], TIMESTAMP_FORMAT) if row and row[0] else None
+
+    def set_cursor(self, device_id, timestamp):
+        self.conn.execute(
+            "INSERT INTO cursors (device_id, last_timestamp, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (device_id) DO UPDATE SET last_timestamp = excluded.last_timestamp, "
+            "updated_at = excluded.updated_at",
+            (device_id, timestamp.strftime(TIMESTAMP_FORMAT), datetime.now().isoformat())
+        )
+        self.conn.commit()
+
+    def server_cursor(self, device_id):
+        """Curseur connu du serveur (None si injoignable ou inconnu)"""
+        try:
+            base_url = self.api_url.rsplit('/attendance', 1)[0]
+            resp = requests.get(f"{base_url}/devices/{device_id}/cursor",
+                                headers={"Authorization": f"Bearer {self.token}"}, timeout=10)
+            if resp.status_code == 200:
+                value = resp.json().get('cursor', {}).get('last_timestamp')
+                return datetime.strptime(value, TIMESTAMP_FORMAT) if value else None
+        except Exception as e:
+            print(f"⚠️  Curseur serveur indisponible : {e}")
+        return None
+
+    def resume_point(self, device_id, since=None):
+        """Date à partir de laquelle envoyer : --since, sinon curseur local, sinon serveur"""
+        if since is not None:
+            return since
+        cursor = self.get_cursor(device_id)
+        if cursor is None:
+            cursor = self.server_cursor(device_id)
+        return cursor
+
+    # --- File d'envoi -------------------------------------------------------
+
+    def enqueue(self, device_id, attendance, since=None):
+        """
+        Met en file les pointages de la pointeuse plus récents que `since`
+        (même seconde incluse : les doublons sont ignorés) et avance le curseur.
+
+        Args:
+            attendance: objets pyzk (user_id, timestamp, punch)
+
+        Returns:
+            int: nombre de pointages mis en file
+        """
+        rows = []
+        newest = None
+        for punch in attendance:
+            if since is not None and punch.timestamp < since:
+                continue
+            rows.append((
+                device_id,
+                str(punch.user_id),
+                punch.timestamp.strftime(TIMESTAMP_FORMAT),
+                "out" if str(punch.punch) == '2' else "in",
+            ))
+            newest = punch.timestamp if newest is None or punch.timestamp > newest else newest
+        before = self.conn.total_changes
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO outbox (device_id, user_id, timestamp, punch_type) VALUES (?, ?, ?, ?)",
+            rows
+        )
+        self.conn.commit()
+        queued = self.conn.total_changes - before
+        if newest is not None:
+            self.set_cursor(device_id, max(newest, self.get_cursor(device_id) or newest))
+        return queued
+
+    def pending_count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def flush(self, batch_size=5000):
+        """
+        Envoie la file par lots. Un lot refusé ou non envoyé reste en file avec
+        un délai exponentiel ; l'envoi s'arrête au premier échec.
+
+        Returns:
+            dict: compteurs renvoyés par l'API (inserted, duplicate...)
+        """
+        headers = {
+            "Authorization": f"Bearer {self.token}",
+            "Content-Type": "application/json"
+        }
+        counts = {}
+        while True:
+            rows = self.conn.execute(
+                "SELECT id, device_id, user_id, timestamp, punch_type FROM outbox "
+                "WHERE next_attempt_at <= ? ORDER BY device_id, timestamp LIMIT ?",
+                (time.time(), batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            device_id = rows[0][1]
+            batch = [row for row in rows if row[1] == device_id]
+            ids = [row[0] for row in batch]
+            payload = {
+                "device_id": device_id,
+                "punches": [{"user_id": user_id, "timestamp": timestamp, "punch_type": punch_type}
+                            for _, _, user_id, timestamp, punch_type in batch]
+            }
+            try:
+                resp = requests.post(self.api_url, json=payload, headers=headers, timeout=30)
+                if resp.status_code != 200:
+                    raise RuntimeError(f"HTTP {resp.status_code}")
+                for status, count in resp.json().get('counts', {}).items():
+                    counts[status] = counts.get(status, 0) + count
+                self.conn.executemany("DELETE FROM outbox WHERE id = ?", [(row_id,) for row_id in ids])
+                self.conn.commit()
+            except Exception as e:
+                self._postpone(ids, str(e))
+                print(f"❌ Lot de {len(ids)} pointages non envoyé ({e}), nouvel essai plus tard")
+                break
+        return counts
+
+    def _postpone(self, ids, error):
+        now = time.time()
+        for row_id in ids:
+            attempts = self.conn.execute("SELECT attempts FROM outbox WHERE id = ?", (row_id,)).fetchone()[0] + 1
+            self.conn.execute(
+                "UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (attempts, now + backoff_delay(attempts), error[:255], row_id)
+            )
+        self.conn.commit()
+
+
+def device_identifier(conn, fallback):
+    """Numéro de série de la pointeuse (ou identifiant de repli)"""
+    try:
+        serial = conn.get_serialnumber()
+        if serial:
+            return str(serial).strip()
+    except Exception:
+        pass
+    return fallback